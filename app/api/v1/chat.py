@@ -1,28 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.schemas.chat import ChatRequest, ChatResponse
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.schemas.chat import ChatRequest, ChatResponse, DataAnalysisResult, RefineRequest
 from app.services.chat_service import ChatService
 from app.services.context_service import ContextService
-from typing import Optional
+from app.services.file_service import FileService
+from app.core.config import settings
+from app.core.executor import ExecutorBusyError, ExecutorTimeoutError
+from app.core.metrics import span
+from app.core.serialization import FastJSONResponse, dumps
+from typing import Optional, Dict, Any, List
+import re
 
 router = APIRouter()
 
+# 会话中记录的引用列数上限
+MAX_REFERENCED_COLUMNS = 50
+
+def _mentions(lowered: str, column: str) -> bool:
+    """
+    查询中是否提到了列名
+
+    列名前后不能紧接英文字母、数字或下划线，避免 id、a、age 这类短列名匹配到 valid、average 等单词；
+    中文前后没有分隔符，不做边界限制
+    """
+    name = re.escape(str(column).lower())
+    return re.search(rf"(?<![a-z0-9_]){name}(?![a-z0-9_])", lowered) is not None
+
+def _referenced_columns(query: str, columns: List[str], previous: List[str]) -> List[str]:
+    """查询中提到的列排在前面，其后是会话中之前引用过的列"""
+    lowered = query.lower()
+    mentioned = [c for c in columns if _mentions(lowered, c)]
+    return list(dict.fromkeys(mentioned + previous))[:MAX_REFERENCED_COLUMNS]
+
+async def _load_analysis_context(
+    request: ChatRequest,
+    context_service: ContextService,
+    file_service: FileService
+) -> Dict[str, Any]:
+    """获取会话上下文，并附加分析所用数据文件的信息"""
+    with span("context_load"):
+        # 不读取完整的对话记录，只在下面读取最近几轮
+        context = await context_service.get_context(request.session_id, include_history=False)
+        if not context:
+            raise HTTPException(
+                status_code=400,
+                detail="未找到有效的会话数据，请先上传CSV文件"
+            )
+        
+        # 对话历史只读取最近几轮，更早的对话已折叠在 history_summary 中
+        context["conversation_history"] = await context_service.get_recent_conversations(
+            request.session_id, settings.HISTORY_LOAD_TURNS
+        )
+    
+    # 确定分析所用的数据文件，默认使用会话中最近上传的文件
+    # 这里只读取parquet元数据，数据本身在执行数据处理指令时按需读取
+    file_id = (request.data_context or {}).get("file_id")
+    if not file_id and context.get("files"):
+        file_id = context["files"][-1]["file_id"]
+    if file_id:
+        with span("data_info"):
+            context["data_info"] = await file_service.get_data_info(request.session_id, file_id)
+        context["data_source"] = {"session_id": request.session_id, "file_id": file_id}
+        # 宽表的数据描述超出预算时，优先保留会话中引用过的列
+        context["referenced_columns"] = _referenced_columns(
+            request.query,
+            (context["data_info"] or {}).get("columns") or [],
+            context.get("referenced_columns") or []
+        )
+        context["prompt_context"] = await file_service.get_prompt_context(
+            request.session_id, file_id, context["referenced_columns"]
+        )
+    if len(context.get("files") or []) > 1:
+        # 会话中有多个文件时，提示词中列出所有表，可以跨表查询
+        context["session_tables"] = await file_service.get_session_tables(
+            request.session_id, context["files"]
+        )
+    return context
+
+async def _save_turn(
+    request: ChatRequest,
+    context: Dict[str, Any],
+    response: Dict[str, Any],
+    context_service: ContextService
+):
+    """保存本轮对话和更新后的会话上下文"""
+    file_id = (context.get("data_source") or {}).get("file_id")
+    with span("context_save"):
+        await context_service.add_conversation(request.session_id, request.query, response, file_id)
+        await context_service.update_context(
+            session_id=request.session_id,
+            new_context={
+                "last_query": request.query,
+                "last_response": response,
+                "referenced_columns": context.get("referenced_columns") or [],
+                "history_summary": context.get("history_summary")
+            }
+        )
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
 @router.post("/analyze", response_model=ChatResponse)
 async def analyze_data(
     request: ChatRequest,
     chat_service: ChatService = Depends(),
-    context_service: ContextService = Depends()
+    context_service: ContextService = Depends(),
+    file_service: FileService = Depends()
 ):
     """
     分析数据并返回结果
     """
     try:
-        # 获取会话上下文
-        context = await context_service.get_context(request.session_id)
-        if not context:
-            raise HTTPException(
-                status_code=400,
-                detail="未找到有效的会话数据，请先上传CSV文件"
-            )
+        context = await _load_analysis_context(request, context_service, file_service)
         
         # 处理分析请求
         response = await chat_service.process_query(
@@ -31,23 +120,107 @@ async def analyze_data(
             data_context=request.data_context
         )
         
-        # 更新会话上下文
-        await context_service.update_context(
-            session_id=request.session_id,
-            new_context={
-                "last_query": request.query,
-                "last_response": response
-            }
-        )
+        # 保存对话记录并更新会话上下文
+        await _save_turn(request, context, response, context_service)
         
         return response
         
+    except (HTTPException, ExecutorBusyError, ExecutorTimeoutError):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"处理分析请求时出错: {str(e)}"
         )
 
+@router.post("/analyze/stream")
+async def analyze_data_stream(
+    request: ChatRequest,
+    chat_service: ChatService = Depends(),
+    context_service: ContextService = Depends(),
+    file_service: FileService = Depends()
+):
+    """
+    以 Server-Sent Events 流式返回分析结果
+
+    事件依次为 answer（回答文本片段）、data_results（数据处理结果）、suggestions、
+    error（数据处理出错时）和 done（完整响应，格式与 /analyze 相同）
+    """
+    context = await _load_analysis_context(request, context_service, file_service)
+    
+    async def event_stream():
+        async for event, data in chat_service.process_query_stream(
+            query=request.query,
+            context=context,
+            data_context=request.data_context
+        ):
+            yield _sse(event, data)
+            if event == "done":
+                await _save_turn(request, context, data, context_service)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/refine", response_model=DataAnalysisResult)
+async def refine_result(
+    request: RefineRequest,
+    chat_service: ChatService = Depends()
+):
+    """
+    对近似结果重新执行精确计算
+
+    operation 和 file_id 取自近似结果的 approximation 字段，结果的格式与 /analyze 中的 data_results 相同
+    """
+    try:
+        result = await chat_service.refine(request.session_id, request.file_id, request.operation)
+    except (ExecutorBusyError, ExecutorTimeoutError):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        **result,
+        "data_type": request.data_type,
+        "suggested_viz_type": request.suggested_viz_type
+    }
+
+@router.get("/results/{session_id}/{file_id}/{result_id}")
+async def get_result_page(
+    session_id: str,
+    file_id: str,
+    result_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    format: str = Query("json", pattern="^(json|arrow)$"),
+    file_service: FileService = Depends()
+):
+    """
+    分页读取保存的分析结果
+
+    format=json 按列返回一页（默认 RESULT_PAGE_SIZE 行，最多 RESULT_MAX_PAGE_SIZE 行）；
+    format=arrow 以 Arrow IPC 流逐批返回，未指定 limit 时返回 offset 之后的所有行
+    """
+    if format == "arrow":
+        stream = file_service.iter_result_ipc(session_id, file_id, result_id, offset, limit)
+        if stream is None:
+            raise HTTPException(status_code=404, detail="未找到分析结果")
+        total_rows, chunks = stream
+        return StreamingResponse(
+            chunks,
+            media_type="application/vnd.apache.arrow.stream",
+            headers={"X-Total-Rows": str(total_rows)}
+        )
+    
+    page = await file_service.get_result_page(
+        session_id, file_id, result_id, offset,
+        min(limit or settings.RESULT_PAGE_SIZE, settings.RESULT_MAX_PAGE_SIZE)
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="未找到分析结果")
+    return FastJSONResponse(page)
+
 @router.get("/context/{session_id}")
 async def get_session_context(
     session_id: str,
@@ -62,4 +235,4 @@ async def get_session_context(
             status_code=404,
             detail="未找到会话上下文"
         )
-    return context 
\ No newline at end of file
+    return FastJSONResponse(context) 
\ No newline at end of file
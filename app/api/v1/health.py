@@ -1,6 +1,13 @@
 from fastapi import APIRouter, HTTPException
-from redis.asyncio import Redis
-from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.scheduler import cleanup_scheduler
+from app.core.executor import dataframe_executor
+from app.core.jobs import upload_jobs
+from app.core.llm_cache import llm_cache
+from app.core.llm_dispatch import llm_dispatcher
+from app.services.file_service import FileService
+from app.utils.dataframe_cache import dataframe_cache
+import asyncio
 
 router = APIRouter()
 
@@ -8,15 +15,21 @@ router = APIRouter()
 async def health_check():
     try:
         # 检查 Redis 连接
-        redis = Redis.from_url(settings.REDIS_URL)
-        await redis.ping()
+        await get_redis().ping()
         
         return {
             "status": "healthy",
             "services": {
                 "api": "up",
                 "redis": "up"
-            }
+            },
+            "dataframe_cache": dataframe_cache.stats(),
+            "dataframe_executor": dataframe_executor.stats(),
+            "llm_cache": llm_cache.stats(),
+            "llm_dispatcher": llm_dispatcher.stats(),
+            "upload_jobs": upload_jobs.stats(),
+            "blob_store": await asyncio.to_thread(FileService().blobs.stats),
+            "cleanup": cleanup_scheduler.metrics
         }
     except Exception as e:
         raise HTTPException(
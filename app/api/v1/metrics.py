@@ -0,0 +1,48 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.executor import dataframe_executor
+from app.core.jobs import upload_jobs
+from app.core.llm_cache import llm_cache
+from app.core.llm_dispatch import llm_dispatcher
+from app.core.metrics import metrics, render_stats
+from app.core.scheduler import cleanup_scheduler
+from app.services.file_service import FileService
+from app.utils.dataframe_cache import dataframe_cache
+import asyncio
+
+router = APIRouter()
+
+# 各组件 stats() 中只增不减的累计字段，以 counter 输出，其余字段以 gauge 输出
+_COUNTERS = {
+    "dataframe_cache": ("hits", "misses", "evictions", "expirations", "invalidations"),
+    "dataframe_executor": ("submitted", "completed", "failed", "rejected", "timeouts", "queue_wait_seconds_total"),
+    "llm_cache": ("hits", "near_duplicate_hits", "misses", "stores", "saved_tokens", "backend_errors"),
+    "llm_dispatcher": (
+        "requests", "completed", "failed", "coalesced", "retries", "timeouts", "rate_limited", "server_errors",
+        "queue_wait_seconds_total",
+    ),
+    "cleanup": ("runs", "skipped", "errors", "total_reclaimed_bytes"),
+}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    以 Prometheus 文本格式输出本进程的指标
+
+    包括请求和各处理阶段的耗时分布、Redis 往返、LLM 调用和 token 用量、数据集行列数，
+    以及 /health 中各组件的统计（累计值以 counter 输出，其余以 gauge 输出）
+    """
+    components = {
+        "dataframe_cache": dataframe_cache.stats(),
+        "dataframe_executor": dataframe_executor.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_dispatcher": llm_dispatcher.stats(),
+        "upload_jobs": upload_jobs.stats(),
+        # blob 统计需要查询数据库，不在事件循环中执行
+        "blob_store": await asyncio.to_thread(FileService().blobs.stats),
+        "cleanup": cleanup_scheduler.metrics,
+    }
+    body = metrics.render() + "".join(
+        render_stats(name, stats, _COUNTERS.get(name, ())) for name, stats in components.items()
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,13 +1,43 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from app.services.file_service import FileService
+from app.core.executor import ExecutorBusyError, ExecutorTimeoutError
+from app.core.metrics import span, PAYLOAD_BYTES
+from app.core.serialization import FastJSONResponse
 from app.services.context_service import ContextService
-from app.schemas.response import UploadResponse
+from app.services.upload_job_service import UploadJobService
+from app.schemas.response import UploadResponse, UploadJobResponse
 from app.core.config import settings
-import pandas as pd
-import uuid
+from pathlib import Path
+from typing import Any, Optional, BinaryIO
+import hashlib
+import tempfile
 
 router = APIRouter()
 
+def _check_file_type(file: UploadFile):
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(
+            status_code=400,
+            detail="只支持CSV文件"
+        )
+
+async def _receive(file: UploadFile, sink: BinaryIO, digest: Optional[Any] = None) -> int:
+    """边读边写入 sink，同时验证文件大小，digest 不为空时同时计算内容哈希，返回文件大小"""
+    file_size = 0
+    with span("upload_receive"):
+        while chunk := await file.read(settings.UPLOAD_READ_CHUNK_SIZE):
+            file_size += len(chunk)
+            if file_size > settings.MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"文件大小超过限制 ({settings.MAX_UPLOAD_SIZE/1024/1024}MB)"
+                )
+            sink.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+    PAYLOAD_BYTES.observe(file_size, stage="upload_receive")
+    return file_size
+
 @router.post("/csv/{session_id}", response_model=UploadResponse)
 async def upload_csv(
     session_id: str,
@@ -16,44 +46,109 @@ async def upload_csv(
     context_service: ContextService = Depends()
 ):
     """上传CSV文件到指定会话"""
-    # 验证文件类型
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(
-            status_code=400,
-            detail="只支持CSV文件"
-        )
+    _check_file_type(file)
     
-    # 验证文件大小
-    file_size = 0
-    content = b''
-    while chunk := await file.read(8192):
-        content += chunk
-        file_size += len(chunk)
-        if file_size > settings.MAX_UPLOAD_SIZE:
+    # 边读边写入临时文件，同时验证文件大小并计算内容哈希
+    # 小文件保留在内存中，超过 UPLOAD_SPOOL_MAX_SIZE 后自动落盘
+    with tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_SIZE) as spool:
+        digest = hashlib.sha256()
+        await _receive(file, spool, digest)
+        
+        try:
+            # 已导入过的内容直接引用已有的数据集，否则分块解析CSV并写入parquet
+            result = await file_service.process_csv(
+                session_id=session_id,
+                filename=file.filename,
+                source=spool,
+                content_hash=digest.hexdigest()
+            )
+            
+            if result["success"]:
+                # 添加文件到会话
+                with span("upload_register"):
+                    await context_service.add_file_to_session(session_id, result)
+            
+            return result
+            
+        except (ExecutorBusyError, ExecutorTimeoutError):
+            raise
+        except Exception as e:
             raise HTTPException(
-                status_code=400,
-                detail=f"文件大小超过限制 ({settings.MAX_UPLOAD_SIZE/1024/1024}MB)"
+                status_code=500,
+                detail=f"处理CSV文件时出错: {str(e)}"
             )
-    
-    try:
-        # 读取CSV数据
-        df = pd.read_csv(pd.io.common.BytesIO(content))
-        
-        # 处理文件
-        result = await file_service.process_csv(
-            session_id=session_id,
-            filename=file.filename,
-            df=df
+
+@router.post("/jobs/{session_id}", response_model=UploadJobResponse, status_code=202)
+async def submit_upload_job(
+    session_id: str,
+    file: UploadFile = File(...),
+    job_service: UploadJobService = Depends()
+):
+    """
+    以后台任务方式上传CSV文件：文件落盘后立即返回任务，通过 GET /jobs/{job_id} 查询进度
+
+    同一会话中重复上传相同内容的文件时返回已有的任务，不重新处理
+    """
+    _check_file_type(file)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=settings.UPLOAD_DIRECTORY, suffix=".csv", delete=False) as f:
+        path = Path(f.name)
+        try:
+            file_size = await _receive(file, f, digest)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+    return await job_service.submit(session_id, file.filename, path, digest.hexdigest(), file_size)
+
+@router.get("/jobs/{job_id}", response_model=UploadJobResponse)
+async def get_upload_job(
+    job_id: str,
+    job_service: UploadJobService = Depends()
+):
+    """查询后台上传任务的状态和进度"""
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="未找到上传任务"
         )
-        
-        if result["success"]:
-            # 添加文件到会话
-            await context_service.add_file_to_session(session_id, result)
-        
-        return result
-        
-    except Exception as e:
+    return job
+
+@router.get("/jobs/{job_id}/result", response_model=UploadResponse)
+async def get_upload_job_result(
+    job_id: str,
+    job_service: UploadJobService = Depends()
+):
+    """获取已完成的后台上传任务的导入结果，与同步上传接口的响应相同"""
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="未找到上传任务"
+        )
+    if job["status"] == "failed":
         raise HTTPException(
             status_code=500,
-            detail=f"处理CSV文件时出错: {str(e)}"
-        ) 
\ No newline at end of file
+            detail=f"处理CSV文件时出错: {job['error']}"
+        )
+    if job["status"] != "done":
+        raise HTTPException(
+            status_code=409,
+            detail=f"上传任务尚未完成（{job['stage']}）"
+        )
+    return job["result"]
+
+@router.get("/profile/{session_id}/{file_id}")
+async def get_file_profile(
+    session_id: str,
+    file_id: str,
+    file_service: FileService = Depends()
+):
+    """获取上传文件的列统计信息（空值数、去重数、取值范围、分位数和高频值）"""
+    profile = await file_service.get_file_profile(session_id, file_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=404,
+            detail="未找到文件统计信息"
+        )
+    return FastJSONResponse(profile)
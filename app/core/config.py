@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
@@ -18,32 +18,108 @@ class Settings(BaseSettings):
     # OpenAI配置
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-3.5-turbo"
+    OPENAI_BASE_URL: Optional[str] = None  # 兼容 OpenAI 接口的服务地址，为空时使用官方地址（测试时可指向本地的假服务）
+    
+    # LLM 调度配置（所有 LLM 调用经过 app.core.llm_dispatch 限流、合并和重试）
+    LLM_MAX_CONCURRENCY: int = 8  # 同时进行的 LLM 调用数
+    LLM_REQUESTS_PER_MINUTE: int = 500  # 每分钟请求数上限，0 为不限制
+    LLM_TOKENS_PER_MINUTE: int = 200_000  # 每分钟 token 数上限（提示词加输出），0 为不限制
+    LLM_TIMEOUT: float = 60  # 单次调用的超时时间（秒），流式调用为等待每个分块的时间
+    LLM_MAX_RETRIES: int = 3  # 超时、429、5xx 和连接错误的最大重试次数
+    LLM_BACKOFF_BASE: float = 0.5  # 指数退避的初始等待时间（秒），实际等待时间在 0 到该值的 2^n 倍之间随机
+    LLM_BACKOFF_MAX: float = 8  # 指数退避的最长等待时间（秒）
     
     # 文件上传配置
-    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_UPLOAD_SIZE: int = 1024 * 1024 * 1024  # 1GB
     ALLOWED_FILE_TYPES: List[str] = ["csv"]
     UPLOAD_DIRECTORY: Path = Path("./uploads")
+    UPLOAD_READ_CHUNK_SIZE: int = 1024 * 1024  # 上传流每次读取的字节数
+    UPLOAD_SPOOL_MAX_SIZE: int = 16 * 1024 * 1024  # 超过该大小后临时文件落盘
+    CSV_CHUNK_ROWS: int = 100_000  # 分块解析CSV时每块的行数（即parquet行组大小）
+    PROFILE_TOP_K: int = 5  # 列统计中保留的高频值个数
+    PROFILE_APPROX_MIN_ROWS: int = 1_000_000  # 达到该行数后高基数非数值列的去重数和高频值改为近似计算
+    PROFILE_SAMPLE_ROWS: int = 100_000  # 近似计算高频值时的抽样行数
+    
+    # 导入类型优化配置（上传时缩小列类型，减少加载后的内存占用和parquet解码时间）
+    INGEST_OPTIMIZE_DTYPES: bool = True  # 整数列按取值范围缩小类型，低基数字符串列转换为分类类型
+    INGEST_MAX_CATEGORIES: int = 10_000  # 取值数不超过该值（且不超过行数一半）的字符串列转换为分类类型
+    INGEST_PARSE_DATES: bool = True  # 取值都是 ISO 8601 日期/时间的字符串列解析为时间列
+    PARQUET_COMPRESSION: str = "zstd"  # parquet 压缩算法（snappy、zstd、lz4、gzip 或 none）
+    PARQUET_COMPRESSION_LEVEL: Optional[int] = None  # 压缩级别，为空时使用算法的默认级别
+    HOT_FORMAT_ENABLED: bool = False  # 同时写入未压缩的 Arrow IPC 文件（data.arrow），加载时内存映射，多个工作进程通过页缓存共享
+    HOT_FORMAT_MAX_BYTES: int = 4 * 1024 * 1024 * 1024  # 内存占用超过该值的数据集不写入 Arrow IPC 文件（写入时整个表需在内存中）
     
     # 缓存配置
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 100  # 共享连接池的最大连接数
+    REDIS_POOL_TIMEOUT: int = 5  # 等待空闲连接的最长时间（秒）
+    REDIS_COMPRESS_MIN_BYTES: int = 4096  # 编码后超过该大小的会话数据压缩后存储
     
     @property
     def REDIS_URL(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
     
-    CACHE_TTL: int = 3600
+    CACHE_TTL: int = 3600  # LLM分析结果缓存的过期时间（秒）
+    LLM_CACHE_SIMILARITY_THRESHOLD: float = 1.0  # 默认只做精确匹配；小于1时开启近似重复匹配（n-gram 相似度阈值，如 0.85）
+    LLM_CACHE_INDEX_SIZE: int = 200  # 每个数据指纹下参与相似度匹配的最近查询数
+    LLM_CACHE_MEMORY_MAX_ENTRIES: int = 1000  # Redis 不可用时进程内缓存的最大条目数
+    DATAFRAME_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 进程内DataFrame缓存容量（字节）
+    QUERY_PUSHDOWN_MIN_BYTES: int = 64 * 1024 * 1024  # parquet超过该大小时按列裁剪/谓词下推读取
+    
+    # 数据处理执行器配置（pandas / pyarrow 计算不在事件循环中执行）
+    DATAFRAME_EXECUTOR_KIND: str = "thread"  # thread、process 或 inline
+    DATAFRAME_EXECUTOR_WORKERS: int = 4  # 工作线程/进程数
+    DATAFRAME_EXECUTOR_MAX_QUEUE: int = 32  # 等待执行的最大任务数，超过后返回503
+    DATAFRAME_JOB_TIMEOUT: float = 60  # 查询类任务的超时时间（秒）
+    UPLOAD_JOB_TIMEOUT: float = 1800  # CSV导入每个阶段的超时时间（秒）
+    UPLOAD_JOB_CONCURRENCY: int = 2  # 同时处理的后台上传任务数，其余任务排队
+    UPLOAD_JOB_TTL: int = 86400  # 后台上传任务状态和内容哈希的保留时间（秒）
+    UPLOAD_JOB_STALE_SECONDS: float = 120  # 排队或处理中的任务超过该时间没有更新状态（处理进程已退出）时视为中断，相同内容可重新上传
+    
+    # 分析结果配置
+    RESULT_PAGE_SIZE: int = 1000  # 超过该行数的结果保存为结果文件，响应中只返回第一页
+    RESULT_MAX_PAGE_SIZE: int = 50000  # 分页接口以 JSON 格式返回时每页的最大行数
+    RESULT_BATCH_ROWS: int = 65536  # 结果文件和 Arrow 流中每个记录批次的行数
+    RESULT_MEMO_MAX_ROWS: int = 100_000  # 不超过该行数的查询结果按指令哈希保存，相同的查询直接读取
+    
+    # 预聚合配置（上传时建立索引，重复的分组、排序和过滤查询直接从索引回答）
+    PREAGGREGATE_ENABLED: bool = True
+    PREAGGREGATE_MAX_GROUPS: int = 1000  # 取值数不超过该值的列作为维度，保存分组偏移和分组聚合结果
+    PREAGGREGATE_MAX_DIMENSIONS: int = 8  # 最多建立索引的维度列数
+    PREAGGREGATE_MAX_MEASURES: int = 8  # 最多保存排序置换和分组统计的数值列数
+    
+    # 近似查询配置（超大文件的探索性统计在上传时抽取的样本上计算，并给出误差范围）
+    SAMPLE_ROWS: int = 200_000  # 上传时抽取的均匀随机样本行数，行数不超过该值的文件不抽样
+    APPROX_AUTO_MIN_ROWS: int = 5_000_000  # 未指定 mode 时，达到该行数的文件自动使用近似查询
+    APPROX_CONFIDENCE: float = 0.95  # 误差范围的置信水平
+    
+    # 提示词配置
+    PROMPT_CONTEXT_TOKEN_BUDGET: int = 1500  # 系统提示词中数据描述的 token 预算
+    HISTORY_TOKEN_BUDGET: int = 1500  # 发送给 LLM 的对话历史（含摘要）的 token 预算
+    HISTORY_VERBATIM_TURNS: int = 4  # 原样保留的最近对话轮数，更早的对话折叠为摘要
+    HISTORY_SUMMARY_TOKEN_BUDGET: int = 400  # 对话摘要的 token 预算，超出时丢弃最早的摘要
+    HISTORY_LOAD_TURNS: int = 20  # 每次分析请求从会话中读取的最近对话轮数
     
     # 会话管理配置
     MAX_CONVERSATION_HISTORY: int = 50  # 每个会话保留的最大对话数
+    CONTEXT_INLINE_RESPONSE_MAX_BYTES: int = 4096  # 超过该大小的回复单独存储，对话记录中只保留引用
     SESSION_EXPIRE_DAYS: int = 7    # 会话过期时间（天）
     MAX_ACTIVE_SESSIONS: int = 100  # 最大活动会话数
+    SESSION_CLEANUP_BATCH_SIZE: int = 500  # 清理会话时每批删除的会话数
     
     # 文件管理配置
     MAX_FILES_PER_SESSION: int = 5  # 每个会话最大文件数
     FILE_EXPIRE_DAYS: int = 7      # 文件保留时间（天）
     CLEANUP_INTERVAL: int = 3600   # 清理间隔（秒）
+    CLEANUP_ENABLED: bool = True   # 是否在应用启动时运行后台清理任务
+    
+    # 性能监控配置（指标通过 /metrics 以 Prometheus 文本格式输出）
+    METRICS_ENABLED: bool = True  # 记录请求耗时、各阶段耗时和 Redis 往返
+    PROFILING_ENABLED: bool = False  # 允许请求带 X-Profile: 1 头触发采样分析，结果保存为火焰图输入格式
+    PROFILING_INTERVAL: float = 0.005  # 采样间隔（秒）
+    PROFILING_DIRECTORY: Path = Path("./profiles")  # 采样分析结果的保存目录
     
     class Config:
         case_sensitive = True
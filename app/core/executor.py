@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Callable, Optional
+from app.core.config import settings
+
+
+class ExecutorBusyError(Exception):
+    """排队的任务数达到上限"""
+
+
+class ExecutorTimeoutError(Exception):
+    """任务执行超时"""
+
+
+def _timed_call(func: Callable, submitted_at: float, args, kwargs):
+    """在工作线程/进程中执行任务，同时返回任务开始执行的时间，用于统计排队等待时间"""
+    started_at = time.time()
+    return started_at, func(*args, **kwargs)
+
+
+class DataFrameExecutor:
+    """
+    pandas / pyarrow 计算任务的有界执行器
+
+    - kind 为 thread（线程池）、process（进程池）或 inline（在事件循环中直接执行，仅用于调试和对比）
+    - 正在执行和排队的任务总数超过 max_workers + max_queue 时拒绝新任务（ExecutorBusyError）
+    - 每个任务有超时时间（ExecutorTimeoutError）。线程无法被强制中止，超时后任务会在后台继续执行完，
+      但仍占用一个排队名额，直到真正结束
+    - 进程池模式下任务函数及参数需要可以被 pickle
+    """
+
+    def __init__(self, kind: str, max_workers: int, max_queue: int, timeout: float):
+        if kind not in ("thread", "process", "inline"):
+            raise ValueError(f"不支持的执行器类型: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+
+    @property
+    def requires_pickling(self) -> bool:
+        return self.kind == "process"
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="dataframe"
+                )
+        return self._pool
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """提交任务并等待结果"""
+        if self.kind == "inline":
+            return func(*args, **kwargs)
+
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise ExecutorBusyError("数据处理任务繁忙，请稍后重试")
+            self._pending += 1
+            self._counters["submitted"] += 1
+
+        submitted_at = time.time()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._get_pool(),
+            functools.partial(_timed_call, func, submitted_at, args, kwargs)
+        )
+        future.add_done_callback(functools.partial(self._on_done, submitted_at))
+
+        try:
+            _, result = await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+            return result
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise ExecutorTimeoutError("数据处理任务超时")
+
+    def _on_done(self, submitted_at: float, future: asyncio.Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._counters["failed"] += 1
+                return
+            started_at, _ = future.result()
+            wait = max(started_at - submitted_at, 0.0)
+            self._counters["completed"] += 1
+            self._counters["queue_wait_seconds_total"] += wait
+            self._counters["queue_wait_seconds_max"] = max(self._counters["queue_wait_seconds_max"], wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self._counters["completed"]
+            return {
+                **self._counters,
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "queue_wait_seconds_avg": (
+                    self._counters["queue_wait_seconds_total"] / completed if completed else 0.0
+                ),
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+dataframe_executor = DataFrameExecutor(
+    kind=settings.DATAFRAME_EXECUTOR_KIND,
+    max_workers=settings.DATAFRAME_EXECUTOR_WORKERS,
+    max_queue=settings.DATAFRAME_EXECUTOR_MAX_QUEUE,
+    timeout=settings.DATAFRAME_JOB_TIMEOUT
+)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.tokens import estimate_tokens
+
+# 原样保留的回答最多保留的字符数
+MAX_ANSWER_CHARS = 800
+# 结果摘要中最多列出的列数
+MAX_DIGEST_COLUMNS = 8
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _turn_key(query: str, content: Any) -> str:
+    raw = json.dumps([query, content], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _result_digest(data_results: Dict[str, Any]) -> str:
+    """把结果表压缩为行数和列名"""
+    data = data_results.get("processed_data")
+    if isinstance(data, list):
+        columns = list(data[0].keys()) if data and isinstance(data[0], dict) else []
+        shown = ", ".join(map(str, columns[:MAX_DIGEST_COLUMNS]))
+        if len(columns) > MAX_DIGEST_COLUMNS:
+            shown += f" 等 {len(columns)} 列"
+        rows = data_results.get("total_rows") or len(data)
+        return f"结果: {rows} 行" + (f"（{shown}）" if shown else "")
+    if isinstance(data, dict):
+        return f"结果: {len(data)} 项"
+    return ""
+
+
+def digest_response(response: Any) -> str:
+    """
+    生成一轮回答在提示词中的内容
+
+    保留回答文本和代码，处理结果只保留行数和列名，不把结果表发回给 LLM
+    """
+    if not isinstance(response, dict):
+        return _truncate(response or "", MAX_ANSWER_CHARS)
+    parts = [_truncate(response.get("answer") or "", MAX_ANSWER_CHARS)]
+    if response.get("code_snippet"):
+        parts.append(f"代码: {_truncate(response['code_snippet'], 200)}")
+    if isinstance(response.get("data_results"), dict):
+        parts.append(_result_digest(response["data_results"]))
+    if response.get("error"):
+        parts.append(f"错误: {_truncate(response['error'], 200)}")
+    return "\n".join(part for part in parts if part)
+
+
+def _summary_line(turn: Dict[str, Any]) -> str:
+    """折叠为摘要的对话每轮一行：问题和回答的第一句"""
+    answer = turn["response"].get("answer") if isinstance(turn["response"], dict) else turn["response"]
+    first_sentence = str(answer or "").replace("！", "。").replace("？", "。").split("。")[0]
+    line = f"- 问: {_truncate(turn['query'], 80)} → 答: {_truncate(first_sentence, 100)}"
+    if isinstance(turn["response"], dict) and isinstance(turn["response"].get("data_results"), dict):
+        line += f"（{_result_digest(turn['response']['data_results'])}）"
+    return line
+
+
+def normalize_turns(history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    把对话历史统一为 {"key", "query", "response"} 的列表
+
+    支持会话中保存的对话记录（含 turn_id、query、response）和
+    请求中传入的消息列表（role/content，assistant 的内容可以是 JSON 编码的回答）
+    """
+    turns = []
+    for item in history or []:
+        if "query" in item:
+            turns.append({
+                "key": item.get("turn_id") or _turn_key(item["query"], item.get("response")),
+                "query": item["query"],
+                "response": item.get("response")
+            })
+        elif item.get("role") == "user":
+            turns.append({"query": item.get("content", ""), "response": None})
+        elif item.get("role") == "assistant" and turns and turns[-1]["response"] is None:
+            content = item.get("content", "")
+            try:
+                parsed = json.loads(content)
+                turns[-1]["response"] = parsed if isinstance(parsed, dict) else content
+            except (TypeError, json.JSONDecodeError):
+                turns[-1]["response"] = content
+    for turn in turns:
+        if "key" not in turn:
+            turn["key"] = _turn_key(turn["query"], turn["response"])
+    return turns
+
+
+def _turn_messages(turn: Dict[str, Any]) -> List[Dict[str, str]]:
+    messages = [{"role": "user", "content": turn["query"]}]
+    if turn["response"] is not None:
+        messages.append({"role": "assistant", "content": digest_response(turn["response"])})
+    return messages
+
+
+def _messages_tokens(messages: List[Dict[str, str]]) -> int:
+    # 每条消息另有角色等格式开销，按 4 个 token 计算
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+def build_history_messages(
+    turns: List[Dict[str, Any]],
+    summary_state: Optional[Dict[str, Any]] = None,
+    token_budget: Optional[int] = None,
+    verbatim_turns: Optional[int] = None,
+    summary_budget: Optional[int] = None
+) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+    """
+    在 token 预算内组装发送给 LLM 的对话历史
+
+    最近 verbatim_turns 轮原样保留（结果表压缩为摘要），放不进预算或更早的对话折叠为滚动摘要。
+    summary_state 是上一次返回的摘要状态，已折叠的对话不会重复处理；返回 (消息列表, 新的摘要状态)
+    """
+    token_budget = settings.HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+    verbatim_turns = settings.HISTORY_VERBATIM_TURNS if verbatim_turns is None else verbatim_turns
+    summary_budget = settings.HISTORY_SUMMARY_TOKEN_BUDGET if summary_budget is None else summary_budget
+
+    # 从最新的对话往前，选出原样保留的对话
+    available = token_budget - summary_budget
+    boundary = len(turns)
+    recent = []
+    while boundary > 0 and len(turns) - boundary < verbatim_turns:
+        messages = _turn_messages(turns[boundary - 1])
+        cost = _messages_tokens(messages)
+        if cost > available:
+            break
+        recent = messages + recent
+        available -= cost
+        boundary -= 1
+
+    # 在上次的摘要基础上继续折叠；上次已折叠的对话不再原样保留
+    keys = [turn["key"] for turn in turns]
+    if summary_state and summary_state.get("last_key") in keys:
+        start = keys.index(summary_state["last_key"]) + 1
+        lines = list(summary_state["lines"])
+        omitted = summary_state.get("omitted", 0)
+        if start > boundary:
+            recent = [m for turn in turns[start:] for m in _turn_messages(turn)]
+            boundary = start
+    else:
+        start, lines, omitted = 0, [], 0
+    lines.extend(_summary_line(turn) for turn in turns[start:boundary])
+
+    # 摘要超出预算时丢弃最早的内容
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    total = sum(costs)
+    while lines and total > summary_budget:
+        total -= costs.pop(0)
+        lines.pop(0)
+        omitted += 1
+
+    state = {"last_key": keys[boundary - 1], "lines": lines, "omitted": omitted} if boundary else summary_state
+    messages = []
+    if lines:
+        header = "之前的对话摘要" + (f"（更早的 {omitted} 轮已省略）" if omitted else "") + ":"
+        messages.append({"role": "system", "content": "\n".join([header] + lines)})
+    return messages + recent, state
@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Callable, Optional, Set
+from app.core.config import settings
+
+
+class JobRunner:
+    """
+    进程内的后台任务池，由 app.main 的 lifespan 停止
+
+    同时执行的任务数不超过 concurrency，其余任务在 slot() 处排队。
+    任务中的计算仍交给数据处理执行器，这里只限制同时进行的任务数，避免大量任务排满执行器队列
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = 0
+
+    def start(self, func: Callable, *args) -> asyncio.Task:
+        """在后台执行 func(*args)，func 应通过 slot() 获取执行名额"""
+        task = asyncio.create_task(func(*args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @asynccontextmanager
+    async def slot(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            self._running += 1
+            try:
+                yield
+            finally:
+                self._running -= 1
+
+    async def wait(self):
+        """等待所有后台任务结束"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def stop(self):
+        """取消并等待所有后台任务"""
+        for task in self._tasks:
+            task.cancel()
+        await self.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "queued": len(self._tasks) - self._running,
+        }
+
+
+upload_jobs = JobRunner(settings.UPLOAD_JOB_CONCURRENCY)
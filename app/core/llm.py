@@ -1,16 +1,127 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, AsyncIterator, Tuple
 import openai
 from app.core.config import settings
+from app.core.history import build_history_messages, normalize_turns
+from app.core.llm_cache import llm_cache
+from app.core.llm_dispatch import llm_dispatcher
+from app.core.metrics import span
+from app.utils.json_stream import IncrementalJSONParser
+from app.schemas.operation import parse_operation
+from app.utils.prompt_context import build_tables_context
+from app.utils.session_query import is_session_operation
 import json
 import pandas as pd
 
-class LLMManager:
+class OpenAIChatClient:
+    """OpenAI 对话接口的封装，测试和基准测试中可替换为离线的假实现"""
+    
     def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+        self._client = None
+    
+    def _get_client(self) -> openai.AsyncOpenAI:
+        # 重试由 llm_dispatcher 负责，关闭 SDK 自身的重试，避免重试次数叠加
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=0
+            )
+        return self._client
+    
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """返回回复内容和本次调用消耗的 token 数"""
+        response = await self._get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return {
+            "content": response.choices[0].message.content,
+            "total_tokens": response.usage.total_tokens if response.usage else 0
+        }
+    
+    async def stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式返回回复内容：每个分块产出 {"content": 文本}，最后产出 {"total_tokens": token数}"""
+        response = await self._get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield {"content": chunk.choices[0].delta.content}
+            if chunk.usage:
+                yield {"total_tokens": chunk.usage.total_tokens}
+
+# 默认使用的客户端，替换该对象即可让所有 LLMManager 使用假实现
+chat_client = OpenAIChatClient()
+
+_SYSTEM_PROMPT = """你是一个数据分析助手。请根据用户的问题和下面的数据信息，生成相应的数据处理方案。
+
+你需要返回以下格式的 JSON 响应:
+{
+    "answer": "对分析结果的解释",
+    "data_operation": 数据处理指令（见下方格式，不需要处理数据时为 null）,
+    "data_type": "返回数据类型(table/series/aggregation)",
+    "suggested_viz_type": "建议的可视化类型",
+    "code_snippet": "使用的pandas代码",
+    "suggestions": ["后续分析建议"]
+}
+
+data_operation 的格式（聚合函数可选 sum/mean/median/min/max/count/nunique/std/var/first/last/size）:
+{"type": "aggregation", "columns": ["分组列"], "target_columns": ["聚合列"], "agg_func": "sum"}，或用 "aggregations": {"列": ["sum", "mean"]} 为各列指定多个函数
+{"type": "filter", "query": "过滤表达式", "columns": ["返回的列（可选）"], "limit": 行数（可选）}
+{"type": "sort", "columns": ["排序列"], "ascending": true, "limit": 行数（可选）}
+{"type": "top_k", "columns": ["排序列"], "k": 10, "ascending": false}
+{"type": "statistical", "method": "correlation/describe", "columns": ["列"]}
+{"type": "histogram", "column": "数值列", "bins": 箱数或箱边界列表, "target_columns": ["各箱内聚合的列（可选）"], "agg_func": "mean"}
+{"type": "pivot", "index": ["行"], "columns": ["展开为列"], "values": ["值"], "agg_func": "sum"}
+{"type": "rolling", "columns": ["列"], "window": 行数或"7D"这样的时间窗口, "func": "mean", "order_by": "排序列"}
+{"type": "resample", "on": "时间列", "rule": "D/W/ME/QE/YE", "target_columns": ["聚合列"], "agg_func": "sum", "columns": ["分组列（可选）"]}
+过滤表达式只能使用列名（含空格等字符时用反引号括起）、常量、比较、in/not in、and/or/not、四则运算，
+以及 列.isna()、列.notna()、列.str.contains('文本')、列.str.startswith('文本')、列.str.endswith('文本')"""
+
+class LLMManager:
+    def __init__(self, client: Optional[OpenAIChatClient] = None):
+        self.client = client or chat_client
         self.model = settings.OPENAI_MODEL  # 例如 "gpt-4" 或 "gpt-3.5-turbo"
         
     def _generate_system_prompt(self, context: Dict[str, Any]) -> str:
-        """生成系统提示，包含数据上下文和分析要求"""
+        """
+        生成系统提示，包含数据上下文和分析要求
+
+        固定的分析要求在前、数据描述在后：所有请求共享相同的前缀，同一文件的完整提示词逐字节相同，
+        可以利用模型服务端的提示词缓存
+        """
+        prompt = f"{_SYSTEM_PROMPT}\n\n{self._data_description(context)}"
+        if context.get('session_tables'):
+            current_file_id = (context.get('data_source') or {}).get('file_id')
+            prompt += f"\n\n{build_tables_context(context['session_tables'], current_file_id)}"
+        return prompt
+
+    @staticmethod
+    def _data_description(context: Dict[str, Any]) -> str:
+        prompt_context = context.get('prompt_context')
+        if prompt_context:
+            # 上传时生成的数据描述
+            return prompt_context['text']
+        
         df = context.get('data')
         if df is not None and isinstance(df, pd.DataFrame):
             data_info = {
@@ -20,25 +131,41 @@ class LLMManager:
                 "sample": df.head(3).to_dict(orient='records')
             }
         else:
-            data_info = {}
+            # 未加载数据时使用从parquet元数据读取的数据信息
+            data_info = context.get('data_info') or {}
+        return f"数据信息: {json.dumps(data_info, ensure_ascii=False, default=str)}"
 
-        return f"""你是一个数据分析助手。请根据用户的问题，生成相应的数据处理方案。
-数据信息: {json.dumps(data_info, ensure_ascii=False)}
+    def _build_messages(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        history: Optional[List[Dict[str, str]]]
+    ) -> List[Dict[str, str]]:
+        system_prompt = self._generate_system_prompt(context)
+        
+        # 对话历史放在当前问题之前
+        return [
+            {"role": "system", "content": system_prompt},
+            *(history or []),
+            {"role": "user", "content": query}
+        ]
 
-你需要返回以下格式的 JSON 响应:
-{{
-    "answer": "对分析结果的解释",
-    "data_operation": {{
-        "type": "操作类型(aggregation/filter/sort/statistical)",
-        "method": "具体方法",
-        "columns": ["涉及的列"],
-        "additional_params": {{}}
-    }},
-    "data_type": "返回数据类型(table/series/aggregation)",
-    "suggested_viz_type": "建议的可视化类型",
-    "code_snippet": "使用的pandas代码",
-    "suggestions": ["后续分析建议"]
-}}"""
+    def _history_messages(
+        self,
+        context: Dict[str, Any],
+        data_context: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, str]]:
+        """
+        在 token 预算内组装对话历史，优先使用请求中传入的 history，否则使用会话中的对话记录
+
+        更新后的摘要状态写回 context["history_summary"]，由调用方随会话上下文保存
+        """
+        history = (data_context or {}).get('history') or context.get('conversation_history')
+        messages, context['history_summary'] = build_history_messages(
+            normalize_turns(history or []),
+            context.get('history_summary')
+        )
+        return messages
 
     async def analyze(
         self,
@@ -48,36 +175,41 @@ class LLMManager:
     ) -> Dict[str, Any]:
         """
         分析用户查询并生成数据处理方案
+
+        相同数据结构和对话历史下的相同（或近似重复的）问题直接返回缓存的结果
         """
         try:
-            system_prompt = self._generate_system_prompt(context)
+            with span("history_build"):
+                history = self._history_messages(context, data_context)
+            with span("llm_cache"):
+                cache_scope = llm_cache.scope(context, history, self.model)
+                cached = await llm_cache.get(cache_scope, query)
+            if cached is not None:
+                return cached
             
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ]
-            
-            # 如果有历史上下文，添加到消息中
-            if data_context and 'history' in data_context:
-                messages.extend(data_context['history'])
+            with span("prompt_build"):
+                messages = self._build_messages(query, context, history)
+            with span("llm_call"):
+                completion = await llm_dispatcher.complete(
+                    self.client,
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.2,  # 降低随机性，保持输出的一致性
+                    max_tokens=2000
+                )
 
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
-                messages=messages,
-                temperature=0.2,  # 降低随机性，保持输出的一致性
-                max_tokens=2000
-            )
-
-            # 解析 LLM 响应
+            # 解析 LLM 响应，只缓存结构化的结果
             try:
-                result = json.loads(response.choices[0].message.content)
-                return result
+                result = json.loads(completion["content"])
             except json.JSONDecodeError:
                 # 如果无法解析为JSON，返回原始回答
                 return {
-                    "answer": response.choices[0].message.content,
+                    "answer": completion["content"],
                     "suggestions": ["无法生成结构化的数据处理方案"]
                 }
+            with span("llm_cache"):
+                await llm_cache.set(cache_scope, query, result, completion["total_tokens"])
+            return result
 
         except Exception as e:
             return {
@@ -85,17 +217,78 @@ class LLMManager:
                 "error": str(e)
             }
 
+    async def analyze_stream(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        data_context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Optional[str], Any]]:
+        """
+        流式分析用户查询
+
+        依次产出:
+        - ("delta", "answer", 文本片段)：answer 字段随生成逐步产出
+        - ("field", 字段名, 值)：某个顶层字段生成完毕，如 data_operation 完整后即可开始执行数据处理
+        - ("result", None, 完整结果)：与 analyze 的返回值相同
+        """
+        try:
+            with span("history_build"):
+                history = self._history_messages(context, data_context)
+            with span("llm_cache"):
+                cache_scope = llm_cache.scope(context, history, self.model)
+                cached = await llm_cache.get(cache_scope, query)
+            if cached is not None:
+                if cached.get("answer"):
+                    yield ("delta", "answer", cached["answer"])
+                for key, value in cached.items():
+                    yield ("field", key, value)
+                yield ("result", None, cached)
+                return
+            
+            with span("prompt_build"):
+                messages = self._build_messages(query, context, history)
+            parser = IncrementalJSONParser(stream_keys=("answer",))
+            content = []
+            total_tokens = 0
+            async for chunk in llm_dispatcher.stream(
+                self.client,
+                model=self.model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=2000
+            ):
+                if "content" in chunk:
+                    content.append(chunk["content"])
+                    for event in parser.feed(chunk["content"]):
+                        yield event
+                total_tokens = chunk.get("total_tokens", total_tokens)
+            
+            result = parser.result()
+            if result is None:
+                # 无法解析为JSON时，把原始回答作为 answer 返回
+                text = "".join(content)
+                if "answer" not in parser.fields:
+                    yield ("delta", "answer", text)
+                yield ("result", None, {
+                    "answer": text,
+                    "suggestions": ["无法生成结构化的数据处理方案"]
+                })
+                return
+            await llm_cache.set(cache_scope, query, result, total_tokens)
+            yield ("result", None, result)
+        
+        except Exception as e:
+            yield ("result", None, {
+                "answer": f"分析过程中出现错误: {str(e)}",
+                "error": str(e)
+            })
+
     def _validate_operation(self, operation: Dict[str, Any]) -> bool:
         """验证操作指令的合法性"""
-        required_fields = {
-            "aggregation": ["method", "columns", "target_columns"],
-            "filter": ["query"],
-            "sort": ["columns"],
-            "statistical": ["method", "columns"]
-        }
-        
-        op_type = operation.get("type")
-        if op_type not in required_fields:
+        if is_session_operation(operation):
+            return True
+        try:
+            parse_operation(operation)
+        except ValueError:
             return False
-            
-        return all(field in operation for field in required_fields[op_type]) 
\ No newline at end of file
+        return True 
\ No newline at end of file
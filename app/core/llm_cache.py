@@ -0,0 +1,244 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.serialization import encode_blob, decode_blob
+
+_KEY_PREFIX = "llm_cache"
+_PUNCTUATION = re.compile(r"[\s\.,!?;:，。！？；：、\"'“”‘’（）()]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# 中文字符之间的空格没有意义
+_CJK_SPACE = re.compile(r"(?<=[\u4e00-\u9fff]) | (?=[\u4e00-\u9fff])")
+
+
+def normalize_query(query: str) -> str:
+    """全角转半角、转小写、去掉空白和标点，使措辞上的细微差别不影响缓存命中"""
+    text = _PUNCTUATION.sub(" ", unicodedata.normalize("NFKC", query).lower()).strip()
+    return _CJK_SPACE.sub("", text)
+
+
+def dataset_fingerprint(context: Dict[str, Any]) -> str:
+    """由数据（以及会话中其他表）的列名、类型和行列数生成指纹，数据结构变化后缓存自动失效"""
+    df = context.get("data")
+    if df is not None:
+        schema = {
+            "columns": list(df.columns),
+            "dtypes": df.dtypes.astype(str).to_dict(),
+            "shape": list(df.shape),
+        }
+    else:
+        data_info = context.get("data_info") or {}
+        schema = {key: data_info.get(key) for key in ("columns", "dtypes", "shape")}
+    if context.get("session_tables"):
+        # 可以跨表查询时，其他表的结构变化也会影响分析结果
+        schema["tables"] = [[t["name"], t["columns"]] for t in context["session_tables"]]
+    return _digest(schema)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+# 英文单词、数字和单个汉字
+_TOKEN = re.compile(r"[a-z0-9_]+|[\u4e00-\u9fff]")
+# 近似重复的查询之间只允许相差这些不影响含义的词
+_STOPWORDS = frozenset({
+    "a", "an", "the", "please", "me", "show", "tell", "give", "can", "could", "you", "i", "want", "to", "know",
+    "请", "帮", "我", "一", "下", "的", "了", "吗", "呢", "吧", "看", "给",
+})
+
+
+def _ngrams(text: str, n: int = 3) -> set:
+    text = f" {text} "
+    return {text[i:i + n] for i in range(max(len(text) - n + 1, 1))}
+
+
+def query_similarity(a: str, b: str) -> float:
+    """
+    两个已规范化查询的字符 n-gram Jaccard 相似度
+
+    按字符切分，对中文和英文都适用。字符相似的查询含义可能相反（north/south、ascending/descending、
+    is null/is not null），因此两个查询中不同的词只能是 _STOPWORDS 中的虚词，否则视为不相似；
+    查询中的数字不同时（如 top 5 与 top 10）同样视为不相似
+    """
+    if _NUMBER.findall(a) != _NUMBER.findall(b):
+        return 0.0
+    if not set(_TOKEN.findall(a)) ^ set(_TOKEN.findall(b)) <= _STOPWORDS:
+        return 0.0
+    grams_a, grams_b = _ngrams(a), _ngrams(b)
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class _MemoryBackend:
+    """Redis 不可用时使用的进程内缓存，按条目数做 LRU 淘汰"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._indexes: Dict[str, "OrderedDict[str, str]"] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def index_add(self, scope: str, query: str, key: str, max_size: int):
+        with self._lock:
+            index = self._indexes.setdefault(scope, OrderedDict())
+            index[query] = key
+            index.move_to_end(query)
+            while len(index) > max_size:
+                index.popitem(last=False)
+
+    def index_items(self, scope: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._indexes.get(scope, {}))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._indexes.clear()
+
+
+class LLMResponseCache:
+    """
+    LLM 分析结果缓存
+
+    - 键由数据指纹、规范化后的查询、对话历史和模型名组成
+    - 优先存储在 Redis 中（各 worker 共享），Redis 出错时退回进程内缓存
+    - 精确未命中时，在同一数据指纹和历史下按 n-gram 相似度查找近似重复的查询
+    - 统计命中率和节省的 token 数
+    """
+
+    def __init__(self, ttl: int, similarity_threshold: float, index_size: int, memory_max_entries: int):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.index_size = index_size
+        self._memory = _MemoryBackend(memory_max_entries)
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "near_duplicate_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "saved_tokens": 0,
+            "backend_errors": 0,
+        }
+
+    @staticmethod
+    def scope(context: Dict[str, Any], history: Optional[List[Dict[str, Any]]], model: str) -> str:
+        """相同数据结构、对话历史和模型下的查询可以互相复用结果"""
+        return f"{model}:{dataset_fingerprint(context)}:{_digest(history or [])[:16]}"
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    async def get(self, scope: str, query: str) -> Optional[Dict[str, Any]]:
+        """查找缓存的分析结果，命中时返回 LLM 的原始响应"""
+        normalized = normalize_query(query)
+        key = self._entry_key(scope, normalized)
+        raw = await self._backend_get(key)
+        counter = "hits"
+
+        if raw is None and self.similarity_threshold < 1:
+            match = await self._find_similar(scope, normalized)
+            if match is not None:
+                raw = await self._backend_get(match)
+                counter = "near_duplicate_hits"
+
+        if raw is None:
+            self._count("misses")
+            return None
+        entry = decode_blob(raw)
+        self._count(counter)
+        self._count("saved_tokens", entry.get("tokens", 0))
+        return entry["response"]
+
+    async def set(self, scope: str, query: str, response: Dict[str, Any], tokens: int):
+        normalized = normalize_query(query)
+        key = self._entry_key(scope, normalized)
+        value = encode_blob({"response": response, "tokens": tokens})
+        index_key = f"{_KEY_PREFIX}:index:{scope}"
+        try:
+            redis = get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=self.ttl)
+                pipe.zadd(index_key, {f"{normalized}\n{key}": time.time()})
+                # 索引只保留最近的 index_size 个查询
+                pipe.zremrangebyrank(index_key, 0, -self.index_size - 1)
+                pipe.expire(index_key, self.ttl)
+                await pipe.execute()
+        except RedisError:
+            self._count("backend_errors")
+            self._memory.set(key, value, self.ttl)
+            self._memory.index_add(scope, normalized, key, self.index_size)
+        self._count("stores")
+
+    async def _find_similar(self, scope: str, normalized: str) -> Optional[str]:
+        try:
+            members = await get_redis().zrange(f"{_KEY_PREFIX}:index:{scope}", 0, -1)
+            candidates = dict(member.split("\n", 1) for member in members)
+        except RedisError:
+            self._count("backend_errors")
+            candidates = self._memory.index_items(scope)
+
+        best_key, best_score = None, self.similarity_threshold
+        for candidate, key in candidates.items():
+            score = query_similarity(normalized, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    async def _backend_get(self, key: str) -> Optional[str]:
+        try:
+            return await get_redis().get(key)
+        except RedisError:
+            self._count("backend_errors")
+            return self._memory.get(key)
+
+    @staticmethod
+    def _entry_key(scope: str, normalized: str) -> str:
+        return f"{_KEY_PREFIX}:{_digest([scope, normalized])}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._counters["hits"] + self._counters["near_duplicate_hits"]
+            lookups = hits + self._counters["misses"]
+            return {**self._counters, "hit_rate": hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        """清空进程内缓存和统计（用于测试）"""
+        self._memory.clear()
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+
+llm_cache = LLMResponseCache(
+    ttl=settings.CACHE_TTL,
+    similarity_threshold=settings.LLM_CACHE_SIMILARITY_THRESHOLD,
+    index_size=settings.LLM_CACHE_INDEX_SIZE,
+    memory_max_entries=settings.LLM_CACHE_MEMORY_MAX_ENTRIES
+)
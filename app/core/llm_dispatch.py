@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, AsyncIterator
+import openai
+from app.core.config import settings
+from app.core.metrics import LLM_CALL_SECONDS, LLM_TOKENS
+from app.utils.tokens import estimate_tokens
+
+# 保留最近多少次调用的耗时用于计算分位数
+_LATENCY_WINDOW = 1000
+# 服务端 Retry-After 的最长等待时间（秒）
+_MAX_RETRY_AFTER = 60
+
+
+class LLMTimeoutError(Exception):
+    """LLM 调用超时，且已用完重试次数"""
+
+
+class TokenBucket:
+    """
+    令牌桶：每分钟补充 per_minute 个令牌，最多积累一分钟的额度
+
+    per_minute 不大于 0 时不限制
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.per_minute, self._tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """取走 amount 个令牌需要等待的秒数；超过桶容量的请求按容量计算，避免永远等不到"""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill()
+        return max(min(amount, self.per_minute) - self._tokens, 0.0) * 60 / self.per_minute
+
+    def take(self, amount: float):
+        if self.per_minute > 0:
+            self._refill()
+            self._tokens -= min(amount, self.per_minute)
+
+    def give(self, amount: float):
+        """按实际用量校正：归还预估多扣的令牌，amount 为负数时补扣"""
+        if self.per_minute > 0:
+            self._refill()
+            self._tokens = min(self.per_minute, self._tokens + amount)
+
+
+class _LoopState:
+    """与事件循环绑定的同步原语和进行中的请求"""
+
+    def __init__(self, max_concurrency: int):
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_lock = asyncio.Lock()
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: BaseException) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after", 0)), _MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _request_key(client: Any, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    payload = json.dumps([model, messages, temperature, max_tokens], ensure_ascii=False, sort_keys=True)
+    return f"{id(client)}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+def _estimated_cost(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    # 调用前按提示词长度加最大输出长度预估 token 数，完成后按实际用量校正
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages) + max_tokens
+
+
+class LLMDispatcher:
+    """
+    LLM 调用的调度层，所有 LLMManager 的请求都经过这里发送
+
+    - 并发数不超过 max_concurrency，超出的请求排队等待
+    - 按每分钟请求数和 token 数两个令牌桶限流，token 按预估值扣除，完成后按实际用量校正
+    - 相同的非流式请求（模型、消息、参数都相同）进行中时，后来的请求等待同一个结果
+    - 每次调用有超时时间（流式调用为每个分块的等待时间）；超时、429、5xx 和连接错误
+      按带随机抖动的指数退避重试，服务端返回 Retry-After 时至少等待该时间；
+      流式调用只在产出第一个分块之前重试
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        timeout: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._state: Optional[_LoopState] = None
+        self._queued = 0
+        self._active = 0
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._counters = {
+            "requests": 0,
+            "completed": 0,
+            "failed": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+
+    def _loop_state(self) -> _LoopState:
+        # asyncio 的同步原语只能在一个事件循环中使用，事件循环变化时（如测试中多次 asyncio.run）重新创建
+        if self._state is None or self._state.loop is not asyncio.get_running_loop():
+            self._state = _LoopState(self.max_concurrency)
+        return self._state
+
+    async def _acquire_rate(self, state: _LoopState, cost: int):
+        # 持有锁等待，保证按到达顺序获得额度
+        async with state.rate_lock:
+            while True:
+                wait = max(self._requests.delay(1), self._tokens.delay(cost))
+                if wait <= 0:
+                    self._requests.take(1)
+                    self._tokens.take(cost)
+                    return
+                await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def _slot(self, cost: int):
+        """等待并发名额和限流额度"""
+        state = self._loop_state()
+        queued_at = time.monotonic()
+        self._queued += 1
+        try:
+            await state.semaphore.acquire()
+            try:
+                await self._acquire_rate(state, cost)
+            except BaseException:
+                state.semaphore.release()
+                raise
+        finally:
+            self._queued -= 1
+        wait = time.monotonic() - queued_at
+        self._counters["requests"] += 1
+        self._counters["queue_wait_seconds_total"] += wait
+        self._counters["queue_wait_seconds_max"] = max(self._counters["queue_wait_seconds_max"], wait)
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            state.semaphore.release()
+
+    def _finish(self, mode: str, started: float, cost: int, total_tokens: Optional[int]):
+        latency = time.monotonic() - started
+        self._counters["completed"] += 1
+        self._latencies.append(latency)
+        LLM_CALL_SECONDS.observe(latency, mode=mode)
+        if total_tokens:
+            self._tokens.give(cost - total_tokens)
+            LLM_TOKENS.inc(total_tokens, mode=mode)
+
+    def _retry_delay(self, exc: BaseException, attempt: int) -> float:
+        """返回重试前的等待时间；不可重试或已用完重试次数时抛出异常"""
+        status = _status_code(exc)
+        timed_out = isinstance(exc, asyncio.TimeoutError)
+        if timed_out:
+            self._counters["timeouts"] += 1
+        elif status == 429:
+            self._counters["rate_limited"] += 1
+        elif status is not None and status >= 500:
+            self._counters["server_errors"] += 1
+
+        retryable = (
+            timed_out
+            or isinstance(exc, openai.APIConnectionError)
+            or status == 429
+            or (status is not None and status >= 500)
+        )
+        if not retryable or attempt >= self.max_retries:
+            self._counters["failed"] += 1
+            if timed_out:
+                raise LLMTimeoutError(f"LLM 请求超时（{self.timeout}秒）") from exc
+            raise exc
+        self._counters["retries"] += 1
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(backoff, _retry_after(exc))
+
+    async def complete(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """与 client.complete 相同，进行中的相同请求只调用一次"""
+        state = self._loop_state()
+        key = _request_key(client, model, messages, temperature, max_tokens)
+        task = state.inflight.get(key)
+        if task is not None:
+            self._counters["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._complete(client, model, messages, temperature, max_tokens))
+            state.inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(state, key, t))
+        # 某个等待者被取消时不影响其他等待同一结果的请求
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _on_done(state: _LoopState, key: str, task: asyncio.Task):
+        state.inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+
+    async def _complete(self, client, model, messages, temperature, max_tokens) -> Dict[str, Any]:
+        cost = _estimated_cost(messages, max_tokens)
+        attempt = 0
+        while True:
+            async with self._slot(cost):
+                started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(
+                        client.complete(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens),
+                        self.timeout
+                    )
+                except Exception as exc:
+                    error = exc
+                else:
+                    self._finish("complete", started, cost, result.get("total_tokens"))
+                    return result
+            delay = self._retry_delay(error, attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def stream(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """与 client.stream 相同；整个流式输出期间占用一个并发名额"""
+        cost = _estimated_cost(messages, max_tokens)
+        attempt = 0
+        while True:
+            async with self._slot(cost):
+                started = time.monotonic()
+                chunks = client.stream(
+                    model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+                ).__aiter__()
+                try:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        self._finish("stream", started, cost, None)
+                        return
+                    except Exception as exc:
+                        error = exc
+                    else:
+                        total_tokens = None
+                        while True:
+                            total_tokens = chunk.get("total_tokens", total_tokens)
+                            yield chunk
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError as exc:
+                                self._counters["timeouts"] += 1
+                                self._counters["failed"] += 1
+                                raise LLMTimeoutError(f"LLM 流式输出超时（{self.timeout}秒）") from exc
+                            except Exception:
+                                self._counters["failed"] += 1
+                                raise
+                        self._finish("stream", started, cost, total_tokens)
+                        return
+                finally:
+                    aclose = getattr(chunks, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+            delay = self._retry_delay(error, attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(q: float) -> float:
+            return latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+
+        requests = self._counters["requests"]
+        return {
+            **self._counters,
+            "max_concurrency": self.max_concurrency,
+            "requests_per_minute": self._requests.per_minute,
+            "tokens_per_minute": self._tokens.per_minute,
+            "queued": self._queued,
+            "in_flight": self._active,
+            "queue_wait_seconds_avg": self._counters["queue_wait_seconds_total"] / requests if requests else 0.0,
+            "latency_seconds_p50": percentile(0.5),
+            "latency_seconds_p95": percentile(0.95),
+            "latency_seconds_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+llm_dispatcher = LLMDispatcher(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    timeout=settings.LLM_TIMEOUT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base=settings.LLM_BACKOFF_BASE,
+    backoff_max=settings.LLM_BACKOFF_MAX
+)
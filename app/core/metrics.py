@@ -0,0 +1,262 @@
+from typing import Dict, Any, Optional, List, Tuple, Iterator, Sequence
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import threading
+import time
+
+# 耗时（秒）、字节数和行列数的默认分桶
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(11))  # 256B ~ 256MB
+COUNT_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, Any]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self._samples()]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """按分桶累计的观测值分布，另记录总和与次数"""
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签对应 [各分桶计数（最后一个为 +Inf）, 总和, 次数]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表，以 Prometheus 文本格式输出
+
+    每个 uvicorn 工作进程各自计数，多进程部署时按进程分别抓取
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+def render_stats(prefix: str, stats: Dict[str, Any], counters: Sequence[str] = ()) -> str:
+    """
+    把组件 stats() 中的数值字段输出为 Prometheus 指标
+
+    counters 中的字段（只增不减的累计值）输出为 counter，名称加 _total 后缀（已有时不重复添加），
+    其余数值字段输出为 gauge；非数值字段（如执行器类型）和空值跳过
+    """
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"{prefix}_{key}"
+            if key in counters:
+                name = name if name.endswith("_total") else f"{name}_total"
+                lines += [f"# TYPE {name} counter", f"{name} {_format_value(value)}"]
+            else:
+                lines += [f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "请求处理耗时（流式响应含发送时间）", ("method", "route", "status")
+)
+HTTP_REQUEST_BYTES = metrics.histogram("http_request_size_bytes", "请求体大小", ("route",), SIZE_BUCKETS)
+HTTP_RESPONSE_BYTES = metrics.histogram("http_response_size_bytes", "响应体大小", ("route",), SIZE_BUCKETS)
+HTTP_REDIS_ROUND_TRIPS = metrics.histogram(
+    "http_request_redis_round_trips", "每个请求的 Redis 往返次数", ("route",), (0, 1, 2, 4, 8, 16, 32, 64)
+)
+STAGE_SECONDS = metrics.histogram("stage_duration_seconds", "请求内各处理阶段的耗时", ("stage",))
+REDIS_COMMAND_SECONDS = metrics.histogram(
+    "redis_command_duration_seconds", "Redis 命令（流水线按一次往返计）的耗时", ("command",)
+)
+REDIS_PAYLOAD_BYTES = metrics.histogram(
+    "redis_payload_bytes", "Redis 命令发送和返回的数据大小", ("command", "direction"), SIZE_BUCKETS
+)
+LLM_CALL_SECONDS = metrics.histogram("llm_call_duration_seconds", "单次 LLM 调用（不含排队）的耗时", ("mode",))
+LLM_TOKENS = metrics.counter("llm_tokens_total", "LLM 调用消耗的 token 数（提示词加输出）", ("mode",))
+DATAFRAME_ROWS = metrics.histogram("dataframe_rows", "导入的数据集和数据处理结果的行数", ("source",), COUNT_BUCKETS)
+DATAFRAME_COLUMNS = metrics.histogram(
+    "dataframe_columns", "导入的数据集和数据处理结果的列数", ("source",), (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+PAYLOAD_BYTES = metrics.histogram("payload_size_bytes", "各处理阶段产生的数据大小", ("stage",), SIZE_BUCKETS)
+
+
+class RequestTrace:
+    """一个请求内记录的阶段耗时和 Redis 往返次数，由中间件创建"""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.redis_round_trips = 0
+
+    def server_timing(self) -> str:
+        """按阶段汇总的 Server-Timing 响应头（毫秒）"""
+        totals: Dict[str, float] = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+# 当前请求的记录；在请求中创建的任务和线程继承同一个对象
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace() -> Iterator[RequestTrace]:
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """记录一个处理阶段的耗时，计入 stage_duration_seconds，并出现在当前请求的 Server-Timing 中"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed))
+
+
+def observe_redis(command: str, seconds: float, sent: int, received: int):
+    """记录一次 Redis 往返"""
+    REDIS_COMMAND_SECONDS.observe(seconds, command=command)
+    REDIS_PAYLOAD_BYTES.observe(sent, command=command, direction="sent")
+    REDIS_PAYLOAD_BYTES.observe(received, command=command, direction="received")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.redis_round_trips += 1
+
+
+def observe_frame(source: str, rows: int, columns: int):
+    DATAFRAME_ROWS.observe(rows, source=source)
+    DATAFRAME_COLUMNS.observe(columns, source=source)
@@ -0,0 +1,91 @@
+from typing import Optional
+from pathlib import Path
+import asyncio
+import time
+import uuid
+from app.core.config import settings
+from app.core.metrics import (
+    HTTP_REQUEST_SECONDS, HTTP_REQUEST_BYTES, HTTP_RESPONSE_BYTES, HTTP_REDIS_ROUND_TRIPS, start_trace
+)
+from app.core.profiling import SamplingProfiler
+
+
+def _route(scope) -> str:
+    # 按路由模板（而不是带会话ID的实际路径）统计，避免标签数量无限增长
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value
+    return None
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的耗时、请求和响应大小以及 Redis 往返次数
+
+    响应头 Server-Timing 中按阶段列出本次请求的耗时（见 app.core.metrics.span），流式响应只包含开始发送前的阶段。
+    PROFILING_ENABLED 时带 X-Profile: 1 头的请求在处理期间进行采样分析，
+    结果保存在 PROFILING_DIRECTORY 中，文件名通过响应头 X-Profile-Id 返回
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = None
+        profile_id = None
+        if settings.PROFILING_ENABLED and _header(scope, b"x-profile") == b"1":
+            profiler = SamplingProfiler(settings.PROFILING_INTERVAL)
+            if profiler.start():
+                profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.folded"
+            else:
+                profiler = None
+
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+        start = time.perf_counter()
+
+        async def receive_wrapper():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        with start_trace() as trace:
+            async def send_wrapper(message):
+                nonlocal status, response_bytes
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    total = f"total;dur={(time.perf_counter() - start) * 1000:.1f}"
+                    timing = ", ".join(filter(None, (trace.server_timing(), total)))
+                    headers = [*message.get("headers", []), (b"server-timing", timing.encode())]
+                    if profile_id is not None:
+                        headers.append((b"x-profile-id", profile_id.encode()))
+                    message = {**message, "headers": headers}
+                elif message["type"] == "http.response.body":
+                    response_bytes += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive_wrapper, send_wrapper)
+            finally:
+                route = _route(scope)
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start, method=scope["method"], route=route, status=status
+                )
+                HTTP_REQUEST_BYTES.observe(request_bytes, route=route)
+                HTTP_RESPONSE_BYTES.observe(response_bytes, route=route)
+                HTTP_REDIS_ROUND_TRIPS.observe(trace.redis_round_trips, route=route)
+                if profiler is not None:
+                    await asyncio.to_thread(profiler.stop)
+                    await asyncio.to_thread(profiler.save, Path(settings.PROFILING_DIRECTORY) / profile_id)
@@ -0,0 +1,80 @@
+from typing import Any, Optional
+import time
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.asyncio.client import Pipeline
+from app.core.config import settings
+from app.core.metrics import observe_redis
+
+# 应用生命周期内共享的连接池，由 app.main 的 lifespan 创建和关闭
+_pool: Optional[BlockingConnectionPool] = None
+
+
+def init_redis_pool() -> BlockingConnectionPool:
+    """
+    创建共享连接池（已存在时直接返回）
+
+    连接数达到上限时请求会排队等待空闲连接，最多等待 REDIS_POOL_TIMEOUT 秒
+    """
+    global _pool
+    if _pool is None:
+        _pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            decode_responses=True
+        )
+    return _pool
+
+
+async def close_redis_pool():
+    """关闭共享连接池"""
+    global _pool
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
+
+
+def _size(value: Any) -> int:
+    """命令参数或返回值中字符串的长度之和（字符串按字符数计）"""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_size(v) for v in value)
+    return 0
+
+
+class InstrumentedPipeline(Pipeline):
+    """一次 execute 为一次往返，按命令 PIPELINE 记录"""
+
+    async def execute(self, raise_on_error: bool = True):
+        sent = sum(_size(args) for args, _ in self.command_stack)
+        result = None
+        start = time.perf_counter()
+        try:
+            result = await super().execute(raise_on_error)
+            return result
+        finally:
+            observe_redis("PIPELINE", time.perf_counter() - start, sent, _size(result))
+
+
+class InstrumentedRedis(Redis):
+    """记录每条命令的耗时、发送和返回的数据大小，以及当前请求的往返次数"""
+
+    async def execute_command(self, *args, **options):
+        result = None
+        start = time.perf_counter()
+        try:
+            result = await super().execute_command(*args, **options)
+            return result
+        finally:
+            observe_redis(str(args[0]).upper(), time.perf_counter() - start, _size(args[1:]), _size(result))
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def get_redis() -> Redis:
+    """获取使用共享连接池的 Redis 客户端，客户端本身很轻量，可按请求创建"""
+    if settings.METRICS_ENABLED:
+        return InstrumentedRedis(connection_pool=init_redis_pool())
+    return Redis(connection_pool=init_redis_pool())
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, Optional
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.context_service import ContextService
+from app.services.file_service import FileService
+
+logger = logging.getLogger(__name__)
+
+# 多个 worker 进程共享同一个 Redis，用锁保证同一周期内只有一个进程执行清理
+_LOCK_KEY = "cleanup:lock"
+
+
+class CleanupScheduler:
+    """
+    后台清理调度器，由 app.main 的 lifespan 启动和停止
+
+    每隔 CLEANUP_INTERVAL 秒清理一次过期的上传文件和 Redis 会话，
+    并记录每次清理的耗时、删除数量和回收的磁盘空间
+    """
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.metrics: Dict[str, Any] = {
+            "runs": 0,
+            "skipped": 0,
+            "errors": 0,
+            "last_run_at": None,
+            "last_duration_seconds": None,
+            "last_file_sessions_removed": 0,
+            "last_redis_sessions_removed": 0,
+            "last_blobs_removed": 0,
+            "last_reclaimed_bytes": 0,
+            "total_reclaimed_bytes": 0,
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> bool:
+        """执行一次清理，本周期已由其他进程执行时跳过，返回是否执行"""
+        try:
+            acquired = await get_redis().set(_LOCK_KEY, os.getpid(), nx=True, ex=self.interval)
+            if not acquired:
+                self.metrics["skipped"] += 1
+                return False
+
+            start = time.perf_counter()
+            file_result = await FileService().cleanup_old_sessions()
+            redis_removed = await ContextService().cleanup_inactive_sessions()
+            duration = time.perf_counter() - start
+
+            self.metrics.update({
+                "runs": self.metrics["runs"] + 1,
+                "last_run_at": time.time(),
+                "last_duration_seconds": duration,
+                "last_file_sessions_removed": file_result["sessions_removed"],
+                "last_redis_sessions_removed": redis_removed,
+                "last_blobs_removed": file_result["blobs_removed"],
+                "last_reclaimed_bytes": file_result["reclaimed_bytes"],
+                "total_reclaimed_bytes": self.metrics["total_reclaimed_bytes"] + file_result["reclaimed_bytes"],
+            })
+            logger.info(
+                "清理完成: 耗时 %.2fs, 删除上传目录 %d 个, 删除数据集 %d 个, 回收 %d 字节, 删除会话 %d 个",
+                duration, file_result["sessions_removed"], file_result["blobs_removed"],
+                file_result["reclaimed_bytes"], redis_removed
+            )
+            return True
+        except Exception:
+            self.metrics["errors"] += 1
+            logger.exception("执行定期清理时出错")
+            return False
+
+
+cleanup_scheduler = CleanupScheduler(settings.CLEANUP_INTERVAL)
@@ -0,0 +1,92 @@
+import base64
+import datetime
+import decimal
+import zlib
+from typing import Any, Union
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+# 压缩后的数据以该前缀开头，JSON 文本不会以字母 z 开头
+_COMPRESSED_PREFIX = "z:"
+
+
+def _default(obj: Any) -> Any:
+    """orjson 不直接支持的类型：pandas 时间和缺失值、numpy 标量等"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, (pd.Timestamp, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def _normalize_keys(obj: Any) -> Any:
+    """把 orjson 不支持的字典键（Timestamp、numpy 标量等）转换为字符串"""
+    if isinstance(obj, dict):
+        return {
+            key if isinstance(key, (str, int, float, bool)) or key is None else str(_default(key)):
+            _normalize_keys(value)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [_normalize_keys(value) for value in obj]
+    return obj
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为 UTF-8 JSON，NaN 编码为 null"""
+    try:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+    except orjson.JSONEncodeError:
+        # 字典键的类型不受支持时，转换键后重试
+        return orjson.dumps(_normalize_keys(obj), default=_default, option=_OPTIONS)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data)
+
+
+def encode_blob(obj: Any) -> str:
+    """编码存入 Redis 的数据，较大的数据压缩后存储"""
+    return compress_json(dumps(obj))
+
+
+def compress_json(data: bytes) -> str:
+    """
+    超过 REDIS_COMPRESS_MIN_BYTES 的 JSON 用 zlib 压缩，再用 base64 编码
+    （连接池使用 decode_responses，值必须是文本）
+    """
+    if len(data) >= settings.REDIS_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 1)
+        return _COMPRESSED_PREFIX + base64.b64encode(compressed).decode("ascii")
+    return data.decode()
+
+
+def decode_blob(value: Union[bytes, str]) -> Any:
+    """解码 encode_blob 编码的数据，也兼容未压缩的普通 JSON"""
+    if isinstance(value, bytes):
+        value = value.decode()
+    if value.startswith(_COMPRESSED_PREFIX):
+        return loads(zlib.decompress(base64.b64decode(value[len(_COMPRESSED_PREFIX):])))
+    return loads(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用 orjson 编码的 JSON 响应，支持 numpy/pandas 类型
+
+    路由直接返回该响应时跳过 jsonable_encoder；带 response_model 的路由由 FastAPI
+    通过 pydantic-core 直接编码，不需要使用该响应类
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
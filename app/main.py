@@ -1,17 +1,39 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.redis import init_redis_pool, close_redis_pool
+from app.core.scheduler import cleanup_scheduler
+from app.core.jobs import upload_jobs
+from app.core.executor import dataframe_executor, ExecutorBusyError, ExecutorTimeoutError
+from app.core.middleware import MetricsMiddleware
 from app.db.database import Base, engine
-from app.api.v1 import chat, upload, health
+from app.models import stored_blob, upload_manifest  # noqa: F401  注册模型以便创建数据表
+from app.api.v1 import chat, upload, health, metrics
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 整个应用共享一个 Redis 连接池
+    init_redis_pool()
+    # 定期清理过期的上传文件和会话
+    if settings.CLEANUP_ENABLED:
+        cleanup_scheduler.start()
+    yield
+    await cleanup_scheduler.stop()
+    await upload_jobs.stop()
+    dataframe_executor.shutdown()
+    await close_redis_pool()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description=settings.DESCRIPTION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # 配置 CORS
@@ -23,10 +45,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记录请求耗时和各阶段耗时，供 /metrics 输出
+app.add_middleware(MetricsMiddleware)
+
+# 数据处理任务排满时返回 503，提示客户端稍后重试；任务超时返回 504
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(ExecutorTimeoutError)
+async def executor_timeout_handler(request: Request, exc: ExecutorTimeoutError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # 包含路由
 app.include_router(upload.router, prefix=f"{settings.API_V1_STR}/upload", tags=["upload"])
 app.include_router(chat.router, prefix=f"{settings.API_V1_STR}/chat", tags=["chat"])
 app.include_router(health.router, prefix=f"{settings.API_V1_STR}", tags=["health"])
+app.include_router(metrics.router, prefix=f"{settings.API_V1_STR}", tags=["health"])
 
 @app.get("/")
 async def root():
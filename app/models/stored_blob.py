@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Float, BigInteger, Integer
+from app.db.database import Base
+
+class StoredBlob(Base):
+    """内容寻址存储中的数据集：相同内容（且导入配置相同）的上传只导入和保存一次"""
+    __tablename__ = "stored_blob"
+
+    blob_id = Column(String, primary_key=True)  # 由内容哈希和导入配置计算
+    content_hash = Column(String, nullable=False, index=True)  # 上传内容的 SHA-256
+    ref_count = Column(Integer, nullable=False, default=0, index=True)  # 引用该数据集的文件数
+    total_bytes = Column(BigInteger, nullable=False, default=0)  # 目录占用的磁盘空间
+    created_at = Column(Float, nullable=False)
+    last_used = Column(Float, nullable=False)  # 最后一次被引用的时间戳
+
+class BlobReference(Base):
+    """会话中的文件对数据集的引用"""
+    __tablename__ = "blob_reference"
+
+    session_id = Column(String, primary_key=True)
+    file_id = Column(String, primary_key=True)
+    blob_id = Column(String, nullable=False, index=True)
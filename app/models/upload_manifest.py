@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Float, BigInteger
+from app.db.database import Base
+
+class UploadManifest(Base):
+    """上传目录清单：记录每个会话目录的最后写入时间和占用空间，清理时按时间索引查询"""
+    __tablename__ = "upload_manifest"
+
+    session_id = Column(String, primary_key=True)
+    last_modified = Column(Float, nullable=False, index=True)  # 最后写入时间戳
+    total_bytes = Column(BigInteger, nullable=False, default=0)  # 目录占用的磁盘空间
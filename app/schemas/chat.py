@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Union
 
 class ChatRequest(BaseModel):
     query: str
@@ -7,9 +7,23 @@ class ChatRequest(BaseModel):
     data_context: Optional[Dict[str, Any]] = None
 
 class DataAnalysisResult(BaseModel):
-    processed_data: Dict[str, Any]  # 处理后的数据
+    processed_data: Union[List[Dict[str, Any]], Dict[str, Any]]  # 处理后的数据（表格为记录列表）
     data_type: str  # 数据类型，如 'table', 'series', 'aggregation' 等
     suggested_viz_type: Optional[str] = None  # 建议的可视化类型
+    # 结果超过一页时 processed_data 只包含第一页，其余通过分页接口按 result_id 读取
+    result_id: Optional[str] = None
+    file_id: Optional[str] = None
+    total_rows: Optional[int] = None
+    # 在样本上近似计算时的样本行数、总行数、置信水平和误差范围（估计值 ± margin），精确结果为空
+    approximation: Optional[Dict[str, Any]] = None
+
+class RefineRequest(BaseModel):
+    """对近似结果重新执行精确计算"""
+    session_id: str
+    file_id: str
+    operation: Dict[str, Any]
+    data_type: str = "table"
+    suggested_viz_type: Optional[str] = None
 
 class ChatResponse(BaseModel):
     answer: str  # LLM 的分析结论
@@ -17,11 +31,3 @@ class ChatResponse(BaseModel):
     code_snippet: Optional[str] = None  # 使用的 pandas 代码
     suggestions: List[str] = []  # 后续分析建议
     error: Optional[str] = None
-
-class UploadResponse(BaseModel):
-    success: bool
-    file_id: str
-    summary: Dict[str, Any]  # 数据基本统计信息
-    columns: List[Dict[str, str]]  # 列名和数据类型
-    sample_data: List[Dict[str, Any]]
-    error: Optional[str] = None 
\ No newline at end of file
@@ -0,0 +1,229 @@
+import hashlib
+import re
+from pandas.tseries.frequencies import to_offset
+from pydantic import BaseModel, BeforeValidator, Field, PrivateAttr, TypeAdapter, ValidationError, field_validator, model_validator
+from typing import Annotated, Any, Dict, List, Literal, Optional, Set, Union
+from app.utils.predicates import Predicate, parse_predicate, predicate_columns
+
+AggFunc = Literal["sum", "mean", "median", "min", "max", "count", "nunique", "std", "var", "first", "last", "size"]
+WindowFunc = Literal["sum", "mean", "median", "min", "max", "count", "std", "var"]
+
+
+def _as_list(value: Any) -> Any:
+    return [value] if isinstance(value, str) else value
+
+
+# LLM 经常把单个列名写成字符串
+ColumnList = Annotated[List[str], BeforeValidator(_as_list)]
+AggFuncs = Annotated[List[AggFunc], BeforeValidator(_as_list)]
+
+# pandas 已废弃的时间频率别名
+_FREQUENCY_ALIASES = {"M": "ME", "Q": "QE", "Y": "YE", "A": "YE", "H": "h", "T": "min", "S": "s"}
+
+
+class BaseOperation(BaseModel):
+    """数据处理指令，LLM 附带的 method、additional_params 等说明字段会被忽略"""
+
+    def referenced_columns(self) -> Set[str]:
+        """指令中出现的所有列，执行前检查是否存在"""
+        return set()
+
+    def required_columns(self) -> Optional[Set[str]]:
+        """计算结果需要读取的列，None 表示结果包含全部列"""
+        return self.referenced_columns()
+
+    def cache_key(self) -> str:
+        """指令的哈希，字段顺序不同或省略默认值的等价指令哈希相同"""
+        return hashlib.sha256(self.model_dump_json().encode()).hexdigest()
+
+
+class AggregationOperation(BaseOperation):
+    """分组聚合；columns 为空时对整个表聚合"""
+    type: Literal["aggregation"]
+    columns: ColumnList = []
+    target_columns: ColumnList = []
+    agg_func: AggFuncs = ["sum"]
+    # 按列指定聚合函数，如 {"sales": ["sum", "mean"]}
+    aggregations: Dict[str, AggFuncs] = {}
+
+    @model_validator(mode="after")
+    def _check_targets(self):
+        if not self.target_columns and not self.aggregations and self.agg_func != ["size"]:
+            raise ValueError("aggregation 需要 target_columns 或 aggregations")
+        return self
+
+    def referenced_columns(self) -> Set[str]:
+        return set(self.columns) | set(self.target_columns) | set(self.aggregations)
+
+
+class FilterOperation(BaseOperation):
+    """按过滤表达式筛选行，可以只返回部分列、限制行数"""
+    type: Literal["filter"]
+    query: str
+    columns: ColumnList = []
+    limit: Optional[int] = Field(None, gt=0)
+    _predicate: Predicate = PrivateAttr()
+
+    @model_validator(mode="after")
+    def _parse_query(self):
+        self._predicate = parse_predicate(self.query)
+        return self
+
+    @property
+    def predicate(self) -> Predicate:
+        return self._predicate
+
+    def referenced_columns(self) -> Set[str]:
+        return predicate_columns(self._predicate) | set(self.columns)
+
+    def required_columns(self) -> Optional[Set[str]]:
+        return self.referenced_columns() if self.columns else None
+
+
+class SortOperation(BaseOperation):
+    """排序；指定 limit 时只取前 limit 行（按 top_k 执行）"""
+    type: Literal["sort"]
+    columns: ColumnList = Field(min_length=1)
+    ascending: Union[bool, List[bool]] = True
+    limit: Optional[int] = Field(None, gt=0)
+
+    def referenced_columns(self) -> Set[str]:
+        return set(self.columns)
+
+    def required_columns(self) -> Optional[Set[str]]:
+        return None
+
+
+class TopKOperation(BaseOperation):
+    """按列取最大（ascending 为 true 时最小）的 k 行"""
+    type: Literal["top_k"]
+    columns: ColumnList = Field(min_length=1)
+    k: int = Field(10, gt=0)
+    ascending: bool = False
+
+    def referenced_columns(self) -> Set[str]:
+        return set(self.columns)
+
+    def required_columns(self) -> Optional[Set[str]]:
+        return None
+
+
+class StatisticalOperation(BaseOperation):
+    """相关系数或描述统计；columns 为空时使用全部数值列"""
+    type: Literal["statistical"]
+    method: Literal["correlation", "describe"]
+    columns: ColumnList = []
+
+    def referenced_columns(self) -> Set[str]:
+        return set(self.columns)
+
+    def required_columns(self) -> Optional[Set[str]]:
+        return set(self.columns) or None
+
+
+class HistogramOperation(BaseOperation):
+    """
+    数值列分箱：bins 为箱数或箱边界
+
+    不指定 target_columns 时返回各箱的行数，否则返回各箱内 target_columns 的聚合值
+    """
+    type: Literal["histogram"]
+    column: str
+    bins: Union[Annotated[int, Field(gt=0, le=1000)], Annotated[List[float], Field(min_length=2)]] = 10
+    target_columns: ColumnList = []
+    agg_func: AggFunc = "mean"
+
+    @field_validator("bins")
+    @classmethod
+    def _check_edges(cls, bins):
+        if isinstance(bins, list) and any(a >= b for a, b in zip(bins, bins[1:])):
+            raise ValueError("箱边界必须严格递增")
+        return bins
+
+    def referenced_columns(self) -> Set[str]:
+        return {self.column} | set(self.target_columns)
+
+
+class PivotOperation(BaseOperation):
+    """透视表：index 为行，columns 的取值展开为列，values 按 agg_func 聚合"""
+    type: Literal["pivot"]
+    index: ColumnList = Field(min_length=1)
+    columns: ColumnList = Field(min_length=1)
+    values: ColumnList = Field(min_length=1)
+    agg_func: AggFunc = "sum"
+    fill_value: Optional[float] = None
+
+    def referenced_columns(self) -> Set[str]:
+        return set(self.index) | set(self.columns) | set(self.values)
+
+
+class RollingOperation(BaseOperation):
+    """
+    滑动窗口：window 为行数，或 "7D" 这样的时间窗口（需要 order_by 为时间列）
+
+    按 order_by 排序后计算，结果包含 order_by、columns 以及 {列名}_rolling_{func} 列
+    """
+    type: Literal["rolling"]
+    columns: ColumnList = Field(min_length=1)
+    window: Union[Annotated[int, Field(gt=0)], str]
+    func: WindowFunc = "mean"
+    order_by: Optional[str] = None
+    min_periods: Optional[int] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def _check_window(self):
+        if isinstance(self.window, str) and not self.order_by:
+            raise ValueError("时间窗口需要指定 order_by 时间列")
+        return self
+
+    def referenced_columns(self) -> Set[str]:
+        return set(self.columns) | ({self.order_by} if self.order_by else set())
+
+
+class ResampleOperation(BaseOperation):
+    """按时间列 on 以 rule（D/W/ME/QE/YE 等）为周期聚合，columns 为额外的分组列"""
+    type: Literal["resample"]
+    on: str
+    rule: str
+    target_columns: ColumnList = Field(min_length=1)
+    agg_func: AggFuncs = ["sum"]
+    columns: ColumnList = []
+
+    @field_validator("rule")
+    @classmethod
+    def _normalize_rule(cls, rule):
+        match = re.fullmatch(r"(\d*)([A-Za-z]+)", rule.strip())
+        if match:
+            rule = match.group(1) + _FREQUENCY_ALIASES.get(match.group(2), match.group(2))
+        try:
+            to_offset(rule)
+        except ValueError:
+            raise ValueError(f"无效的时间频率: {rule}")
+        return rule
+
+    def referenced_columns(self) -> Set[str]:
+        return {self.on} | set(self.target_columns) | set(self.columns)
+
+
+Operation = Annotated[
+    Union[
+        AggregationOperation, FilterOperation, SortOperation, TopKOperation, StatisticalOperation,
+        HistogramOperation, PivotOperation, RollingOperation, ResampleOperation,
+    ],
+    Field(discriminator="type")
+]
+_operation_adapter = TypeAdapter(Operation)
+
+
+def parse_operation(operation: Union[Dict[str, Any], BaseOperation]) -> BaseOperation:
+    """校验数据处理指令，返回对应类型的指令对象；指令无效时抛出 ValueError"""
+    if isinstance(operation, BaseOperation):
+        return operation
+    try:
+        return _operation_adapter.validate_python(operation)
+    except ValidationError as e:
+        details = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'operation'}: {error['msg']}"
+            for error in e.errors()
+        )
+        raise ValueError(f"无效的数据处理指令: {details}")
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, List, Any
+
+class UploadResponse(BaseModel):
+    success: bool
+    file_id: str
+    summary: Dict[str, Any]  # 数据基本统计信息
+    columns: List[Dict[str, Any]]  # 列名、数据类型及空值/唯一值数量
+    sample_data: List[Dict[str, Any]]
+    error: Optional[str] = None
+
+class UploadJobResponse(BaseModel):
+    job_id: str
+    session_id: str
+    filename: str
+    status: str  # queued / running / done / failed
+    stage: str  # 当前阶段：queued、parse、write_parquet、profile、index、register
+    progress: float  # 0 到 1
+    file_id: Optional[str] = None  # 完成后导入的文件ID
+    error: Optional[str] = None
+    duplicate: bool = False  # 是否复用了相同内容的已有任务
+    created_at: float
+    updated_at: float
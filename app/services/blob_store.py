@@ -0,0 +1,236 @@
+from typing import Dict, Any, Optional, Tuple, Iterator
+from pathlib import Path
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from sqlalchemy import delete, func, update
+from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.db.database import SessionLocal
+from app.models.stored_blob import StoredBlob, BlobReference
+
+# blob 存储在上传目录下的目录名，清理会话目录时跳过
+BLOB_DIR_NAME = "_blobs"
+
+# 只由数据集内容和导入配置决定的产物，保存在 blob 目录中，各会话的文件目录通过符号链接引用
+SHARED_ARTIFACTS = ("data.parquet", "data.arrow", "profile.json", "index", "sample.parquet")
+
+# blob 目录中保存导入结果和元数据的文件，目录放入存储前写入
+_MANIFEST = "blob.json"
+
+# 正在构建的 blob 目录的前缀
+_STAGING_PREFIX = ".tmp-"
+
+# 保存 blob 锁文件的目录名和锁的槽位数
+_LOCK_DIR_NAME = ".locks"
+_LOCK_SLOTS = 64
+
+# 影响导入产物的配置，任一项变化后相同内容会重新导入为新的 blob
+_INGEST_SETTINGS = (
+    "CSV_CHUNK_ROWS", "INGEST_OPTIMIZE_DTYPES", "INGEST_MAX_CATEGORIES", "INGEST_PARSE_DATES",
+    "PARQUET_COMPRESSION", "PARQUET_COMPRESSION_LEVEL", "HOT_FORMAT_ENABLED", "HOT_FORMAT_MAX_BYTES",
+    "PROFILE_TOP_K", "PROFILE_APPROX_MIN_ROWS", "PROFILE_SAMPLE_ROWS",
+    "PREAGGREGATE_ENABLED", "PREAGGREGATE_MAX_GROUPS", "PREAGGREGATE_MAX_DIMENSIONS", "PREAGGREGATE_MAX_MEASURES",
+    "SAMPLE_ROWS", "PROMPT_CONTEXT_TOKEN_BUDGET",
+)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file() and not f.is_symlink())
+
+
+class BlobStore:
+    """
+    内容寻址的数据集存储
+
+    每个 blob 目录保存一个数据集的 parquet、列统计、预聚合索引和样本，目录名由上传内容的 SHA-256
+    和导入配置计算。会话中的文件在数据库中登记对 blob 的引用（BlobReference），引用计数
+    （StoredBlob.ref_count）与引用记录在同一个事务中原子地更新；清理时只删除没有引用的 blob。
+    这些方法都会同步访问数据库和磁盘，在异步代码中需放到线程中调用
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    @staticmethod
+    def blob_id(content_hash: str) -> str:
+        config = json.dumps({name: getattr(settings, name) for name in _INGEST_SETTINGS}, sort_keys=True)
+        return hashlib.sha256(f"{content_hash}:{config}".encode()).hexdigest()
+
+    def path(self, blob_id: str) -> Path:
+        return self.root / blob_id
+
+    def staging_dir(self) -> Path:
+        """创建用于构建新 blob 的临时目录"""
+        staging = self.root / f"{_STAGING_PREFIX}{uuid.uuid4().hex}"
+        staging.mkdir(parents=True)
+        return staging
+
+    @contextmanager
+    def _locked(self, blob_id: str) -> Iterator[None]:
+        """
+        对 blob 加排他锁：放入、登记引用和删除同一个 blob 的操作串行执行
+
+        使用文件锁，同一台机器上的多个工作进程之间同样有效；锁文件按 blob_id 分到固定数量的槽位，不随 blob 增多
+        """
+        lock_dir = self.root / _LOCK_DIR_NAME
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        with open(lock_dir / f"{int(blob_id[:8], 16) % _LOCK_SLOTS}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, blob_id: str, session_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+        """已有该 blob 时登记引用并返回导入结果和元数据，否则返回 None"""
+        manifest_path = self.path(blob_id) / _MANIFEST
+        with self._locked(blob_id), SessionLocal() as db:
+            if not manifest_path.exists():
+                return None
+            # 引用计数在数据库中原子地加一，并发登记不会相互覆盖
+            updated = db.execute(
+                update(StoredBlob)
+                .where(StoredBlob.blob_id == blob_id)
+                .values(ref_count=StoredBlob.ref_count + 1, last_used=time.time())
+            ).rowcount
+            if not updated:
+                db.rollback()
+                return None
+            db.add(BlobReference(session_id=session_id, file_id=file_id, blob_id=blob_id))
+            db.commit()
+            return loads(manifest_path.read_bytes())
+
+    def store(
+        self,
+        staging: Path,
+        blob_id: str,
+        content_hash: str,
+        manifest: Dict[str, Any],
+        session_id: str,
+        file_id: str
+    ):
+        """
+        把构建好的目录放入存储并登记引用
+
+        并发上传相同内容时，先放入的目录生效，后放入的丢弃
+        """
+        (staging / _MANIFEST).write_bytes(dumps(manifest))
+        target = self.path(blob_id)
+        with self._locked(blob_id):
+            if target.is_dir() and not (target / _MANIFEST).exists():
+                # 之前中断时留下的不完整目录
+                shutil.rmtree(target, ignore_errors=True)
+            try:
+                staging.rename(target)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+
+            now = time.time()
+            with SessionLocal() as db:
+                updated = db.execute(
+                    update(StoredBlob)
+                    .where(StoredBlob.blob_id == blob_id)
+                    .values(ref_count=StoredBlob.ref_count + 1, last_used=now)
+                ).rowcount
+                if not updated:
+                    db.add(StoredBlob(
+                        blob_id=blob_id,
+                        content_hash=content_hash,
+                        ref_count=1,
+                        total_bytes=_dir_size(target),
+                        created_at=now,
+                        last_used=now
+                    ))
+                db.add(BlobReference(session_id=session_id, file_id=file_id, blob_id=blob_id))
+                db.commit()
+
+    def link(self, blob_id: str, file_dir: Path):
+        """在文件目录中创建指向 blob 中共享产物的相对符号链接"""
+        source = self.path(blob_id)
+        for name in SHARED_ARTIFACTS:
+            if (source / name).exists():
+                (file_dir / name).symlink_to(os.path.relpath(source / name, file_dir))
+
+    def release(self, session_id: str, file_id: Optional[str] = None):
+        """删除会话（或会话中某个文件）的引用"""
+        with SessionLocal() as db:
+            query = db.query(BlobReference).filter(BlobReference.session_id == session_id)
+            if file_id is not None:
+                query = query.filter(BlobReference.file_id == file_id)
+            for reference in query.all():
+                # 只有实际删除了引用记录的一方减少计数，同一引用被并发释放时不会重复减
+                deleted = db.execute(
+                    delete(BlobReference)
+                    .where(BlobReference.session_id == reference.session_id)
+                    .where(BlobReference.file_id == reference.file_id)
+                ).rowcount
+                if deleted:
+                    db.execute(
+                        update(StoredBlob)
+                        .where(StoredBlob.blob_id == reference.blob_id)
+                        .values(ref_count=StoredBlob.ref_count - 1)
+                    )
+            db.commit()
+
+    def collect(self, grace_seconds: float = 3600) -> Tuple[int, int]:
+        """
+        删除没有引用的 blob，返回 (删除的 blob 数, 回收的字节数)
+
+        每个 blob 在锁内按条件（引用计数仍不大于 0）删除记录后再删除目录，与同一 blob 的登记和放入串行执行，
+        列出之后又被引用的 blob 会保留；数据库中没有记录、且超过 grace_seconds 未修改的目录
+        （如进程中断时留下的临时目录）一并删除
+        """
+        with SessionLocal() as db:
+            candidates = [
+                blob_id for (blob_id,) in db.query(StoredBlob.blob_id).filter(StoredBlob.ref_count <= 0).all()
+            ]
+        removed = 0
+        reclaimed = 0
+        for blob_id in candidates:
+            with self._locked(blob_id):
+                with SessionLocal() as db:
+                    deleted = db.execute(
+                        delete(StoredBlob)
+                        .where(StoredBlob.blob_id == blob_id)
+                        .where(StoredBlob.ref_count <= 0)
+                    ).rowcount
+                    db.commit()
+                if deleted:
+                    removed += 1
+                    reclaimed += self._remove(self.path(blob_id))
+
+        if self.root.is_dir():
+            cutoff = time.time() - grace_seconds
+            for path in self.root.iterdir():
+                if not path.is_dir() or path.name == _LOCK_DIR_NAME or path.stat().st_mtime >= cutoff:
+                    continue
+                if path.name.startswith(_STAGING_PREFIX):
+                    removed += 1
+                    reclaimed += self._remove(path)
+                    continue
+                with self._locked(path.name), SessionLocal() as db:
+                    if db.get(StoredBlob, path.name) is None:
+                        removed += 1
+                        reclaimed += self._remove(path)
+        return removed, reclaimed
+
+    @staticmethod
+    def _remove(path: Path) -> int:
+        if not path.is_dir():
+            return 0
+        size = _dir_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        with SessionLocal() as db:
+            blobs, references, total_bytes = db.query(
+                func.count(StoredBlob.blob_id), func.sum(StoredBlob.ref_count), func.sum(StoredBlob.total_bytes)
+            ).one()
+        return {"blobs": blobs, "references": references or 0, "total_bytes": total_bytes or 0}
@@ -1,11 +1,20 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+import asyncio
+import uuid
 import pandas as pd
+from app.core.config import settings
+from app.core.executor import dataframe_executor, ExecutorBusyError, ExecutorTimeoutError
 from app.core.llm import LLMManager
+from app.core.metrics import span, observe_frame
+from app.services.file_service import FileService
+from app.utils.approximate import ApproximateResult
 from app.utils.data_processor import process_dataframe
+from app.utils.session_query import is_session_operation
 
 class ChatService:
     def __init__(self):
         self.llm_manager = LLMManager()
+        self.file_service = FileService()
     
     async def process_query(
         self,
@@ -21,31 +30,205 @@ class ChatService:
                 data_context=data_context
             )
             
-            # 执行数据处理
-            if 'data_operation' in llm_response:
-                df = context['data']  # 假设context中的data是DataFrame
-                processed_result = process_dataframe(
-                    df,
-                    llm_response['data_operation']
+            # 执行数据处理，不需要处理数据时 data_operation 为 null
+            operation = llm_response.get('data_operation')
+            if isinstance(operation, dict):
+                processed_result = await self._run_operation(
+                    context, operation, self._use_approximation(context, data_context)
                 )
-                
-                return {
-                    "answer": llm_response['answer'],
-                    "data_results": {
-                        "processed_data": processed_result.to_dict(orient='records') 
-                            if isinstance(processed_result, pd.DataFrame) 
-                            else processed_result,
-                        "data_type": llm_response.get('data_type', 'table'),
-                        "suggested_viz_type": llm_response.get('suggested_viz_type')
-                    },
-                    "code_snippet": llm_response.get('code_snippet'),
-                    "suggestions": llm_response.get('suggestions', [])
-                }
+                result = await self._result_payload(context, processed_result, operation)
+                return self._build_response(llm_response, result)
             else:
-                return {
-                    "answer": llm_response['answer'],
-                    "suggestions": llm_response.get('suggestions', [])
-                }
+                return self._build_response(llm_response)
                 
+        except (ExecutorBusyError, ExecutorTimeoutError):
+            # 交给路由层返回 503/504，而不是作为普通回答返回
+            raise
         except Exception as e:
-            return {"error": str(e)} 
\ No newline at end of file
+            return {"error": str(e)}
+    
+    async def process_query_stream(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        data_context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        流式处理分析请求，依次产出 (事件名, 数据):
+        - answer：回答文本片段，随 LLM 生成逐步产出
+        - data_results：data_operation 生成完毕后立即开始执行，执行完成即产出，不等待 LLM 生成其余字段
+        - suggestions：后续分析建议
+        - error：数据处理出错
+        - done：完整响应，与 process_query 的返回值相同
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        operation_task: Optional[asyncio.Task] = None
+        
+        async def run_operation(operation: Dict[str, Any]):
+            try:
+                processed = await self._run_operation(
+                    context, operation, self._use_approximation(context, data_context)
+                )
+                result = await self._result_payload(context, processed, operation)
+                await events.put(("data_results", result))
+                return result
+            except Exception as e:
+                await events.put(("error", {"error": str(e)}))
+                raise
+        
+        async def read_llm():
+            nonlocal operation_task
+            try:
+                async for kind, key, value in self.llm_manager.analyze_stream(query, context, data_context):
+                    if kind == "delta":
+                        await events.put(("answer", value))
+                    elif kind == "field" and key == "data_operation" and isinstance(value, dict):
+                        operation_task = asyncio.create_task(run_operation(value))
+                    elif kind == "field" and key == "suggestions":
+                        await events.put(("suggestions", value))
+                    elif kind == "result":
+                        await events.put(("llm_done", value))
+            except Exception as e:
+                await events.put(("llm_done", {"answer": f"分析过程中出现错误: {str(e)}", "error": str(e)}))
+        
+        reader = asyncio.create_task(read_llm())
+        try:
+            while True:
+                event, data = await events.get()
+                if event == "llm_done":
+                    llm_response = data
+                    break
+                yield event, data
+            
+            if operation_task is None:
+                # 缓存命中或 data_operation 不是对象时，在这里执行
+                response = self._build_response(llm_response)
+                if isinstance(llm_response.get('data_operation'), dict):
+                    operation_task = asyncio.create_task(run_operation(llm_response['data_operation']))
+            if operation_task is not None:
+                try:
+                    result = await operation_task
+                    response = self._build_response(llm_response, result)
+                except Exception as e:
+                    response = {"error": str(e)}
+                # 执行过程中产生的 data_results / error 事件
+                while not events.empty():
+                    yield events.get_nowait()
+            yield "done", response
+        finally:
+            reader.cancel()
+            if operation_task is not None and not operation_task.done():
+                operation_task.cancel()
+    
+    async def refine(self, session_id: str, file_id: str, operation: Dict[str, Any]) -> Dict[str, Any]:
+        """对近似结果中的指令重新执行精确计算"""
+        context = {"data_source": {"session_id": session_id, "file_id": file_id}}
+        processed_result = await self._run_operation(context, operation)
+        return await self._result_payload(context, processed_result)
+    
+    @staticmethod
+    def _use_approximation(context: Dict[str, Any], data_context: Optional[Dict[str, Any]]) -> bool:
+        """
+        data_context 中的 mode 为 approximate / exact 时按指定方式计算；
+        未指定（auto）时，行数达到 APPROX_AUTO_MIN_ROWS 的文件使用近似计算
+        """
+        mode = (data_context or {}).get("mode", "auto")
+        if mode in ("approximate", "exact"):
+            return mode == "approximate"
+        shape = (context.get("data_info") or {}).get("shape") or [0]
+        return shape[0] >= settings.APPROX_AUTO_MIN_ROWS
+    
+    async def _run_operation(self, context: Dict[str, Any], operation: Dict[str, Any], approximate: bool = False):
+        with span("data_operation"):
+            result = await self._execute_operation(context, operation, approximate)
+        frame = result.result if isinstance(result, ApproximateResult) else result
+        if isinstance(frame, pd.DataFrame):
+            observe_frame("query", len(frame), len(frame.columns))
+        return result
+    
+    async def _execute_operation(self, context: Dict[str, Any], operation: Dict[str, Any], approximate: bool):
+        if context.get('data') is not None:
+            return await dataframe_executor.run(
+                process_dataframe,
+                context['data'],
+                operation
+            )
+        if is_session_operation(operation):
+            # 跨文件操作按表名访问会话中的所有数据文件
+            return await self.file_service.query_session_data(
+                context['data_source']['session_id'],
+                context.get('files') or [],
+                operation
+            )
+        # 按指令从数据文件中读取所需的列和行
+        return await self.file_service.query_file_data(
+            context['data_source']['session_id'],
+            context['data_source']['file_id'],
+            operation,
+            approximate
+        )
+    
+    async def _result_payload(
+        self,
+        context: Dict[str, Any],
+        processed_result,
+        operation: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        生成 data_results 中的数据部分
+
+        超过 RESULT_PAGE_SIZE 行的表格结果保存为结果文件，响应中只包含第一页和结果句柄，
+        其余的行通过分页接口读取。近似结果附带误差范围和用于 /refine 精确计算的指令
+        """
+        if isinstance(processed_result, ApproximateResult):
+            payload = await self._result_payload(context, processed_result.result)
+            payload["approximation"] = {
+                **processed_result.summary(),
+                "file_id": context['data_source']['file_id'],
+                "operation": operation
+            }
+            return payload
+        
+        source = context.get('data_source')
+        if (
+            not isinstance(processed_result, pd.DataFrame)
+            or len(processed_result) <= settings.RESULT_PAGE_SIZE
+            or source is None
+        ):
+            return {"processed_data": self._records(processed_result)}
+        
+        result_id = uuid.uuid4().hex
+        with span("result_save"):
+            await self.file_service.save_analysis_result(
+                source['session_id'], source['file_id'], result_id, processed_result
+            )
+        return {
+            "processed_data": self._records(processed_result.head(settings.RESULT_PAGE_SIZE)),
+            "result_id": result_id,
+            "file_id": source['file_id'],
+            "total_rows": len(processed_result)
+        }
+    
+    @staticmethod
+    def _records(processed_result):
+        if not isinstance(processed_result, pd.DataFrame):
+            return processed_result
+        with span("result_serialize"):
+            return processed_result.to_dict(orient='records')
+    
+    def _build_response(self, llm_response: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if isinstance(llm_response.get('data_operation'), dict) and result is not None:
+            return {
+                "answer": llm_response['answer'],
+                "data_results": {
+                    **result,
+                    "data_type": llm_response.get('data_type', 'table'),
+                    "suggested_viz_type": llm_response.get('suggested_viz_type')
+                },
+                "code_snippet": llm_response.get('code_snippet'),
+                "suggestions": llm_response.get('suggestions', [])
+            }
+        return {
+            "answer": llm_response['answer'],
+            "suggestions": llm_response.get('suggestions', [])
+        }
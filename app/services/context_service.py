@@ -1,55 +1,325 @@
-from typing import Dict, Any, Optional, List
-import json
+from typing import Dict, Any, Optional, List, Union, Sequence
+import time
+import uuid
+from redis.exceptions import ResponseError
 from app.core.config import settings
-from redis.asyncio import Redis
+from app.core.redis import get_redis
+from app.core.serialization import dumps, loads, encode_blob, decode_blob, compress_json
 from datetime import datetime
 
+# 会话存储结构（{prefix} 即 context:{session_id}）:
+#   {prefix}                     HASH  会话元数据，每个字段的值为JSON编码（较大的值压缩存储）
+#   {prefix}:files               LIST  关联的文件列表
+#   {prefix}:history             LIST  对话记录，长度不超过 MAX_CONVERSATION_HISTORY
+#   {prefix}:history:{file_id}   LIST  按文件索引的对话记录
+#   {prefix}:responses           HASH  较大的回复内容（压缩存储），对话记录中只保存 response_ref
+
+# 活动会话索引：有序集合，成员为 session_id，分值为最后活动时间戳
+ACTIVE_SESSIONS_KEY = "sessions:active"
+
+# 脚本访问的键都由 ContextService 的键名方法生成并通过 KEYS 传入，脚本中不拼接键名。
+# 按文件索引的对话记录键取决于会话中的文件，调用前先读取文件列表；脚本在写入前检查要访问的文件是否都已声明，
+# 有未声明的文件（读取之后又添加了文件）时不做任何修改，返回 UNDECLARED_FILES [[session_id, file_id], ...]，调用方补充后重试
+
+# 会话更新脚本的公共参数:
+#   KEYS: 活动会话索引, 会话元数据, 文件列表, 对话记录, 回复内容, 各文件的对话记录...
+#   ARGV: session_id, 活动时间戳, 最后活动时间(JSON), 过期时间, KEYS[6..] 对应的 file_id 列表(JSON), 脚本参数...
+# touch 更新最后活动时间和索引分值，并刷新会话所有键的过期时间
+_SESSION_LUA = """
+local file_history = {}
+for i, file_id in ipairs(cjson.decode(ARGV[5])) do
+    file_history[file_id] = KEYS[5 + i]
+end
+
+local function session_file_ids()
+    local file_ids = {}
+    for _, item in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+        table.insert(file_ids, cjson.decode(item)['file_id'])
+    end
+    return file_ids
+end
+
+local function undeclared(file_ids)
+    local missing = {}
+    for _, file_id in ipairs(file_ids) do
+        if not file_history[file_id] then
+            table.insert(missing, {ARGV[1], file_id})
+        end
+    end
+    if #missing > 0 then
+        return redis.error_reply('UNDECLARED_FILES ' .. cjson.encode(missing))
+    end
+end
+
+local function touch(file_ids)
+    local ttl = ARGV[4]
+    redis.call('HSET', KEYS[2], 'last_active', ARGV[3])
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    for i = 2, 5 do
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+    for _, file_id in ipairs(file_ids) do
+        redis.call('EXPIRE', file_history[file_id], ttl)
+    end
+end
+"""
+
+# 脚本参数: 对话记录, file_id, turn_id, 回复内容(内联时为空), 最大记录数
+_ADD_TURN_LUA = _SESSION_LUA + """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return redis.error_reply('SESSION_NOT_FOUND')
+end
+local file_ids = session_file_ids()
+if ARGV[7] ~= '' then
+    table.insert(file_ids, ARGV[7])
+end
+-- 追加后超出上限的最早记录，连同其按文件索引的记录和单独存储的回复一起删除
+local overflow = redis.call('LLEN', KEYS[4]) + 1 - tonumber(ARGV[10])
+local evicted = {}
+if overflow > 0 then
+    for _, item in ipairs(redis.call('LRANGE', KEYS[4], 0, overflow - 1)) do
+        local turn = cjson.decode(item)
+        table.insert(evicted, turn)
+        if turn['file_id'] then
+            table.insert(file_ids, turn['file_id'])
+        end
+    end
+end
+local rejected = undeclared(file_ids)
+if rejected then
+    return rejected
+end
+
+if ARGV[9] ~= '' then
+    redis.call('HSET', KEYS[5], ARGV[8], ARGV[9])
+end
+redis.call('RPUSH', KEYS[4], ARGV[6])
+if ARGV[7] ~= '' then
+    redis.call('RPUSH', file_history[ARGV[7]], ARGV[6])
+end
+if overflow > 0 then
+    for _, turn in ipairs(evicted) do
+        if turn['response_ref'] then
+            redis.call('HDEL', KEYS[5], turn['response_ref'])
+        end
+        if turn['file_id'] then
+            redis.call('LPOP', file_history[turn['file_id']])
+        end
+    end
+    redis.call('LTRIM', KEYS[4], overflow, -1)
+end
+touch(file_ids)
+return 1
+"""
+
+# 脚本参数: 文件信息, 最大文件数
+_ADD_FILE_LUA = _SESSION_LUA + """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return redis.error_reply('SESSION_NOT_FOUND')
+end
+if redis.call('LLEN', KEYS[3]) >= tonumber(ARGV[7]) then
+    return redis.error_reply('FILE_LIMIT')
+end
+local file_ids = session_file_ids()
+table.insert(file_ids, cjson.decode(ARGV[6])['file_id'])
+local rejected = undeclared(file_ids)
+if rejected then
+    return rejected
+end
+redis.call('RPUSH', KEYS[3], ARGV[6])
+touch(file_ids)
+return 1
+"""
+
+# 脚本参数: 字段1, 值1, 字段2, 值2 ...
+_UPDATE_FIELDS_LUA = _SESSION_LUA + """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return redis.error_reply('SESSION_NOT_FOUND')
+end
+local file_ids = session_file_ids()
+local rejected = undeclared(file_ids)
+if rejected then
+    return rejected
+end
+redis.call('HSET', KEYS[2], unpack(ARGV, 6))
+touch(file_ids)
+return 1
+"""
+
+# 批量删除会话的所有键并移出活动索引
+# KEYS: 活动会话索引, 之后每个会话依次为 会话元数据, 文件列表, 对话记录, 回复内容, 各文件的对话记录...
+# ARGV: 最大活动时间戳（'+inf' 表示不限）, 各会话的 [session_id, [file_id...]] 列表(JSON)，顺序与 KEYS 一致
+# 删除前再次检查索引分值，跳过在查询之后又变为活跃的会话
+_DELETE_SESSIONS_LUA = """
+local max_score = ARGV[1] == '+inf' and math.huge or tonumber(ARGV[1])
+local sessions = {}
+local missing = {}
+local position = 2
+for _, entry in ipairs(cjson.decode(ARGV[2])) do
+    local session_id, file_ids = entry[1], entry[2]
+    local keys = {}
+    for i = position, position + 3 + #file_ids do
+        table.insert(keys, KEYS[i])
+    end
+    position = position + 4 + #file_ids
+    local score = redis.call('ZSCORE', KEYS[1], session_id)
+    if not score or tonumber(score) <= max_score then
+        local declared = {}
+        for _, file_id in ipairs(file_ids) do
+            declared[file_id] = true
+        end
+        for _, item in ipairs(redis.call('LRANGE', keys[2], 0, -1)) do
+            local file_id = cjson.decode(item)['file_id']
+            if not declared[file_id] then
+                table.insert(missing, {session_id, file_id})
+            end
+        end
+        table.insert(sessions, {session_id, keys})
+    end
+end
+if #missing > 0 then
+    return redis.error_reply('UNDECLARED_FILES ' .. cjson.encode(missing))
+end
+for _, session in ipairs(sessions) do
+    redis.call('DEL', unpack(session[2]))
+    redis.call('ZREM', KEYS[1], session[1])
+end
+return #sessions
+"""
+
+# 文件列表在读取后变化时脚本的最大重试次数
+_MAX_SCRIPT_ATTEMPTS = 5
+
+# 单独存储的字段，不能通过 update_context 修改
+_RESERVED_FIELDS = {"files", "conversation_history"}
+
 class ContextService:
     def __init__(self):
-        self.redis = Redis(host=settings.REDIS_URL)
-    
-    async def get_context(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """获取会话上下文"""
-        context = await self.redis.get(f"context:{session_id}")
-        return json.loads(context) if context else None
-    
+        self.redis = get_redis()
+        self._add_turn = self.redis.register_script(_ADD_TURN_LUA)
+        self._add_file = self.redis.register_script(_ADD_FILE_LUA)
+        self._update_fields = self.redis.register_script(_UPDATE_FIELDS_LUA)
+        self._delete_sessions_script = self.redis.register_script(_DELETE_SESSIONS_LUA)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"context:{session_id}"
+
+    @classmethod
+    def _files_key(cls, session_id: str) -> str:
+        return f"{cls._key(session_id)}:files"
+
+    @classmethod
+    def _history_key(cls, session_id: str, file_id: Optional[str] = None) -> str:
+        """会话的对话记录，指定 file_id 时为该文件的对话记录"""
+        key = f"{cls._key(session_id)}:history"
+        return key if file_id is None else f"{key}:{file_id}"
+
+    @classmethod
+    def _responses_key(cls, session_id: str) -> str:
+        return f"{cls._key(session_id)}:responses"
+
+    @classmethod
+    def _session_keys(cls, session_id: str, file_ids: List[str]) -> List[str]:
+        """会话的所有键，顺序与脚本中 KEYS 的约定一致"""
+        return [
+            cls._key(session_id),
+            cls._files_key(session_id),
+            cls._history_key(session_id),
+            cls._responses_key(session_id),
+            *(cls._history_key(session_id, file_id) for file_id in file_ids),
+        ]
+
+    async def _file_ids(self, session_ids: List[str]) -> Dict[str, List[str]]:
+        """读取会话中的文件 id，用于声明按文件索引的对话记录键"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for session_id in session_ids:
+                pipe.lrange(self._files_key(session_id), 0, -1)
+            results = await pipe.execute()
+        return {
+            session_id: [loads(item)["file_id"] for item in items]
+            for session_id, items in zip(session_ids, results)
+        }
+
+    @staticmethod
+    def _undeclared_files(error: ResponseError) -> Optional[List[List[str]]]:
+        """脚本因文件未声明而未执行时返回 [[session_id, file_id], ...]，其他错误返回 None"""
+        message = str(error)
+        if "UNDECLARED_FILES " not in message:
+            return None
+        return loads(message.split("UNDECLARED_FILES ", 1)[1])
+
+    @property
+    def _ttl(self) -> int:
+        return settings.SESSION_EXPIRE_DAYS * 86400
+
+    async def get_context(self, session_id: str, include_history: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        获取会话上下文
+
+        include_history 为 False 时不读取对话记录，适用于只需要会话元数据和文件列表的请求
+        """
+        prefix = self._key(session_id)
+        async with self.redis.pipeline() as pipe:
+            pipe.hgetall(prefix)
+            pipe.lrange(self._files_key(session_id), 0, -1)
+            if include_history:
+                pipe.lrange(self._history_key(session_id), 0, -1)
+            results = await pipe.execute()
+
+        if not results[0]:
+            return None
+
+        context = {field: decode_blob(value) for field, value in results[0].items()}
+        context["files"] = [loads(item) for item in results[1]]
+        if include_history:
+            context["conversation_history"] = await self._load_turns(session_id, results[2])
+        return context
+
     async def create_session(self, session_id: str) -> Dict[str, Any]:
         """创建新的会话"""
         session_data = {
             "session_id": session_id,
             "created_at": datetime.now().isoformat(),
             "last_active": datetime.now().isoformat(),
-            "files": [],  # 关联的文件列表
-            "conversation_history": [],
             "analysis_results": []
         }
-        
-        await self.redis.set(
-            f"context:{session_id}",
-            json.dumps(session_data),
-            ex=settings.SESSION_EXPIRE_DAYS * 86400
-        )
-        return session_data
-    
+
+        await self._delete_sessions([session_id])
+        prefix = self._key(session_id)
+        async with self.redis.pipeline() as pipe:
+            pipe.hset(prefix, mapping={k: encode_blob(v) for k, v in session_data.items()})
+            pipe.expire(prefix, self._ttl)
+            pipe.zadd(ACTIVE_SESSIONS_KEY, {session_id: time.time()})
+            pipe.zcard(ACTIVE_SESSIONS_KEY)
+            results = await pipe.execute()
+
+        # 超过最大活动会话数时，淘汰最久未活动的会话
+        overflow = results[-1] - settings.MAX_ACTIVE_SESSIONS
+        if overflow > 0:
+            stale = await self.redis.zrange(ACTIVE_SESSIONS_KEY, 0, overflow - 1)
+            await self._delete_sessions(stale)
+
+        return {
+            **session_data,
+            "files": [],  # 关联的文件列表
+            "conversation_history": []
+        }
+
     async def add_file_to_session(self, session_id: str, file_info: Dict[str, Any]):
         """添加文件到会话"""
-        context = await self.get_context(session_id)
-        if not context:
-            raise ValueError("Session not found")
-        
-        # 检查文件数量限制
-        if len(context["files"]) >= settings.MAX_FILES_PER_SESSION:
-            raise ValueError(f"每个会话最多支持 {settings.MAX_FILES_PER_SESSION} 个文件")
-        
-        # 添加文件信息
-        context["files"].append({
+        file_entry = {
             "file_id": file_info["file_id"],
             "filename": file_info["original_filename"],
             "added_at": datetime.now().isoformat()
-        })
-        
-        await self.update_context(session_id, context)
-    
+        }
+        await self._run_script(
+            self._add_file,
+            session_id,
+            [dumps(file_entry), settings.MAX_FILES_PER_SESSION],
+            file_ids=[file_entry["file_id"]]
+        )
+
     async def add_conversation(
         self,
         session_id: str,
@@ -57,62 +327,257 @@ class ContextService:
         response: Dict[str, Any],
         file_id: Optional[str] = None
     ):
-        """添加对话记录"""
-        context = await self.get_context(session_id)
-        if not context:
-            raise ValueError("Session not found")
-        
-        # 添加对话记录
+        """
+        添加对话记录
+
+        只追加一条记录并按 MAX_CONVERSATION_HISTORY 截断（读取文件列表后在一个脚本中完成），
+        超过 CONTEXT_INLINE_RESPONSE_MAX_BYTES 的回复单独存储，记录中只保留引用
+        """
+        turn_id = str(uuid.uuid4())
         conversation = {
+            "turn_id": turn_id,
             "timestamp": datetime.now().isoformat(),
             "query": query,
-            "response": response,
             "file_id": file_id
         }
-        
-        context["conversation_history"].append(conversation)
-        
-        # 限制对话历史长度
-        if len(context["conversation_history"]) > settings.MAX_CONVERSATION_HISTORY:
-            context["conversation_history"] = context["conversation_history"][-settings.MAX_CONVERSATION_HISTORY:]
-        
-        # 更新最后活动时间
-        context["last_active"] = datetime.now().isoformat()
-        
-        await self.update_context(session_id, context)
-    
+
+        response_json = dumps(response)
+        if len(response_json) > settings.CONTEXT_INLINE_RESPONSE_MAX_BYTES:
+            conversation["response_ref"] = turn_id
+            stored_response = compress_json(response_json)
+        else:
+            conversation["response"] = response
+            stored_response = ""
+        if file_id is None:
+            del conversation["file_id"]
+
+        await self._run_script(
+            self._add_turn,
+            session_id,
+            [
+                dumps(conversation),
+                file_id or "",
+                turn_id,
+                stored_response,
+                settings.MAX_CONVERSATION_HISTORY
+            ],
+            file_ids=[file_id] if file_id else []
+        )
+
     async def get_file_conversations(self, session_id: str, file_id: str) -> List[Dict[str, Any]]:
         """获取特定文件的对话历史"""
-        context = await self.get_context(session_id)
-        if not context:
-            return []
-        
-        return [
-            conv for conv in context["conversation_history"]
-            if conv.get("file_id") == file_id
-        ]
-    
-    async def update_context(self, session_id: str, context: Dict[str, Any]):
-        """更新会话上下文"""
-        await self.redis.set(
-            f"context:{session_id}",
-            json.dumps(context),
-            ex=settings.SESSION_EXPIRE_DAYS * 86400
-        )
-    
-    async def cleanup_inactive_sessions(self):
-        """清理不活跃的会话"""
-        active_sessions = await self.get_active_sessions()
-        for session_id in active_sessions:
-            context = await self.get_context(session_id)
-            if not context:
-                continue
-                
-            last_active = datetime.fromisoformat(context["last_active"])
-            if (datetime.now() - last_active).days >= settings.SESSION_EXPIRE_DAYS:
-                await self.redis.delete(f"context:{session_id}")
-    
+        items = await self.redis.lrange(self._history_key(session_id, file_id), 0, -1)
+        return await self._load_turns(session_id, items)
+
+    async def update_context(self, session_id: str, new_context: Dict[str, Any]):
+        """更新会话上下文，new_context 中的字段合并到已有上下文中"""
+        reserved = _RESERVED_FIELDS & new_context.keys()
+        if reserved:
+            raise ValueError(f"字段 {', '.join(sorted(reserved))} 不能通过 update_context 修改")
+        if not new_context:
+            return
+
+        fields = []
+        for field, value in new_context.items():
+            fields.extend([field, encode_blob(value)])
+        await self._run_script(self._update_fields, session_id, fields)
+
+    async def _run_script(self, script, session_id: str, args: List[Any], file_ids: Sequence[str] = ()):
+        """
+        执行会话更新脚本，并将脚本返回的错误转换为 ValueError
+
+        file_ids 为会话文件列表之外、脚本需要访问其对话记录的文件（如新添加的文件）
+        """
+        now = datetime.now()
+        common = [session_id, now.timestamp(), dumps(now.isoformat()), self._ttl]
+        declared = [*(await self._file_ids([session_id]))[session_id], *file_ids]
+        for _ in range(_MAX_SCRIPT_ATTEMPTS):
+            declared = list(dict.fromkeys(declared))
+            try:
+                return await script(
+                    keys=[ACTIVE_SESSIONS_KEY, *self._session_keys(session_id, declared)],
+                    args=[*common, dumps(declared), *args]
+                )
+            except ResponseError as e:
+                missing = self._undeclared_files(e)
+                if missing is not None:
+                    declared.extend(file_id for _, file_id in missing)
+                    continue
+                if "SESSION_NOT_FOUND" in str(e):
+                    raise ValueError("Session not found")
+                if "FILE_LIMIT" in str(e):
+                    raise ValueError(f"每个会话最多支持 {settings.MAX_FILES_PER_SESSION} 个文件")
+                raise
+        raise ValueError("会话的文件列表正在被并发修改，请重试")
+
+    async def get_recent_conversations(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        """获取最近 limit 轮对话记录，按时间从早到晚排序"""
+        items = await self.redis.lrange(self._history_key(session_id), -limit, -1)
+        return await self._load_turns(session_id, items)
+
+    async def _load_turns(self, session_id: str, items: List[str]) -> List[Dict[str, Any]]:
+        """解码对话记录，并批量取回按引用存储的回复内容"""
+        turns = [loads(item) for item in items]
+        refs = [turn["response_ref"] for turn in turns if "response_ref" in turn]
+        if refs:
+            responses = await self.redis.hmget(self._responses_key(session_id), refs)
+            stored = dict(zip(refs, responses))
+            for turn in turns:
+                if "response_ref" in turn:
+                    raw = stored.get(turn.pop("response_ref"))
+                    turn["response"] = decode_blob(raw) if raw else None
+        for turn in turns:
+            turn.setdefault("file_id", None)
+        return turns
+
+    async def _delete_sessions(self, session_ids: List[str], max_score: Union[float, str] = "+inf") -> int:
+        """删除会话的所有键并移出活动索引，只删除最后活动时间不晚于 max_score 的会话"""
+        if not session_ids:
+            return 0
+        declared = await self._file_ids(session_ids)
+        for _ in range(_MAX_SCRIPT_ATTEMPTS):
+            keys = [ACTIVE_SESSIONS_KEY]
+            for session_id, file_ids in declared.items():
+                keys.extend(self._session_keys(session_id, file_ids))
+            try:
+                return await self._delete_sessions_script(
+                    keys=keys,
+                    args=[max_score, dumps([[session_id, file_ids] for session_id, file_ids in declared.items()])]
+                )
+            except ResponseError as e:
+                missing = self._undeclared_files(e)
+                if missing is None:
+                    raise
+                for session_id, file_id in missing:
+                    declared[session_id].append(file_id)
+        raise ValueError("会话的文件列表正在被并发修改，请重试")
+
+    async def cleanup_inactive_sessions(self) -> int:
+        """
+        清理不活跃的会话
+
+        按活动索引分批取出超过 SESSION_EXPIRE_DAYS 未活动的会话并删除，
+        每批的删除在一个脚本中完成，Redis 单次阻塞时间只与批大小有关
+        """
+        cutoff = time.time() - self._ttl
+        deleted = 0
+        while True:
+            session_ids = await self.redis.zrangebyscore(
+                ACTIVE_SESSIONS_KEY, "-inf", cutoff,
+                start=0, num=settings.SESSION_CLEANUP_BATCH_SIZE
+            )
+            if not session_ids:
+                break
+            deleted += await self._delete_sessions(session_ids, max_score=cutoff)
+            if len(session_ids) < settings.SESSION_CLEANUP_BATCH_SIZE:
+                break
+        return deleted
+
     async def get_active_sessions(self) -> List[str]:
-        """获取所有活动会话"""
-        keys = await self.redis.keys("context:*")
-        return [key.split(":")[1] for key in keys] 
\ No newline at end of file
+        """获取所有活动会话，按最后活动时间从早到晚排序"""
+        return await self.redis.zrange(ACTIVE_SESSIONS_KEY, 0, -1)
+
+    async def rebuild_activity_index(self) -> int:
+        """
+        用 SCAN 遍历已有会话重建活动索引（用于迁移索引引入之前创建的会话）
+
+        SCAN 按游标分批返回，不会像 KEYS 一样长时间阻塞 Redis。
+        旧版以整个 JSON 字符串存储的会话先转换为当前的存储结构再加入索引，其他类型的键跳过
+        """
+        indexed = 0
+        batch = []
+        async for key in self.redis.scan_iter(match="context:*", count=settings.SESSION_CLEANUP_BATCH_SIZE):
+            # 只处理会话元数据键，忽略 files/history 等子键
+            if key.count(":") == 1:
+                batch.append(key)
+            if len(batch) >= settings.SESSION_CLEANUP_BATCH_SIZE:
+                indexed += await self._index_sessions(batch)
+                batch = []
+        if batch:
+            indexed += await self._index_sessions(batch)
+        return indexed
+
+    async def _index_sessions(self, keys: List[str]) -> int:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.type(key)
+            types = await pipe.execute()
+
+        hashes = [key for key, key_type in zip(keys, types) if key_type == "hash"]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in hashes:
+                pipe.hget(key, "last_active")
+            values = await pipe.execute()
+
+        scores = {
+            key.split(":", 1)[1]: datetime.fromisoformat(decode_blob(value)).timestamp()
+            for key, value in zip(hashes, values) if value
+        }
+        for key, key_type in zip(keys, types):
+            if key_type == "string":
+                score = await self._migrate_legacy_session(key)
+                if score is not None:
+                    scores[key.split(":", 1)[1]] = score
+        if scores:
+            await self.redis.zadd(ACTIVE_SESSIONS_KEY, scores)
+        return len(scores)
+
+    async def _migrate_legacy_session(self, key: str) -> Optional[float]:
+        """
+        把旧版以 JSON 字符串存储的会话转换为当前的存储结构，返回最后活动时间戳
+
+        内容无法解析时保持原样并返回 None；保留原有的剩余过期时间
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.ttl(key)
+            raw, ttl = await pipe.execute()
+        try:
+            legacy = loads(raw)
+        except ValueError:
+            return None
+        if not isinstance(legacy, dict):
+            return None
+
+        session_id = key.split(":", 1)[1]
+        files = legacy.pop("files", None) or []
+        history = (legacy.pop("conversation_history", None) or [])[-settings.MAX_CONVERSATION_HISTORY:]
+        legacy.setdefault("session_id", session_id)
+        try:
+            last_active = datetime.fromisoformat(legacy["last_active"])
+        except (KeyError, TypeError, ValueError):
+            last_active = datetime.now()
+            legacy["last_active"] = last_active.isoformat()
+
+        turns, responses, file_turns = [], {}, {}
+        for turn in history:
+            turn = {"turn_id": str(uuid.uuid4()), **turn}
+            if turn.get("file_id") is None:
+                turn.pop("file_id", None)
+            response_json = dumps(turn.get("response"))
+            if len(response_json) > settings.CONTEXT_INLINE_RESPONSE_MAX_BYTES:
+                del turn["response"]
+                turn["response_ref"] = turn["turn_id"]
+                responses[turn["turn_id"]] = compress_json(response_json)
+            item = dumps(turn)
+            turns.append(item)
+            if "file_id" in turn:
+                file_turns.setdefault(turn["file_id"], []).append(item)
+
+        file_ids = list(dict.fromkeys([*(entry["file_id"] for entry in files), *file_turns]))
+        ttl = ttl if ttl and ttl > 0 else self._ttl
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={field: encode_blob(value) for field, value in legacy.items()})
+            if files:
+                pipe.rpush(self._files_key(session_id), *(dumps(entry) for entry in files))
+            if turns:
+                pipe.rpush(self._history_key(session_id), *turns)
+            for file_id, items in file_turns.items():
+                pipe.rpush(self._history_key(session_id, file_id), *items)
+            if responses:
+                pipe.hset(self._responses_key(session_id), mapping=responses)
+            for session_key in self._session_keys(session_id, file_ids):
+                pipe.expire(session_key, ttl)
+            await pipe.execute()
+        return last_active.timestamp()
@@ -1,125 +1,801 @@
 from fastapi import UploadFile
 import pandas as pd
-from typing import Dict, Any, Optional, List
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Any, Optional, BinaryIO, Iterator, List, Union, Sequence, Tuple, Callable, Awaitable
 from pathlib import Path
 from app.core.config import settings
+from app.core.executor import dataframe_executor, ExecutorBusyError, ExecutorTimeoutError
+from app.core.metrics import span, observe_frame
+from app.utils.csv_ingest import infer_csv_dtypes, write_csv_to_parquet
+from app.utils.dataframe_cache import dataframe_cache
+from app.utils.profiler import profile_parquet, describe_from_profile
+from app.utils.prompt_context import build_prompt_context
+from app.core.serialization import dumps, loads
+from app.schemas.operation import BaseOperation, parse_operation
+from app.utils.approximate import APPROXIMABLE_TYPES, ApproximateResult, approximate_operation, build_sample
+from app.utils.data_processor import process_dataframe
+from app.utils.file_index import FileIndex, build_file_index
+from app.utils.query_planner import execute_operation
+from app.utils.session_query import execute_session_operation, session_table_names
+from app.db.database import SessionLocal
+from app.models.upload_manifest import UploadManifest
+from app.services.blob_store import BLOB_DIR_NAME, BlobStore
+import asyncio
+import hashlib
+import io
+import re
 import uuid
 import json
 import shutil
+import tempfile
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+
+# 结果文件名由 uuid4().hex 生成
+_RESULT_ID = re.compile(r"[0-9a-f]{32}")
+
+# 导入CSV的各个阶段，依次为：推断列类型、写入parquet、计算列统计、建立索引和样本
+INGEST_STAGES = ("parse", "write_parquet", "profile", "index")
+
+def _copied_bytes(df: pd.DataFrame, mapped: pa.Buffer) -> int:
+    """DataFrame 中数据不在内存映射区域内（转换时复制）的列和索引占用的字节数"""
+    start, end = mapped.address, mapped.address + mapped.size
+    copied = int(df.index.memory_usage())
+    for _, series in df.items():
+        array = series.array
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            in_map = False
+        elif hasattr(array, "__arrow_array__"):
+            # Arrow 支持的扩展类型（如字符串列）直接持有 Arrow 数组
+            buffers = [b for chunk in array.__arrow_array__().chunks for b in chunk.buffers() if b is not None and b.size]
+            in_map = all(start <= b.address < end for b in buffers)
+        else:
+            values = series.to_numpy(copy=False)
+            in_map = values.size == 0 or start <= values.__array_interface__["data"][0] < end
+        if not in_map:
+            copied += int(series.memory_usage(deep=True, index=False))
+    return copied
+
+@lru_cache(maxsize=256)
+def _load_json(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """按文件路径和修改时间缓存读取的JSON，文件被重写后自动重新读取"""
+    with open(path) as f:
+        return json.load(f)
+
+@lru_cache(maxsize=256)
+def _build_prompt_context(
+    profile_path: str,
+    mtime_ns: int,
+    priority_columns: Tuple[str, ...],
+    token_budget: int
+) -> Dict[str, Any]:
+    return build_prompt_context(_load_json(profile_path, mtime_ns), token_budget, priority_columns)
 
 class FileService:
     def __init__(self):
         self.base_dir = settings.UPLOAD_DIRECTORY
         
-    async def process_csv(self, session_id: str, filename: str, df: pd.DataFrame) -> Dict[str, Any]:
-        """处理上传的CSV文件"""
+    async def process_csv(
+        self,
+        session_id: str,
+        filename: str,
+        source: Union[BinaryIO, Path],
+        progress: Optional[Callable[[str], Awaitable[None]]] = None,
+        content_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        处理上传的CSV文件
+
+        source 为已落盘（或内存中）的CSV文件对象或文件路径，content_hash 为上传时计算的内容
+        SHA-256（为空时在这里计算）。相同内容已导入过时，直接引用 blob 存储中的数据集，不再解析、统计和写入；
+        否则分块解析后逐个行组写入parquet，解析和写入阶段的峰值内存只与 CSV_CHUNK_ROWS 有关，与文件大小无关。
+        各阶段（INGEST_STAGES）依次在数据处理执行器中进行，不阻塞事件循环；
+        每个阶段开始前调用 progress(阶段名)，失败时删除已写入的文件
+        """
+        spilled = None
+        staging = None
+        file_dir = None
+        referenced = False
+        file_id = str(uuid.uuid4())
         try:
-            # 创建会话目录
-            session_dir = self.base_dir / session_id
-            session_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 生成文件ID和目录
-            file_id = str(uuid.uuid4())
-            file_dir = session_dir / file_id
-            file_dir.mkdir(parents=True, exist_ok=True)
+            if content_hash is None:
+                with span("upload_hash"):
+                    content_hash = await asyncio.to_thread(self._hash_source, source)
+            blob_id = self.blobs.blob_id(content_hash)
+            manifest = await asyncio.to_thread(self.blobs.acquire, blob_id, session_id, file_id)
+            referenced = manifest is not None
             
-            # 保存文件元数据
-            metadata = {
-                "file_id": file_id,
-                "session_id": session_id,
-                "original_filename": filename,
-                "created_at": datetime.now().isoformat(),
-                "file_size": df.memory_usage(deep=True).sum(),
-                "row_count": len(df),
-                "column_count": len(df.columns),
-                "columns": self._get_column_info(df)
-            }
-            
-            # 保存元数据
-            with open(file_dir / "metadata.json", "w") as f:
-                json.dump(metadata, f, indent=2)
-            
-            # 保存数据
-            df.to_parquet(file_dir / "data.parquet")
+            if manifest is None:
+                # 进程池无法传递文件对象，先把上传内容写到临时文件，由工作进程按路径读取
+                if dataframe_executor.requires_pickling and not isinstance(source, Path):
+                    source.seek(0)
+                    with tempfile.NamedTemporaryFile(dir=self.base_dir, suffix=".csv", delete=False) as f:
+                        shutil.copyfileobj(source, f)
+                    spilled = source = Path(f.name)
+                
+                async def stage(name: str, func: Callable, *args):
+                    if progress is not None:
+                        await progress(name)
+                    with span(f"upload_{name}"):
+                        return await dataframe_executor.run(func, *args, timeout=settings.UPLOAD_JOB_TIMEOUT)
+                
+                # 在临时目录中构建，完成后放入 blob 存储
+                staging = self.blobs.staging_dir()
+                dtypes = await stage("parse", self._infer_dtypes, source)
+                ingest = await stage("write_parquet", self._write_parquet, source, staging, dtypes)
+                profile = await stage("profile", self._profile, staging)
+                manifest = await stage("index", self._build_artifacts, staging, dtypes, ingest, profile)
+                await asyncio.to_thread(
+                    self.blobs.store, staging, blob_id, content_hash, manifest, session_id, file_id
+                )
+                staging = None
+                referenced = True
+                observe_frame("upload", manifest["metadata"]["row_count"], manifest["metadata"]["column_count"])
             
-            # 创建分析结果目录
-            (file_dir / "analysis_results").mkdir(exist_ok=True)
+            file_dir = self.base_dir / session_id / file_id
+            await asyncio.to_thread(self._link_file, session_id, filename, file_dir, blob_id, manifest["metadata"])
             
+            # 记录到上传清单，供定期清理使用
+            await asyncio.to_thread(self._touch_manifest, session_id, self._dir_size(file_dir))
             return {
                 "success": True,
                 "file_id": file_id,
-                "summary": self._generate_summary(df),
-                "columns": metadata["columns"],
-                "sample_data": df.head(5).to_dict(orient='records')
+                "original_filename": filename,
+                **manifest["result"]
             }
-            
         except Exception as e:
+            self._discard(staging)
+            self._discard(file_dir)
+            if referenced:
+                await asyncio.to_thread(self.blobs.release, session_id, file_id)
+            if isinstance(e, (ExecutorBusyError, ExecutorTimeoutError)):
+                raise
             return {"success": False, "error": str(e)}
+        finally:
+            if spilled is not None:
+                spilled.unlink(missing_ok=True)
     
-    async def get_file_data(self, session_id: str, file_id: str) -> Optional[pd.DataFrame]:
-        """获取文件数据"""
+    @property
+    def blobs(self) -> BlobStore:
+        return BlobStore(self.base_dir / BLOB_DIR_NAME)
+    
+    @classmethod
+    def _hash_source(cls, source: Union[BinaryIO, Path]) -> str:
+        digest = hashlib.sha256()
+        with cls._open_source(source) as f:
+            f.seek(0)
+            while chunk := f.read(settings.UPLOAD_READ_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _link_file(self, session_id: str, filename: str, file_dir: Path, blob_id: str, metadata: Dict[str, Any]):
+        """创建会话中的文件目录：共享产物链接到 blob，元数据和分析结果目录属于该文件"""
+        file_dir.mkdir(parents=True)
+        self.blobs.link(blob_id, file_dir)
+        metadata = {
+            "file_id": file_dir.name,
+            "session_id": session_id,
+            "original_filename": filename,
+            "created_at": datetime.now().isoformat(),
+            "blob_id": blob_id,
+            **metadata
+        }
+        with open(file_dir / "metadata.json", "w") as f:
+            json.dump(metadata, f, indent=2)
+        (file_dir / "analysis_results").mkdir()
+    
+    @staticmethod
+    def _discard(file_dir: Optional[Path]):
+        if file_dir is not None:
+            shutil.rmtree(file_dir, ignore_errors=True)
+    
+    def delete_file(self, session_id: str, file_id: str):
+        """删除已导入的文件及其缓存，并释放对 blob 的引用"""
+        self._discard(self.base_dir / session_id / file_id)
+        self.blobs.release(session_id, file_id)
+        dataframe_cache.invalidate(session_id, file_id)
+    
+    @staticmethod
+    @contextmanager
+    def _open_source(source: Union[BinaryIO, Path]) -> Iterator[BinaryIO]:
+        if isinstance(source, Path):
+            with open(source, "rb") as f:
+                yield f
+        else:
+            yield source
+    
+    @classmethod
+    def _infer_dtypes(cls, source: Union[BinaryIO, Path]) -> Dict[str, Any]:
+        """第一遍扫描CSV，推断（并按配置优化）各列的存储类型"""
+        optimize = settings.INGEST_OPTIMIZE_DTYPES
+        with cls._open_source(source) as f:
+            return infer_csv_dtypes(
+                f, settings.CSV_CHUNK_ROWS,
+                max_categories=settings.INGEST_MAX_CATEGORIES if optimize else 0,
+                downcast_ints=optimize,
+                parse_dates=settings.INGEST_PARSE_DATES
+            )
+    
+    @classmethod
+    def _write_parquet(cls, source: Union[BinaryIO, Path], file_dir: Path, dtypes: Dict[str, Any]) -> Dict[str, Any]:
+        """第二遍扫描CSV，按推断的类型分块写入parquet"""
+        with cls._open_source(source) as f:
+            return write_csv_to_parquet(
+                f, file_dir / "data.parquet", dtypes, settings.CSV_CHUNK_ROWS,
+                settings.PARQUET_COMPRESSION, settings.PARQUET_COMPRESSION_LEVEL
+            )
+    
+    @staticmethod
+    def _profile(file_dir: Path) -> Dict[str, Any]:
+        """逐列计算统计信息，保存在 metadata.json 旁边，供提示词和接口响应复用"""
+        profile = profile_parquet(
+            file_dir / "data.parquet",
+            settings.PROFILE_TOP_K, settings.PROFILE_APPROX_MIN_ROWS, settings.PROFILE_SAMPLE_ROWS
+        )
+        with open(file_dir / "profile.json", "w") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        return profile
+    
+    @classmethod
+    def _build_artifacts(
+        cls,
+        file_dir: Path,
+        dtypes: Dict[str, Any],
+        ingest: Dict[str, Any],
+        profile: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """建立索引和样本，返回保存在 blob 中的导入结果和元数据"""
+        data_path = file_dir / "data.parquet"
+        columns, summary = cls._summarize_profile(profile, ingest)
+        
+        # 为低基数列和数值列建立预聚合索引，重复的分组、排序和过滤查询直接从索引回答
+        if settings.PREAGGREGATE_ENABLED:
+            build_file_index(
+                data_path, profile, file_dir / "index",
+                settings.PREAGGREGATE_MAX_GROUPS,
+                settings.PREAGGREGATE_MAX_DIMENSIONS,
+                settings.PREAGGREGATE_MAX_MEASURES
+            )
+        
+        # 超大文件抽取均匀随机样本，探索性的统计查询在样本上近似计算
+        sample_rows = build_sample(
+            data_path, file_dir / "sample.parquet", settings.SAMPLE_ROWS, settings.PARQUET_COMPRESSION
+        )
+        
+        if settings.HOT_FORMAT_ENABLED and summary["memory_usage"] <= settings.HOT_FORMAT_MAX_BYTES:
+            cls._write_hot_file(data_path, file_dir / "data.arrow")
+        
+        return {
+            "result": {
+                "summary": summary,
+                "columns": columns,
+                "sample_data": ingest["sample"]
+            },
+            "metadata": {
+                "file_size": summary["memory_usage"],
+                "row_count": ingest["row_count"],
+                "column_count": len(columns),
+                "columns": columns,
+                "sample_rows": sample_rows,
+                "storage": cls._storage_report(dtypes, ingest, data_path),
+                # 提示词中的数据描述在上传时生成一次，之后每次请求直接复用
+                "prompt_context": build_prompt_context(profile, settings.PROMPT_CONTEXT_TOKEN_BUDGET)
+            }
+        }
+    
+    @staticmethod
+    def _write_hot_file(data_path: Path, hot_path: Path):
+        """
+        把parquet另存为未压缩的 Arrow IPC 文件
+
+        每列合并为一个数据块写成单个记录批次，内存映射加载时各列直接引用文件中的缓冲区，不需要复制；
+        单列超过 Arrow 的 2GB 偏移量上限无法合并时按原有分块写入，加载时会复制分块的列
+        """
+        table = pq.read_table(data_path)
         try:
-            file_path = self.base_dir / session_id / file_id / "data.parquet"
-            if file_path.exists():
-                return pd.read_parquet(file_path)
+            table = table.combine_chunks()
+        except pa.ArrowException:
+            pass
+        tmp_path = hot_path.with_suffix(".tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        tmp_path.replace(hot_path)
+    
+    @staticmethod
+    def _read_hot_file(hot_path: Path) -> Tuple[pd.DataFrame, int]:
+        """
+        以内存映射加载 Arrow IPC 文件，返回 (DataFrame, 转换时复制的字节数)
+
+        没有空值的数值列和时间列以及字符串列引用映射的页面（各工作进程通过页缓存共享），加载时间与文件大小基本无关；
+        有空值的数值列（转换为带 NaN 的 float64）、布尔列和分类列在转换时复制到进程内存中。
+        进程内缓存只按复制的字节数计算这类条目的占用
+        """
+        mapped = pa.memory_map(str(hot_path)).read_buffer()
+        table = pa.ipc.open_file(mapped).read_all()
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        return df, _copied_bytes(df, mapped)
+    
+    async def get_file_data(self, session_id: str, file_id: str) -> Optional[pd.DataFrame]:
+        """
+        获取文件数据，优先从进程内缓存读取
+
+        有 Arrow IPC 文件（HOT_FORMAT_ENABLED）时内存映射加载，各工作进程通过页缓存共享同一份数据，否则解码parquet
+        """
+        file_dir = self.base_dir / session_id / file_id
+        if not (file_dir / "data.parquet").exists():
+            dataframe_cache.invalidate(session_id, file_id)
+            return None
+        hot_path = file_dir / "data.arrow"
+        if hot_path.exists():
+            return await self._read_cached((session_id, file_id), hot_path)
+        return await self._read_cached((session_id, file_id), file_dir / "data.parquet")
+    
+    async def get_file_sample(self, session_id: str, file_id: str) -> Optional[pd.DataFrame]:
+        """获取上传时抽取的样本，文件没有样本（行数较少）时返回 None"""
+        file_path = self.base_dir / session_id / file_id / "sample.parquet"
+        if not file_path.exists():
             return None
+        return await self._read_cached((session_id, file_id, "sample"), file_path)
+    
+    async def _read_cached(self, key: Tuple[str, ...], file_path: Path) -> Optional[pd.DataFrame]:
+        try:
+            # 以文件修改时间和大小作为版本，文件被替换后缓存自动失效
+            stat = file_path.stat()
+            version = (stat.st_mtime_ns, stat.st_size)
+            df = dataframe_cache.get(key, version)
+            if df is None:
+                size = None
+                if file_path.suffix == ".arrow":
+                    # 内存映射几乎不消耗CPU；经进程池返回会复制整个数据集，因此在线程中打开
+                    df, size = await asyncio.to_thread(self._read_hot_file, file_path)
+                else:
+                    df = await dataframe_executor.run(pd.read_parquet, file_path)
+                dataframe_cache.put(key, df, version, size=size)
+            return df
+        except (ExecutorBusyError, ExecutorTimeoutError):
+            raise
         except Exception:
             return None
     
+    async def get_file_profile(self, session_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+        """读取上传时生成的列统计信息（进程内缓存，调用方不能修改返回值）"""
+        profile_path = self.base_dir / session_id / file_id / "profile.json"
+        if not profile_path.exists():
+            return None
+        return _load_json(str(profile_path), profile_path.stat().st_mtime_ns)
+    
+    async def get_prompt_context(
+        self,
+        session_id: str,
+        file_id: str,
+        priority_columns: Sequence[str] = ()
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取提示词中的数据描述
+
+        数据描述在上传时按 PROMPT_CONTEXT_TOKEN_BUDGET 生成并保存在 metadata.json 中；
+        只有宽表超出预算被截断时，才按会话引用过的列（priority_columns）重新生成，结果在进程内缓存
+        """
+        file_dir = self.base_dir / session_id / file_id
+        metadata_path = file_dir / "metadata.json"
+        if not metadata_path.exists():
+            return None
+        metadata = _load_json(str(metadata_path), metadata_path.stat().st_mtime_ns)
+        prompt_context = metadata.get("prompt_context")
+        if prompt_context is not None and (not prompt_context["truncated"] or not priority_columns):
+            return prompt_context
+        
+        profile_path = file_dir / "profile.json"
+        if not profile_path.exists():
+            return None
+        return _build_prompt_context(
+            str(profile_path),
+            profile_path.stat().st_mtime_ns,
+            tuple(priority_columns),
+            settings.PROMPT_CONTEXT_TOKEN_BUDGET
+        )
+    
+    async def get_data_info(self, session_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取列、类型、行数、样本数据和列统计信息，无需加载整个文件
+
+        优先使用上传时保存的 profile.json，旧文件没有统计信息时读取parquet元数据
+        """
+        profile = await self.get_file_profile(session_id, file_id)
+        if profile is not None:
+            return {
+                "columns": [c["name"] for c in profile["columns"]],
+                "shape": [profile["row_count"], profile["column_count"]],
+                "dtypes": {c["name"]: c["type"] for c in profile["columns"]},
+                "sample": profile["sample"],
+                "column_stats": {c["name"]: self._compact_stats(c) for c in profile["columns"]}
+            }
+        
+        file_path = self.base_dir / session_id / file_id / "data.parquet"
+        if not file_path.exists():
+            return None
+        return await dataframe_executor.run(self._read_data_info, file_path)
+    
+    @staticmethod
+    def _read_data_info(file_path: Path) -> Dict[str, Any]:
+        parquet_file = pq.ParquetFile(file_path)
+        sample = next(parquet_file.iter_batches(batch_size=3), None)
+        sample_df = sample.to_pandas() if sample is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+        return {
+            "columns": parquet_file.schema_arrow.names,
+            "shape": [parquet_file.metadata.num_rows, len(parquet_file.schema_arrow.names)],
+            "dtypes": sample_df.dtypes.astype(str).to_dict(),
+            "sample": sample_df.to_dict(orient='records')
+        }
+    
+    async def query_file_data(
+        self,
+        session_id: str,
+        file_id: str,
+        operation: Dict[str, Any],
+        approximate: bool = False
+    ) -> Union[pd.DataFrame, Dict[str, Any], ApproximateResult]:
+        """
+        按数据处理指令查询文件数据
+
+        相同指令的结果按指令哈希保存在 analysis_results 中，再次查询时直接读取。
+        否则先尝试用上传时建立的预聚合索引回答；索引无法回答时，小文件整体加载（并进入DataFrame缓存）
+        后由pandas处理，超过 QUERY_PUSHDOWN_MIN_BYTES 的文件只读取操作涉及的列，并尽量把过滤条件下推到扫描阶段
+
+        approximate 为 True 时，统计、分组聚合和直方图在上传时抽取的样本上计算，返回带误差范围的
+        ApproximateResult（不保存结果）；已有精确结果、索引可以回答或文件没有样本时仍返回精确结果
+        """
+        file_dir = self.base_dir / session_id / file_id
+        if not (file_dir / "data.parquet").exists():
+            raise ValueError("数据文件不存在")
+        try:
+            op = parse_operation(operation)
+        except ValueError as e:
+            raise ValueError(f"数据处理错误: {e}")
+        
+        memo_path = file_dir / "analysis_results" / f"op_{op.cache_key()}"
+        result = await dataframe_executor.run(self._read_memo, memo_path)
+        if result is not None:
+            return result
+        
+        if approximate and op.type in APPROXIMABLE_TYPES:
+            sample = await self.get_file_sample(session_id, file_id)
+            if sample is not None:
+                result = await dataframe_executor.run(self._run_approximate, file_dir, op, sample)
+                if result is not None:
+                    return result
+        
+        df = None
+        if (file_dir / "data.parquet").stat().st_size < settings.QUERY_PUSHDOWN_MIN_BYTES:
+            df = await self.get_file_data(session_id, file_id)
+        result = await dataframe_executor.run(self._run_query, file_dir, op, df)
+        
+        memo_size = await dataframe_executor.run(self._write_memo, memo_path, result)
+        if memo_size:
+            await asyncio.to_thread(self._touch_manifest, session_id, memo_size)
+        return result
+    
+    @staticmethod
+    def _run_query(
+        file_dir: Path,
+        op: BaseOperation,
+        df: Optional[pd.DataFrame]
+    ) -> Union[pd.DataFrame, Dict[str, Any]]:
+        data_path = file_dir / "data.parquet"
+        index = FileIndex.load(file_dir / "index")
+        if index is not None:
+            result = index.answer(op, data_path, df)
+            if result is not None:
+                return result
+        
+        if df is not None:
+            return process_dataframe(df, op)
+        return execute_operation(data_path, op)
+    
+    @staticmethod
+    def _run_approximate(
+        file_dir: Path,
+        op: BaseOperation,
+        sample: pd.DataFrame
+    ) -> Union[pd.DataFrame, ApproximateResult, None]:
+        index = FileIndex.load(file_dir / "index")
+        result = index.aggregate(op) if index is not None else None
+        if result is not None:
+            # 分组统计已在上传时预先计算，精确结果不比样本慢
+            return result
+        total_rows = pq.ParquetFile(file_dir / "data.parquet").metadata.num_rows
+        return approximate_operation(sample, op, total_rows, settings.APPROX_CONFIDENCE)
+    
+    @classmethod
+    def _read_memo(cls, memo_path: Path) -> Union[pd.DataFrame, Dict[str, Any], None]:
+        if memo_path.with_suffix(".arrow").exists():
+            return cls._open_result_table(memo_path.with_suffix(".arrow")).to_pandas()
+        if memo_path.with_suffix(".json").exists():
+            return loads(memo_path.with_suffix(".json").read_bytes())
+        return None
+    
+    @classmethod
+    def _write_memo(cls, memo_path: Path, result: Union[pd.DataFrame, Dict[str, Any]]) -> int:
+        """保存查询结果，返回写入的字节数；结果过大或无法保存时不保存，返回 0"""
+        try:
+            if isinstance(result, pd.DataFrame):
+                if len(result) > settings.RESULT_MEMO_MAX_ROWS:
+                    return 0
+                path = memo_path.with_suffix(".arrow")
+                cls._write_result_table(result, path)
+            else:
+                path = memo_path.with_suffix(".json")
+                tmp_path = memo_path.with_suffix(".tmp")
+                tmp_path.write_bytes(dumps(result))
+                tmp_path.replace(path)
+            return path.stat().st_size
+        except (pa.ArrowException, OSError, TypeError, ValueError):
+            return 0
+    
+    async def query_session_data(
+        self,
+        session_id: str,
+        files: List[Dict[str, Any]],
+        operation: Dict[str, Any]
+    ) -> Union[pd.DataFrame, Dict[str, Any]]:
+        """按表名在会话的多个数据文件上执行数据处理指令（join、union 或指定表的单表操作）"""
+        tables = {
+            name: self.base_dir / session_id / file_id / "data.parquet"
+            for name, file_id in session_table_names(files).items()
+        }
+        tables = {name: path for name, path in tables.items() if path.exists()}
+        return await dataframe_executor.run(execute_session_operation, tables, operation)
+    
+    async def get_session_tables(self, session_id: str, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """会话中各数据文件的表名、行数和列类型，用于在提示词中描述可跨表查询的数据"""
+        tables = []
+        for name, file_id in session_table_names(files).items():
+            info = await self.get_data_info(session_id, file_id)
+            if info is not None:
+                tables.append({
+                    "name": name,
+                    "file_id": file_id,
+                    "rows": info["shape"][0],
+                    "columns": info["dtypes"]
+                })
+        return tables
+    
     async def save_analysis_result(
         self,
         session_id: str,
         file_id: str,
         analysis_id: str,
-        result: Dict[str, Any]
+        result: Union[Dict[str, Any], pd.DataFrame]
     ):
-        """保存分析结果"""
+        """
+        保存分析结果
+
+        表格结果保存为未压缩的 Arrow IPC 文件，分页读取时通过内存映射只访问所需的行
+        """
         result_dir = self.base_dir / session_id / file_id / "analysis_results"
         result_dir.mkdir(parents=True, exist_ok=True)
         
-        with open(result_dir / f"{analysis_id}.json", "w") as f:
-            json.dump(result, f, indent=2)
+        if isinstance(result, pd.DataFrame):
+            result_path = result_dir / f"{analysis_id}.arrow"
+            await dataframe_executor.run(self._write_result_table, result, result_path)
+        else:
+            result_path = result_dir / f"{analysis_id}.json"
+            with open(result_path, "w") as f:
+                json.dump(result, f, indent=2)
+        
+        await asyncio.to_thread(self._touch_manifest, session_id, result_path.stat().st_size)
+    
+    @staticmethod
+    def _write_result_table(df: pd.DataFrame, result_path: Path):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = result_path.with_suffix(".tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=settings.RESULT_BATCH_ROWS)
+        tmp_path.replace(result_path)
+    
+    def _result_path(self, session_id: str, file_id: str, result_id: str) -> Optional[Path]:
+        if not _RESULT_ID.fullmatch(result_id):
+            return None
+        result_path = self.base_dir / session_id / file_id / "analysis_results" / f"{result_id}.arrow"
+        return result_path if result_path.exists() else None
+    
+    @staticmethod
+    def _open_result_table(result_path: Path) -> pa.Table:
+        """以内存映射打开结果文件，切片不会复制数据"""
+        return pa.ipc.open_file(pa.memory_map(str(result_path))).read_all()
+    
+    async def get_result_page(
+        self,
+        session_id: str,
+        file_id: str,
+        result_id: str,
+        offset: int,
+        limit: int
+    ) -> Optional[Dict[str, Any]]:
+        """按列读取结果文件的一页，结果不存在时返回 None"""
+        result_path = self._result_path(session_id, file_id, result_id)
+        if result_path is None:
+            return None
+        return await dataframe_executor.run(self._columnar_page, result_path, offset, limit)
+    
+    @classmethod
+    def _columnar_page(cls, result_path: Path, offset: int, limit: int) -> Dict[str, Any]:
+        table = cls._open_result_table(result_path)
+        page = table.slice(offset, limit)
+        end = offset + page.num_rows
+        return {
+            "total_rows": table.num_rows,
+            "offset": offset,
+            "next_offset": end if end < table.num_rows else None,
+            "columns": page.column_names,
+            "data": {name: page.column(name).to_pylist() for name in page.column_names}
+        }
+    
+    def iter_result_ipc(
+        self,
+        session_id: str,
+        file_id: str,
+        result_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Optional[Tuple[int, Iterator[bytes]]]:
+        """
+        以 Arrow IPC 流格式逐批输出结果文件中的行，返回 (总行数, 字节块迭代器)
+
+        每次只序列化一个记录批次，内存占用与结果总行数无关
+        """
+        result_path = self._result_path(session_id, file_id, result_id)
+        if result_path is None:
+            return None
+        table = self._open_result_table(result_path)
+        page = table.slice(offset, limit)
+        
+        def chunks() -> Iterator[bytes]:
+            sink = io.BytesIO()
+            with pa.ipc.new_stream(sink, page.schema) as writer:
+                for batch in page.to_batches(max_chunksize=settings.RESULT_BATCH_ROWS):
+                    writer.write_batch(batch)
+                    yield sink.getvalue()
+                    sink.seek(0)
+                    sink.truncate()
+            yield sink.getvalue()
+        
+        return table.num_rows, chunks()
     
-    async def cleanup_old_sessions(self):
-        """清理过期会话数据"""
+    async def cleanup_old_sessions(self) -> Dict[str, int]:
+        """
+        清理过期会话数据
+
+        文件系统和数据库操作都是阻塞的，放到线程池中执行，避免阻塞事件循环
+        """
         try:
-            for session_dir in self.base_dir.iterdir():
-                if not session_dir.is_dir():
+            return await asyncio.to_thread(self._cleanup_expired_sessions)
+        except Exception as e:
+            print(f"清理会话数据时出错: {e}")
+            return {"sessions_removed": 0, "blobs_removed": 0, "reclaimed_bytes": 0}
+    
+    def _cleanup_expired_sessions(self) -> Dict[str, int]:
+        """
+        按上传清单删除超过 FILE_EXPIRE_DAYS 未写入的会话目录，再删除没有引用的 blob
+
+        清单按最后写入时间建有索引，每次只查询已过期的会话，不再遍历所有文件
+        """
+        self._reconcile_manifest()
+        cutoff = time.time() - settings.FILE_EXPIRE_DAYS * 86400
+        removed = 0
+        reclaimed = 0
+        with SessionLocal() as db:
+            expired = db.query(UploadManifest).filter(UploadManifest.last_modified < cutoff).all()
+            for entry in expired:
+                session_dir = self.base_dir / entry.session_id
+                if session_dir.is_dir():
+                    reclaimed += self._dir_size(session_dir)
+                    shutil.rmtree(session_dir)
+                dataframe_cache.invalidate(entry.session_id)
+                self.blobs.release(entry.session_id)
+                db.delete(entry)
+                removed += 1
+            db.commit()
+        # 会话目录中的数据集只是引用，不再被任何会话引用的 blob 才删除
+        blobs_removed, blob_bytes = self.blobs.collect()
+        return {
+            "sessions_removed": removed,
+            "blobs_removed": blobs_removed,
+            "reclaimed_bytes": reclaimed + blob_bytes
+        }
+    
+    def _reconcile_manifest(self):
+        """
+        将清单中缺失的会话目录补录进清单，并移除目录已不存在的记录
+
+        只列出上传目录的第一层；需要遍历文件的只有尚未登记的目录，且只遍历一次
+        """
+        session_dirs = {p.name: p for p in self.base_dir.iterdir() if p.is_dir() and p.name != BLOB_DIR_NAME}
+        with SessionLocal() as db:
+            known = {entry.session_id: entry for entry in db.query(UploadManifest).all()}
+            for session_id, session_dir in session_dirs.items():
+                if session_id in known:
                     continue
-                    
-                # 检查会话目录中最新的文件修改时间
                 latest_modified = max(
-                    f.stat().st_mtime 
-                    for f in session_dir.rglob("*") 
-                    if f.is_file()
+                    (f.stat().st_mtime for f in session_dir.rglob("*") if f.is_file()),
+                    default=session_dir.stat().st_mtime
                 )
-                
-                # 如果超过过期时间，删除整个会话目录
-                if (datetime.now().timestamp() - latest_modified) > settings.FILE_EXPIRE_DAYS * 86400:
-                    shutil.rmtree(session_dir)
-                    
-        except Exception as e:
-            print(f"清理会话数据时出错: {e}")
+                db.add(UploadManifest(
+                    session_id=session_id,
+                    last_modified=latest_modified,
+                    total_bytes=self._dir_size(session_dir)
+                ))
+            for session_id, entry in known.items():
+                if session_id not in session_dirs:
+                    self.blobs.release(session_id)
+                    db.delete(entry)
+            db.commit()
     
-    def _generate_summary(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """生成数据摘要"""
+    def _touch_manifest(self, session_id: str, added_bytes: int):
+        """更新会话目录在上传清单中的最后写入时间和占用空间"""
+        with SessionLocal() as db:
+            entry = db.get(UploadManifest, session_id)
+            if entry is None:
+                entry = UploadManifest(session_id=session_id, total_bytes=0)
+                db.add(entry)
+            entry.last_modified = time.time()
+            entry.total_bytes += added_bytes
+            db.commit()
+    
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        # 指向 blob 的符号链接不计入会话目录的大小
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file() and not f.is_symlink())
+    
+    @staticmethod
+    def _storage_report(dtypes: Dict[str, Any], ingest: Dict[str, Any], data_path: Path) -> Dict[str, Any]:
+        """各列的存储类型，以及类型优化前后在 pandas 中的内存占用"""
+        before = sum(ingest["raw_memory_usage"].values())
+        after = sum(ingest["memory_usage"].values())
         return {
-            "row_count": len(df),
-            "column_count": len(df.columns),
-            "memory_usage": df.memory_usage(deep=True).sum(),
-            "basic_stats": df.describe().to_dict(),
-            "missing_values": df.isnull().sum().to_dict()
+            "dtypes": {col: "category" if isinstance(dtype, pd.CategoricalDtype) else str(dtype) for col, dtype in dtypes.items()},
+            "memory_before": before,
+            "memory_after": after,
+            "memory_saved_ratio": round(1 - after / before, 4) if before else 0.0,
+            "column_memory": {
+                col: {"before": ingest["raw_memory_usage"][col], "after": ingest["memory_usage"][col]}
+                for col in dtypes
+            },
+            "parquet_bytes": data_path.stat().st_size,
         }
     
-    def _get_column_info(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """获取列信息"""
-        return [
+    @staticmethod
+    def _summarize_profile(profile: Dict[str, Any], ingest: Dict[str, Any]):
+        """由列统计信息生成列信息和数据摘要"""
+        columns = [
             {
-                "name": col,
-                "type": str(df[col].dtype),
-                "null_count": df[col].isnull().sum(),
-                "unique_count": df[col].nunique()
+                "name": c["name"],
+                "type": c["type"],
+                "null_count": c["null_count"],
+                "unique_count": c["unique_count"]
             }
-            for col in df.columns
-        ] 
\ No newline at end of file
+            for c in profile["columns"]
+        ]
+        return columns, {
+            "row_count": profile["row_count"],
+            "column_count": profile["column_count"],
+            "memory_usage": sum(ingest["memory_usage"].values()),
+            "basic_stats": describe_from_profile(profile),
+            "missing_values": {c["name"]: c["null_count"] for c in profile["columns"]}
+        }
+    
+    @staticmethod
+    def _compact_stats(column: Dict[str, Any]) -> Dict[str, Any]:
+        """提示词中使用的精简列统计：去重数、空值数、取值范围和最常见的几个值"""
+        stats = {"null_count": column["null_count"], "unique_count": column["unique_count"]}
+        for key in ("min", "max", "mean"):
+            if key in column:
+                stats[key] = column[key]
+        if column["top_values"]:
+            stats["top_values"] = [v["value"] for v in column["top_values"][:3]]
+        return stats
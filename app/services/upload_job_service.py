@@ -0,0 +1,149 @@
+from typing import Dict, Any, Optional
+from pathlib import Path
+import asyncio
+import time
+import uuid
+from app.core.config import settings
+from app.core.jobs import upload_jobs
+from app.core.metrics import span
+from app.core.redis import get_redis
+from app.core.serialization import dumps, loads
+from app.services.context_service import ContextService
+from app.services.file_service import FileService, INGEST_STAGES
+
+# 任务存储结构:
+#   upload_job:{job_id}                          STRING  任务状态（JSON），完成后包含导入结果 result
+#   upload_job:hash:{session_id}:{content_hash}  STRING  同一会话中该内容的上传对应的 job_id
+# 任务依次经过 JOB_STAGES 中的各个阶段，status 为 queued、running、done 或 failed
+JOB_STAGES = ("queued", *INGEST_STAGES, "register")
+
+
+class UploadJobService:
+    """
+    后台上传任务
+
+    上传内容落盘后立即返回任务，导入的各个阶段和注册到会话在后台任务池（upload_jobs）中进行，
+    客户端轮询任务状态，完成后获取导入结果。同一会话中内容相同的上传（按 SHA-256）复用已有的任务
+    """
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.file_service = FileService()
+        self.context_service = ContextService()
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"upload_job:{job_id}"
+
+    async def _save(self, job: Dict[str, Any]):
+        job["updated_at"] = time.time()
+        await self.redis.set(self._key(job["job_id"]), dumps(job), ex=settings.UPLOAD_JOB_TTL)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务状态；排队或处理中、但超过 UPLOAD_JOB_STALE_SECONDS 没有更新的任务返回为失败"""
+        data = await self.redis.get(self._key(job_id))
+        if data is None:
+            return None
+        job = loads(data)
+        if self._stale(job):
+            job.update(status="failed", error="任务已中断（处理该任务的进程可能已退出），请重新上传")
+        return job
+
+    @staticmethod
+    def _stale(job: Dict[str, Any]) -> bool:
+        # 未结束的任务由心跳定期更新 updated_at，长时间没有更新说明处理进程已经退出
+        return (
+            job["status"] in ("queued", "running")
+            and time.time() - job.get("updated_at", job["created_at"]) > settings.UPLOAD_JOB_STALE_SECONDS
+        )
+
+    def _reusable(self, job: Optional[Dict[str, Any]]) -> bool:
+        """已有的任务可以复用：未失败或中断，且完成的任务导入的文件仍然存在"""
+        if job is None or job["status"] == "failed" or self._stale(job):
+            return False
+        if job["status"] == "done":
+            return (self.file_service.base_dir / job["session_id"] / job["file_id"] / "data.parquet").exists()
+        return True
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        """任务结束前定期保存状态（刷新 updated_at），排队和单个阶段耗时较长时不会被视为中断"""
+        while True:
+            await asyncio.sleep(settings.UPLOAD_JOB_STALE_SECONDS / 4)
+            try:
+                await self._save(job)
+            except Exception:
+                # 下一次心跳或阶段更新时再保存
+                pass
+
+    async def submit(
+        self,
+        session_id: str,
+        filename: str,
+        path: Path,
+        content_hash: str,
+        size: int
+    ) -> Dict[str, Any]:
+        """
+        创建后台上传任务并立即返回任务状态
+
+        path 为落盘的上传内容，由任务处理完后删除；复用已有任务时直接删除
+        """
+        hash_key = f"upload_job:hash:{session_id}:{content_hash}"
+        job_id = uuid.uuid4().hex
+        if not await self.redis.set(hash_key, job_id, nx=True, ex=settings.UPLOAD_JOB_TTL):
+            existing_id = await self.redis.get(hash_key)
+            existing = await self.get_job(existing_id) if existing_id else None
+            if self._reusable(existing):
+                path.unlink(missing_ok=True)
+                return {**existing, "duplicate": True}
+            await self.redis.set(hash_key, job_id, ex=settings.UPLOAD_JOB_TTL)
+
+        job = {
+            "job_id": job_id,
+            "session_id": session_id,
+            "filename": filename,
+            "content_hash": content_hash,
+            "size": size,
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "file_id": None,
+            "error": None,
+            "created_at": time.time(),
+        }
+        await self._save(job)
+        upload_jobs.start(self._run, dict(job), path)
+        return {**job, "duplicate": False}
+
+    async def _run(self, job: Dict[str, Any], path: Path):
+        session_id = job["session_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+
+        async def progress(stage: str):
+            job.update(status="running", stage=stage, progress=JOB_STAGES.index(stage) / len(JOB_STAGES))
+            await self._save(job)
+
+        result = None
+        try:
+            async with upload_jobs.slot():
+                result = await self.file_service.process_csv(
+                    session_id, job["filename"], path, progress, job["content_hash"]
+                )
+                if not result["success"]:
+                    raise ValueError(result["error"])
+                await progress("register")
+                with span("upload_register"):
+                    await self.context_service.add_file_to_session(session_id, result)
+            job.update(status="done", progress=1.0, file_id=result["file_id"], result=result)
+        except asyncio.CancelledError:
+            job.update(status="failed", error="服务停止，任务已取消")
+            raise
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+        finally:
+            heartbeat.cancel()
+            path.unlink(missing_ok=True)
+            if job["status"] == "failed" and result and result.get("success"):
+                # 导入成功但注册到会话失败，删除已写入的文件
+                await asyncio.to_thread(self.file_service.delete_file, session_id, result["file_id"])
+            await self._save(job)
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from statistics import NormalDist
+from typing import Any, Dict, NamedTuple, Optional, Union
+from app.schemas.operation import (
+    AggregationOperation,
+    BaseOperation,
+    HistogramOperation,
+    StatisticalOperation,
+)
+from app.utils.data_processor import process_dataframe
+
+# 按样本比例放大为总体估计的聚合函数
+_SCALED_FUNCS = {"sum", "count", "size"}
+
+
+class ApproximateResult(NamedTuple):
+    """
+    在样本上计算的近似结果
+
+    margins 与 result 结构相同，值为置信区间的半宽（估计值 ± margin），
+    无法给出误差范围的统计量（如 min/max、分位数）为 None
+    """
+    result: Union[pd.DataFrame, Dict[str, Any]]
+    margins: Union[pd.DataFrame, Dict[str, Any]]
+    sample_rows: int
+    total_rows: int
+    confidence: float
+
+    def summary(self) -> Dict[str, Any]:
+        margins = self.margins
+        if isinstance(margins, pd.DataFrame):
+            margins = margins.astype(object).where(margins.notna(), None).to_dict(orient="records")
+        return {
+            "sample_rows": self.sample_rows,
+            "total_rows": self.total_rows,
+            "confidence": self.confidence,
+            "margins": margins,
+        }
+
+
+def build_sample(data_path: Path, sample_path: Path, sample_rows: int, compression: str = "snappy", seed: int = 0) -> int:
+    """
+    从数据文件中无放回地均匀抽取 sample_rows 行，按原顺序写入 sample_path
+
+    逐个行组读取并取出被抽中的行，峰值内存约为一个行组加上样本；
+    文件行数不超过 sample_rows 时不抽样，返回 0
+    """
+    parquet_file = pq.ParquetFile(data_path)
+    metadata = parquet_file.metadata
+    total = metadata.num_rows
+    if total <= sample_rows:
+        return 0
+
+    positions = np.sort(np.random.default_rng(seed).choice(total, sample_rows, replace=False))
+    starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    bounds = np.searchsorted(positions, starts)
+    parts = []
+    for group in range(metadata.num_row_groups):
+        local = positions[bounds[group]:bounds[group + 1]] - starts[group]
+        if len(local):
+            parts.append(parquet_file.read_row_group(group).take(pa.array(local)))
+    pq.write_table(pa.concat_tables(parts), sample_path, compression=compression)
+    return sample_rows
+
+
+def _z(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _total_margin(sums: np.ndarray, squares: np.ndarray, n: int, total: int, z: float) -> np.ndarray:
+    """
+    简单随机抽样下总体总量的置信区间半宽
+
+    z_i = y_i（属于该组时）否则为 0，sums/squares 为样本中 z 的和与平方和
+    """
+    variance = np.maximum(squares - sums ** 2 / n, 0) / (n - 1)
+    return z * total * np.sqrt((1 - n / total) * variance / n)
+
+
+def _mean_margin(std: np.ndarray, count: np.ndarray, n: int, total: int, z: float) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return z * std / np.sqrt(count) * np.sqrt(1 - n / total)
+
+
+def _statistical(sample: pd.DataFrame, op: StatisticalOperation, total: int, z: float):
+    result = process_dataframe(sample, op)
+    n = len(sample)
+    data = sample[op.columns] if op.columns else sample.select_dtypes("number")
+    if op.method == "correlation":
+        # Fisher z 变换的置信区间，取两侧距离中较大的一侧
+        valid = data.notna().astype(np.int64)
+        pairs = valid.T @ valid
+        margins = {}
+        for col, column in result.items():
+            margins[col] = {}
+            for other, r in column.items():
+                count = pairs.loc[other, col]
+                if r is None or np.isnan(r) or abs(r) >= 1 or count <= 3:
+                    margins[col][other] = None
+                    continue
+                spread = z / np.sqrt(count - 3)
+                low, high = np.tanh(np.arctanh(r) - spread), np.tanh(np.arctanh(r) + spread)
+                margins[col][other] = float(max(r - low, high - r))
+        return result, margins
+
+    margins = {}
+    for col, stats in result.items():
+        count = stats["count"]
+        share = count / n
+        stats["count"] = float(np.rint(count * total / n))
+        margins[col] = {key: None for key in stats}
+        margins[col]["count"] = float(z * total * np.sqrt(share * (1 - share) / n * (1 - n / total)))
+        if count > 1 and "std" in stats:
+            margins[col]["mean"] = float(_mean_margin(stats["std"], count, n, total, z))
+    return result, margins
+
+
+def _aggregation(sample: pd.DataFrame, op: AggregationOperation, total: int, z: float):
+    result = process_dataframe(sample, op)
+    n = len(sample)
+    # 与 process_dataframe 相同的分组（按分组键排序、丢弃空键），结果按位置对齐
+    keys = [sample[col] for col in op.columns] if op.columns else np.zeros(n, dtype=np.int8)
+    margins = result[op.columns].copy() if op.columns else pd.DataFrame(index=result.index)
+
+    if not op.target_columns and not op.aggregations:
+        sizes = sample.groupby(keys).size().to_numpy(dtype=np.float64)
+        result["size"] = np.rint(sizes * total / n).astype(np.int64)
+        margins["size"] = _total_margin(sizes, sizes, n, total, z)
+        return result, margins
+
+    specs = {col: op.agg_func for col in op.target_columns}
+    specs.update(op.aggregations)
+    single = not op.aggregations and len(op.agg_func) == 1
+    for col, funcs in specs.items():
+        values = sample[col]
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            values = None
+        else:
+            values = values.astype(np.float64)
+        for func in funcs:
+            name = col if single else f"{col}_{func}"
+            margin = np.full(len(result), np.nan)
+            if func == "count" or (func in ("sum", "mean") and values is not None):
+                present = sample[col].notna()
+                counts = present.groupby(keys).sum().to_numpy(dtype=np.float64)
+                if func == "count":
+                    margin = _total_margin(counts, counts, n, total, z)
+                elif func == "sum":
+                    filled = values.fillna(0)
+                    sums = filled.groupby(keys).sum().to_numpy()
+                    squares = (filled ** 2).groupby(keys).sum().to_numpy()
+                    margin = _total_margin(sums, squares, n, total, z)
+                else:
+                    std = values.groupby(keys).std().to_numpy()
+                    margin = _mean_margin(std, counts, n, total, z)
+            if func in _SCALED_FUNCS:
+                scaled = result[name] * (total / n)
+                result[name] = np.rint(scaled).astype(np.int64) if func == "count" else scaled
+            margins[name] = margin
+    return result, margins
+
+
+def _histogram(sample: pd.DataFrame, op: HistogramOperation, total: int, z: float):
+    result = process_dataframe(sample, op)
+    n = len(sample)
+    margins = result[["bin_start", "bin_end"]].copy()
+    if "count" in result:
+        counts = result["count"].to_numpy(dtype=np.float64)
+        result["count"] = np.rint(counts * total / n).astype(np.int64)
+        margins["count"] = _total_margin(counts, counts, n, total, z)
+    for col in op.target_columns:
+        margins[col] = np.nan
+    return result, margins
+
+
+_ESTIMATORS = {
+    "statistical": _statistical,
+    "aggregation": _aggregation,
+    "histogram": _histogram,
+}
+
+# 可以在样本上估算并给出误差范围的指令类型
+APPROXIMABLE_TYPES = frozenset(_ESTIMATORS)
+
+
+def approximate_operation(
+    sample: pd.DataFrame,
+    op: BaseOperation,
+    total_rows: int,
+    confidence: float
+) -> Optional[ApproximateResult]:
+    """
+    在均匀随机样本上执行指令，返回总体估计和误差范围；指令类型不支持近似计算时返回 None
+
+    - 计数、总和按 total_rows / 样本行数放大，误差按简单随机抽样（含有限总体校正）的正态近似计算
+    - 均值的误差为 z * 标准差 / sqrt(样本数)，相关系数使用 Fisher z 变换
+    - min/max、分位数等统计量直接取样本值，不给出误差范围
+    """
+    estimator = _ESTIMATORS.get(op.type)
+    if estimator is None or len(sample) < 2 or total_rows <= len(sample):
+        return None
+    result, margins = estimator(sample, op, total_rows, _z(confidence))
+    return ApproximateResult(result, margins, len(sample), total_rows, confidence)
@@ -0,0 +1,195 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Dict, Any, BinaryIO, Optional
+
+# 分块推断出的列类型，按照 pandas 读取时的 dtype 映射
+_KIND_DTYPES = {
+    "bool": "bool",
+    "int": "int64",
+    "float": "float64",
+    "string": "str",
+}
+
+# 整数列按取值范围缩小到的类型，从小到大依次尝试
+_INT_DTYPES = ("int8", "int16", "int32", "int64")
+
+# 时间列以 ISO 8601 日期开头，不满足时不尝试解析
+_DATE_PREFIX = re.compile(r"\d{4}-\d{1,2}-\d{1,2}")
+DATETIME_DTYPE = "datetime64[us]"
+
+
+def _column_kind(series: pd.Series) -> str:
+    """将单个数据块中的列类型归类为 bool/int/float/string"""
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "string"
+
+
+def _merge_kind(current: Optional[str], new: str) -> str:
+    """合并不同数据块对同一列推断出的类型"""
+    if current is None or current == new:
+        return new
+    if {current, new} == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+def _is_dates(values: pd.Series) -> bool:
+    """非空字符串是否都是不带时区的 ISO 8601 日期/时间"""
+    if values.empty or not _DATE_PREFIX.match(str(values.iloc[0])):
+        return False
+    parsed = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    return parsed.dtype.kind == "M" and getattr(parsed.dtype, "tz", None) is None and not parsed.isna().any()
+
+
+def _observe(stats: Dict[str, Any], series: pd.Series, max_categories: int):
+    """用一个数据块更新单列的类型、整数范围、字符串取值集合和日期判断"""
+    previous = stats.get("kind")
+    kind = stats["kind"] = _merge_kind(previous, _column_kind(series))
+    if kind == "int":
+        low, high = int(series.min()), int(series.max())
+        stats["min"], stats["max"] = min(stats.get("min", low), low), max(stats.get("max", high), high)
+    if kind != "string":
+        return
+    if previous not in (None, "string"):
+        # 之前的数据块按数值解析，取值集合和日期判断不完整
+        stats["categories"], stats["dates"] = None, False
+        return
+
+    values = series.dropna()
+    if stats.setdefault("categories", set()) is not None:
+        stats["categories"].update(values.unique())
+        if len(stats["categories"]) > max_categories:
+            stats["categories"] = None
+    if stats.setdefault("dates", True) and not values.empty:
+        stats["dates"] = _is_dates(values)
+        stats["seen_dates"] = stats["dates"]
+
+
+def _optimized_dtype(stats: Dict[str, Any], row_count: int, downcast_ints: bool, parse_dates: bool):
+    kind = stats["kind"]
+    if kind == "int" and downcast_ints:
+        return next(
+            dtype for dtype in _INT_DTYPES
+            if np.iinfo(dtype).min <= stats["min"] and stats["max"] <= np.iinfo(dtype).max
+        )
+    if kind != "string":
+        return _KIND_DTYPES[kind]
+    if parse_dates and stats.get("seen_dates") and stats["dates"]:
+        return DATETIME_DTYPE
+    categories = stats.get("categories")
+    # 取值数超过行数一半时分类编码不再节省内存；含空值的布尔列等混合类型保持为字符串
+    if categories and len(categories) * 2 <= row_count and all(isinstance(v, str) for v in categories):
+        return pd.CategoricalDtype(sorted(categories))
+    return "str"
+
+
+def infer_csv_dtypes(
+    source: BinaryIO,
+    chunk_rows: int,
+    max_categories: int = 0,
+    downcast_ints: bool = False,
+    parse_dates: bool = False
+) -> Dict[str, Any]:
+    """
+    第一遍扫描：分块读取整个CSV，推断每列在全量数据上的存储类型
+
+    - downcast_ints 时，整数列按取值范围缩小为 int8/int16/int32
+    - 取值数不超过 max_categories 的字符串列转换为分类类型（parquet 中为字典编码），
+      分类按字典序排列，排序结果与字符串列一致
+    - parse_dates 时，所有取值都是 ISO 8601 日期/时间的字符串列解析为时间列
+
+    只保留每列的类型信息和取值范围（分类列还有取值集合），内存占用与文件大小无关
+    """
+    source.seek(0)
+    stats: Dict[str, Dict[str, Any]] = {}
+    row_count = 0
+    for chunk in pd.read_csv(source, chunksize=chunk_rows):
+        row_count += len(chunk)
+        for col in chunk.columns:
+            _observe(stats.setdefault(col, {}), chunk[col], max_categories)
+    return {
+        col: _optimized_dtype(column, row_count, downcast_ints, parse_dates)
+        for col, column in stats.items()
+    }
+
+
+def _read_dtype(dtype: Any) -> str:
+    """CSV 分块按基本类型解析，再转换为优化后的类型"""
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == DATETIME_DTYPE:
+        return "str"
+    if dtype in _INT_DTYPES:
+        return "int64"
+    return dtype
+
+
+def _convert(chunk: pd.DataFrame, dtypes: Dict[str, Any]) -> pd.DataFrame:
+    converted = {}
+    for col, dtype in dtypes.items():
+        if dtype == DATETIME_DTYPE:
+            converted[col] = pd.to_datetime(chunk[col], format="ISO8601").astype(DATETIME_DTYPE)
+        elif dtype != _read_dtype(dtype):
+            converted[col] = chunk[col].astype(dtype)
+    return chunk.assign(**converted) if converted else chunk
+
+
+def write_csv_to_parquet(
+    source: BinaryIO,
+    path: Path,
+    dtypes: Dict[str, Any],
+    chunk_rows: int,
+    compression: str = "snappy",
+    compression_level: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    第二遍扫描：按推断出的类型分块解析CSV，每块作为一个行组写入parquet
+
+    返回总行数、前5行样本数据，以及各列按基本类型（int64/float64/str）解析时
+    和转换为推断类型后在 pandas 中的内存占用
+    """
+    source.seek(0)
+    row_count = 0
+    sample = []
+    memory_usage = {col: 0 for col in dtypes}
+    raw_memory_usage = {col: 0 for col in dtypes}
+    read_dtypes = {col: _read_dtype(dtype) for col, dtype in dtypes.items()}
+    writer = None
+    try:
+        for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype=read_dtypes):
+            for col, size in chunk.memory_usage(deep=True, index=False).items():
+                raw_memory_usage[col] += int(size)
+            chunk = _convert(chunk, dtypes)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # 字典编码按列自动选择：低基数列写入字典页，取值过多时回退为普通编码
+                writer = pq.ParquetWriter(
+                    path, table.schema, compression=compression, compression_level=compression_level
+                )
+                sample = chunk.head(5).to_dict(orient='records')
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            row_count += len(chunk)
+            for col, size in chunk.memory_usage(deep=True, index=False).items():
+                memory_usage[col] += int(size)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError("CSV文件中没有数据")
+
+    return {
+        "row_count": row_count,
+        "sample": sample,
+        "memory_usage": memory_usage,
+        "raw_memory_usage": raw_memory_usage,
+    }
@@ -1,44 +1,194 @@
+import numpy as np
 import pandas as pd
-from typing import Union, Dict, Any
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+from typing import Union, Dict, Any, List
+from app.schemas.operation import (
+    AggregationOperation,
+    BaseOperation,
+    FilterOperation,
+    HistogramOperation,
+    PivotOperation,
+    ResampleOperation,
+    RollingOperation,
+    SortOperation,
+    StatisticalOperation,
+    TopKOperation,
+    parse_operation,
+)
+from app.utils.predicates import evaluate_mask
 
-def process_dataframe(df: pd.DataFrame, operation: Dict[str, Any]) -> Union[pd.DataFrame, Dict[str, Any]]:
+# 透视表最多展开的列数，避免对高基数列透视生成超宽的表
+MAX_PIVOT_COLUMNS = 1000
+
+
+def _flatten_columns(columns: pd.Index) -> List[str]:
+    return ["_".join(str(part) for part in col) if isinstance(col, tuple) else str(col) for col in columns]
+
+
+def _aggregation(df: pd.DataFrame, op: AggregationOperation) -> pd.DataFrame:
+    # 不分组时按常量分组，所有聚合函数的行为与分组聚合一致
+    keys = op.columns or np.zeros(len(df), dtype=np.int8)
+    grouped = df.groupby(keys)
+    if not op.target_columns and not op.aggregations:
+        result = grouped.size().rename("size")
+    elif not op.aggregations and len(op.agg_func) == 1:
+        result = grouped[op.target_columns].agg(op.agg_func[0])
+    else:
+        specs = {col: op.agg_func for col in op.target_columns}
+        specs.update(op.aggregations)
+        result = grouped.agg(**{
+            f"{col}_{func}": (col, func) for col, funcs in specs.items() for func in funcs
+        })
+    if op.columns:
+        return result.reset_index()
+    result = result.reset_index(drop=True)
+    return result.to_frame() if isinstance(result, pd.Series) else result
+
+
+def _filter(df: pd.DataFrame, op: FilterOperation) -> pd.DataFrame:
+    mask = evaluate_mask(op.predicate, df)
+    result = df.iloc[np.flatnonzero(mask)[:op.limit]] if op.limit is not None else df[mask]
+    return result[op.columns] if op.columns else result
+
+
+def _is_orderable(series: pd.Series) -> bool:
+    """nlargest/nsmallest 支持的列类型"""
+    return (is_numeric_dtype(series) and not is_bool_dtype(series)) or is_datetime64_any_dtype(series)
+
+
+def _top_k(df: pd.DataFrame, columns: List[str], k: int, ascending: Union[bool, List[bool]]) -> pd.DataFrame:
+    if k < len(df) and isinstance(ascending, bool) and all(_is_orderable(df[c]) for c in columns):
+        # 部分选择（select-k），不对整个表排序
+        return df.nsmallest(k, columns) if ascending else df.nlargest(k, columns)
+    return df.sort_values(by=columns, ascending=ascending, kind="stable").head(k)
+
+
+def _sort(df: pd.DataFrame, op: SortOperation) -> pd.DataFrame:
+    if op.limit is not None:
+        return _top_k(df, op.columns, op.limit, op.ascending)
+    return df.sort_values(by=op.columns, ascending=op.ascending, kind="stable")
+
+
+def _top_k_operation(df: pd.DataFrame, op: TopKOperation) -> pd.DataFrame:
+    return _top_k(df, op.columns, op.k, op.ascending)
+
+
+def _statistical(df: pd.DataFrame, op: StatisticalOperation) -> Dict[str, Any]:
+    data = df[op.columns] if op.columns else df.select_dtypes("number")
+    if op.method == "correlation":
+        return data.corr().to_dict()
+    return data.describe().to_dict()
+
+
+def _histogram(df: pd.DataFrame, op: HistogramOperation) -> pd.DataFrame:
+    column = df[op.column]
+    if not is_numeric_dtype(column) or is_bool_dtype(column):
+        raise ValueError(f"列 {op.column} 不是数值列，无法分箱")
+    values = column.to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(values)
+    edges = np.histogram_bin_edges(values[valid], bins=op.bins)
+    bins = len(edges) - 1
+
+    # 与 np.histogram 相同：各箱左闭右开，最后一个箱包含右边界
+    index = np.searchsorted(edges, values, side="right") - 1
+    index[values == edges[-1]] = bins - 1
+    inside = valid & (index >= 0) & (index < bins)
+
+    result = pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:]})
+    if not op.target_columns:
+        result["count"] = np.bincount(index[inside], minlength=bins)
+        return result
+    aggregated = df.loc[inside, op.target_columns].groupby(index[inside]).agg(op.agg_func)
+    return pd.concat([result, aggregated.reindex(range(bins)).reset_index(drop=True)], axis=1)
+
+
+def _pivot(df: pd.DataFrame, op: PivotOperation) -> pd.DataFrame:
+    # 各列取值数的乘积是透视后列数的上界，超过上限时才计算实际的组合数
+    width = int(np.prod([df[col].nunique() for col in op.columns])) * len(op.values)
+    if width > MAX_PIVOT_COLUMNS and len(op.columns) > 1:
+        width = df.groupby(op.columns, observed=True).ngroups * len(op.values)
+    if width > MAX_PIVOT_COLUMNS:
+        raise ValueError(f"透视后有 {width} 列，超过上限 {MAX_PIVOT_COLUMNS}，请选择取值较少的列")
+    result = df.pivot_table(
+        index=op.index,
+        columns=op.columns,
+        values=op.values,
+        aggfunc=op.agg_func,
+        fill_value=op.fill_value,
+        observed=True
+    )
+    if len(op.values) == 1:
+        result = result[op.values[0]]
+    result.columns = _flatten_columns(result.columns)
+    return result.reset_index()
+
+
+def _rolling(df: pd.DataFrame, op: RollingOperation) -> pd.DataFrame:
+    frame = df[list(dict.fromkeys(([op.order_by] if op.order_by else []) + op.columns))]
+    if op.order_by:
+        frame = frame.sort_values(op.order_by, kind="stable")
+    if isinstance(op.window, str):
+        # 时间窗口以时间列为索引计算
+        source = frame[op.columns].set_index(pd.DatetimeIndex(pd.to_datetime(frame[op.order_by])))
+    else:
+        source = frame[op.columns]
+    rolled = source.rolling(op.window, min_periods=op.min_periods).agg(op.func)
+
+    result = frame.reset_index(drop=True)
+    for col in op.columns:
+        result[f"{col}_rolling_{op.func}"] = rolled[col].to_numpy()
+    return result
+
+
+def _resample(df: pd.DataFrame, op: ResampleOperation) -> pd.DataFrame:
+    frame = df[list(dict.fromkeys([*op.columns, op.on, *op.target_columns]))]
+    if not is_datetime64_any_dtype(frame[op.on]):
+        frame = frame.assign(**{op.on: pd.to_datetime(frame[op.on], errors="coerce")})
+    grouped = frame.groupby([*op.columns, pd.Grouper(key=op.on, freq=op.rule)])[op.target_columns]
+    if len(op.agg_func) == 1:
+        return grouped.agg(op.agg_func[0]).reset_index()
+    result = grouped.agg(op.agg_func)
+    result.columns = _flatten_columns(result.columns)
+    return result.reset_index()
+
+
+_EXECUTORS = {
+    "aggregation": _aggregation,
+    "filter": _filter,
+    "sort": _sort,
+    "top_k": _top_k_operation,
+    "statistical": _statistical,
+    "histogram": _histogram,
+    "pivot": _pivot,
+    "rolling": _rolling,
+    "resample": _resample,
+}
+
+
+def process_dataframe(
+    df: pd.DataFrame,
+    operation: Union[Dict[str, Any], BaseOperation]
+) -> Union[pd.DataFrame, Dict[str, Any]]:
     """
     根据LLM的指令处理DataFrame
-    
+
+    指令先按 app.schemas.operation 校验并检查引用的列是否存在，再由对应类型的执行函数
+    转换为向量化的 pandas/numpy 调用；过滤表达式解析为语法树后计算，不会作为字符串执行
+
     operation 示例:
     {
         "type": "aggregation",
-        "method": "groupby",
         "columns": ["category"],
         "agg_func": "mean",
         "target_columns": ["sales"]
     }
     """
     try:
-        op_type = operation['type']
-        
-        if op_type == "aggregation":
-            result = df.groupby(operation['columns'])[operation['target_columns']]\
-                      .agg(operation['agg_func'])
-            return result.reset_index()
-            
-        elif op_type == "filter":
-            query = operation['query']
-            return df.query(query)
-            
-        elif op_type == "sort":
-            return df.sort_values(
-                by=operation['columns'],
-                ascending=operation.get('ascending', True)
-            )
-            
-        elif op_type == "statistical":
-            if operation['method'] == 'correlation':
-                return df[operation['columns']].corr().to_dict()
-            elif operation['method'] == 'describe':
-                return df[operation['columns']].describe().to_dict()
-                
-        return df
-        
+        op = parse_operation(operation)
+        missing = op.referenced_columns() - set(df.columns)
+        if missing:
+            raise ValueError(f"未知的列: {', '.join(sorted(missing))}")
+        return _EXECUTORS[op.type](df, op)
+
     except Exception as e:
-        raise ValueError(f"数据处理错误: {str(e)}") 
\ No newline at end of file
+        raise ValueError(f"数据处理错误: {str(e)}")
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Hashable
+import pandas as pd
+from app.core.config import settings
+
+
+class DataFrameCache:
+    """
+    进程内 DataFrame LRU 缓存
+
+    - 以 (session_id, file_id) 为键，容量按 memory_usage(deep=True) 统计的字节数限制；
+      内存映射加载的 DataFrame 由调用方传入实际复制到进程内存中的字节数，共享的映射页面不计入
+    - 超出容量时按最近最少使用顺序淘汰
+    - 每个条目带有过期时间，并记录数据文件版本（mtime/size），文件被替换后自动失效
+
+    缓存返回的 DataFrame 为共享对象，调用方不应原地修改
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key: Hashable, version: Optional[Tuple] = None) -> Optional[pd.DataFrame]:
+        """读取缓存，条目过期或版本不一致时视为未命中"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+
+            if entry["expires_at"] <= time.monotonic():
+                self._remove(key)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+
+            if version is not None and entry["version"] != version:
+                self._remove(key)
+                self._counters["invalidations"] += 1
+                self._counters["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry["data"]
+
+    def put(
+        self,
+        key: Hashable,
+        df: pd.DataFrame,
+        version: Optional[Tuple] = None,
+        size: Optional[int] = None
+    ) -> bool:
+        """写入缓存，单个条目超过容量上限时不缓存；size 为空时按 memory_usage(deep=True) 计算占用"""
+        if size is None:
+            size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            while self._entries and self._current_bytes + size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters["evictions"] += 1
+
+            self._entries[key] = {
+                "data": df,
+                "size": size,
+                "version": version,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._current_bytes += size
+            return True
+
+    def invalidate(self, session_id: str, file_id: Optional[str] = None) -> int:
+        """使指定文件（或整个会话下所有文件）的缓存失效，返回移除的条目数"""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if key[0] == session_id and (file_id is None or key[1] == file_id)
+            ]
+            for key in keys:
+                self._remove(key)
+            self._counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """清空缓存并重置计数"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息，用于容量调优"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "current_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._current_bytes -= entry["size"]
+
+
+dataframe_cache = DataFrameCache(
+    max_bytes=settings.DATAFRAME_CACHE_MAX_BYTES,
+    ttl=settings.FILE_EXPIRE_DAYS * 86400
+)
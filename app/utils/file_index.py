@@ -0,0 +1,323 @@
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.schemas.operation import (
+    AggregationOperation,
+    BaseOperation,
+    FilterOperation,
+    SortOperation,
+    TopKOperation,
+)
+from app.utils.predicates import Column, Comparison, Membership, Value
+
+# 索引格式变化时递增，旧索引不再使用
+INDEX_VERSION = 1
+
+# 分组聚合缓存中每个数值列保存的统计量，mean 由 sum / count 得到
+_CACHED_FUNCS = ("sum", "count", "min", "max")
+_ANSWERABLE_FUNCS = {"sum", "count", "min", "max", "mean", "size"}
+
+
+def _is_measure(value_type: pa.DataType) -> bool:
+    return pa.types.is_integer(value_type) or pa.types.is_floating(value_type)
+
+
+def _is_dimension(value_type: pa.DataType) -> bool:
+    # 时间列与字符串比较时 pandas 会先转换类型，按取值查找分组无法得到相同的结果
+    if pa.types.is_dictionary(value_type):
+        value_type = value_type.value_type
+    return _is_measure(value_type) or pa.types.is_string(value_type) \
+        or pa.types.is_large_string(value_type) or pa.types.is_boolean(value_type)
+
+
+def build_file_index(
+    data_path: Path,
+    profile: Dict[str, Any],
+    index_dir: Path,
+    max_groups: int,
+    max_dimensions: int,
+    max_measures: int
+) -> Dict[str, Any]:
+    """
+    为上传的文件建立预聚合索引
+
+    - 维度：取值数不超过 max_groups 的列。保存按分组排列的行号和各分组的起止偏移，
+      以及各分组的行数和每个数值列的 sum/count/min/max
+    - 数值列：保存稳定排序的行号置换和排序后的取值（空值排在最后），
+      可以直接回答排序、top-k 和单列范围过滤
+
+    每次只从文件读取一列，峰值内存约为一个数值列加上各维度的分组编号
+    """
+    parquet_file = pq.ParquetFile(data_path)
+    schema = parquet_file.schema_arrow
+    row_count = parquet_file.metadata.num_rows
+    position_type = np.int32 if row_count < 2 ** 31 else np.int64
+
+    dimensions = [
+        c["name"] for c in profile["columns"]
+        if not c["approximate"] and 0 < c["unique_count"] <= max_groups
+        and _is_dimension(schema.field(c["name"]).type)
+    ][:max_dimensions]
+    measures = [
+        name for name in schema.names
+        if _is_measure(schema.field(name).type) and name not in dimensions
+    ][:max_measures]
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    codes, groups = [], []
+    for i, name in enumerate(dimensions):
+        keys = parquet_file.read(columns=[name]).column(0).to_pandas()
+        # 空值的编号为 -1，排在所有分组之前
+        code, uniques = pd.factorize(keys, sort=True)
+        code = code.astype(np.int16 if len(uniques) < 2 ** 15 else np.int32)
+        order = np.argsort(code, kind="stable")
+        offsets = np.searchsorted(code[order], np.arange(len(uniques) + 1))
+        np.save(index_dir / f"dim_{i}_order.npy", order.astype(position_type))
+        np.save(index_dir / f"dim_{i}_offsets.npy", offsets.astype(np.int64))
+        codes.append(code)
+        valid = code >= 0
+        groups.append({"key": uniques, "size": np.bincount(code[valid], minlength=len(uniques))})
+
+    sorted_columns = {}
+    for j, name in enumerate(measures):
+        values = parquet_file.read(columns=[name]).column(0).to_pandas()
+        for code, group in zip(codes, groups):
+            valid = code >= 0
+            stats = values[valid].groupby(code[valid]).agg(list(_CACHED_FUNCS))
+            for func in _CACHED_FUNCS:
+                group[f"m{j}_{func}"] = stats[func].to_numpy()
+        # 浮点 NaN 在稳定排序中排在最后
+        array = values.to_numpy()
+        order = np.argsort(array, kind="stable")
+        np.save(index_dir / f"sort_{j}_order.npy", order.astype(position_type))
+        np.save(index_dir / f"sort_{j}_values.npy", array[order])
+        sorted_columns[name] = int(values.notna().sum())
+
+    for i, group in enumerate(groups):
+        pq.write_table(pa.Table.from_pandas(pd.DataFrame(group), preserve_index=False), index_dir / f"dim_{i}_groups.parquet")
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "row_count": row_count,
+        "columns": schema.names,
+        "dimensions": dimensions,
+        "measures": measures,
+        # 数值列 -> 非空值个数
+        "sorted": sorted_columns,
+    }
+    with open(index_dir / "index.json", "w") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return manifest
+
+
+class FileIndex:
+    """按上传时建立的预聚合索引回答匹配的数据处理指令，无法回答时返回 None"""
+
+    def __init__(self, index_dir: Path, manifest: Dict[str, Any]):
+        self.index_dir = index_dir
+        self.row_count = manifest["row_count"]
+        self.columns = manifest["columns"]
+        self.dimensions = manifest["dimensions"]
+        self.measures = manifest["measures"]
+        self.sorted = manifest["sorted"]
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["FileIndex"]:
+        manifest_path = index_dir / "index.json"
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            return None
+        return cls(index_dir, manifest)
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.index_dir / name, mmap_mode="r")
+
+    def _groups(self, dimension: str) -> pd.DataFrame:
+        return pq.read_table(self.index_dir / f"dim_{self.dimensions.index(dimension)}_groups.parquet").to_pandas()
+
+    def aggregate(self, op: BaseOperation) -> Optional[pd.DataFrame]:
+        """按单个维度分组、聚合函数为 sum/count/min/max/mean/size 的聚合直接读取分组聚合缓存"""
+        if not isinstance(op, AggregationOperation) or len(op.columns) != 1 or op.columns[0] not in self.dimensions:
+            return None
+        specs = {col: op.agg_func for col in op.target_columns}
+        specs.update(op.aggregations)
+        funcs = {func for funcs in specs.values() for func in funcs}
+        if any(col not in self.measures for col in specs) or not funcs <= _ANSWERABLE_FUNCS - {"size"}:
+            return None
+
+        dimension = op.columns[0]
+        groups = self._groups(dimension)
+        result = pd.DataFrame({dimension: groups["key"]})
+        if not specs:
+            result["size"] = groups["size"]
+            return result
+
+        def stat(col: str, func: str) -> pd.Series:
+            prefix = f"m{self.measures.index(col)}"
+            if func == "mean":
+                return groups[f"{prefix}_sum"] / groups[f"{prefix}_count"]
+            return groups[f"{prefix}_{func}"]
+
+        if not op.aggregations and len(op.agg_func) == 1:
+            for col in op.target_columns:
+                result[col] = stat(col, op.agg_func[0])
+        else:
+            for col, funcs in specs.items():
+                for func in funcs:
+                    result[f"{col}_{func}"] = stat(col, func)
+        return result
+
+    def _sorted(self, column: str):
+        j = self.measures.index(column)
+        return self._load(f"sort_{j}_order.npy"), self._load(f"sort_{j}_values.npy"), self.sorted[column]
+
+    def _descending(self, order: np.ndarray, values: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """order[start:stop] 按取值从大到小排列，相同取值保持原来的行顺序（与 sort_values(kind="stable") 一致）"""
+        positions = np.asarray(order[start:stop])
+        keys = np.asarray(values[start:stop])
+        if len(keys) < 2:
+            return positions
+        # 同一取值的连续区间在升序中按行号递增，区间整体倒序排列，区间内保持原顺序
+        change = np.r_[True, keys[1:] != keys[:-1]]
+        starts = np.flatnonzero(change)
+        ends = np.r_[starts[1:], len(keys)]
+        block = np.cumsum(change) - 1
+        index = np.arange(len(keys))
+        result = np.empty_like(positions)
+        result[len(keys) - ends[block] + (index - starts[block])] = positions
+        return result
+
+    def _top_k(self, column: str, k: int, ascending: bool) -> Optional[np.ndarray]:
+        """与 nsmallest/nlargest(keep="first") 相同：不含空值，相同取值时行号小的在前"""
+        order, values, valid = self._sorted(column)
+        if k >= self.row_count:
+            return None
+        if ascending:
+            return np.asarray(order[:min(k, valid)])
+        if k >= valid:
+            return self._descending(order, values, 0, valid)
+        # 第 k 大的取值可能有多行，只取其中行号最小的几行
+        boundary = values[valid - k]
+        first = int(np.searchsorted(values[:valid], boundary, side="left"))
+        after = int(np.searchsorted(values[:valid], boundary, side="right"))
+        above = self._descending(order, values, after, valid)
+        return np.concatenate([above, np.asarray(order[first:first + k - len(above)])])
+
+    def _sort_all(self, column: str, ascending: bool) -> np.ndarray:
+        """与 sort_values(kind="stable") 相同：空值排在最后"""
+        order, values, valid = self._sorted(column)
+        head = np.asarray(order[:valid]) if ascending else self._descending(order, values, 0, valid)
+        return np.concatenate([head, np.asarray(order[valid:])])
+
+    def _range(self, comparison: Comparison) -> Optional[np.ndarray]:
+        left, right, op = comparison.left, comparison.right, comparison.op
+        if isinstance(left, Value) and isinstance(right, Column):
+            left, right = right, left
+            op = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}.get(op, op)
+        if not (isinstance(left, Column) and isinstance(right, Value)) or left.name not in self.sorted:
+            return None
+        value = right.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+
+        order, values, valid = self._sorted(left.name)
+        lo = int(np.searchsorted(values[:valid], value, side="left"))
+        hi = int(np.searchsorted(values[:valid], value, side="right"))
+        if op == "!=":
+            # 与 pandas 相同，空值不等于任何值
+            return np.sort(np.concatenate([order[:lo], order[hi:]]))
+        start, stop = {"==": (lo, hi), "<": (0, lo), "<=": (0, hi), ">": (hi, valid), ">=": (lo, valid)}[op]
+        return np.sort(order[start:stop])
+
+    def _members(self, column: str, values: List[Any]) -> np.ndarray:
+        i = self.dimensions.index(column)
+        keys = {key: g for g, key in enumerate(self._groups(column)["key"].tolist())}
+        order, offsets = self._load(f"dim_{i}_order.npy"), self._load(f"dim_{i}_offsets.npy")
+        found = sorted({keys[v] for v in values if v in keys})
+        parts = [np.asarray(order[offsets[g]:offsets[g + 1]]) for g in found]
+        if len(parts) == 1:
+            # 同一分组内的行号已经递增
+            return parts[0]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _filter(self, op: FilterOperation) -> Optional[np.ndarray]:
+        predicate = op.predicate
+        if not set(op.columns) <= set(self.columns):
+            return None
+        if isinstance(predicate, Comparison):
+            positions = self._range(predicate)
+            if positions is None and predicate.op == "==" and isinstance(predicate.left, Column) \
+                    and isinstance(predicate.right, Value) and predicate.left.name in self.dimensions:
+                positions = self._members(predicate.left.name, [predicate.right.value])
+        elif isinstance(predicate, Membership) and not predicate.negate \
+                and isinstance(predicate.operand, Column) and predicate.operand.name in self.dimensions:
+            positions = self._members(predicate.operand.name, list(predicate.values))
+        else:
+            return None
+        if positions is not None and op.limit is not None:
+            positions = positions[:op.limit]
+        return positions
+
+    def row_positions(self, op: BaseOperation) -> Optional[np.ndarray]:
+        """单列排序、top-k 和单个条件的过滤返回结果行在文件中的行号（按结果顺序）"""
+        if isinstance(op, FilterOperation):
+            return self._filter(op)
+        if isinstance(op, (SortOperation, TopKOperation)):
+            if len(op.columns) != 1 or op.columns[0] not in self.sorted:
+                return None
+            ascending = op.ascending[0] if isinstance(op.ascending, list) else op.ascending
+            if isinstance(op, TopKOperation):
+                return self._top_k(op.columns[0], op.k, ascending)
+            if op.limit is not None:
+                return self._top_k(op.columns[0], op.limit, ascending)
+            return self._sort_all(op.columns[0], ascending)
+        return None
+
+    def answer(
+        self,
+        op: BaseOperation,
+        data_path: Path,
+        df: Optional[pd.DataFrame] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        用索引回答指令，无法回答时返回 None
+
+        需要返回原始行时，已加载数据（df）则直接按行号取出，否则只读取结果行所在的行组
+        """
+        result = self.aggregate(op)
+        if result is not None:
+            return result
+        positions = self.row_positions(op)
+        if positions is None:
+            return None
+        columns = op.columns if isinstance(op, FilterOperation) else []
+        if df is None:
+            return take_rows(data_path, positions, columns or None)
+        rows = df.take(positions)
+        return rows[columns] if columns else rows
+
+
+def take_rows(data_path: Path, positions: np.ndarray, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """只读取包含指定行的行组，按 positions 的顺序返回这些行，索引为行号"""
+    parquet_file = pq.ParquetFile(data_path)
+    if len(positions) == 0:
+        return parquet_file.schema_arrow.empty_table().select(columns or parquet_file.schema_arrow.names).to_pandas()
+    metadata = parquet_file.metadata
+    starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    row_groups = np.unique(np.searchsorted(starts, positions, side="right") - 1)
+    table = parquet_file.read_row_groups(row_groups.tolist(), columns=columns)
+
+    # 读取的行组拼接后，每个行组在表中的起始位置
+    local_starts = np.cumsum([0] + [metadata.row_group(g).num_rows for g in row_groups[:-1]])
+    group_of = np.searchsorted(starts, positions, side="right") - 1
+    local = positions - starts[group_of] + local_starts[np.searchsorted(row_groups, group_of)]
+    df = table.take(pa.array(local)).to_pandas()
+    df.index = pd.Index(positions, dtype=np.int64)
+    return df
@@ -0,0 +1,160 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONParser:
+    """
+    增量解析 LLM 流式输出的顶层 JSON 对象
+
+    每次 feed 一段文本，返回新产生的事件：
+    - ("delta", key, text)：stream_keys 中的字符串字段新解码出的内容
+    - ("field", key, value)：某个顶层字段的值已完整，value 为解析后的对象
+
+    第一个 "{" 之前的内容（如 ```json 代码块标记）会被忽略
+    """
+
+    def __init__(self, stream_keys: Tuple[str, ...] = ("answer",)):
+        self.stream_keys = stream_keys
+        self.fields = {}
+        self._state = "start"
+        self._key = ""
+        self._raw = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = ""
+        self._surrogate = 0
+        self._decoded = []
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str) -> List[Tuple[str, str, Any]]:
+        events = []
+        for char in text:
+            self._consume(char, events)
+        # 一段文本内连续解码出的字符合并为一个 delta 事件
+        if self._decoded:
+            events.append(("delta", self._key, "".join(self._decoded)))
+            self._decoded = []
+        return events
+
+    def _consume(self, char: str, events: list):
+        state = self._state
+        if state == "start":
+            if char == "{":
+                self._state = "key_or_end"
+        elif state == "key_or_end":
+            if char == '"':
+                self._state = "key"
+                self._key = ""
+            elif char == "}":
+                self._state = "done"
+        elif state == "key":
+            if self._escape:
+                self._key += _ESCAPES.get(char, char)
+                self._escape = ""
+            elif char == "\\":
+                self._escape = "\\"
+            elif char == '"':
+                self._state = "colon"
+            else:
+                self._key += char
+        elif state == "colon":
+            if char == ":":
+                self._state = "value_start"
+        elif state == "value_start":
+            if char.isspace():
+                return
+            self._raw = [char]
+            if char == '"' and self._key in self.stream_keys:
+                self._state = "stream_string"
+            elif char == '"':
+                self._state = "value"
+                self._in_string = True
+            elif char in "{[":
+                self._state = "value"
+                self._depth = 1
+            else:
+                self._state = "scalar"
+        elif state == "stream_string":
+            self._stream_char(char, events)
+        elif state == "value":
+            self._raw.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = ""
+                elif char == "\\":
+                    self._escape = "\\"
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        self._finish(events)
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish(events)
+        elif state == "scalar":
+            if char in ",}" or char.isspace():
+                self._finish(events)
+                if char == "}":
+                    self._state = "done"
+                elif char == ",":
+                    self._state = "key_or_end"
+            else:
+                self._raw.append(char)
+        elif state == "after_value":
+            if char == ",":
+                self._state = "key_or_end"
+            elif char == "}":
+                self._state = "done"
+
+    def _stream_char(self, char: str, events: list):
+        """逐字符解码流式字符串字段，处理跨分块的转义序列"""
+        self._raw.append(char)
+        if self._escape:
+            self._escape += char
+            if self._escape[1] != "u":
+                self._decoded.append(_ESCAPES.get(char, char))
+                self._escape = ""
+            elif len(self._escape) == 6:
+                code = int(self._escape[2:], 16)
+                self._escape = ""
+                if 0xD800 <= code < 0xDC00:
+                    # 代理对的高位，等待低位后再组合
+                    self._surrogate = code
+                elif 0xDC00 <= code < 0xE000 and self._surrogate:
+                    self._decoded.append(chr(0x10000 + ((self._surrogate - 0xD800) << 10) + code - 0xDC00))
+                    self._surrogate = 0
+                else:
+                    self._decoded.append(chr(code))
+        elif char == "\\":
+            self._escape = "\\"
+        elif char == '"':
+            if self._decoded:
+                events.append(("delta", self._key, "".join(self._decoded)))
+                self._decoded = []
+            self._finish(events)
+        else:
+            self._decoded.append(char)
+
+    def _finish(self, events: list):
+        raw = "".join(self._raw)
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+        self.fields[self._key] = value
+        events.append(("field", self._key, value))
+        self._raw = []
+        self._state = "after_value"
+
+    def result(self) -> Optional[dict]:
+        """完整解析出的对象；输出不是 JSON 对象时返回 None"""
+        return self.fields if self._state == "done" else None
@@ -0,0 +1,292 @@
+import ast
+import math
+import operator
+import re
+import numpy as np
+import pandas as pd
+from typing import Any, NamedTuple, Set, Tuple, Union
+
+# 过滤表达式的语法树：由白名单内的 Python 语法解析得到，按向量化的 pandas/numpy 运算求值，
+# 不会把字符串交给 df.query/eval 执行
+
+
+class Column(NamedTuple):
+    name: str
+
+
+class Value(NamedTuple):
+    value: Union[bool, int, float, str]
+
+
+class Arithmetic(NamedTuple):
+    op: str
+    left: Any
+    right: Any
+
+
+class Comparison(NamedTuple):
+    op: str
+    left: Any
+    right: Any
+
+
+class Membership(NamedTuple):
+    operand: Any
+    values: Tuple[Any, ...]
+    negate: bool
+
+
+class NullCheck(NamedTuple):
+    column: Column
+    negate: bool
+
+
+class StringMatch(NamedTuple):
+    column: Column
+    method: str
+    pattern: str
+
+
+class BoolOp(NamedTuple):
+    op: str
+    operands: Tuple[Any, ...]
+
+
+class Not(NamedTuple):
+    operand: Any
+
+
+Expression = Union[Column, Value, Arithmetic]
+Predicate = Union[Comparison, Membership, NullCheck, StringMatch, BoolOp, Not]
+
+_COMPARE_SYMBOLS = {
+    ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=",
+}
+_ARITHMETIC_SYMBOLS = {
+    ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.FloorDiv: "//", ast.Mod: "%", ast.Pow: "**",
+}
+COMPARE_OPS = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+ARITHMETIC_OPS = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+    "//": operator.floordiv, "%": operator.mod, "**": operator.pow,
+}
+# 常量运算在解析时计算，整数结果不能超出 int64 的范围
+_MAX_FOLDED_BITS = 63
+_NULL_METHODS = {"isna": False, "isnull": False, "notna": True, "notnull": True}
+_STRING_METHODS = ("contains", "startswith", "endswith")
+_BACKTICK = re.compile(r"`([^`]+)`")
+
+
+class _Parser:
+    def __init__(self, names: dict):
+        # 反引号列名替换后的占位名 -> 原列名
+        self.names = names
+
+    def _error(self, node: ast.AST) -> ValueError:
+        return ValueError(f"不支持的过滤表达式: {ast.unparse(node)}")
+
+    def _column(self, node: ast.AST) -> Column:
+        if not isinstance(node, ast.Name):
+            raise self._error(node)
+        return Column(self.names.get(node.id, node.id))
+
+    def _literal(self, node: ast.AST):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float, str)):
+            return node.value
+        if (
+            isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+            and isinstance(node.operand, ast.Constant)
+            and isinstance(node.operand.value, (int, float))
+        ):
+            return -node.operand.value
+        raise self._error(node)
+
+    def _fold(self, node: ast.BinOp, op: str, left: Value, right: Value) -> Value:
+        """
+        两侧都是常量的运算在解析时计算
+
+        结果超出 int64 范围、溢出或不是实数时拒绝：如 9**9**9 若在执行时计算会长时间占用执行器线程，
+        且超时后线程仍在运行
+        """
+        a, b = left.value, right.value
+        if isinstance(a, str) or isinstance(b, str):
+            raise self._error(node)
+        if (
+            op == "**" and isinstance(a, int) and isinstance(b, int)
+            and abs(a) > 1 and b * math.log2(abs(a)) > _MAX_FOLDED_BITS
+        ):
+            raise self._error(node)
+        try:
+            value = ARITHMETIC_OPS[op](a, b)
+        except ArithmeticError:
+            raise self._error(node)
+        if (
+            isinstance(value, complex)
+            or (isinstance(value, int) and abs(value).bit_length() > _MAX_FOLDED_BITS)
+            or (isinstance(value, float) and not math.isfinite(value))
+        ):
+            raise self._error(node)
+        return Value(value)
+
+    def expression(self, node: ast.AST) -> Expression:
+        if isinstance(node, ast.Name):
+            return self._column(node)
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC_SYMBOLS:
+            op = _ARITHMETIC_SYMBOLS[type(node.op)]
+            left, right = self.expression(node.left), self.expression(node.right)
+            if isinstance(left, Value) and isinstance(right, Value):
+                return self._fold(node, op, left, right)
+            return Arithmetic(op, left, right)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Name):
+            return Arithmetic("*", Value(-1), self._column(node.operand))
+        return Value(self._literal(node))
+
+    def _call(self, node: ast.Call) -> Predicate:
+        func = node.func
+        if not isinstance(func, ast.Attribute) or node.keywords:
+            raise self._error(node)
+        # col.isna() / col.notna()
+        if func.attr in _NULL_METHODS and not node.args:
+            return NullCheck(self._column(func.value), _NULL_METHODS[func.attr])
+        # col.str.contains('x') / startswith / endswith
+        if (
+            func.attr in _STRING_METHODS and len(node.args) == 1
+            and isinstance(func.value, ast.Attribute) and func.value.attr == "str"
+        ):
+            pattern = self._literal(node.args[0])
+            if isinstance(pattern, str):
+                return StringMatch(self._column(func.value.value), func.attr, pattern)
+        raise self._error(node)
+
+    def _compare(self, left: ast.AST, op: ast.cmpop, right: ast.AST) -> Predicate:
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+                raise self._error(right)
+            values = tuple(self._literal(item) for item in right.elts)
+            return Membership(self.expression(left), values, isinstance(op, ast.NotIn))
+        if type(op) not in _COMPARE_SYMBOLS:
+            raise ValueError(f"不支持的比较运算: {type(op).__name__}")
+        return Comparison(_COMPARE_SYMBOLS[type(op)], self.expression(left), self.expression(right))
+
+    def predicate(self, node: ast.AST) -> Predicate:
+        if isinstance(node, ast.BoolOp):
+            op = "and" if isinstance(node.op, ast.And) else "or"
+            return BoolOp(op, tuple(self.predicate(value) for value in node.values))
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            op = "and" if isinstance(node.op, ast.BitAnd) else "or"
+            return BoolOp(op, (self.predicate(node.left), self.predicate(node.right)))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            return Not(self.predicate(node.operand))
+        if isinstance(node, ast.Compare):
+            # 链式比较 a < x < b 等价于 a < x and x < b
+            operands = [node.left] + node.comparators
+            parts = tuple(
+                self._compare(operands[i], op, operands[i + 1])
+                for i, op in enumerate(node.ops)
+            )
+            return parts[0] if len(parts) == 1 else BoolOp("and", parts)
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        if isinstance(node, ast.Name):
+            # 布尔列
+            return Comparison("==", self._column(node), Value(True))
+        raise self._error(node)
+
+
+def parse_predicate(query: str) -> Predicate:
+    """
+    把 df.query 风格的过滤表达式解析为语法树
+
+    支持列名（含反引号引用的列名）、常量、比较和链式比较、in/not in、and/or/not（及 &、|、~）、
+    四则运算，以及 isna()/notna()、str.contains()/startswith()/endswith()，其余语法一律拒绝；
+    常量之间的运算在解析时计算，结果超出 int64 范围或溢出时拒绝
+    """
+    names = {}
+
+    def placeholder(match: re.Match) -> str:
+        name = f"__column_{len(names)}__"
+        names[name] = match.group(1)
+        return name
+
+    try:
+        tree = ast.parse(_BACKTICK.sub(placeholder, query).strip(), mode="eval")
+    except SyntaxError:
+        raise ValueError(f"过滤表达式语法错误: {query}")
+    return _Parser(names).predicate(tree.body)
+
+
+def predicate_columns(node: Any) -> Set[str]:
+    """语法树中引用的所有列"""
+    if isinstance(node, Column):
+        return {node.name}
+    if isinstance(node, tuple):
+        columns = set()
+        for child in node:
+            columns |= predicate_columns(child)
+        return columns
+    return set()
+
+
+def _widen(operand):
+    """导入时缩小的整数类型先提升为 int64 再做算术运算，避免溢出回绕"""
+    if isinstance(operand, pd.Series) and operand.dtype.kind == "i" and operand.dtype.itemsize < 8:
+        return operand.astype(np.int64)
+    return operand
+
+
+def _decode(operand):
+    """分类列按取值比较大小（未排序的分类类型只支持相等比较）"""
+    if isinstance(operand, pd.Series) and isinstance(operand.dtype, pd.CategoricalDtype):
+        return operand.astype(operand.cat.categories.dtype)
+    return operand
+
+
+def _evaluate(node: Expression, df: pd.DataFrame):
+    if isinstance(node, Column):
+        return df[node.name]
+    if isinstance(node, Value):
+        return node.value
+    return ARITHMETIC_OPS[node.op](_widen(_evaluate(node.left, df)), _widen(_evaluate(node.right, df)))
+
+
+def _as_mask(result, length: int, na_value: bool = False) -> np.ndarray:
+    if isinstance(result, pd.Series):
+        return result.to_numpy(dtype=bool, na_value=na_value)
+    return np.full(length, bool(result))
+
+
+def evaluate_mask(node: Predicate, df: pd.DataFrame) -> np.ndarray:
+    """
+    按语法树计算行掩码
+
+    与 df.query 的语义一致：空值参与比较的结果为 False（!= 为 True），不在 in 列表中
+    """
+    if isinstance(node, BoolOp):
+        masks = [evaluate_mask(operand, df) for operand in node.operands]
+        return (np.logical_and if node.op == "and" else np.logical_or).reduce(masks)
+    if isinstance(node, Not):
+        return ~evaluate_mask(node.operand, df)
+    if isinstance(node, Comparison):
+        left, right = _evaluate(node.left, df), _evaluate(node.right, df)
+        if node.op not in ("==", "!=") or (isinstance(left, pd.Series) and isinstance(right, pd.Series)):
+            left, right = _decode(left), _decode(right)
+        result = COMPARE_OPS[node.op](left, right)
+        return _as_mask(result, len(df), na_value=node.op == "!=")
+    if isinstance(node, Membership):
+        operand = _evaluate(node.operand, df)
+        mask = _as_mask(operand.isin(node.values) if isinstance(operand, pd.Series) else operand in node.values, len(df))
+        return ~mask if node.negate else mask
+    if isinstance(node, NullCheck):
+        mask = df[node.column.name].isna().to_numpy()
+        return ~mask if node.negate else mask
+    if isinstance(node, StringMatch):
+        strings = df[node.column.name].str
+        if node.method == "contains":
+            result = strings.contains(node.pattern, regex=False, na=False)
+        else:
+            result = getattr(strings, node.method)(node.pattern, na=False)
+        return _as_mask(result, len(df))
+    raise ValueError(f"不支持的过滤条件: {node}")
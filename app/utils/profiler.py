@@ -0,0 +1,257 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Dict, Any, List
+
+# HyperLogLog 寄存器数量为 2^14，标准误差约 0.8%
+_HLL_PRECISION = 14
+_QUANTILES = [0.25, 0.5, 0.75]
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 的混合函数，使哈希值的各个位分布均匀"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash_strings(chunk: pa.Array) -> np.ndarray:
+    """
+    直接在 Arrow 的偏移量和数据缓冲区上计算字符串哈希，不创建 Python 字符串对象
+
+    每个字节乘以其在字符串中位置对应的随机权重后求和（按 2^64 取模），再混合长度
+    """
+    offsets_type = np.int64 if pa.types.is_large_string(chunk.type) else np.int32
+    _, offsets_buf, data_buf = chunk.buffers()
+    offsets = np.frombuffer(offsets_buf, dtype=offsets_type)[chunk.offset:chunk.offset + len(chunk) + 1]
+    offsets = offsets.astype(np.int64)
+    lengths = np.diff(offsets)
+    start, end = offsets[0], offsets[-1]
+    hashes = lengths.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    if end > start:
+        data = np.frombuffer(data_buf, dtype=np.uint8)[start:end].astype(np.uint64)
+        positions = np.arange(end - start) - np.repeat(offsets[:-1] - start, lengths)
+        weights = np.random.default_rng(0).integers(0, _MASK64, size=int(lengths.max()), dtype=np.uint64, endpoint=True)
+        products = data * weights[positions]
+        non_empty = lengths > 0
+        hashes[non_empty] += np.add.reduceat(products, (offsets[:-1] - start)[non_empty])
+    return _mix64(hashes)
+
+
+def _hash_values(values: pa.ChunkedArray) -> np.ndarray:
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        if not values.num_chunks:
+            return np.empty(0, dtype=np.uint64)
+        return np.concatenate([_hash_strings(chunk) for chunk in values.chunks])
+    return pd.util.hash_array(values.to_numpy(zero_copy_only=False), categorize=False)
+
+
+def hll_distinct_count(values: pa.ChunkedArray, precision: int = _HLL_PRECISION) -> int:
+    """用 HyperLogLog 估算非空值的去重数量，内存占用固定为 2^precision 个寄存器"""
+    values = values.drop_null()
+    if len(values) == 0:
+        return 0
+    hashes = _hash_values(values)
+    bits = 64 - precision
+    index = (hashes >> np.uint64(bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << bits) - 1)
+    # rank 为剩余 bits 位中第一个 1 的位置（从 1 开始计数）
+    with np.errstate(divide="ignore"):
+        rank = np.where(rest == 0, bits + 1, bits - np.floor(np.log2(rest.astype(np.float64))))
+    registers = np.zeros(1 << precision, dtype=np.float64)
+    np.maximum.at(registers, index, rank)
+
+    m = float(1 << precision)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-registers))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # 小基数修正
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+
+def _top_values(counts: pa.StructArray, k: int, scale: int = 1) -> List[Dict[str, Any]]:
+    """从 value_counts 的结果中取出现次数最多的 k 个非空值"""
+    values = counts.field("values")
+    frequencies = counts.field("counts").to_numpy(zero_copy_only=False)
+    valid = np.asarray(values.is_valid())
+    frequencies = np.where(valid, frequencies, 0)
+    if len(frequencies) == 0 or frequencies.max() <= 1:
+        # 所有值都只出现一次，没有意义
+        return []
+    order = np.argsort(-frequencies, kind="stable")[:k]
+    return [
+        {"value": _as_py(values[int(i)]), "count": int(frequencies[i]) * scale}
+        for i in order if frequencies[i] > 0
+    ]
+
+
+def _as_py(value):
+    value = value.as_py() if isinstance(value, pa.Scalar) else value
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, (datetime.date, datetime.time)):
+        # 统计信息保存为 JSON，时间值使用 ISO 8601 字符串
+        return value.isoformat()
+    return value
+
+
+def _numeric_stats(values: pa.ChunkedArray, top_k: int) -> Dict[str, Any]:
+    """
+    数值列的统计：排序一次后同时得到去重数、高频值、最值和精确分位数
+
+    排序的开销低于哈希去重 + 分位数选择，且结果都是精确值
+    """
+    data = np.sort(values.drop_null().to_numpy())
+    if data.dtype.kind == "f":
+        data = data[~np.isnan(data)]
+    if len(data) == 0:
+        return {"unique_count": 0, "top_values": []}
+
+    starts = np.concatenate(([0], np.flatnonzero(data[1:] != data[:-1]) + 1))
+    counts = np.diff(np.append(starts, len(data)))
+    top_values = []
+    if counts.max() > 1:
+        order = np.argsort(-counts, kind="stable")[:top_k]
+        top_values = [{"value": _as_py(data[starts[i]]), "count": int(counts[i])} for i in order]
+
+    # 与 pandas 默认的线性插值一致；导入时整数列可能缩小为 int8/int16，插值和统计量按 float64 计算，避免相减溢出
+    floats = data.astype(np.float64)
+    positions = np.array(_QUANTILES) * (len(data) - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    quantiles = floats[lower] + (floats[upper] - floats[lower]) * (positions - lower)
+    return {
+        "unique_count": len(starts),
+        "top_values": top_values,
+        "min": _as_py(data[0]),
+        "max": _as_py(data[-1]),
+        "mean": _as_py(floats.mean()),
+        "std": _as_py(floats.std(ddof=1)) if len(data) > 1 else None,
+        "quantiles": {f"{int(q * 100)}%": _as_py(v) for q, v in zip(_QUANTILES, quantiles)},
+    }
+
+
+def profile_column(
+    name: str,
+    dtype: str,
+    values: pa.ChunkedArray,
+    top_k: int,
+    approx_min_rows: int,
+    sample_rows: int
+) -> Dict[str, Any]:
+    """
+    计算单列的统计信息
+
+    数值列通过排序得到精确统计。其他列在行数低于 approx_min_rows 时用一次 value_counts
+    同时得到精确的去重数和高频值；达到该行数后先按等间隔抽样，抽样中取值较少的列仍精确计算，
+    高基数列的去重数改用 HyperLogLog 估算，高频值由抽样结果估算，避免为整列建立哈希表
+    """
+    value_type = values.type
+    column: Dict[str, Any] = {
+        "name": name,
+        "type": dtype,
+        "null_count": values.null_count,
+        "approximate": False,
+    }
+    if pa.types.is_integer(value_type) or pa.types.is_floating(value_type):
+        column.update(_numeric_stats(values, top_k))
+        return column
+
+    total = len(values)
+    counts = None
+    # 分类列（字典编码）的取值数在导入时已限制，直接按编码精确计数
+    is_dictionary = pa.types.is_dictionary(value_type)
+    if total >= approx_min_rows and not is_dictionary:
+        stride = max(total // sample_rows, 1)
+        sampled = values.take(pa.array(np.arange(0, total, stride))) if stride > 1 else values
+        sample_counts = pc.value_counts(sampled)
+        if len(sample_counts) * 10 > len(sampled):
+            column["approximate"] = True
+            column["unique_count"] = hll_distinct_count(values)
+            column["top_values"] = _top_values(sample_counts, top_k, stride)
+    if not column["approximate"]:
+        counts = pc.value_counts(values)
+        column["unique_count"] = len(counts) - (1 if values.null_count else 0)
+        column["top_values"] = _top_values(counts, top_k)
+
+    if total > values.null_count and is_dictionary:
+        min_max = pc.min_max(counts.field("values").dictionary_decode())
+        column["min"] = _as_py(min_max["min"])
+        column["max"] = _as_py(min_max["max"])
+    elif total > values.null_count and not pa.types.is_boolean(value_type):
+        min_max = pc.min_max(values)
+        column["min"] = _as_py(min_max["min"])
+        column["max"] = _as_py(min_max["max"])
+    return column
+
+
+def profile_parquet(
+    path: Path,
+    top_k: int,
+    approx_min_rows: int,
+    sample_rows: int
+) -> Dict[str, Any]:
+    """
+    逐列读取parquet并生成所有列的统计信息
+
+    每列只从文件读取一次，所有统计量都在 Arrow 数组上计算，不转换为 pandas 对象
+    """
+    parquet_file = pq.ParquetFile(path)
+    schema = parquet_file.schema_arrow
+    dtypes = schema.empty_table().to_pandas().dtypes.astype(str).to_dict()
+    sample = next(parquet_file.iter_batches(batch_size=3), None)
+
+    columns = []
+    for name in schema.names:
+        values = parquet_file.read(columns=[name]).column(0)
+        columns.append(profile_column(name, dtypes[name], values, top_k, approx_min_rows, sample_rows))
+
+    return {
+        "row_count": parquet_file.metadata.num_rows,
+        "column_count": len(columns),
+        "columns": columns,
+        "sample": [
+            {key: _as_py(value) for key, value in row.items()} for row in sample.to_pylist()
+        ] if sample is not None else []
+    }
+
+
+def describe_from_profile(profile: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    由统计信息生成与 DataFrame.describe().to_dict() 结构一致的基础统计
+
+    与 describe() 一致：存在数值列时只统计数值列，否则统计其余列的 count/unique/top/freq
+    """
+    row_count = profile["row_count"]
+    numeric = {
+        c["name"]: {
+            "count": float(row_count - c["null_count"]),
+            "mean": c["mean"],
+            "std": c["std"],
+            "min": c["min"],
+            **c["quantiles"],
+            "max": c["max"],
+        }
+        for c in profile["columns"] if "quantiles" in c
+    }
+    if numeric:
+        return numeric
+    return {
+        c["name"]: {
+            "count": row_count - c["null_count"],
+            "unique": c["unique_count"],
+            "top": c["top_values"][0]["value"] if c["top_values"] else None,
+            "freq": c["top_values"][0]["count"] if c["top_values"] else None,
+        }
+        for c in profile["columns"]
+    }
@@ -0,0 +1,134 @@
+import json
+from typing import Dict, Any, List, Optional, Sequence
+from app.utils.tokens import estimate_tokens
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _compact_line(column: Dict[str, Any]) -> str:
+    return f"- {_dumps(column['name'])} ({column['type']})"
+
+
+def _detailed_line(column: Dict[str, Any]) -> str:
+    parts = [_compact_line(column), f"空值 {column['null_count']}", f"去重 {column['unique_count']}"]
+    if column.get("min") is not None:
+        parts.append(f"范围 {_dumps(column['min'])} ~ {_dumps(column['max'])}")
+    if column.get("mean") is not None:
+        parts.append(f"均值 {column['mean']:.6g}")
+    if column.get("top_values"):
+        parts.append(f"常见值 {_dumps([v['value'] for v in column['top_values'][:3]])}")
+    return ", ".join(parts)
+
+
+# 会话数据表列表中每个表最多列出的列数
+MAX_TABLE_COLUMNS = 30
+
+_SESSION_OPERATIONS_HELP = """跨表操作（data_operation）格式:
+{"type": "join", "left": "表名", "right": "表名", "on": ["连接列"], "how": "inner/left/right/outer", "then": 连接后执行的单表操作}
+{"type": "union", "tables": ["表名", ...], "source_column": "记录来源表名的列（可选）", "then": 合并后执行的单表操作}
+单表操作中加入 "table": "表名" 可以作用于其他表；连接后右表中重名的列以 "_右表名" 结尾"""
+
+
+def build_tables_context(tables: List[Dict[str, Any]], current_file_id: Optional[str] = None) -> str:
+    """描述会话中可以跨表查询的所有数据表：表名、行数和列类型"""
+    lines = ["会话中的数据表:"]
+    for table in tables:
+        columns = [f"{_dumps(name)} ({dtype})" for name, dtype in table["columns"].items()]
+        shown = ", ".join(columns[:MAX_TABLE_COLUMNS])
+        if len(columns) > MAX_TABLE_COLUMNS:
+            shown += f" 等 {len(columns)} 列"
+        current = "当前表，" if table["file_id"] == current_file_id else ""
+        lines.append(f"- {table['name']}（{current}{table['rows']} 行）: {shown}")
+    lines.append(_SESSION_OPERATIONS_HELP)
+    return "\n".join(lines)
+
+
+def build_prompt_context(
+    profile: Dict[str, Any],
+    token_budget: int,
+    priority_columns: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    由上传时生成的列统计信息构建提示词中的数据描述
+
+    所有列的详细统计和样本数据能放进 token_budget 时全部输出（此时与 priority_columns 无关，
+    同一文件的输出逐字节相同）。超出预算时：
+    1. 会话中引用过的列（priority_columns）给出详细统计
+    2. 其余列保留名称和类型，列数过多时截断，并注明省略的列数
+    3. 剩余预算按文件中的顺序把列升级为详细统计
+    4. 最后加入只包含详细列的样本数据
+
+    返回 {"text": 描述文本, "tokens": 估算的 token 数, "truncated": 是否有信息被省略}
+    """
+    columns = profile["columns"]
+    by_name = {c["name"]: c for c in columns}
+    referenced = list(dict.fromkeys(n for n in priority_columns if n in by_name))
+    order = list(dict.fromkeys(referenced + list(by_name)))
+    header = f"数据信息:\n行数: {profile['row_count']}, 列数: {profile['column_count']}"
+    columns_title = "列（名称、类型、空值数、去重数、取值范围、均值、常见值）:"
+
+    def render(detailed: set, listed: set, sample_rows: List[Dict[str, Any]]) -> str:
+        lines = [header, columns_title]
+        for column in columns:
+            if column["name"] in detailed:
+                lines.append(_detailed_line(column))
+            elif column["name"] in listed:
+                lines.append(_compact_line(column))
+        omitted = len(columns) - len(listed)
+        if omitted:
+            lines.append(f"（另有 {omitted} 列未列出）")
+        if sample_rows:
+            lines.append("样本数据:")
+            lines.extend(
+                _dumps({k: v for k, v in row.items() if k in detailed})
+                for row in sample_rows
+            )
+        return "\n".join(lines)
+
+    sample = profile.get("sample", [])
+    everything = set(by_name)
+    text = render(everything, everything, sample)
+    tokens = estimate_tokens(text)
+    if tokens <= token_budget:
+        return {"text": text, "tokens": tokens, "truncated": False}
+
+    used = estimate_tokens(render(set(), set(), [])) + estimate_tokens("（另有 0000 列未列出）")
+    listed = set()
+    detailed = set()
+
+    def add(names: List[str], detail: bool) -> bool:
+        nonlocal used
+        for name in names:
+            if name in (detailed if detail else listed):
+                continue
+            line = _detailed_line(by_name[name]) if detail else _compact_line(by_name[name])
+            cost = estimate_tokens(line)
+            if name in listed:
+                cost -= estimate_tokens(_compact_line(by_name[name]))
+            if used + cost > token_budget:
+                return False
+            (detailed if detail else listed).add(name)
+            listed.add(name)
+            used += cost
+        return True
+
+    # 引用过的列优先给出详细统计，再列出其余列的名称和类型，最后用剩余预算补充其余列的详细统计
+    add(referenced, detail=True)
+    if add(order, detail=False):
+        add(order, detail=True)
+
+    # 最后在剩余预算内加入样本数据
+    rows = []
+    if detailed:
+        used += estimate_tokens("样本数据:")
+        for row in sample:
+            cost = estimate_tokens(_dumps({k: v for k, v in row.items() if k in detailed}))
+            if used + cost > token_budget:
+                break
+            rows.append(row)
+            used += cost
+
+    text = render(detailed, listed, rows)
+    return {"text": text, "tokens": estimate_tokens(text), "truncated": True}
@@ -0,0 +1,202 @@
+import operator
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pathlib import Path
+from typing import Union, Dict, Any, Optional, List
+from app.schemas.operation import BaseOperation, FilterOperation, parse_operation
+from app.utils.data_processor import process_dataframe
+from app.utils.predicates import (
+    COMPARE_OPS,
+    BoolOp,
+    Column,
+    Comparison,
+    Membership,
+    Not,
+    NullCheck,
+    Predicate,
+    Value,
+    parse_predicate,
+)
+
+
+class _Untranslatable(Exception):
+    """过滤表达式无法转换为 Arrow 表达式"""
+
+
+def _operand(node, columns: List[str]):
+    if isinstance(node, Column):
+        if node.name not in columns:
+            raise _Untranslatable()
+        return pc.field(node.name)
+    if isinstance(node, Value):
+        return node.value
+    # 算术运算中空值和 NaN 的处理与 pandas 不同，交给 pandas 计算
+    raise _Untranslatable()
+
+
+def _temporal_literal(column, value, types: Dict[str, pa.DataType]):
+    """时间列与字符串比较时 pandas 会先把字符串转换为时间，这里同样转换为时间标量"""
+    value_type = types.get(column.name) if isinstance(column, Column) else None
+    if not isinstance(value, str) or value_type is None or not pa.types.is_timestamp(value_type):
+        return value
+    try:
+        timestamp = pd.Timestamp(value)
+    except ValueError:
+        raise _Untranslatable()
+    if value_type.tz is not None or timestamp.tzinfo is not None:
+        raise _Untranslatable()
+    try:
+        # 字符串的精度高于列的时间单位时转换会失败，交给 pandas 比较
+        return pa.scalar(timestamp.as_unit("ns").to_datetime64(), pa.timestamp("ns")).cast(value_type)
+    except pa.ArrowInvalid:
+        raise _Untranslatable()
+
+
+def _compare(node: Comparison, columns: List[str], types: Dict[str, pa.DataType]) -> pc.Expression:
+    """
+    转换单个比较
+
+    Arrow 中与空值比较的结果为 null，而 pandas 中 NaN 比较结果为 False（!= 为 True），
+    这里补充有效性判断，保证取反、组合后的语义与 df.query 一致
+    """
+    left, right = _operand(node.left, columns), _operand(node.right, columns)
+    left, right = _temporal_literal(node.right, left, types), _temporal_literal(node.left, right, types)
+    fields = [v for v in (left, right) if isinstance(v, pc.Expression)]
+    if not fields:
+        raise _Untranslatable()
+
+    result = COMPARE_OPS[node.op](left, right)
+    for field in fields:
+        if node.op == "!=":
+            result = result | field.is_null()
+        else:
+            result = result & field.is_valid()
+    return result
+
+
+def _translate(node, columns: List[str], types: Dict[str, pa.DataType]) -> pc.Expression:
+    if isinstance(node, BoolOp):
+        parts = [_translate(operand, columns, types) for operand in node.operands]
+        combine = operator.and_ if node.op == "and" else operator.or_
+        result = parts[0]
+        for part in parts[1:]:
+            result = combine(result, part)
+        return result
+
+    if isinstance(node, Not):
+        return ~_translate(node.operand, columns, types)
+
+    if isinstance(node, Comparison):
+        return _compare(node, columns, types)
+
+    if isinstance(node, Membership):
+        field = _operand(node.operand, columns)
+        if not isinstance(field, pc.Expression):
+            raise _Untranslatable()
+        result = field.isin(list(node.values))
+        return ~result if node.negate else result
+
+    if isinstance(node, NullCheck):
+        result = _operand(node.column, columns).is_null(nan_is_null=True)
+        return ~result if node.negate else result
+
+    raise _Untranslatable()
+
+
+def translate_predicate(
+    predicate: Predicate,
+    columns: List[str],
+    types: Optional[Dict[str, pa.DataType]] = None
+) -> Optional[pc.Expression]:
+    """
+    将过滤条件的语法树转换为 Arrow 表达式，无法转换时返回 None
+
+    types 为列的 Arrow 类型，提供时与时间列比较的字符串转换为时间标量
+    """
+    try:
+        return _translate(predicate, columns, types or {})
+    except _Untranslatable:
+        return None
+
+
+def translate_query(
+    query: str,
+    columns: List[str],
+    types: Optional[Dict[str, pa.DataType]] = None
+) -> Optional[pc.Expression]:
+    """将 df.query 风格的过滤表达式转换为 Arrow 表达式，无法转换时返回 None"""
+    try:
+        predicate = parse_predicate(query)
+    except ValueError:
+        return None
+    return translate_predicate(predicate, columns, types)
+
+
+def plan_operation(
+    operation: Union[Dict[str, Any], BaseOperation],
+    columns: List[str],
+    types: Optional[Dict[str, pa.DataType]] = None
+) -> Dict[str, Any]:
+    """
+    根据数据处理指令生成扫描计划
+
+    返回:
+    {
+        "columns": 需要读取的列（None 表示全部列）,
+        "filter": 下推到扫描阶段的 Arrow 过滤表达式,
+        "limit": 扫描阶段最多读取的行数（None 表示不限制）,
+        "residual": 扫描后仍需交给 pandas 执行的操作（None 表示无需处理）
+    }
+    """
+    op = parse_operation(operation)
+    plan = {"columns": None, "filter": None, "limit": None, "residual": op}
+
+    if isinstance(op, FilterOperation):
+        expression = translate_predicate(op.predicate, columns, types)
+        if expression is not None:
+            plan["filter"] = expression
+            plan["limit"] = op.limit
+            plan["residual"] = None
+            if op.columns and all(col in columns for col in op.columns):
+                plan["columns"] = list(dict.fromkeys(op.columns))
+            elif op.columns:
+                # 列名无效时交由 pandas 报告错误
+                plan["residual"] = op
+        return plan
+
+    needed = op.required_columns()
+    # 列名无效时不做裁剪，交由 pandas 报告错误
+    if needed and all(col in columns for col in needed):
+        plan["columns"] = [col for col in columns if col in needed]
+    return plan
+
+
+def execute_operation(path: Path, operation: Dict[str, Any]) -> Union[pd.DataFrame, Dict[str, Any]]:
+    """
+    按扫描计划读取parquet文件并执行数据处理指令
+
+    列裁剪和可转换的过滤条件在 Arrow 扫描阶段完成，其余部分回退到 process_dataframe
+    """
+    try:
+        op = parse_operation(operation)
+    except ValueError as e:
+        raise ValueError(f"数据处理错误: {e}")
+    dataset = ds.dataset(path, format="parquet")
+    plan = plan_operation(op, dataset.schema.names, dict(zip(dataset.schema.names, dataset.schema.types)))
+
+    try:
+        if plan["limit"] is not None:
+            table = dataset.head(plan["limit"], columns=plan["columns"], filter=plan["filter"])
+        else:
+            table = dataset.to_table(columns=plan["columns"], filter=plan["filter"])
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        # 类型不匹配等情况无法下推，读取后由 pandas 执行完整操作
+        table = dataset.to_table(columns=plan["columns"] if plan["residual"] is not None else None)
+        plan["residual"] = op
+
+    df = table.to_pandas()
+    if plan["residual"] is None:
+        return df
+    return process_dataframe(df, plan["residual"])
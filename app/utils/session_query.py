@@ -0,0 +1,270 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pathlib import Path
+from typing import Union, Dict, Any, Optional, List, Set, Tuple
+from app.schemas.operation import parse_operation
+from app.utils.data_processor import process_dataframe
+from app.utils.predicates import predicate_columns
+from app.utils.query_planner import execute_operation, translate_predicate
+
+# 跨文件操作类型，其余操作作用于单个表
+SESSION_OPERATIONS = ("join", "union")
+
+_JOIN_TYPES = ("inner", "left", "right", "outer")
+_ARROW_JOIN_TYPES = {"inner": "inner", "left": "left outer", "right": "right outer", "outer": "full outer"}
+
+
+def session_table_names(files: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    为会话中的文件生成表名，返回 {表名: file_id}
+
+    表名取自原始文件名（去掉扩展名，非单词字符替换为下划线），重名时依次追加 _2、_3
+    """
+    names = {}
+    for entry in files:
+        stem = Path(entry.get("filename") or entry["file_id"]).stem
+        base = re.sub(r"\W+", "_", stem).strip("_") or "table"
+        if base[0].isdigit():
+            base = f"t_{base}"
+        name, index = base, 2
+        while name in names:
+            name, index = f"{base}_{index}", index + 1
+        names[name] = entry["file_id"]
+    return names
+
+
+def is_session_operation(operation: Dict[str, Any]) -> bool:
+    """操作是否需要按表名访问会话中的文件"""
+    return operation.get("type") in SESSION_OPERATIONS or bool(operation.get("table"))
+
+
+def _needed_columns(operation: Dict[str, Any]) -> Optional[Set[str]]:
+    """跨表操作结果中需要的列：columns 中指定的列加上 then 引用的列，None 表示全部列"""
+    columns = set(_as_list(operation.get("columns")))
+    then = operation.get("then")
+    if not then:
+        return columns or None
+    then_columns = parse_operation(then).required_columns()
+    return None if then_columns is None else columns | then_columns
+
+
+def _as_list(value: Union[str, List[str], None]) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _table_path(tables: Dict[str, Path], name: str) -> Path:
+    if name not in tables:
+        raise ValueError(f"未知的数据表: {name}，可用的表: {', '.join(tables)}")
+    return tables[name]
+
+
+def _dataset(tables: Dict[str, Path], name: str) -> ds.Dataset:
+    return ds.dataset(_table_path(tables, name), format="parquet")
+
+
+def _read(dataset: ds.Dataset, columns: Optional[List[str]], filter: Optional[pc.Expression] = None) -> pa.Table:
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def _join_columns(
+    left: pa.Schema,
+    right: pa.Schema,
+    right_keys: List[str],
+    coalesce_keys: bool,
+    suffix: str
+) -> Dict[str, Tuple[str, str]]:
+    """
+    连接结果中的列名到来源的映射 {结果列名: ("left"/"right", 原列名)}
+
+    与 pandas merge(suffixes=("", suffix)) 一致：左表列名不变，右表中与左表重名的列加后缀，
+    on 指定的连接键合并为一列（归入左表）
+    """
+    columns = {name: ("left", name) for name in left.names}
+    for name in right.names:
+        if coalesce_keys and name in right_keys:
+            continue
+        columns[f"{name}{suffix}" if name in left.names else name] = ("right", name)
+    return columns
+
+
+def _pushdown_filters(
+    then: Optional[Dict[str, Any]],
+    how: str,
+    columns: Dict[str, Tuple[str, str]],
+    schemas: Dict[str, pa.Schema]
+) -> Dict[str, pc.Expression]:
+    """
+    then 为过滤操作时，把只涉及一侧原列名的条件下推到该侧的扫描，返回 {"left"/"right": 表达式}
+
+    只下推到不会因连接补空值而改变结果的一侧（inner 两侧、left 左表、right 右表），
+    过滤条件仍在连接后完整执行一次
+    """
+    if not then or then.get("type") != "filter":
+        return {}
+    try:
+        op = parse_operation(then)
+    except ValueError:
+        return {}
+    referenced = predicate_columns(op.predicate)
+    sides = {columns[name][0] for name in referenced if name in columns}
+    if len(sides) != 1 or not all(name in columns and columns[name][1] == name for name in referenced):
+        return {}
+    side = sides.pop()
+    if how != "inner" and how != side:
+        return {}
+    schema = schemas[side]
+    expression = translate_predicate(op.predicate, schema.names, dict(zip(schema.names, schema.types)))
+    return {} if expression is None else {side: expression}
+
+
+def _unify_keys(left: pa.Table, right: pa.Table, left_keys: List[str], right_keys: List[str]):
+    """连接键类型不同（如导入时缩小的整数类型、分类列）时转换为共同类型，Arrow 连接要求两侧键类型相同"""
+    for left_key, right_key in zip(left_keys, right_keys):
+        if left.schema.field(left_key).type == right.schema.field(right_key).type:
+            continue
+        types = [
+            t.value_type if pa.types.is_dictionary(t) else t
+            for t in (left.schema.field(left_key).type, right.schema.field(right_key).type)
+        ]
+        try:
+            common = pa.unify_schemas(
+                [pa.schema([pa.field("key", t)]) for t in types], promote_options="permissive"
+            ).field("key").type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            raise ValueError(f"连接键 {left_key} 和 {right_key} 的类型不兼容: {types[0]} 和 {types[1]}")
+        left = left.set_column(left.schema.get_field_index(left_key), left_key, left[left_key].cast(common))
+        right = right.set_column(right.schema.get_field_index(right_key), right_key, right[right_key].cast(common))
+    return left, right
+
+
+def _join(tables: Dict[str, Path], operation: Dict[str, Any], needed: Optional[Set[str]]) -> pd.DataFrame:
+    left_name, right_name = operation["left"], operation["right"]
+    left, right = _dataset(tables, left_name), _dataset(tables, right_name)
+    left_keys = _as_list(operation.get("left_on") or operation.get("on"))
+    right_keys = _as_list(operation.get("right_on") or operation.get("on"))
+    if not left_keys or len(left_keys) != len(right_keys):
+        raise ValueError("join 操作需要 on，或数量相同的 left_on 和 right_on")
+    how = operation.get("how", "inner")
+    if how not in _JOIN_TYPES:
+        raise ValueError(f"不支持的连接方式: {how}")
+    missing = [k for k in left_keys if k not in left.schema.names] + [k for k in right_keys if k not in right.schema.names]
+    if missing:
+        raise ValueError(f"连接 {left_name} 和 {right_name} 失败: 连接键不存在: {', '.join(missing)}")
+
+    suffix = f"_{right_name}"
+    coalesce_keys = left_keys == right_keys
+    columns = _join_columns(left.schema, right.schema, right_keys, coalesce_keys, suffix)
+
+    # 只读取连接键和后续操作引用的列；结果中加了后缀的列按来源映射回原列名，
+    # 引用了不存在的列时不裁剪，交由后续操作报告错误
+    left_columns, right_columns = None, None
+    if needed is not None and all(name in columns for name in needed):
+        sources = {columns[name] for name in needed}
+        left_columns = [c for c in left.schema.names if c in left_keys or ("left", c) in sources]
+        right_columns = [c for c in right.schema.names if c in right_keys or ("right", c) in sources]
+    filters = _pushdown_filters(operation.get("then"), how, columns, {"left": left.schema, "right": right.schema})
+
+    left_table, right_table = _unify_keys(
+        _read(left, left_columns, filters.get("left")),
+        _read(right, right_columns, filters.get("right")),
+        left_keys,
+        right_keys
+    )
+    # 右表的列按完整表结构中的映射命名，不依赖裁剪后是否仍有重名列
+    renames = {source: name for name, (side, source) in columns.items() if side == "right"}
+    right_table = right_table.rename_columns([renames.get(name, name) for name in right_table.column_names])
+    try:
+        # 在 Arrow 中完成连接，结果的行顺序不保证与输入一致
+        joined = left_table.join(
+            right_table,
+            keys=left_keys,
+            right_keys=[renames.get(key, key) for key in right_keys],
+            join_type=_ARROW_JOIN_TYPES[how],
+            coalesce_keys=coalesce_keys
+        )
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+        raise ValueError(f"连接 {left_name} 和 {right_name} 失败: {e}")
+    return joined.to_pandas()
+
+
+def _decode_mixed_dictionaries(parts: List[pa.Table]) -> List[pa.Table]:
+    """
+    同名列在一部分表中是分类（字典）类型、在另一部分表中不是时，把字典列解码为取值类型
+
+    导入时只有低基数的字符串列转换为分类类型，同一列在不同文件中可能一个是分类、一个是字符串，Arrow 无法直接合并
+    """
+    kinds: Dict[str, Set[bool]] = {}
+    for table in parts:
+        for field in table.schema:
+            kinds.setdefault(field.name, set()).add(pa.types.is_dictionary(field.type))
+    mixed = {name for name, flags in kinds.items() if len(flags) > 1}
+    if not mixed:
+        return parts
+    decoded = []
+    for table in parts:
+        for i, field in enumerate(table.schema):
+            if field.name in mixed and pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+        decoded.append(table)
+    return decoded
+
+
+def _union(tables: Dict[str, Path], operation: Dict[str, Any], needed: Optional[Set[str]]) -> pd.DataFrame:
+    names = _as_list(operation.get("tables"))
+    if len(names) < 2:
+        raise ValueError("union 操作至少需要两个表")
+    source_column = operation.get("source_column")
+
+    parts = []
+    for name in names:
+        dataset = _dataset(tables, name)
+        columns = None if needed is None else [c for c in dataset.schema.names if c in needed]
+        table = _read(dataset, columns)
+        if source_column:
+            table = table.append_column(
+                source_column, pa.array(np.full(table.num_rows, name, dtype=object), pa.string())
+            )
+        parts.append(table)
+    try:
+        # 按列名合并，缺少的列填充空值，数值类型按需提升
+        return pa.concat_tables(_decode_mixed_dictionaries(parts), promote_options="permissive").to_pandas()
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ValueError(f"合并 {', '.join(names)} 失败: {e}")
+
+
+def execute_session_operation(
+    tables: Dict[str, Path],
+    operation: Dict[str, Any]
+) -> Union[pd.DataFrame, Dict[str, Any]]:
+    """
+    在会话的多个数据表上执行数据处理指令
+
+    tables 为 {表名: parquet文件路径}。支持:
+    - {"type": "join", "left": 表名, "right": 表名, "on": [...] 或 "left_on"/"right_on",
+       "how": "inner/left/right/outer", "then": 后续单表操作}
+    - {"type": "union", "tables": [表名...], "source_column": 可选的来源列名, "then": 后续单表操作}
+    - 带 "table" 字段的单表操作，作用于指定的表
+
+    join/union 只读取连接键、columns 以及 then 引用的列，连接和合并在 Arrow 中完成，再由 process_dataframe 执行 then；
+    join 的 then 为过滤时，只涉及一侧列的条件下推到该侧的扫描
+    """
+    op_type = operation.get("type")
+    if op_type not in SESSION_OPERATIONS:
+        single = {k: v for k, v in operation.items() if k != "table"}
+        return execute_operation(_table_path(tables, operation.get("table")), single)
+
+    then = operation.get("then")
+    needed = _needed_columns(operation)
+    if needed is not None and op_type == "union":
+        needed.discard(operation.get("source_column"))
+
+    df = _join(tables, operation, needed) if op_type == "join" else _union(tables, operation, needed)
+    if then:
+        return process_dataframe(df, then)
+    return df
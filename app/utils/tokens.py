@@ -0,0 +1,20 @@
+import re
+
+# 近似 GPT 系列 BPE 分词的切分方式：每个汉字、连续字母、最多3位的数字、其他单个符号各算一段
+_SEGMENT = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]|[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    离线估算文本的 token 数，不依赖分词器和网络
+
+    英文单词较长时会被拆成多个 token，按每 6 个字母一个 token 计算。
+    结果用于控制提示词预算，只需量级准确
+    """
+    count = 0
+    for segment in _SEGMENT.findall(text):
+        if segment[0].isascii() and segment[0].isalpha():
+            count += (len(segment) + 5) // 6
+        else:
+            count += 1
+    return count
@@ -0,0 +1,103 @@
+"""
+近似查询基准测试：对比在完整数据文件上精确计算与在上传时抽取的样本上近似计算的耗时和误差
+
+用法:
+    python benchmarks/bench_approximate.py --rows 10000000 --sample-rows 200000
+
+生成订单数据写入parquet并抽取样本，逐个指令报告:
+- exact: execute_operation 只读取需要的列后精确计算（未加载到内存的大文件的查询路径）
+- approximate: 读取样本文件后 approximate_operation 计算（包含样本读取时间）
+- err/margin: 各估计值的绝对误差与误差范围之比的最大值；within: 精确值落在误差范围内的比例
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.schemas.operation import parse_operation
+from app.utils.approximate import approximate_operation, build_sample
+from app.utils.query_planner import execute_operation
+
+OPERATIONS = {
+    "describe": {"type": "statistical", "method": "describe", "columns": ["price", "quantity"]},
+    "correlation": {"type": "statistical", "method": "correlation", "columns": ["price", "quantity", "discount"]},
+    "groupby mean": {"type": "aggregation", "columns": ["city", "category"], "aggregations": {"price": ["mean", "sum"]}},
+    "histogram": {"type": "histogram", "column": "price", "bins": [0, 25, 50, 75, 100]},
+}
+
+
+def generate(path: Path, rows: int, block_rows: int = 1_000_000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(0)
+    writer = None
+    for start in range(0, rows, block_rows):
+        size = min(block_rows, rows - start)
+        table = pa.Table.from_pandas(pd.DataFrame({
+            "city": rng.choice(["北京", "上海", "广州", "深圳"], size),
+            "category": rng.choice(["家电", "服饰", "食品"], size),
+            "quantity": rng.integers(1, 20, size),
+            "price": rng.random(size) * 100,
+            "discount": rng.random(size),
+            "extra": rng.random(size),
+        }), preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table, row_group_size=100_000)
+    writer.close()
+
+
+def _values(result):
+    """把结果（或误差范围）展开为数值数组，用于比较；分组键和分箱边界不参与比较"""
+    if isinstance(result, dict):
+        return pd.DataFrame(result).astype(float).to_numpy()
+    return result.drop(columns=["bin_start", "bin_end"]).select_dtypes("number").to_numpy(dtype=float) \
+        if "bin_start" in result else result.select_dtypes("number").to_numpy(dtype=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--sample-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_path = Path(work_dir) / "data.parquet"
+        sample_path = Path(work_dir) / "sample.parquet"
+        generate(data_path, args.rows)
+        start = time.perf_counter()
+        build_sample(data_path, sample_path, args.sample_rows)
+        print(f"{args.rows:,} 行，抽样 {args.sample_rows:,} 行耗时 {time.perf_counter() - start:.2f}s")
+
+        print(f"{'operation':<14} {'exact s':>8} {'approx s':>9} {'err/margin':>11} {'within':>7}")
+        for name, operation in OPERATIONS.items():
+            op = parse_operation(operation)
+            start = time.perf_counter()
+            exact = execute_operation(data_path, op)
+            exact_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            approximate = approximate_operation(pd.read_parquet(sample_path), op, args.rows, 0.95)
+            approx_time = time.perf_counter() - start
+
+            expected, estimated = _values(exact), _values(approximate.result)
+            margins = _values(approximate.margins)
+            bounded = ~np.isnan(margins) & (margins > 0)
+            errors = np.abs(estimated - expected)[bounded]
+            print(
+                f"{name:<14} {exact_time:>8.3f} {approx_time:>9.3f} {np.max(errors / margins[bounded]):>11.2f} "
+                f"{np.mean(errors <= margins[bounded]):>7.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+会话上下文负载测试：使用 fakeredis 模拟 Redis，对比旧的整体 JSON 读写与当前的会话存储实现
+
+依赖 fakeredis 和 lupa（fakeredis 通过 lupa 执行 Lua 脚本）。
+
+用法:
+    python benchmarks/bench_context_load.py --sessions 200 --turns 10 --writers 2
+
+每个会话由 --writers 个并发写入者各追加 --turns 轮对话，统计:
+- 每个请求的 Redis 往返次数（按连接上发送的命令包计数）和发送字节数
+- 吞吐量（请求/秒）
+- 丢失的对话记录数
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import fakeredis
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio.connection import AbstractConnection
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.services.context_service import ContextService
+
+_round_trips = 0
+_bytes_sent = 0
+_original_send = AbstractConnection.send_packed_command
+
+
+async def _counting_send(self, command, check_health=True):
+    global _round_trips, _bytes_sent
+    _round_trips += 1
+    if isinstance(command, (bytes, str)):
+        command = [command]
+    _bytes_sent += sum(len(part) for part in command)
+    return await _original_send(self, command, check_health)
+
+
+class LegacyContextService(ContextService):
+    """旧实现：整个会话存为一个JSON字符串，GET、整体解码、修改、SET，没有并发保护"""
+
+    async def create_session(self, session_id):
+        session_data = {"session_id": session_id, "files": [], "conversation_history": []}
+        await self.redis.set(f"legacy:{session_id}", json.dumps(session_data))
+
+    async def get_context(self, session_id, include_history=True):
+        context = await self.redis.get(f"legacy:{session_id}")
+        return json.loads(context) if context else None
+
+    async def add_conversation(self, session_id, query, response, file_id=None):
+        context = await self.get_context(session_id)
+        context["conversation_history"].append({"query": query, "response": response, "file_id": file_id})
+        context["conversation_history"] = context["conversation_history"][-settings.MAX_CONVERSATION_HISTORY:]
+        await self.redis.set(f"legacy:{session_id}", json.dumps(context))
+
+
+def fake_pool() -> BlockingConnectionPool:
+    """与应用配置相同大小的阻塞连接池，底层连接替换为 fakeredis（fakeredis 较慢，不设等待超时）"""
+    template = fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool
+    return BlockingConnectionPool(
+        connection_class=template.connection_class,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=None,
+        **template.connection_kwargs
+    )
+
+
+async def run(service_cls, sessions: int, turns: int, writers: int, response_bytes: int):
+    global _round_trips, _bytes_sent
+    redis_module._pool = fake_pool()
+    settings.MAX_ACTIVE_SESSIONS = max(settings.MAX_ACTIVE_SESSIONS, sessions)
+    service = service_cls()
+    session_ids = [f"bench-{i}" for i in range(sessions)]
+    await asyncio.gather(*[service.create_session(sid) for sid in session_ids])
+
+    async def writer(session_id: str, writer_id: int):
+        worker = service_cls()
+        for turn in range(turns):
+            await worker.add_conversation(session_id, f"{writer_id}-{turn}", {"answer": "x" * response_bytes})
+
+    _round_trips = 0
+    _bytes_sent = 0
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        writer(sid, w) for sid in session_ids for w in range(writers)
+    ])
+    elapsed = time.perf_counter() - start
+    trips = _round_trips
+    sent = _bytes_sent
+
+    expected = min(turns * writers, settings.MAX_CONVERSATION_HISTORY)
+    lost = 0
+    for sid in session_ids:
+        context = await service.get_context(sid)
+        lost += expected - len(context["conversation_history"])
+
+    requests = sessions * turns * writers
+    await redis_module.close_redis_pool()
+    return requests, trips / requests, sent / requests, requests / elapsed, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--writers", type=int, default=2, help="每个会话的并发写入者数量")
+    parser.add_argument("--response-bytes", type=int, default=200, help="每轮回复内容的大小")
+    args = parser.parse_args()
+
+    AbstractConnection.send_packed_command = _counting_send
+    print(f"{'mode':<12} {'requests':>9} {'trips/req':>10} {'bytes/req':>10} {'req/s':>10} {'lost':>6}")
+    for label, service_cls in (("legacy", LegacyContextService), ("current", ContextService)):
+        requests, trips, sent, throughput, lost = asyncio.run(run(
+            service_cls, args.sessions, args.turns, args.writers, args.response_bytes
+        ))
+        print(f"{label:<12} {requests:>9} {trips:>10.2f} {sent:>10.0f} {throughput:>10.0f} {lost:>6}")
+
+
+if __name__ == "__main__":
+    main()
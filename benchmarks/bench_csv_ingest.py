@@ -0,0 +1,123 @@
+"""
+CSV 上传入库基准测试：对比旧的整文件缓冲方式与流式分块入库的峰值内存和耗时
+
+用法:
+    python benchmarks/bench_csv_ingest.py --sizes 10,100,1024
+
+每个 (模式, 文件大小) 组合在独立子进程中运行，峰值内存取子进程的 ru_maxrss。
+旧方式在 8KB 循环中使用 bytes 拼接，复制代价是平方级的，超过 --legacy-max-mb 的文件默认跳过。
+"""
+import argparse
+import asyncio
+import io
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+LEGACY_READ_SIZE = 8192
+
+
+def generate_csv(path: Path, target_bytes: int, block_rows: int = 200_000):
+    """生成指定大小的合成CSV文件"""
+    rng = np.random.default_rng(42)
+    categories = np.array(["北京", "上海", "广州", "深圳", "杭州", "成都"])
+    written = 0
+    start_id = 0
+    with open(path, "w", encoding="utf-8") as f:
+        header = True
+        while written < target_bytes:
+            block = pd.DataFrame({
+                "id": np.arange(start_id, start_id + block_rows),
+                "price": rng.normal(100, 25, block_rows).round(2),
+                "quantity": rng.integers(1, 500, block_rows),
+                "city": categories[rng.integers(0, len(categories), block_rows)],
+                "sku": rng.integers(0, 10**9, block_rows).astype(str),
+            })
+            text = block.to_csv(index=False, header=header)
+            f.write(text)
+            written += len(text.encode("utf-8"))
+            start_id += block_rows
+            header = False
+
+
+def run_legacy(csv_path: str, out_dir: str):
+    """旧方式：整文件拼接到内存，pd.read_csv 后整表写 parquet 并统计"""
+    content = b""
+    with open(csv_path, "rb") as f:
+        while chunk := f.read(LEGACY_READ_SIZE):
+            content += chunk
+    df = pd.read_csv(io.BytesIO(content))
+    df.memory_usage(deep=True).sum()
+    [(df[c].isnull().sum(), df[c].nunique()) for c in df.columns]
+    df.describe().to_dict()
+    df.isnull().sum().to_dict()
+    df.to_parquet(Path(out_dir) / "data.parquet")
+
+
+def run_streaming(csv_path: str, out_dir: str):
+    """新方式：分块写入临时文件，再由 FileService.process_csv 分块入库"""
+    from app.core.config import settings
+    from app.services.file_service import FileService
+
+    service = FileService()
+    service.base_dir = Path(out_dir)
+    with tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_SIZE) as spool:
+        with open(csv_path, "rb") as f:
+            while chunk := f.read(settings.UPLOAD_READ_CHUNK_SIZE):
+                spool.write(chunk)
+        result = asyncio.run(service.process_csv("bench", "bench.csv", spool))
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+
+
+def _child(mode: str, csv_path: str, out_dir: str, queue):
+    runner = run_legacy if mode == "legacy" else run_streaming
+    start = time.perf_counter()
+    runner(csv_path, out_dir)
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def measure(mode: str, csv_path: Path):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    with tempfile.TemporaryDirectory() as out_dir:
+        proc = ctx.Process(target=_child, args=(mode, str(csv_path), out_dir, queue))
+        proc.start()
+        elapsed, max_rss_kb = queue.get()
+        proc.join()
+    return elapsed, max_rss_kb / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1024", help="CSV大小列表（MB），逗号分隔")
+    parser.add_argument("--legacy-max-mb", type=int, default=100, help="旧方式测试的最大文件大小（MB）")
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'mode':>10} {'wall(s)':>10} {'peak RSS(MB)':>14}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size_mb in [int(s) for s in args.sizes.split(",")]:
+            csv_path = Path(work_dir) / f"bench_{size_mb}mb.csv"
+            generate_csv(csv_path, size_mb * 1024 * 1024)
+            for mode in ("legacy", "streaming"):
+                if mode == "legacy" and size_mb > args.legacy_max_mb:
+                    print(f"{size_mb:>6}MB {mode:>10} {'skipped':>10} {'-':>14}")
+                    continue
+                elapsed, peak_mb = measure(mode, csv_path)
+                print(f"{size_mb:>6}MB {mode:>10} {elapsed:>10.2f} {peak_mb:>14.1f}")
+            csv_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+数据处理执行器基准测试：在处理大文件上传的同时发送并发分析请求，统计分析请求的延迟分布
+
+用法:
+    python benchmarks/bench_executor_latency.py --upload-mb 100 --rate 20
+
+依赖 fakeredis、lupa 和 httpx。LLM 调用替换为固定延迟的桩函数，
+分析请求对一个小文件执行分组聚合。分别以 inline（在事件循环中直接执行，即旧行为）
+和 thread（有界线程池）模式运行，按固定速率发送分析请求，
+报告上传期间分析请求的 p50 / p99 / 最大延迟和被拒绝的请求数。
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fakeredis
+import httpx
+import numpy as np
+import pandas as pd
+from redis.asyncio import BlockingConnectionPool
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.core.executor import dataframe_executor
+from app.core.llm import LLMManager
+from app.main import app
+from app.services.context_service import ContextService
+
+OPERATION = {
+    "type": "aggregation", "method": "groupby", "columns": ["category"],
+    "agg_func": "mean", "target_columns": ["value"],
+}
+
+
+async def fake_analyze(self, query, context, data_context=None):
+    await asyncio.sleep(0.02)
+    return {"answer": "ok", "data_operation": OPERATION}
+
+
+def generate_csv(size_mb: int) -> bytes:
+    """生成约 size_mb 大小的CSV"""
+    rng = np.random.default_rng(0)
+    rows = size_mb * 1024 * 1024 // 60
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "category": rng.choice(["A", "B", "C", "D"], rows),
+        "value": rng.random(rows),
+        "amount": rng.integers(0, 1_000_000, rows),
+        "label": rng.choice(["north", "south", "east", "west"], rows),
+    })
+    return df.to_csv(index=False).encode()
+
+
+def fake_pool() -> BlockingConnectionPool:
+    template = fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool
+    return BlockingConnectionPool(
+        connection_class=template.connection_class,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=None,
+        **template.connection_kwargs
+    )
+
+
+async def run(kind: str, upload: bytes, rate: float):
+    redis_module._pool = fake_pool()
+    dataframe_executor.shutdown()
+    dataframe_executor.kind = kind
+    await ContextService().create_session("bench")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        small = generate_csv(1)
+        response = await client.post(
+            "/api/v1/upload/csv/bench", files={"file": ("small.csv", small, "text/csv")}
+        )
+        file_id = response.json()["file_id"]
+        payload = {"session_id": "bench", "query": "各类别的平均值", "data_context": {"file_id": file_id}}
+        # 预热：加载小文件到DataFrame缓存
+        await client.post("/api/v1/chat/analyze", json=payload)
+
+        latencies = []
+        rejected = 0
+        upload_finished_at = None
+
+        async def chat_request(scheduled: float):
+            nonlocal rejected
+            response = await client.post("/api/v1/chat/analyze", json=payload)
+            if response.status_code == 503:
+                rejected += 1
+            else:
+                latencies.append(time.perf_counter() - scheduled)
+
+        async def chat_load():
+            # 开环负载：按固定速率发送请求，延迟从计划发送时间算起，
+            # 事件循环被阻塞期间本应发出的请求在恢复后立即补发，等待时间计入延迟
+            tasks = []
+            start = time.perf_counter()
+            i = 0
+            while True:
+                scheduled = start + i / rate
+                if upload_finished_at is not None and scheduled > upload_finished_at:
+                    break
+                await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+                tasks.append(asyncio.ensure_future(chat_request(scheduled)))
+                i += 1
+            await asyncio.gather(*tasks)
+
+        async def big_upload():
+            nonlocal upload_finished_at
+            start = time.perf_counter()
+            await asyncio.sleep(0.1)
+            response = await client.post(
+                "/api/v1/upload/csv/bench", files={"file": ("big.csv", io.BytesIO(upload), "text/csv")}
+            )
+            assert response.status_code == 200, response.text
+            upload_finished_at = time.perf_counter()
+            return upload_finished_at - start
+
+        results = await asyncio.gather(big_upload(), chat_load())
+
+    await redis_module.close_redis_pool()
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return results[0], len(latencies), statistics.median(latencies), p99, latencies[-1], rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upload-mb", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=20, help="每秒发送的分析请求数")
+    args = parser.parse_args()
+
+    LLMManager.analyze = fake_analyze
+    settings.UPLOAD_DIRECTORY = Path(tempfile.mkdtemp())
+    settings.MAX_FILES_PER_SESSION = 100
+    upload = generate_csv(args.upload_mb)
+
+    print(f"{'mode':<8} {'upload(s)':>10} {'requests':>9} {'p50(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9} {'rejected':>9}")
+    for kind in ("inline", "thread"):
+        upload_time, count, p50, p99, worst, rejected = asyncio.run(run(kind, upload, args.rate))
+        print(
+            f"{kind:<8} {upload_time:>10.1f} {count:>9} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} "
+            f"{worst * 1000:>9.1f} {rejected:>9}"
+        )
+    dataframe_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
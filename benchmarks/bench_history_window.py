@@ -0,0 +1,88 @@
+"""
+对话历史窗口基准测试：对比把完整对话记录附加到消息中与按 token 预算组装的对话历史
+
+用法:
+    python benchmarks/bench_history_window.py --turns 5 10 25 50 --rows 100
+
+模拟一个会话，每轮回答带有 rows 行的结果表，按会话长度报告:
+- 原方式：每轮问题和完整回答（JSON，含结果表）原样附加时的估算 token 数
+- 新方式：最近几轮原样保留、结果表压缩为摘要、更早的对话折叠为滚动摘要后的估算 token 数
+- 组装耗时：沿用上一轮的摘要状态与每次从头生成摘要
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.core.config import settings
+from app.core.history import build_history_messages, normalize_turns
+from app.utils.tokens import estimate_tokens
+
+
+def make_turn(i: int, rows: int):
+    return {
+        "turn_id": f"turn-{i}",
+        "query": f"第{i}轮：按城市统计 2023 年第 {i % 4 + 1} 季度的销售额和订单数，并按销售额排序",
+        "response": {
+            "answer": f"第 {i % 4 + 1} 季度销售额最高的是城市 c0，共 {1000 + i} 万元。订单数与销售额基本正相关。",
+            "data_results": {
+                "processed_data": [
+                    {"city": f"c{r}", "sales": round(1000.0 / (r + 1), 2), "orders": 500 - r}
+                    for r in range(rows)
+                ],
+                "data_type": "table",
+                "suggested_viz_type": "bar",
+            },
+            "code_snippet": "df[df.quarter == q].groupby('city')[['sales', 'orders']].sum().sort_values('sales')",
+            "suggestions": ["查看月度趋势", "比较不同城市的客单价"],
+        },
+    }
+
+
+def legacy_tokens(turns) -> int:
+    """原方式：问题和完整回答原样附加"""
+    return sum(
+        estimate_tokens(turn["query"]) + estimate_tokens(json.dumps(turn["response"], ensure_ascii=False)) + 8
+        for turn in turns
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[5, 10, 25, 50])
+    parser.add_argument("--rows", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"预算 {settings.HISTORY_TOKEN_BUDGET} tokens，原样保留 {settings.HISTORY_VERBATIM_TURNS} 轮，"
+        f"摘要预算 {settings.HISTORY_SUMMARY_TOKEN_BUDGET} tokens，每轮结果 {args.rows} 行"
+    )
+    stored = [make_turn(i, args.rows) for i in range(max(args.turns))]
+    for count in args.turns:
+        # 逐轮推进会话，沿用上一轮的摘要状态
+        state = None
+        incremental = 0.0
+        for n in range(1, count + 1):
+            window = stored[max(0, n - settings.HISTORY_LOAD_TURNS):n]
+            start = time.perf_counter()
+            messages, state = build_history_messages(normalize_turns(window), state)
+            incremental += time.perf_counter() - start
+
+        start = time.perf_counter()
+        build_history_messages(normalize_turns(stored[max(0, count - settings.HISTORY_LOAD_TURNS):count]))
+        cold = time.perf_counter() - start
+
+        after = sum(estimate_tokens(m["content"]) + 4 for m in messages)
+        print(
+            f"{count:>4} 轮  原方式 {legacy_tokens(stored[:count]):>8} tokens  新方式 {after:>5} tokens  "
+            f"组装耗时: 沿用摘要 {incremental / count * 1000:.2f} ms/轮, 从头生成 {cold * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
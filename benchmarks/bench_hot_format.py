@@ -0,0 +1,124 @@
+"""
+热格式基准测试：多个工作进程加载同一数据集时，parquet 与内存映射的 Arrow IPC 文件的加载耗时和内存占用
+
+用法:
+    python benchmarks/bench_hot_format.py --rows 24000000 --workers 4
+
+生成约 1GB（加载到 pandas 后）的订单数据，写入 data.parquet 和 data.arrow（FileService._write_hot_file），
+然后分别启动 --workers 个进程同时加载（parquet: pd.read_parquet，arrow: FileService._read_hot_file），
+每个进程报告:
+- 加载耗时
+- 加载后、以及遍历所有列（求和/计数）后的 RSS 和 PSS（按共享进程数分摊共享页面后的占用，读取 /proc/self/smaps_rollup）
+
+两种格式测试前都先顺序读取一遍文件，使其位于页缓存中，对比的是解码/映射本身的开销
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services.file_service import FileService
+
+
+def generate(path: Path, rows: int):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "order_id": np.arange(rows),
+        "city": pd.Categorical(rng.choice(["北京", "上海", "广州", "深圳"], rows)),
+        "quantity": rng.integers(1, 100, rows).astype("int16"),
+        "price": rng.normal(100, 25, rows).round(2),
+        "created_at": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 86400 * 365, rows), unit="s"),
+        "sku": pd.Series(rng.integers(0, 10**6, rows)).map("SKU-{:06d}".format).astype("str"),
+    })
+    size = df.memory_usage(deep=True).sum()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    del df
+    pq.write_table(table, path / "data.parquet", row_group_size=1_000_000, compression="zstd")
+    FileService._write_hot_file(path / "data.parquet", path / "data.arrow")
+    return size
+
+
+def _memory() -> dict:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) * 1024
+    return values
+
+
+def worker(fmt: str, path: str, barrier, queue):
+    load = FileService._read_hot_file if fmt == "arrow" else pd.read_parquet
+    file_path = Path(path) / ("data.arrow" if fmt == "arrow" else "data.parquet")
+    before = _memory()
+    barrier.wait()
+    start = time.perf_counter()
+    df = load(file_path)
+    elapsed = time.perf_counter() - start
+    loaded = _memory()
+    for name in df.columns:
+        column = df[name]
+        column.sum() if pd.api.types.is_numeric_dtype(column) else column.count()
+    barrier.wait()  # 所有进程都映射了全部页面后再统计 PSS
+    queue.put((elapsed, before, loaded, _memory()))
+    barrier.wait()
+
+
+def run(fmt: str, path: Path, workers: int):
+    with open(path / ("data.arrow" if fmt == "arrow" else "data.parquet"), "rb") as f:
+        while f.read(1 << 24):
+            pass
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(fmt, str(path), barrier, queue)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    mb = 2**20
+    print(f"\n{fmt}（{workers} 个进程）")
+    print(f"{'加载耗时':>10} {'加载后RSS':>10} {'遍历后RSS':>10} {'遍历后PSS':>10}")
+    for elapsed, before, loaded, scanned in results:
+        print(
+            f"{elapsed:>9.3f}s {(loaded['Rss'] - before['Rss']) / mb:>8.0f}MB "
+            f"{(scanned['Rss'] - before['Rss']) / mb:>8.0f}MB {(scanned['Pss'] - before['Pss']) / mb:>8.0f}MB"
+        )
+    total = sum(scanned["Pss"] - before["Pss"] for _, before, _, scanned in results)
+    print(f"平均加载 {np.mean([r[0] for r in results]):.3f}s，合计 PSS {total / mb:.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=24_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = Path(work_dir)
+        size = generate(path, args.rows)
+        print(
+            f"{args.rows:,} 行，pandas {size / 2**20:.0f}MB，parquet {(path / 'data.parquet').stat().st_size / 2**20:.0f}MB，"
+            f"arrow {(path / 'data.arrow').stat().st_size / 2**20:.0f}MB"
+        )
+        for fmt in ("parquet", "arrow"):
+            run(fmt, path, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+导入类型优化基准测试：对比基本类型（int64/float64/str）与优化后的类型（缩小的整数、分类列、时间列）
+写入的parquet在加载时的耗时、峰值内存和 DataFrame 内存占用
+
+用法:
+    python benchmarks/bench_ingest_dtypes.py --rows 2000000
+
+生成订单CSV后分别按以下配置入库，每个配置的加载在独立子进程中运行，峰值内存取子进程的 ru_maxrss:
+- baseline: 不做类型优化，snappy 压缩（原实现）
+- optimized (snappy): 类型优化，snappy 压缩
+- optimized (zstd): 类型优化，zstd 压缩（默认配置）
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.utils.csv_ingest import infer_csv_dtypes, write_csv_to_parquet
+
+CHUNK_ROWS = 100_000
+
+CONFIGS = {
+    "baseline": {"optimize": False, "compression": "snappy"},
+    "optimized (snappy)": {"optimize": True, "compression": "snappy"},
+    "optimized (zstd)": {"optimize": True, "compression": "zstd"},
+}
+
+
+def generate_csv(path: Path, rows: int, queue):
+    rng = np.random.default_rng(0)
+    cities = np.array(["北京", "上海", "广州", "深圳", "杭州", "成都"])
+    categories = np.array(["家电", "服饰", "食品", "图书", "数码"])
+    pd.DataFrame({
+        "order_id": np.arange(rows),
+        "city": cities[rng.integers(0, len(cities), rows)],
+        "category": categories[rng.integers(0, len(categories), rows)],
+        "quantity": rng.integers(1, 100, rows),
+        "price": rng.normal(100, 25, rows).round(2),
+        "order_date": (pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")).strftime("%Y-%m-%d"),
+        "sku": rng.integers(0, 10**9, rows).astype(str),
+    }).to_csv(path, index=False)
+    queue.put(None)
+
+
+def ingest(csv_path: Path, out_path: Path, optimize: bool, compression: str, queue):
+    start = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        dtypes = infer_csv_dtypes(
+            f, CHUNK_ROWS, max_categories=10_000 if optimize else 0, downcast_ints=optimize, parse_dates=optimize
+        )
+        write_csv_to_parquet(f, out_path, dtypes, CHUNK_ROWS, compression)
+    queue.put(time.perf_counter() - start)
+
+
+def load(path: Path, queue):
+    start = time.perf_counter()
+    df = pd.read_parquet(path)
+    elapsed = time.perf_counter() - start
+    memory = int(df.memory_usage(deep=True).sum())
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, memory))
+
+
+def run(target, *args):
+    """在独立子进程中运行，父进程保持很小，子进程的 ru_maxrss 不受父进程影响"""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        csv_path = work_dir / "orders.csv"
+        run(generate_csv, csv_path, args.rows)
+        print(f"{args.rows:,} 行，CSV {csv_path.stat().st_size / 2**20:.0f}MB")
+        print(f"{'config':<20} {'ingest s':>9} {'parquet MB':>11} {'load s':>7} {'peak RSS MB':>12} {'frame MB':>9}")
+        for name, config in CONFIGS.items():
+            out_path = work_dir / f"{name.split()[0]}_{config['compression']}.parquet"
+            ingest_time = run(ingest, csv_path, out_path, config["optimize"], config["compression"])
+            load_time, peak_mb, memory = run(load, out_path)
+            print(
+                f"{name:<20} {ingest_time:>9.2f} {out_path.stat().st_size / 2**20:>11.1f} "
+                f"{load_time:>7.3f} {peak_mb:>12.1f} {memory / 2**20:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
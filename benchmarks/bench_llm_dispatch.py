@@ -0,0 +1,153 @@
+"""
+LLM 调度基准测试：在本地兼容 OpenAI 接口的假 LLM 服务上，对比直接调用与经过 LLMDispatcher 调用
+
+用法:
+    python benchmarks/bench_llm_dispatch.py --requests 300 --latency 0.2 --capacity 16 --error-rate 0.05
+
+假服务在独立子进程中运行，每个请求等待 latency 秒（加少量随机抖动）后返回，并注入错误:
+- 同时处理的请求超过 capacity 时返回 429（附带 Retry-After），模拟服务商的并发/速率限制
+- 其余请求以 error-rate 的概率返回 503
+
+同时发出 requests 个请求，其中 duplicate-ratio 比例是相同的提示词（如多个用户同时问同一个问题）:
+- direct: OpenAIChatClient 直接调用（SDK 不重试），突发请求超出服务容量的部分直接失败
+- dispatcher: 经过 LLMDispatcher，限制并发、合并相同请求、对 429/5xx 退避重试
+报告成功/失败数、实际发送到服务的请求数、总耗时和请求耗时分位数
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+
+def serve(port: int, latency: float, capacity: int, error_rate: float):
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    state = {"active": 0, "received": 0}
+    rng = random.Random(0)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state["received"] += 1
+        if state["active"] >= capacity:
+            return JSONResponse({"error": {"message": "rate limited"}}, status_code=429, headers={"Retry-After": "0.1"})
+        state["active"] += 1
+        try:
+            await asyncio.sleep(latency * rng.uniform(0.8, 1.2))
+        finally:
+            state["active"] -= 1
+        if rng.random() < error_rate:
+            return JSONResponse({"error": {"message": "overloaded"}}, status_code=503)
+        content = body["messages"][-1]["content"]
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 50, "total_tokens": 100},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return state
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(base_url: str):
+    import httpx
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                return (await client.get(f"{base_url}/stats")).json()["received"]
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("假 LLM 服务未能启动")
+
+
+async def run(mode: str, prompts, base_url: str):
+    import httpx
+    from app.core.config import settings
+    from app.core.llm import OpenAIChatClient
+    from app.core.llm_dispatch import LLMDispatcher
+
+    settings.OPENAI_BASE_URL = f"{base_url}/v1"
+    client = OpenAIChatClient()
+    dispatcher = LLMDispatcher(
+        max_concurrency=settings.LLM_MAX_CONCURRENCY * 2, requests_per_minute=0, tokens_per_minute=0,
+        timeout=10, max_retries=6, backoff_base=0.1, backoff_max=2
+    )
+    received_before = await _wait_ready(base_url)
+
+    async def one(prompt):
+        messages = [{"role": "user", "content": prompt}]
+        start = time.perf_counter()
+        try:
+            if mode == "direct":
+                await client.complete("gpt-fake", messages, 0.2, 100)
+            else:
+                await dispatcher.complete(client, "gpt-fake", messages, 0.2, 100)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[one(p) for p in prompts])
+    elapsed = time.perf_counter() - start
+    await client._get_client().close()
+    async with httpx.AsyncClient() as http:
+        received = (await http.get(f"{base_url}/stats")).json()["received"] - received_before
+    ok = np.array([l for l in latencies if l is not None])
+    return len(ok), len(prompts) - len(ok), received, elapsed, np.percentile(ok, 50), np.percentile(ok, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--capacity", type=int, default=16)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    prompts = [
+        "各城市的平均销售额" if rng.random() < args.duplicate_ratio else f"问题 {i}"
+        for i in range(args.requests)
+    ]
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = mp.get_context("spawn").Process(
+        target=serve, args=(port, args.latency, args.capacity, args.error_rate), daemon=True
+    )
+    server.start()
+    try:
+        print(f"{args.requests} 个并发请求，服务容量 {args.capacity}，延迟 {args.latency}s，503 比例 {args.error_rate:.0%}")
+        print(f"{'mode':<11} {'ok':>5} {'failed':>7} {'sent':>6} {'wall s':>7} {'p50 s':>7} {'p95 s':>7}")
+        for mode in ("direct", "dispatcher"):
+            ok, failed, sent, elapsed, p50, p95 = asyncio.run(run(mode, prompts, base_url))
+            print(f"{mode:<11} {ok:>5} {failed:>7} {sent:>6} {elapsed:>7.2f} {p50:>7.2f} {p95:>7.2f}")
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
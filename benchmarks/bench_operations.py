@@ -0,0 +1,99 @@
+"""
+数据处理指令基准测试：按操作类型对比 process_dataframe 与等价的直接 pandas 写法
+
+用法:
+    python benchmarks/bench_operations.py --rows 1000000 10000000 --repeat 3
+
+对每个行数生成订单数据，逐个操作类型报告最短耗时:
+- engine: process_dataframe（校验指令、检查列后执行）
+- baseline: 原实现或最直接的 pandas 写法（filter 为 df.query，top_k 为完整排序后取前 k 行，
+  histogram 为 pd.cut + value_counts）
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.utils.data_processor import process_dataframe
+
+QUERY = "city in ['北京', '上海'] and price > 50 and quantity * price >= 200"
+
+CASES = {
+    "filter": (
+        {"type": "filter", "query": QUERY},
+        lambda df: df.query(QUERY),
+    ),
+    "aggregation": (
+        {"type": "aggregation", "columns": ["city", "category"], "aggregations": {"price": ["sum", "mean"], "quantity": ["max"]}},
+        lambda df: df.groupby(["city", "category"]).agg(
+            price_sum=("price", "sum"), price_mean=("price", "mean"), quantity_max=("quantity", "max")
+        ).reset_index(),
+    ),
+    "top_k": (
+        {"type": "top_k", "columns": ["price"], "k": 100},
+        lambda df: df.sort_values("price", ascending=False).head(100),
+    ),
+    "histogram": (
+        {"type": "histogram", "column": "price", "bins": 50},
+        lambda df: pd.cut(df["price"], 50).value_counts(sort=False),
+    ),
+    "pivot": (
+        {"type": "pivot", "index": ["city"], "columns": ["category"], "values": ["price"], "agg_func": "sum"},
+        lambda df: df.pivot_table(index="city", columns="category", values="price", aggfunc="sum").reset_index(),
+    ),
+    "rolling": (
+        {"type": "rolling", "columns": ["price"], "window": 7, "func": "mean", "order_by": "order_time"},
+        lambda df: df.sort_values("order_time")["price"].rolling(7).mean(),
+    ),
+    "resample": (
+        {"type": "resample", "on": "order_time", "rule": "D", "target_columns": ["price"], "agg_func": "sum"},
+        lambda df: df.resample("D", on="order_time")["price"].sum().reset_index(),
+    ),
+}
+
+
+def generate(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "city": rng.choice(["北京", "上海", "广州", "深圳"], rows),
+        "category": rng.choice(["家电", "服饰", "食品"], rows),
+        "quantity": rng.integers(1, 20, rows),
+        "price": rng.random(rows) * 100,
+        "order_time": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, rows), unit="s"),
+    })
+
+
+def _best(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        df = generate(rows)
+        print(f"\n{rows:,} 行")
+        print(f"{'operation':<12} {'engine s':>9} {'baseline s':>11}")
+        for name, (operation, baseline) in CASES.items():
+            engine_time = _best(lambda: process_dataframe(df, operation), args.repeat)
+            baseline_time = _best(lambda: baseline(df), args.repeat)
+            print(f"{name:<12} {engine_time:>9.3f} {baseline_time:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
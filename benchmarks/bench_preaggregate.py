@@ -0,0 +1,90 @@
+"""
+预聚合索引基准测试：对比 process_dataframe 在已加载数据上执行与 FileIndex 用上传时建立的索引回答
+
+用法:
+    python benchmarks/bench_preaggregate.py --rows 1000000 --repeat 3
+
+生成订单数据并建立索引，逐个指令报告最短耗时:
+- engine: pd.read_parquet 读取整个文件后 process_dataframe（未命中索引时的路径）
+- engine (loaded): 数据已在内存中时 process_dataframe 的耗时
+- index: FileIndex.answer 只读取索引文件和结果行所在的行组
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.schemas.operation import parse_operation
+from app.utils.data_processor import process_dataframe
+from app.utils.file_index import FileIndex, build_file_index
+from app.utils.profiler import profile_parquet
+
+OPERATIONS = {
+    "aggregation": {"type": "aggregation", "columns": ["city"], "aggregations": {"price": ["sum", "mean", "max"]}},
+    "top_k": {"type": "top_k", "columns": ["price"], "k": 100},
+    "sort+limit": {"type": "sort", "columns": ["quantity"], "ascending": True, "limit": 50},
+    "range filter": {"type": "filter", "query": "price > 99.9"},
+    "member filter": {"type": "filter", "query": "category == '食品'", "limit": 1000},
+}
+
+
+def generate(path: Path, rows: int):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "city": rng.choice(["北京", "上海", "广州", "深圳"], rows),
+        "category": rng.choice(["家电", "服饰", "食品"], rows),
+        "quantity": rng.integers(1, 10_000, rows),
+        "price": rng.random(rows) * 100,
+    })
+    for i in range(6):
+        df[f"extra_{i}"] = rng.random(rows)
+    df.to_parquet(path, row_group_size=100_000)
+
+
+def _best(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        path = work_dir / "data.parquet"
+        generate(path, args.rows)
+
+        start = time.perf_counter()
+        profile = profile_parquet(path, 5, 1_000_000, 100_000)
+        build_file_index(path, profile, work_dir / "index", 1000, 8, 8)
+        print(f"建立索引: {time.perf_counter() - start:.2f}s")
+
+        index = FileIndex.load(work_dir / "index")
+        df = pd.read_parquet(path)
+        print(f"{'operation':<14} {'engine s':>9} {'loaded s':>9} {'index s':>9}")
+        for name, operation in OPERATIONS.items():
+            op = parse_operation(operation)
+            assert index.answer(op, path) is not None, name
+            engine_time = _best(lambda: process_dataframe(pd.read_parquet(path), op), args.repeat)
+            loaded_time = _best(lambda: process_dataframe(df, op), args.repeat)
+            index_time = _best(lambda: index.answer(op, path), args.repeat)
+            print(f"{name:<14} {engine_time:>9.3f} {loaded_time:>9.3f} {index_time:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+列统计基准测试：对比原来基于 pandas 的统计方式与逐列 Arrow 统计
+
+用法:
+    python benchmarks/bench_profiling.py --rows 1000000 --columns 100
+
+原实现对整表分别执行 isnull().sum()、nunique()、describe() 和 memory_usage(deep=True)，
+每个统计量都要遍历一遍数据。新实现每列只读取一次，在 Arrow 数组上计算全部统计量，
+分别以精确模式和近似模式（高基数非数值列用 HyperLogLog 去重、抽样估算高频值）运行，
+报告耗时和峰值内存。
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.profiler import profile_parquet
+
+
+def generate_parquet(path: Path, rows: int, columns: int):
+    """数值列、低基数整数列、类别字符串列和高基数字符串列按 6:2:1:1 混合"""
+    rng = np.random.default_rng(0)
+    data = {}
+    for i in range(columns):
+        kind = i % 10
+        if kind < 6:
+            data[f"metric_{i}"] = rng.random(rows)
+        elif kind < 8:
+            data[f"code_{i}"] = rng.integers(0, 1000, rows)
+        elif kind == 8:
+            data[f"category_{i}"] = rng.choice(["north", "south", "east", "west", None], rows)
+        else:
+            data[f"user_{i}"] = pd.Series(rng.integers(0, rows, rows)).map("user-{}".format)
+    pd.DataFrame(data).to_parquet(path, row_group_size=100_000)
+
+
+def legacy_profile(path: Path):
+    """原实现：整表加载后逐列统计，再生成摘要"""
+    df = pd.read_parquet(path)
+    columns = [
+        {
+            "name": col,
+            "type": str(df[col].dtype),
+            "null_count": df[col].isnull().sum(),
+            "unique_count": df[col].nunique()
+        }
+        for col in df.columns
+    ]
+    summary = {
+        "row_count": len(df),
+        "column_count": len(df.columns),
+        "memory_usage": df.memory_usage(deep=True).sum(),
+        "basic_stats": df.describe().to_dict(),
+        "missing_values": df.isnull().sum().to_dict()
+    }
+    df.memory_usage(deep=True)
+    return columns, summary
+
+
+def _measure(mode: str, path: Path, top_k: int, rows: int, queue):
+    runs = {
+        "legacy (pandas)": lambda: legacy_profile(path),
+        "profile (exact)": lambda: profile_parquet(path, top_k, rows + 1, 100_000),
+        "profile (approx)": lambda: profile_parquet(path, top_k, 0, 100_000),
+    }
+    start = time.perf_counter()
+    runs[mode]()
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = Path(work_dir) / "data.parquet"
+        # 生成数据和每种统计方式都在独立进程中运行，峰值内存互不影响
+        # （子进程会继承父进程的峰值内存记录，父进程本身不能加载大数据）
+        context = multiprocessing.get_context("spawn")
+        generator = context.Process(target=generate_parquet, args=(path, args.rows, args.columns))
+        generator.start()
+        generator.join()
+
+        print(f"{'mode':<18} {'seconds':>8} {'peak RSS(MB)':>13}")
+        for mode in ("legacy (pandas)", "profile (exact)", "profile (approx)"):
+            queue = context.Queue()
+            process = context.Process(target=_measure, args=(mode, path, args.top_k, args.rows, queue))
+            process.start()
+            elapsed, peak = queue.get()
+            process.join()
+            print(f"{mode:<18} {elapsed:>8.2f} {peak:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+提示词数据描述基准测试：对比原来直接嵌入 data_info JSON 的系统提示词与按预算生成的数据描述
+
+用法:
+    python benchmarks/bench_prompt_context.py --rows 2000 --columns 20 200 2000
+
+对每种列数导入一个 CSV，报告:
+- 原系统提示词（数据信息 JSON 位于分析要求之前，包含 column_stats）和新系统提示词的估算 token 数
+- 两种提示词与另一个列名不同的文件的提示词的公共前缀长度（服务端提示词缓存按前缀匹配）
+- 每次请求获取数据描述的耗时：读取预先生成的结果、按引用列重新生成以及命中进程内缓存
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.core.config import settings
+from app.core.llm import LLMManager
+from app.db.database import Base, engine
+from app.services.file_service import FileService
+from app.utils.tokens import estimate_tokens
+
+
+def legacy_system_prompt(data_info) -> str:
+    """原实现：数据信息 JSON 位于固定的分析要求之前"""
+    return f"""你是一个数据分析助手。请根据用户的问题，生成相应的数据处理方案。
+数据信息: {json.dumps(data_info, ensure_ascii=False, default=str)}
+
+你需要返回以下格式的 JSON 响应:
+{{
+    "answer": "对分析结果的解释",
+    "data_operation": {{
+        "type": "操作类型(aggregation/filter/sort/statistical)",
+        "method": "具体方法",
+        "columns": ["涉及的列"],
+        "additional_params": {{}}
+    }},
+    "data_type": "返回数据类型(table/series/aggregation)",
+    "suggested_viz_type": "建议的可视化类型",
+    "code_snippet": "使用的pandas代码",
+    "suggestions": ["后续分析建议"]
+}}"""
+
+
+def generate_csv(rows: int, columns: int, seed: int, prefix: str = "") -> bytes:
+    """数值列、整数编码列和类别列按 3:1:1 混合，prefix 用于生成列名不同的文件"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(columns):
+        kind = i % 5
+        if kind < 3:
+            data[f"{prefix}metric_{i}"] = rng.random(rows).round(4)
+        elif kind == 3:
+            data[f"{prefix}code_{i}"] = rng.integers(0, 1000, rows)
+        else:
+            data[f"{prefix}region_{i}"] = rng.choice(["华北", "华东", "华南", "西南"], rows)
+    return pd.DataFrame(data).to_csv(index=False).encode()
+
+
+def _common_prefix(a: str, b: str) -> int:
+    return len(os.path.commonprefix([a, b]))
+
+
+def _timed(coro_factory, repeat: int) -> float:
+    async def run():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await coro_factory()
+        return (time.perf_counter() - start) / repeat * 1000
+    return asyncio.run(run())
+
+
+def run(rows: int, columns: int, repeat: int):
+    service = FileService()
+    manager = LLMManager(client=object())
+
+    async def ingest(seed, prefix=""):
+        csv = generate_csv(rows, columns, seed, prefix)
+        upload = await service.process_csv("bench", f"data_{seed}.csv", io.BytesIO(csv))
+        data_info = await service.get_data_info("bench", upload["file_id"])
+        return upload["file_id"], data_info
+
+    (file_id, data_info), (other_id, other_info) = asyncio.run(ingest(0)), asyncio.run(ingest(1, "other_"))
+    prompt_context = asyncio.run(service.get_prompt_context("bench", file_id))
+    other_context = asyncio.run(service.get_prompt_context("bench", other_id))
+
+    before = legacy_system_prompt(data_info)
+    after = manager._generate_system_prompt({"prompt_context": prompt_context})
+    referenced = [data_info["columns"][-1], data_info["columns"][len(data_info["columns"]) // 2]]
+
+    precomputed_ms = _timed(lambda: service.get_prompt_context("bench", file_id), repeat)
+    rebuilt_ms = _timed(lambda: service.get_prompt_context("bench", file_id, [f"{columns}-{time.perf_counter()}"] + referenced), 3)
+    memoized_ms = _timed(lambda: service.get_prompt_context("bench", file_id, referenced), repeat)
+
+    print(
+        f"{columns:>6} 列  "
+        f"原提示词 {estimate_tokens(before):>7} tokens (公共前缀 {_common_prefix(before, legacy_system_prompt(other_info)):>4} 字符)  "
+        f"新提示词 {estimate_tokens(after):>5} tokens (公共前缀 {_common_prefix(after, manager._generate_system_prompt({'prompt_context': other_context})):>4} 字符, "
+        f"{'截断' if prompt_context['truncated'] else '完整'})  "
+        f"获取耗时: 预生成 {precomputed_ms:.3f} ms / 重新生成 {rebuilt_ms:.2f} ms / 缓存 {memoized_ms:.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--columns", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.UPLOAD_DIRECTORY = Path(tmp)
+        print(f"数据描述预算 {settings.PROMPT_CONTEXT_TOKEN_BUDGET} tokens，每个文件 {args.rows} 行")
+        for columns in args.columns:
+            run(args.rows, columns, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
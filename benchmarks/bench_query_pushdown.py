@@ -0,0 +1,106 @@
+"""
+列裁剪 / 谓词下推基准测试：对比整表读取后 pandas 处理与按扫描计划读取的读取字节数和耗时
+
+用法:
+    python benchmarks/bench_query_pushdown.py --rows 200000 --columns 200
+
+读取字节数按 parquet 元数据估算：实际被扫描的行组中，所读取列的压缩后大小之和。
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.data_processor import process_dataframe
+from app.utils.query_planner import execute_operation, plan_operation
+
+
+def generate_parquet(path: Path, rows: int, columns: int, row_group_size: int):
+    rng = np.random.default_rng(0)
+    data = {
+        "id": np.arange(rows),
+        "category": rng.choice(["A", "B", "C", "D"], rows),
+    }
+    for i in range(columns - 2):
+        data[f"metric_{i}"] = rng.random(rows)
+    pd.DataFrame(data).to_parquet(path, row_group_size=row_group_size)
+
+
+def bytes_read(path: Path, plan) -> int:
+    """估算按计划扫描时读取的字节数"""
+    metadata = pq.ParquetFile(path).metadata
+    dataset = ds.dataset(path, format="parquet")
+    names = dataset.schema.names
+    wanted = set(plan["columns"] or names)
+    if plan["filter"] is not None:
+        fragment = next(dataset.get_fragments())
+        row_groups = [rg.id for f in fragment.split_by_row_group(plan["filter"]) for rg in f.row_groups]
+    else:
+        row_groups = range(metadata.num_row_groups)
+
+    total = 0
+    for rg in row_groups:
+        group = metadata.row_group(rg)
+        for i in range(group.num_columns):
+            column = group.column(i)
+            if column.path_in_schema in wanted:
+                total += column.total_compressed_size
+    return total
+
+
+def timed(func, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--columns", type=int, default=200)
+    parser.add_argument("--row-group-size", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    operations = {
+        "aggregation(3 cols)": {
+            "type": "aggregation", "method": "groupby", "columns": ["category"],
+            "agg_func": "mean", "target_columns": ["metric_0", "metric_1"],
+        },
+        "statistical(3 cols)": {
+            "type": "statistical", "method": "describe",
+            "columns": ["metric_0", "metric_1", "metric_2"],
+        },
+        "filter(5% rows)": {
+            "type": "filter", "query": f"id < {args.rows // 20}",
+        },
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = Path(work_dir) / "data.parquet"
+        generate_parquet(path, args.rows, args.columns, args.row_group_size)
+        names = pq.ParquetFile(path).schema_arrow.names
+        full_plan = {"columns": None, "filter": None}
+
+        print(f"{'operation':<22} {'mode':<10} {'bytes read':>14} {'latency(ms)':>12}")
+        for label, operation in operations.items():
+            full = timed(lambda: process_dataframe(pd.read_parquet(path), operation), args.repeat)
+            pushed = timed(lambda: execute_operation(path, operation), args.repeat)
+            plan = plan_operation(operation, names)
+            print(f"{label:<22} {'full':<10} {bytes_read(path, full_plan):>14,} {full * 1000:>12.1f}")
+            print(f"{label:<22} {'pushdown':<10} {bytes_read(path, plan):>14,} {pushed * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+分析结果传输基准测试：对比把整个结果表转换为记录列表返回与保存结果文件后分页返回
+
+用法:
+    python benchmarks/bench_result_transport.py --rows 1000000
+
+模拟对大文件执行 filter/sort 后得到的结果表，每种方式在独立进程中运行，报告耗时、峰值内存和传输字节数:
+- legacy: to_dict(orient='records') 后经 ChatResponse 校验并编码为 JSON（原实现）
+- paged first response: 保存 Arrow IPC 结果文件，响应只包含第一页和结果句柄
+- paged read (json): 通过分页接口以 JSON 格式读完全部结果（每页 RESULT_MAX_PAGE_SIZE 行）
+- paged read (arrow): 通过分页接口以 Arrow IPC 流读完全部结果
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.db.database import Base, engine
+from app.schemas.chat import ChatResponse
+from app.services.chat_service import ChatService
+from app.services.file_service import FileService
+
+LLM_RESPONSE = {"answer": "按销售额从高到低排序", "data_operation": {"type": "sort"}, "suggestions": []}
+
+
+def generate_result(path: Path, rows: int):
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "order_id": np.arange(rows),
+        "city": rng.choice(["北京", "上海", "广州", "深圳"], rows),
+        "category": rng.choice(["家电", "服饰", "食品"], rows),
+        "quantity": rng.integers(1, 20, rows),
+        "price": rng.random(rows) * 100,
+        "order_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    }).to_parquet(path)
+
+
+def _encode(response) -> bytes:
+    """与 FastAPI 按 response_model 返回响应的过程相同"""
+    return json.dumps(jsonable_encoder(ChatResponse.model_validate(response))).encode()
+
+
+def _measure(mode: str, path: Path, upload_dir: str, queue):
+    settings.UPLOAD_DIRECTORY = Path(upload_dir)
+    Base.metadata.create_all(bind=engine)
+    df = pd.read_parquet(path)
+    service = ChatService()
+    context = {"data_source": {"session_id": "bench", "file_id": "result"}}
+
+    async def run():
+        if mode == "legacy":
+            return len(_encode(service._build_response(LLM_RESPONSE, {"processed_data": service._records(df)})))
+        payload = await service._result_payload(context, df)
+        if mode == "paged first response":
+            return len(_encode(service._build_response(LLM_RESPONSE, payload)))
+        file_service = FileService()
+        if mode == "paged read (arrow)":
+            _, chunks = file_service.iter_result_ipc("bench", "result", payload["result_id"])
+            return sum(len(chunk) for chunk in chunks)
+        sent, offset = 0, 0
+        while offset is not None:
+            page = await file_service.get_result_page(
+                "bench", "result", payload["result_id"], offset, settings.RESULT_MAX_PAGE_SIZE
+            )
+            sent += len(json.dumps(page, ensure_ascii=False, default=str).encode())
+            offset = page["next_offset"]
+        return sent
+
+    start = time.perf_counter()
+    sent = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, sent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = Path(work_dir) / "result.parquet"
+        context = multiprocessing.get_context("spawn")
+        generator = context.Process(target=generate_result, args=(path, args.rows))
+        generator.start()
+        generator.join()
+
+        print(f"{'mode':<22} {'seconds':>8} {'peak RSS(MB)':>13} {'bytes sent':>12}")
+        for mode in ("legacy", "paged first response", "paged read (json)", "paged read (arrow)"):
+            queue = context.Queue()
+            upload_dir = tempfile.mkdtemp(dir=work_dir)
+            process = context.Process(target=_measure, args=(mode, path, upload_dir, queue))
+            process.start()
+            elapsed, peak, sent = queue.get()
+            process.join()
+            print(f"{mode:<22} {elapsed:>8.2f} {peak:>13.0f} {sent:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+序列化基准测试：对比标准库 json 与 app.core.serialization 的编码、解码吞吐量
+
+用法:
+    python benchmarks/bench_serialization.py --repeat 20
+
+使用两类接近实际的数据:
+- session: 会话上下文，50 轮对话，每轮回答带 200 行结果
+- upload: 100 列文件的上传响应（describe 结构的基础统计、样本数据）和列统计信息
+
+每类数据报告以下方式的耗时、吞吐量和编码后大小:
+- stdlib json: json.dumps(default=str) / json.loads（原会话存储）
+- jsonable_encoder: FastAPI 对未声明 response_model 的路由返回值的处理（原 GET /context 等接口）
+- orjson: dumps / loads
+- orjson + zlib: encode_blob / decode_blob（会话存储，超过阈值时压缩）
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.serialization import decode_blob, dumps, encode_blob, loads
+from app.utils.profiler import describe_from_profile, profile_parquet
+
+
+def session_payload():
+    rng = np.random.default_rng(0)
+    turns = []
+    for i in range(50):
+        rows = pd.DataFrame({
+            "city": rng.choice(["北京", "上海", "广州", "深圳"], 200),
+            "month": pd.date_range("2023-01-01", periods=200, freq="D").strftime("%Y-%m-%d"),
+            "sales": rng.random(200) * 1000,
+            "orders": rng.integers(1, 100, 200),
+        }).to_dict(orient="records")
+        turns.append({
+            "turn_id": f"turn-{i}",
+            "timestamp": "2023-06-01T12:00:00",
+            "query": f"第{i}轮：按城市和月份统计销售额",
+            "file_id": "f1",
+            "response": {
+                "answer": "北京的销售额最高，上海其次。" * 3,
+                "data_results": {"processed_data": rows, "data_type": "table", "suggested_viz_type": "line"},
+                "code_snippet": "df.groupby(['city', 'month'])['sales'].sum()",
+                "suggestions": ["查看月度趋势", "比较城市间的客单价"],
+            },
+        })
+    return {
+        "session_id": "s1",
+        "created_at": "2023-06-01T12:00:00",
+        "files": [{"file_id": "f1", "filename": "sales.csv", "added_at": "2023-06-01T12:00:00"}],
+        "last_response": turns[-1]["response"],
+        "conversation_history": turns,
+    }
+
+
+def upload_payload(work_dir: Path):
+    rng = np.random.default_rng(0)
+    rows = 20_000
+    data = {}
+    for i in range(100):
+        if i % 4 == 3:
+            data[f"category_{i}"] = rng.choice(["north", "south", "east", "west"], rows)
+        else:
+            data[f"metric_{i}"] = rng.random(rows)
+    df = pd.DataFrame(data)
+    path = work_dir / "data.parquet"
+    df.to_parquet(path)
+    profile = profile_parquet(path, top_k=5, approx_min_rows=1_000_000, sample_rows=100_000)
+    return {
+        "summary": {
+            "row_count": np.int64(rows),
+            "column_count": len(df.columns),
+            "memory_usage": df.memory_usage(deep=True).sum(),
+            "basic_stats": describe_from_profile(profile),
+            "missing_values": df.isnull().sum().to_dict(),
+        },
+        "sample_data": df.head(5).to_dict(orient="records"),
+        "profile": profile,
+    }
+
+
+def _timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run(name: str, payload, repeat: int):
+    codecs = {
+        "stdlib json": (lambda: json.dumps(payload, ensure_ascii=False, default=str), json.loads),
+        "jsonable_encoder": (lambda: json.dumps(jsonable_encoder(payload, custom_encoder={np.generic: lambda v: v.item()}), ensure_ascii=False), None),
+        "orjson": (lambda: dumps(payload), loads),
+        "orjson + zlib": (lambda: encode_blob(payload), decode_blob),
+    }
+    raw_size = len(dumps(payload))
+    print(f"\n{name}（JSON {raw_size / 1e6:.2f} MB）")
+    print(f"{'codec':<18} {'encode ms':>10} {'MB/s':>8} {'decode ms':>10} {'MB/s':>8} {'size MB':>8}")
+    for codec, (encode, decode) in codecs.items():
+        encode_time, encoded = _timed(encode, repeat)
+        size = len(encoded)
+        line = f"{codec:<18} {encode_time * 1000:>10.2f} {raw_size / encode_time / 1e6:>8.0f}"
+        if decode is not None:
+            decode_time, _ = _timed(lambda: decode(encoded), repeat)
+            line += f" {decode_time * 1000:>10.2f} {raw_size / decode_time / 1e6:>8.0f}"
+        else:
+            line += f" {'-':>10} {'-':>8}"
+        print(f"{line} {size / 1e6:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    run("session", session_payload(), args.repeat)
+    with tempfile.TemporaryDirectory() as work_dir:
+        run("upload", upload_payload(Path(work_dir)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
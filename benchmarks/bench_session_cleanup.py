@@ -0,0 +1,112 @@
+"""
+会话清理基准测试：对比 KEYS 遍历 + 逐个读取 last_active 与基于活动索引的分批清理
+
+用法:
+    python benchmarks/bench_session_cleanup.py --sessions 100000 --stale-ratio 0.5
+
+依赖 fakeredis 和 lupa。fakeredis 在进程内执行命令，单个命令的耗时近似于
+真实 Redis 执行该命令时阻塞其他客户端的时间，报告中以最长单次命令耗时表示。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import fakeredis
+from redis.asyncio import Redis
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.services.context_service import ContextService, ACTIVE_SESSIONS_KEY
+
+_command_times = []
+_original_execute = Redis.execute_command
+
+
+async def _timed_execute(self, *args, **options):
+    start = time.perf_counter()
+    try:
+        return await _original_execute(self, *args, **options)
+    finally:
+        _command_times.append(time.perf_counter() - start)
+
+
+async def populate(redis: Redis, sessions: int, stale_ratio: float):
+    """批量写入合成会话：元数据哈希 + 活动索引"""
+    now = time.time()
+    stale_before = now - settings.SESSION_EXPIRE_DAYS * 86400 - 3600
+    stale_count = int(sessions * stale_ratio)
+    for start in range(0, sessions, 1000):
+        async with redis.pipeline(transaction=False) as pipe:
+            for i in range(start, min(start + 1000, sessions)):
+                ts = stale_before if i < stale_count else now
+                session_id = f"bench-{i}"
+                pipe.hset(f"context:{session_id}", mapping={
+                    "session_id": json.dumps(session_id),
+                    "last_active": json.dumps(datetime.fromtimestamp(ts).isoformat()),
+                })
+                pipe.zadd(ACTIVE_SESSIONS_KEY, {session_id: ts})
+            await pipe.execute()
+    return stale_count
+
+
+async def legacy_cleanup(redis: Redis) -> int:
+    """旧实现：KEYS 枚举全部会话，逐个读取 last_active 判断是否过期"""
+    deleted = 0
+    keys = await redis.keys("context:*")
+    for key in keys:
+        if key.count(":") != 1:
+            continue
+        last_active = await redis.hget(key, "last_active")
+        if not last_active:
+            continue
+        if (datetime.now() - datetime.fromisoformat(json.loads(last_active))).days >= settings.SESSION_EXPIRE_DAYS:
+            await redis.delete(key)
+            deleted += 1
+    return deleted
+
+
+async def run(mode: str, sessions: int, stale_ratio: float):
+    redis_module._pool = fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool
+    service = ContextService()
+    expected = await populate(service.redis, sessions, stale_ratio)
+
+    _command_times.clear()
+    Redis.execute_command = _timed_execute
+    start = time.perf_counter()
+    try:
+        if mode == "legacy":
+            deleted = await legacy_cleanup(service.redis)
+        else:
+            deleted = await service.cleanup_inactive_sessions()
+    finally:
+        Redis.execute_command = _original_execute
+    elapsed = time.perf_counter() - start
+
+    assert deleted == expected, (deleted, expected)
+    return elapsed, max(_command_times), len(_command_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--stale-ratio", type=float, default=0.5)
+    parser.add_argument("--batch-size", type=int, default=settings.SESSION_CLEANUP_BATCH_SIZE)
+    args = parser.parse_args()
+    settings.SESSION_CLEANUP_BATCH_SIZE = args.batch_size
+
+    print(f"{'mode':<10} {'cleanup(s)':>11} {'max block(ms)':>14} {'commands':>9}")
+    for mode in ("legacy", "indexed"):
+        elapsed, max_block, commands = asyncio.run(run(mode, args.sessions, args.stale_ratio))
+        print(f"{mode:<10} {elapsed:>11.2f} {max_block * 1000:>14.1f} {commands:>9}")
+
+
+if __name__ == "__main__":
+    main()
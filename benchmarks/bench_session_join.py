@@ -0,0 +1,91 @@
+"""
+跨文件连接基准测试：对比 session_query 按列裁剪读取后连接与直接用 pandas 读取整个文件后 merge
+
+用法:
+    python benchmarks/bench_session_join.py --rows 1000000
+
+生成两个各 --rows 行、带若干无关列的数据文件（订单表和客户表），执行
+"按地区汇总订单金额"，每种方式在独立进程中运行，报告耗时和峰值内存:
+- pandas merge: pd.read_parquet 读取两个文件的全部列，merge 后 groupby（朴素实现）
+- session_query: execute_session_operation 只读取连接键和引用的列，连接后聚合
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.utils.session_query import execute_session_operation
+
+OPERATION = {
+    "type": "join", "left": "orders", "right": "customers", "on": "customer_id",
+    "then": {"type": "aggregation", "columns": ["region"], "target_columns": ["amount"], "agg_func": "sum"},
+}
+
+
+def generate(work_dir: Path, rows: int):
+    rng = np.random.default_rng(0)
+    orders = {
+        "order_id": np.arange(rows),
+        "customer_id": rng.integers(0, rows, rows),
+        "amount": rng.random(rows) * 100,
+        "order_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    }
+    customers = {
+        "customer_id": np.arange(rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+    }
+    # 与查询无关的列
+    for i in range(8):
+        orders[f"extra_{i}"] = rng.random(rows)
+        customers[f"attr_{i}"] = rng.choice(["a" * 12, "b" * 12, "c" * 12], rows)
+    pd.DataFrame(orders).to_parquet(work_dir / "orders.parquet")
+    pd.DataFrame(customers).to_parquet(work_dir / "customers.parquet")
+
+
+def _measure(mode: str, work_dir: Path, queue):
+    tables = {"orders": work_dir / "orders.parquet", "customers": work_dir / "customers.parquet"}
+    start = time.perf_counter()
+    if mode == "pandas merge":
+        merged = pd.read_parquet(tables["orders"]).merge(pd.read_parquet(tables["customers"]), on="customer_id")
+        result = merged.groupby("region")["amount"].sum().reset_index()
+    else:
+        result = execute_session_operation(tables, OPERATION)
+    elapsed = time.perf_counter() - start
+    total = float(result["amount"].sum())
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, total))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        context = multiprocessing.get_context("spawn")
+        generator = context.Process(target=generate, args=(work_dir, args.rows))
+        generator.start()
+        generator.join()
+
+        print(f"{'mode':<15} {'seconds':>8} {'peak RSS(MB)':>13} {'amount total':>15}")
+        for mode in ("pandas merge", "session_query"):
+            queue = context.Queue()
+            process = context.Process(target=_measure, args=(mode, work_dir, queue))
+            process.start()
+            elapsed, peak, total = queue.get()
+            process.join()
+            print(f"{mode:<15} {elapsed:>8.2f} {peak:>13.0f} {total:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+后台上传任务基准测试：对比同步上传接口与后台任务接口的请求耗时
+
+依赖 fakeredis 和 lupa（fakeredis 通过 lupa 执行 Lua 脚本）。
+
+用法:
+    python benchmarks/bench_upload_jobs.py --rows 1000000
+
+生成订单CSV后分别:
+- sync: POST /upload/csv，请求在解析、统计、写入parquet和注册会话后才返回
+- job: POST /upload/jobs，文件落盘并计算哈希后立即返回；之后每 50ms 轮询一次状态直到完成
+- duplicate: 再次提交相同内容，直接返回已完成的任务
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fakeredis
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from fastapi import UploadFile
+
+from app.api.v1.upload import get_upload_job, submit_upload_job, upload_csv
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.db.database import Base, engine
+from app.services.context_service import ContextService
+from app.services.file_service import FileService
+from app.services.upload_job_service import UploadJobService
+
+
+def generate_csv(rows: int) -> bytes:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "city": rng.choice(["北京", "上海", "广州", "深圳"], rows),
+        "category": rng.choice(["家电", "服饰", "食品"], rows),
+        "quantity": rng.integers(1, 100, rows),
+        "price": rng.normal(100, 25, rows).round(2),
+    }).to_csv(index=False).encode()
+
+
+def _upload(content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename="orders.csv")
+
+
+async def run(content: bytes):
+    context_service = ContextService()
+    for session_id in ("sync", "job"):
+        await context_service.create_session(session_id)
+
+    start = time.perf_counter()
+    await upload_csv("sync", _upload(content), FileService(), context_service)
+    print(f"{'sync':<10} 请求耗时 {time.perf_counter() - start:>7.3f}s")
+
+    start = time.perf_counter()
+    job = await submit_upload_job("job", _upload(content), UploadJobService())
+    accepted = time.perf_counter() - start
+    polls = 0
+    while job["status"] not in ("done", "failed"):
+        await asyncio.sleep(0.05)
+        job = await get_upload_job(job["job_id"], UploadJobService())
+        polls += 1
+    print(
+        f"{'job':<10} 请求耗时 {accepted:>7.3f}s，完成耗时 {time.perf_counter() - start:.3f}s"
+        f"（{job['status']}，轮询 {polls} 次）"
+    )
+
+    start = time.perf_counter()
+    duplicate = await submit_upload_job("job", _upload(content), UploadJobService())
+    assert duplicate["duplicate"] and duplicate["status"] == "done"
+    print(f"{'duplicate':<10} 请求耗时 {time.perf_counter() - start:>7.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    content = generate_csv(args.rows)
+    print(f"{args.rows:,} 行，CSV {len(content) / 2**20:.0f}MB")
+    Base.metadata.create_all(bind=engine)
+    redis_module._pool = fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool
+    with tempfile.TemporaryDirectory() as work_dir:
+        settings.UPLOAD_DIRECTORY = Path(work_dir)
+        asyncio.run(run(content))
+
+
+if __name__ == "__main__":
+    main()
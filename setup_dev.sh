@@ -8,8 +8,8 @@ source venv/bin/activate  # Linux/Mac
 # 或
 # .\venv\Scripts\activate  # Windows
 
-# 安装依赖
-pip install -r requirements.txt
+# 安装依赖（含测试依赖）
+pip install -r requirements-dev.txt
 
 # 创建必要的目录
 mkdir -p uploads
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings 要求配置 OPENAI_API_KEY，测试环境下使用占位值
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+# 上传清单等数据写入临时数据库，不影响本地开发数据库
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+
+@pytest.fixture(autouse=True)
+def database():
+    from app.db.database import Base, engine
+    from app.models import stored_blob, upload_manifest  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
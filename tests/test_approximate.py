@@ -0,0 +1,126 @@
+import asyncio
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.api.v1.chat import refine_result
+from app.core.config import settings
+from app.schemas.chat import RefineRequest
+from app.schemas.operation import parse_operation
+from app.services.chat_service import ChatService
+from app.services.file_service import FileService
+from app.utils.approximate import ApproximateResult, approximate_operation, build_sample
+from app.utils.data_processor import process_dataframe
+
+
+@pytest.fixture
+def population():
+    rng = np.random.default_rng(0)
+    rows = 200_000
+    df = pd.DataFrame({
+        "city": rng.choice(["北京", "上海", "广州"], rows, p=[0.6, 0.3, 0.1]),
+        "sales": rng.exponential(100, rows),
+        "quantity": rng.integers(1, 10, rows),
+    })
+    df.loc[rng.random(rows) < 0.05, "sales"] = np.nan
+    return df
+
+
+def test_build_sample_keeps_row_order(tmp_path):
+    df = pd.DataFrame({"id": np.arange(1000), "value": np.arange(1000) * 2.0})
+    df.to_parquet(tmp_path / "data.parquet", row_group_size=128)
+
+    assert build_sample(tmp_path / "data.parquet", tmp_path / "sample.parquet", 100) == 100
+    sample = pd.read_parquet(tmp_path / "sample.parquet")
+    assert len(sample) == 100 and sample["id"].is_monotonic_increasing and sample["id"].is_unique
+    assert (sample["value"] == sample["id"] * 2.0).all()
+    assert build_sample(tmp_path / "data.parquet", tmp_path / "other.parquet", 1000) == 0
+
+
+@pytest.mark.parametrize("operation", [
+    {"type": "aggregation", "columns": ["city"], "aggregations": {"sales": ["sum", "mean", "count"]}},
+    {"type": "aggregation", "columns": ["city"], "agg_func": "size"},
+    {"type": "histogram", "column": "quantity", "bins": 3},
+])
+def test_estimates_are_within_margins(population, operation):
+    op = parse_operation(operation)
+    sample = population.sample(20_000, random_state=1)
+    approximate = approximate_operation(sample, op, len(population), 0.99)
+    exact = process_dataframe(population, op)
+
+    value_columns = [c for c in exact.columns if c not in ("city", "bin_start", "bin_end")]
+    assert list(approximate.result.columns) == list(exact.columns)
+    errors = (approximate.result[value_columns] - exact[value_columns]).abs()
+    assert (errors <= approximate.margins[value_columns]).all().all()
+
+
+def test_statistical_estimates(population):
+    sample = population.sample(20_000, random_state=1)
+    describe = approximate_operation(
+        sample, parse_operation({"type": "statistical", "method": "describe", "columns": ["sales"]}),
+        len(population), 0.99
+    )
+    exact = population["sales"].describe()
+    assert abs(describe.result["sales"]["count"] - exact["count"]) <= describe.margins["sales"]["count"]
+    assert abs(describe.result["sales"]["mean"] - exact["mean"]) <= describe.margins["sales"]["mean"]
+    assert describe.margins["sales"]["max"] is None
+
+    correlation = approximate_operation(
+        sample, parse_operation({"type": "statistical", "method": "correlation", "columns": ["sales", "quantity"]}),
+        len(population), 0.99
+    )
+    assert 0 < correlation.margins["sales"]["quantity"] < 0.05
+    assert correlation.margins["sales"]["sales"] is None
+
+
+def test_approximate_queries_and_refine(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+    monkeypatch.setattr(settings, "SAMPLE_ROWS", 500)
+    rng = np.random.default_rng(0)
+    csv = pd.DataFrame({
+        "city": rng.choice(["北京", "上海"], 5000),
+        "sales": rng.random(5000).round(6) * 100,
+    }).to_csv(index=False)
+    upload = asyncio.run(FileService().process_csv("s1", "data.csv", io.BytesIO(csv.encode())))
+    file_id = upload["file_id"]
+    describe = {"type": "statistical", "method": "describe", "columns": ["sales"]}
+
+    async def scenario():
+        service = FileService()
+        approximate = await service.query_file_data("s1", file_id, describe, approximate=True)
+        # 索引可以回答的分组聚合和不支持近似计算的指令返回精确结果
+        grouped = await service.query_file_data(
+            "s1", file_id, {"type": "aggregation", "columns": ["city"], "agg_func": "size"}, approximate=True
+        )
+        filtered = await service.query_file_data("s1", file_id, {"type": "filter", "query": "sales > 99"}, approximate=True)
+
+        chat_service = ChatService()
+        payload = await chat_service._result_payload(
+            {"data_source": {"session_id": "s1", "file_id": file_id}}, approximate, describe
+        )
+        approximation = payload["approximation"]
+        request = RefineRequest(session_id="s1", file_id=approximation["file_id"], operation=approximation["operation"])
+        refined = await refine_result(request, chat_service)
+        return approximate, grouped, filtered, payload, refined
+
+    approximate, grouped, filtered, payload, refined = asyncio.run(scenario())
+    assert isinstance(approximate, ApproximateResult) and approximate.sample_rows == 500
+    assert grouped["size"].sum() == 5000
+    assert isinstance(filtered, pd.DataFrame)
+
+    assert payload["approximation"]["total_rows"] == 5000
+    assert payload["approximation"]["operation"] == describe
+    assert "approximation" not in refined
+    assert refined["processed_data"]["sales"]["count"] == 5000
+
+
+def test_mode_selection(monkeypatch):
+    monkeypatch.setattr(settings, "APPROX_AUTO_MIN_ROWS", 1000)
+    large = {"data_info": {"shape": [5000, 2]}}
+    small = {"data_info": {"shape": [10, 2]}}
+    assert ChatService._use_approximation(large, None)
+    assert not ChatService._use_approximation(small, None)
+    assert ChatService._use_approximation(small, {"mode": "approximate"})
+    assert not ChatService._use_approximation(large, {"mode": "exact"})
@@ -0,0 +1,109 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.stored_blob import StoredBlob
+from app.models.upload_manifest import UploadManifest
+from app.services.blob_store import BLOB_DIR_NAME
+from app.services.file_service import FileService
+
+CSV = b"city,sales\nA,1\nB,2\nA,3\n"
+
+
+def _make_service(tmp_path):
+    service = FileService()
+    service.base_dir = tmp_path
+    return service
+
+
+def _blob_dirs(service):
+    # 不含锁文件目录
+    return [p for p in (service.base_dir / BLOB_DIR_NAME).iterdir() if not p.name.startswith(".")]
+
+
+def _ref_counts():
+    with SessionLocal() as db:
+        return [blob.ref_count for blob in db.query(StoredBlob).all()]
+
+
+def test_reupload_references_existing_dataset(tmp_path, monkeypatch):
+    service = _make_service(tmp_path)
+    first = asyncio.run(service.process_csv("s1", "a.csv", io.BytesIO(CSV)))
+
+    def fail(*args):
+        raise AssertionError("已导入过的内容不应重新解析")
+
+    monkeypatch.setattr(FileService, "_infer_dtypes", fail)
+    second = asyncio.run(service.process_csv("s2", "b.csv", io.BytesIO(CSV)))
+
+    assert second["success"], second.get("error")
+    assert second["file_id"] != first["file_id"] and second["original_filename"] == "b.csv"
+    assert second["summary"]["row_count"] == first["summary"]["row_count"] == 3
+    assert len(_blob_dirs(service)) == 1
+    assert _ref_counts() == [2]
+
+    file_dir = tmp_path / "s2" / second["file_id"]
+    assert (file_dir / "data.parquet").is_symlink() and (file_dir / "index").is_symlink()
+    assert not (file_dir / "metadata.json").is_symlink()
+    assert pd.read_parquet(file_dir / "data.parquet")["sales"].tolist() == [1, 2, 3]
+    assert asyncio.run(service.get_data_info("s2", second["file_id"]))["shape"] == [3, 2]
+
+    # 导入配置变化后重新导入
+    monkeypatch.undo()
+    monkeypatch.setattr(settings, "SAMPLE_ROWS", 2)
+    asyncio.run(service.process_csv("s3", "a.csv", io.BytesIO(CSV)))
+    assert len(_blob_dirs(service)) == 2
+
+
+def test_cleanup_deletes_only_unreferenced_datasets(tmp_path):
+    service = _make_service(tmp_path)
+    for session_id in ("old", "new"):
+        asyncio.run(service.process_csv(session_id, "data.csv", io.BytesIO(CSV)))
+    dropped = asyncio.run(service.process_csv("new", "other.csv", io.BytesIO(CSV + b"C,4\n")))
+    service.delete_file("new", dropped["file_id"])
+    assert sorted(_ref_counts()) == [0, 2]
+
+    with SessionLocal() as db:
+        db.get(UploadManifest, "old").last_modified = 0
+        db.commit()
+    result = asyncio.run(service.cleanup_old_sessions())
+    # 仍被 new 引用的数据集保留，没有引用的数据集删除
+    assert result["sessions_removed"] == 1 and result["blobs_removed"] == 1
+    assert _ref_counts() == [1]
+    assert len(_blob_dirs(service)) == 1
+
+    with SessionLocal() as db:
+        db.get(UploadManifest, "new").last_modified = 0
+        db.commit()
+    result = asyncio.run(service.cleanup_old_sessions())
+    assert result["blobs_removed"] == 1 and result["reclaimed_bytes"] > 0
+    assert _ref_counts() == []
+    assert not _blob_dirs(service)
+
+
+def test_concurrent_references_keep_count_consistent(tmp_path):
+    service = _make_service(tmp_path)
+    asyncio.run(service.process_csv("s0", "a.csv", io.BytesIO(CSV)))
+    blob_id = _blob_dirs(service)[0].name
+    blobs = service.blobs
+
+    with ThreadPoolExecutor(8) as pool:
+        manifests = list(pool.map(lambda i: blobs.acquire(blob_id, f"s{i}", "f"), range(1, 41)))
+    assert all(manifests) and _ref_counts() == [41]
+
+    # 同一引用被重复释放时只减一次
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: blobs.release(f"s{i % 20 + 1}"), range(40)))
+    assert _ref_counts() == [21]
+
+    for i in range(21, 41):
+        blobs.release(f"s{i}")
+    blobs.release("s0")
+    assert blobs.collect()[0] == 1
+    # 删除后不能再被引用，重新上传时重新导入
+    assert blobs.acquire(blob_id, "s99", "f") is None
+    assert not _blob_dirs(service) and _ref_counts() == []
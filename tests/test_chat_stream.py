@@ -0,0 +1,115 @@
+import asyncio
+import io
+import json
+import time
+
+import pytest
+
+from app.api.v1.chat import analyze_data_stream
+from app.core import llm as llm_module
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.core.llm_cache import llm_cache
+from app.schemas.chat import ChatRequest, ChatResponse
+from app.services.chat_service import ChatService
+from app.services.context_service import ContextService
+from app.services.file_service import FileService
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+LLM_OUTPUT = json.dumps({
+    "answer": "按城市分组后，北京的平均销售额最高。",
+    "data_operation": {
+        "type": "aggregation", "method": "groupby", "columns": ["city"],
+        "agg_func": "mean", "target_columns": ["sales"],
+    },
+    "data_type": "table",
+    "suggested_viz_type": "bar",
+    "code_snippet": "df.groupby('city')['sales'].mean()",
+    "suggestions": ["查看各城市销售额的月度趋势", "比较各城市的订单数量", "找出销售额最高的门店"],
+}, ensure_ascii=False)
+
+
+class FakeStreamingClient:
+    """按固定间隔逐块输出 LLM_OUTPUT 的假 LLM"""
+
+    def __init__(self, chunk_size=8, delay=0.02):
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    async def stream(self, model, messages, temperature, max_tokens):
+        for i in range(0, len(LLM_OUTPUT), self.chunk_size):
+            await asyncio.sleep(self.delay)
+            yield {"content": LLM_OUTPUT[i:i + self.chunk_size]}
+        yield {"total_tokens": 300}
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+    monkeypatch.setattr(llm_module, "chat_client", FakeStreamingClient())
+    llm_cache.clear()
+
+
+def _parse_sse(chunk: str):
+    event, data = chunk.strip().split("\n", 1)
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_stream_sends_answer_before_generation_finishes():
+    async def scenario():
+        context_service = ContextService()
+        file_service = FileService()
+        await context_service.create_session("s1")
+        upload = await file_service.process_csv(
+            "s1", "sales.csv", io.BytesIO("city,sales\n北京,10\n上海,4\n北京,20\n".encode())
+        )
+        await context_service.add_file_to_session("s1", upload)
+
+        request = ChatRequest(session_id="s1", query="哪个城市的平均销售额最高")
+        start = time.perf_counter()
+        response = await analyze_data_stream(request, ChatService(), context_service, file_service)
+        events = []
+        async for chunk in response.body_iterator:
+            events.append((time.perf_counter() - start, *_parse_sse(chunk)))
+        context = await context_service.get_context("s1")
+        return events, context
+
+    events, context = asyncio.run(scenario())
+    names = [name for _, name, _ in events]
+    total = events[-1][0]
+    generation_time = len(LLM_OUTPUT) / 8 * 0.02
+
+    # 第一个回答片段在 LLM 生成的前几个分块内到达
+    assert names[0] == "answer"
+    assert events[0][0] < generation_time * 0.25
+    assert total >= generation_time
+    assert "".join(data for _, name, data in events if name == "answer") == "按城市分组后，北京的平均销售额最高。"
+
+    # 数据处理在 suggestions 生成完之前就已完成并发送
+    assert names.index("data_results") < names.index("suggestions")
+    data_results = next(data for _, name, data in events if name == "data_results")
+    assert data_results["processed_data"] == [{"city": "上海", "sales": 4.0}, {"city": "北京", "sales": 15.0}]
+
+    assert names[-1] == "done"
+    done = events[-1][2]
+    assert done["data_results"]["suggested_viz_type"] == "bar"
+    assert len(done["suggestions"]) == 3
+    assert context["last_response"] == done
+
+
+def test_plain_answer_without_data_operation(monkeypatch):
+    class PlainAnswerClient:
+        async def complete(self, model, messages, temperature, max_tokens):
+            content = json.dumps({"answer": "数据共有两列。", "data_operation": None, "suggestions": []})
+            return {"content": content, "total_tokens": 50}
+
+    monkeypatch.setattr(llm_module, "chat_client", PlainAnswerClient())
+    context = {"data_source": {"session_id": "s1", "file_id": "f1"}}
+    response = asyncio.run(ChatService().process_query("有哪些列？", context))
+
+    assert "error" not in response
+    assert ChatResponse.model_validate(response).answer == "数据共有两列。"
+    assert response.get("data_results") is None
@@ -0,0 +1,192 @@
+import asyncio
+import pytest
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.services.context_service import ContextService
+
+fakeredis = pytest.importorskip("fakeredis")
+# fakeredis 需要 lupa 才能执行会话更新使用的 Lua 脚本
+pytest.importorskip("lupa")
+
+
+@pytest.fixture
+def context_service(monkeypatch):
+    fake = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_module, "_pool", fake.connection_pool)
+    return ContextService()
+
+
+def test_services_share_one_connection_pool(context_service):
+    assert ContextService().redis.connection_pool is context_service.redis.connection_pool
+
+
+def test_concurrent_conversations_are_not_lost(context_service):
+    async def scenario():
+        await context_service.create_session("s1")
+        await asyncio.gather(*[
+            context_service.add_conversation("s1", f"q{i}", {"answer": str(i)})
+            for i in range(20)
+        ])
+        return await context_service.get_context("s1")
+
+    context = asyncio.run(scenario())
+    assert sorted(c["query"] for c in context["conversation_history"]) == sorted(f"q{i}" for i in range(20))
+
+
+def test_update_context_merges_fields_and_file_limit(context_service, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILES_PER_SESSION", 1)
+
+    async def scenario():
+        await context_service.create_session("s1")
+        await context_service.add_file_to_session("s1", {"file_id": "f1", "original_filename": "a.csv"})
+        await context_service.update_context("s1", {"last_query": "hello"})
+        with pytest.raises(ValueError):
+            await context_service.add_file_to_session("s1", {"file_id": "f2", "original_filename": "b.csv"})
+        with pytest.raises(ValueError):
+            await context_service.update_context("missing", {"last_query": "hello"})
+        return await context_service.get_context("s1")
+
+    context = asyncio.run(scenario())
+    assert context["last_query"] == "hello"
+    assert [f["file_id"] for f in context["files"]] == ["f1"]
+
+
+def test_history_is_capped_and_indexed_per_file(context_service, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_CONVERSATION_HISTORY", 3)
+    monkeypatch.setattr(settings, "CONTEXT_INLINE_RESPONSE_MAX_BYTES", 50)
+
+    async def scenario():
+        await context_service.create_session("s1")
+        for i in range(5):
+            # 偶数轮的回复较大，按引用单独存储
+            response = {"answer": "x" * 100 if i % 2 == 0 else str(i)}
+            await context_service.add_conversation("s1", f"q{i}", response, file_id="a" if i < 3 else "b")
+        context = await context_service.get_context("s1")
+        file_a = await context_service.get_file_conversations("s1", "a")
+        file_b = await context_service.get_file_conversations("s1", "b")
+        stored = await context_service.redis.hkeys("context:s1:responses")
+        return context, file_a, file_b, stored
+
+    context, file_a, file_b, stored = asyncio.run(scenario())
+    assert [c["query"] for c in context["conversation_history"]] == ["q2", "q3", "q4"]
+    assert context["conversation_history"][0]["response"] == {"answer": "x" * 100}
+    assert [c["query"] for c in file_a] == ["q2"]
+    assert [c["query"] for c in file_b] == ["q3", "q4"]
+    # 被截断的 q0 的回复内容也被删除，只剩 q2、q4
+    assert len(stored) == 2
+
+
+def test_scripts_declare_every_session_key(context_service, monkeypatch):
+    declared = []
+    original_file_ids = context_service._file_ids
+    original_script = context_service._update_fields
+
+    async def stale_file_ids(session_ids):
+        # 模拟读取文件列表之后又添加了文件，第一次声明的文件不完整
+        file_ids = await original_file_ids(session_ids)
+        return {session_id: [] for session_id in file_ids} if not declared else file_ids
+
+    async def recording_script(keys, args):
+        declared.append(set(keys))
+        return await original_script(keys=keys, args=args)
+
+    async def scenario():
+        await context_service.create_session("s1")
+        await context_service.add_file_to_session("s1", {"file_id": "f1", "original_filename": "a.csv"})
+        await context_service.add_conversation("s1", "q", {"answer": "a"}, file_id="f1")
+        monkeypatch.setattr(context_service, "_file_ids", stale_file_ids)
+        monkeypatch.setattr(context_service, "_update_fields", recording_script)
+        await context_service.update_context("s1", {"last_query": "q"})
+        keys = {key async for key in context_service.redis.scan_iter("context:s1*")}
+        ttl = await context_service.redis.ttl("context:s1:history:f1")
+        return keys, ttl
+
+    keys, ttl = asyncio.run(scenario())
+    # 第一次因未声明 f1 的对话记录键而未执行，补充后重试
+    assert len(declared) == 2 and "context:s1:history:f1" not in declared[0]
+    assert keys <= declared[1] and "context:s1:history:f1" in keys
+    assert ttl > 0
+
+
+def test_get_context_without_history(context_service):
+    async def scenario():
+        await context_service.create_session("s1")
+        await context_service.add_conversation("s1", "q", {"answer": "a"})
+        return await context_service.get_context("s1", include_history=False)
+
+    context = asyncio.run(scenario())
+    assert "conversation_history" not in context
+    assert context["files"] == []
+
+
+def test_activity_index_cleanup_and_session_limit(context_service, monkeypatch):
+    from app.services.context_service import ACTIVE_SESSIONS_KEY
+
+    monkeypatch.setattr(settings, "MAX_ACTIVE_SESSIONS", 3)
+    monkeypatch.setattr(settings, "SESSION_CLEANUP_BATCH_SIZE", 2)
+
+    async def scenario():
+        for sid in ["s1", "s2", "s3", "s4"]:
+            await context_service.create_session(sid)
+        after_limit = await context_service.get_active_sessions()
+
+        # s2、s3 的最后活动时间设为很久以前
+        await context_service.redis.zadd(ACTIVE_SESSIONS_KEY, {"s2": 0, "s3": 0})
+        deleted = await context_service.cleanup_inactive_sessions()
+        return after_limit, deleted, await context_service.get_active_sessions(), await context_service.redis.keys("context:s2*")
+
+    after_limit, deleted, remaining, leftover = asyncio.run(scenario())
+    assert after_limit == ["s2", "s3", "s4"]
+    assert deleted == 2
+    assert remaining == ["s4"]
+    assert leftover == []
+
+
+def test_rebuild_activity_index_from_existing_sessions(context_service):
+    from app.services.context_service import ACTIVE_SESSIONS_KEY
+
+    async def scenario():
+        await context_service.create_session("s1")
+        await context_service.add_file_to_session("s1", {"file_id": "f1", "original_filename": "a.csv"})
+        await context_service.redis.delete(ACTIVE_SESSIONS_KEY)
+        indexed = await context_service.rebuild_activity_index()
+        return indexed, await context_service.get_active_sessions()
+
+    assert asyncio.run(scenario()) == (1, ["s1"])
+
+
+def test_rebuild_converts_legacy_string_sessions(context_service, monkeypatch):
+    import json
+
+    monkeypatch.setattr(settings, "CONTEXT_INLINE_RESPONSE_MAX_BYTES", 50)
+    legacy = {
+        "session_id": "old",
+        "created_at": "2024-01-01T00:00:00",
+        "last_active": "2024-01-02T00:00:00",
+        "files": [{"file_id": "f1", "filename": "a.csv", "added_at": "2024-01-01T00:00:00"}],
+        "conversation_history": [
+            {"timestamp": "2024-01-01T01:00:00", "query": "q1", "response": {"answer": "x" * 100}, "file_id": "f1"},
+            {"timestamp": "2024-01-01T02:00:00", "query": "q2", "response": {"answer": "2"}, "file_id": None},
+        ],
+        "analysis_results": [],
+    }
+
+    async def scenario():
+        await context_service.create_session("new")
+        # 旧版会话是 JSON 字符串，直接用哈希命令读取会报 WRONGTYPE
+        await context_service.redis.set("context:old", json.dumps(legacy), ex=3600)
+        await context_service.redis.set("context:broken", "not json")
+        indexed = await context_service.rebuild_activity_index()
+        context = await context_service.get_context("old")
+        file_turns = await context_service.get_file_conversations("old", "f1")
+        ttl = await context_service.redis.ttl("context:old:history")
+        return indexed, await context_service.get_active_sessions(), context, file_turns, ttl
+
+    indexed, active, context, file_turns, ttl = asyncio.run(scenario())
+    assert indexed == 2 and active == ["old", "new"]
+    assert context["created_at"] == "2024-01-01T00:00:00"
+    assert [f["file_id"] for f in context["files"]] == ["f1"]
+    assert [t["query"] for t in context["conversation_history"]] == ["q1", "q2"]
+    assert context["conversation_history"][0]["response"] == {"answer": "x" * 100}
+    assert [t["query"] for t in file_turns] == ["q1"]
+    assert 0 < ttl <= 3600
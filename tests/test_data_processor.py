@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.schemas.operation import parse_operation
+from app.utils.data_processor import process_dataframe
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    rows = 500
+    return pd.DataFrame({
+        "city": rng.choice(["北京", "上海", "广州"], rows),
+        "category": rng.choice(["家电", "服饰"], rows),
+        "sales": rng.permutation(rows) * 1.5,
+        "quantity": rng.integers(1, 10, rows),
+        "note": rng.choice(["促销 活动", "普通", None], rows),
+        "order date": pd.Timestamp("2023-01-01") + pd.to_timedelta(np.arange(rows) * 6, unit="h"),
+    })
+
+
+@pytest.mark.parametrize("query", [
+    "sales > 300 and city == '北京'",
+    "city in ['北京', '广州'] or quantity * 2 >= 15",
+    "not (sales < 100) and ~(category != '家电')",
+    "100 < sales <= 400",
+    "note != '普通'",
+    "sales > 100 * 3 - 2 ** 4",
+])
+def test_filter_matches_df_query(df, query):
+    result = process_dataframe(df, {"type": "filter", "query": query})
+    pd.testing.assert_frame_equal(result, df.query(query))
+
+
+def test_filter_methods_projection_and_limit(df):
+    result = process_dataframe(df, {
+        "type": "filter",
+        "query": "note.str.contains('促销') and `order date` >= '2023-02-01' or note.isna()",
+        "columns": ["city", "note"],
+        "limit": 20,
+    })
+    expected = df[
+        (df["note"].str.contains("促销", na=False) & (df["order date"] >= "2023-02-01")) | df["note"].isna()
+    ][["city", "note"]].head(20)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("query", [
+    "__import__('os').system('ls')",
+    "sales.apply(print)",
+    "[x for x in sales]",
+    "sales is None",
+    # 常量运算结果过大，解析时拒绝而不是在执行器中长时间计算
+    "sales > 9**9**9",
+    "sales > 'x' * 10**9",
+    "sales > 1 / 0",
+])
+def test_filter_rejects_arbitrary_code(df, query):
+    with pytest.raises(ValueError, match="数据处理错误"):
+        process_dataframe(df, {"type": "filter", "query": query})
+
+
+def test_invalid_operations_are_rejected(df):
+    with pytest.raises(ValueError, match="does not match any of the expected tags"):
+        process_dataframe(df, {"type": "unknown"})
+    with pytest.raises(ValueError, match="未知的列: missing"):
+        process_dataframe(df, {"type": "sort", "columns": ["missing"]})
+    with pytest.raises(ValueError, match="agg_func"):
+        process_dataframe(df, {"type": "aggregation", "columns": ["city"], "target_columns": ["sales"], "agg_func": "eval"})
+
+
+def test_aggregation_with_multiple_functions(df):
+    result = process_dataframe(df, {
+        "type": "aggregation", "columns": "city",
+        "aggregations": {"sales": ["sum", "mean"], "quantity": "max"},
+    })
+    expected = df.groupby("city").agg(
+        sales_sum=("sales", "sum"), sales_mean=("sales", "mean"), quantity_max=("quantity", "max")
+    ).reset_index()
+    pd.testing.assert_frame_equal(result, expected)
+
+    total = process_dataframe(df, {"type": "aggregation", "target_columns": ["sales", "quantity"], "agg_func": "sum"})
+    assert total.to_dict(orient="records") == [{"sales": df["sales"].sum(), "quantity": df["quantity"].sum()}]
+
+
+def test_top_k_matches_full_sort(df):
+    result = process_dataframe(df, {"type": "top_k", "columns": ["sales"], "k": 5})
+    pd.testing.assert_frame_equal(result, df.sort_values("sales", ascending=False).head(5))
+
+    result = process_dataframe(df, {"type": "sort", "columns": ["city"], "limit": 5})
+    pd.testing.assert_frame_equal(result, df.sort_values("city").head(5))
+
+
+def test_histogram_matches_numpy(df):
+    result = process_dataframe(df, {"type": "histogram", "column": "sales", "bins": 8})
+    counts, edges = np.histogram(df["sales"], bins=8)
+    assert result["count"].tolist() == counts.tolist()
+    assert result["bin_start"].tolist() == edges[:-1].tolist()
+
+    result = process_dataframe(df, {
+        "type": "histogram", "column": "sales", "bins": [0, 300, 750], "target_columns": ["quantity"]
+    })
+    low = df.loc[df["sales"] < 300, "quantity"].mean()
+    high = df.loc[df["sales"] >= 300, "quantity"].mean()
+    assert result["quantity"].tolist() == pytest.approx([low, high])
+
+
+def test_pivot_flattens_columns(df):
+    result = process_dataframe(df, {
+        "type": "pivot", "index": "city", "columns": "category", "values": "sales", "agg_func": "sum"
+    })
+    expected = df.pivot_table(index="city", columns="category", values="sales", aggfunc="sum")
+    assert list(result.columns) == ["city", "家电", "服饰"]
+    assert result.set_index("city")["家电"].to_dict() == pytest.approx(expected["家电"].to_dict())
+
+
+def test_rolling_and_resample(df):
+    shuffled = df.sample(frac=1, random_state=0)
+    result = process_dataframe(shuffled, {
+        "type": "rolling", "columns": "sales", "window": 3, "func": "sum", "order_by": "order date"
+    })
+    expected = df["sales"].rolling(3).sum()
+    assert list(result.columns) == ["order date", "sales", "sales_rolling_sum"]
+    np.testing.assert_allclose(result["sales_rolling_sum"], expected)
+
+    result = process_dataframe(df, {
+        "type": "rolling", "columns": "sales", "window": "2D", "func": "mean", "order_by": "order date"
+    })
+    expected = df.set_index("order date")["sales"].rolling("2D").mean()
+    np.testing.assert_allclose(result["sales_rolling_mean"], expected)
+
+    result = process_dataframe(df, {
+        "type": "resample", "on": "order date", "rule": "M", "target_columns": ["sales"], "agg_func": "sum"
+    })
+    expected = df.resample("ME", on="order date")["sales"].sum()
+    assert result["sales"].tolist() == pytest.approx(expected.tolist())
+
+
+def test_required_columns():
+    assert parse_operation({"type": "filter", "query": "a > 1"}).required_columns() is None
+    assert parse_operation({"type": "filter", "query": "a > 1", "columns": ["b"]}).required_columns() == {"a", "b"}
+    assert parse_operation({
+        "type": "pivot", "index": "a", "columns": "b", "values": "c"
+    }).required_columns() == {"a", "b", "c"}
+
+
+def test_compact_dtypes_match_wide_dtypes(df):
+    # 导入时缩小的整数类型和分类列，结果与原始类型一致
+    compact = df.assign(
+        quantity=df["quantity"].astype("int8"),
+        city=df["city"].astype(pd.CategoricalDtype(sorted(df["city"].unique()))),
+    )
+    for query in ("quantity * 100 > 500", "city > '广州' or city == '上海'"):
+        result = process_dataframe(compact, {"type": "filter", "query": query})
+        assert result.index.tolist() == df.query(query).index.tolist()
+    result = process_dataframe(compact, {"type": "sort", "columns": ["city", "sales"]})
+    assert result.index.tolist() == df.sort_values(["city", "sales"]).index.tolist()
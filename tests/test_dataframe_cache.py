@@ -0,0 +1,48 @@
+import time
+import pandas as pd
+from app.utils.dataframe_cache import DataFrameCache
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"value": range(rows)})
+
+
+def test_lru_eviction_respects_byte_budget():
+    size = int(_frame(100).memory_usage(deep=True).sum())
+    cache = DataFrameCache(max_bytes=size * 2, ttl=60)
+    cache.put(("s", "a"), _frame(100))
+    cache.put(("s", "b"), _frame(100))
+    assert cache.get(("s", "a")) is not None  # a 成为最近使用
+
+    cache.put(("s", "c"), _frame(100))
+
+    assert cache.get(("s", "b")) is None
+    assert cache.get(("s", "a")) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["current_bytes"] <= stats["max_bytes"]
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+def test_version_change_ttl_and_session_invalidation():
+    cache = DataFrameCache(max_bytes=10**9, ttl=60)
+    cache.put(("s", "a"), _frame(10), version=(1, 10))
+    assert cache.get(("s", "a"), version=(2, 10)) is None
+
+    cache.put(("s", "a"), _frame(10))
+    cache.put(("s", "b"), _frame(10))
+    cache.put(("t", "a"), _frame(10))
+    assert cache.invalidate("s") == 2
+    assert cache.get(("t", "a")) is not None
+
+    expiring = DataFrameCache(max_bytes=10**9, ttl=0.01)
+    expiring.put(("s", "a"), _frame(10))
+    time.sleep(0.02)
+    assert expiring.get(("s", "a")) is None
+    assert expiring.stats()["expirations"] == 1
+
+
+def test_oversized_frame_is_not_cached():
+    cache = DataFrameCache(max_bytes=10, ttl=60)
+    assert not cache.put(("s", "a"), _frame(100))
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,70 @@
+import asyncio
+import io
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from app.core.executor import DataFrameExecutor, ExecutorBusyError, ExecutorTimeoutError
+from app.services.file_service import FileService
+
+
+def test_rejects_jobs_beyond_queue_depth():
+    executor = DataFrameExecutor("thread", max_workers=1, max_queue=1, timeout=5)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(lambda: "rejected")
+        release.set()
+        return await running, await queued
+
+    assert asyncio.run(main()) == (True, "queued")
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["pending"] == 0
+    # 第二个任务需要等第一个任务结束才能开始执行
+    assert stats["queue_wait_seconds_max"] >= 0.04
+    executor.shutdown()
+
+
+def test_job_timeout_keeps_slot_until_job_finishes():
+    executor = DataFrameExecutor("thread", max_workers=1, max_queue=0, timeout=5)
+
+    async def main():
+        with pytest.raises(ExecutorTimeoutError):
+            await executor.run(time.sleep, 0.3, timeout=0.05)
+        # 超时的任务仍在执行，名额未释放
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(lambda: None)
+        await asyncio.sleep(0.4)
+        return await executor.run(lambda: "ok")
+
+    assert asyncio.run(main()) == "ok"
+    assert executor.stats()["timeouts"] == 1
+    executor.shutdown()
+
+
+def test_process_csv_in_process_pool(tmp_path, monkeypatch):
+    from app.services import file_service
+
+    executor = DataFrameExecutor("process", max_workers=1, max_queue=1, timeout=60)
+    monkeypatch.setattr(file_service, "dataframe_executor", executor)
+    service = FileService()
+    service.base_dir = tmp_path
+
+    try:
+        result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(b"a,b\n1,x\n2,y\n")))
+    finally:
+        executor.shutdown()
+
+    assert result["success"], result.get("error")
+    df = pd.read_parquet(tmp_path / "s1" / result["file_id"] / "data.parquet")
+    assert df["a"].tolist() == [1, 2]
+    # 临时写出的CSV已删除
+    assert not list(tmp_path.glob("*.csv"))
@@ -0,0 +1,111 @@
+import asyncio
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.schemas.operation import parse_operation
+from app.services.file_service import FileService
+from app.utils.data_processor import process_dataframe
+from app.utils.file_index import FileIndex, build_file_index, take_rows
+from app.utils.profiler import profile_parquet
+
+
+@pytest.fixture
+def indexed(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = 2000
+    df = pd.DataFrame({
+        "city": rng.choice(["北京", "上海", "广州", None], rows),
+        "year": rng.choice([2021, 2022, 2023], rows),
+        # 大量相同取值，检验并列时的行顺序
+        "quantity": rng.integers(1, 6, rows),
+        "price": np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows) * 100),
+    })
+    path = tmp_path / "data.parquet"
+    df.to_parquet(path, row_group_size=256)
+    profile = profile_parquet(path, 5, 1_000_000, 100_000)
+    build_file_index(path, profile, tmp_path / "index", 100, 8, 8)
+    return df, path, FileIndex.load(tmp_path / "index")
+
+
+def _answer(index, df, operation, data_path=None):
+    result = index.answer(parse_operation(operation), data_path, None if data_path else df)
+    assert result is not None, operation
+    return result
+
+
+def test_index_layout(indexed):
+    _, _, index = indexed
+    assert index.dimensions == ["city", "year", "quantity"]
+    assert index.measures == ["price"]
+
+
+@pytest.mark.parametrize("operation", [
+    {"type": "aggregation", "columns": ["city"], "target_columns": ["price"], "agg_func": "sum"},
+    {"type": "aggregation", "columns": ["year"], "aggregations": {"price": ["mean", "count", "min", "max"]}},
+    {"type": "aggregation", "columns": ["quantity"], "agg_func": "size"},
+])
+def test_cached_aggregations_match_engine(indexed, operation):
+    df, _, index = indexed
+    pd.testing.assert_frame_equal(_answer(index, df, operation), process_dataframe(df, operation), check_exact=False)
+
+
+@pytest.mark.parametrize("operation", [
+    {"type": "top_k", "columns": ["price"], "k": 15},
+    {"type": "top_k", "columns": ["price"], "k": 15, "ascending": True},
+    {"type": "sort", "columns": ["price"], "ascending": False},
+    {"type": "sort", "columns": ["price"], "ascending": True, "limit": 30},
+    {"type": "filter", "query": "price >= 50"},
+    {"type": "filter", "query": "20 > price"},
+    {"type": "filter", "query": "price != 10", "limit": 40},
+    {"type": "filter", "query": "city == '北京'"},
+    {"type": "filter", "query": "year in [2021, 2023]", "columns": ["city", "price"]},
+])
+def test_index_answers_match_engine(indexed, operation):
+    df, path, index = indexed
+    expected = process_dataframe(df, operation)
+    pd.testing.assert_frame_equal(_answer(index, df, operation), expected)
+    # 未加载数据时只读取结果行所在的行组
+    pd.testing.assert_frame_equal(_answer(index, df, operation, path), expected)
+
+
+def test_descending_ties_keep_row_order(tmp_path):
+    df = pd.DataFrame({"dim": ["a"] * 8, "v": [3.0, 1.0, 3.0, 2.0, 3.0, 2.0, np.nan, 1.0]})
+    df.to_parquet(tmp_path / "data.parquet")
+    build_file_index(tmp_path / "data.parquet", profile_parquet(tmp_path / "data.parquet", 5, 1000, 1000),
+                     tmp_path / "index", 2, 8, 8)
+    index = FileIndex.load(tmp_path / "index")
+    for operation in (
+        {"type": "top_k", "columns": ["v"], "k": 4},
+        {"type": "sort", "columns": ["v"], "ascending": False},
+    ):
+        pd.testing.assert_frame_equal(_answer(index, df, operation), process_dataframe(df, operation))
+
+
+def test_take_rows_reads_only_needed_row_groups(indexed):
+    df, path, _ = indexed
+    positions = np.array([1500, 3, 700, 4])
+    pd.testing.assert_frame_equal(take_rows(path, positions), df.take(positions))
+    assert take_rows(path, np.array([], dtype=np.int64), ["city"]).columns.tolist() == ["city"]
+
+
+def test_query_results_are_memoized(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+    csv = "city,price\n" + "\n".join(f"{c},{i}" for i, c in enumerate(["北京", "上海"] * 50))
+    service = FileService()
+    upload = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(csv.encode())))
+    operation = {"type": "filter", "query": "price > 90 and city == '上海'"}
+
+    first = asyncio.run(service.query_file_data("s1", upload["file_id"], operation))
+    memos = list((tmp_path / "s1" / upload["file_id"] / "analysis_results").glob("op_*.arrow"))
+    assert len(memos) == 1
+
+    calls = []
+    monkeypatch.setattr(FileService, "_run_query", staticmethod(lambda *args: calls.append(args)))
+    # 字段顺序不同的等价指令命中同一个结果
+    second = asyncio.run(service.query_file_data("s1", upload["file_id"], {"query": operation["query"], "type": "filter"}))
+    assert calls == []
+    assert second.to_dict(orient="records") == first.to_dict(orient="records")
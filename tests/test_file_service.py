@@ -0,0 +1,140 @@
+import asyncio
+import io
+import json
+import pandas as pd
+from app.core.config import settings
+from app.services.file_service import FileService
+
+
+def _make_service(tmp_path):
+    service = FileService()
+    service.base_dir = tmp_path
+    return service
+
+
+def test_process_csv_streams_chunks_into_parquet(tmp_path, monkeypatch):
+    # 使用很小的分块，确保多个行组被写入，且后续块中出现的空值/浮点数能正确合并类型
+    monkeypatch.setattr(settings, "CSV_CHUNK_ROWS", 3)
+    csv = (
+        "id,price,city,flag\n"
+        "1,10,北京,true\n"
+        "2,20,上海,false\n"
+        "3,30,北京,true\n"
+        "4,,广州,false\n"
+        "5,12.5,,true\n"
+    )
+    service = _make_service(tmp_path)
+    result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(csv.encode())))
+
+    assert result["success"], result.get("error")
+    df = pd.read_parquet(tmp_path / "s1" / result["file_id"] / "data.parquet")
+    assert len(df) == 5
+    assert pd.api.types.is_integer_dtype(df["id"])
+    assert pd.api.types.is_float_dtype(df["price"])
+    assert pd.api.types.is_bool_dtype(df["flag"])
+
+    columns = {c["name"]: c for c in result["columns"]}
+    assert columns["price"]["null_count"] == 1
+    assert columns["city"]["unique_count"] == 3
+    assert result["summary"]["row_count"] == 5
+    assert result["summary"]["missing_values"]["city"] == 1
+    assert set(result["summary"]["basic_stats"]) == {"id", "price"}
+    assert len(result["sample_data"]) == 3
+    assert result["original_filename"] == "data.csv"
+
+
+def test_process_csv_stores_compact_dtypes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CSV_CHUNK_ROWS", 40)
+    days = pd.date_range("2023-01-01", periods=100, freq="D").strftime("%Y-%m-%d")
+    rows = [f"{i},{['北京', '上海'][i % 2]},{days[i]},{i * 1000},note {i}" for i in range(100)]
+    csv = "id,city,day,amount,note\n" + "\n".join(rows) + "\n100,,,70000,\n"
+    service = _make_service(tmp_path)
+    result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(csv.encode())))
+
+    file_dir = tmp_path / "s1" / result["file_id"]
+    df = pd.read_parquet(file_dir / "data.parquet")
+    assert df["id"].dtype == "int8"
+    assert df["amount"].dtype == "int32"
+    assert list(df["city"].cat.categories) == ["上海", "北京"]
+    assert df["day"].dtype == "datetime64[us]" and df["day"].isna().sum() == 1
+    # 取值数超过行数一半的字符串列保持为字符串
+    assert pd.api.types.is_string_dtype(df["note"])
+
+    storage = json.loads((file_dir / "metadata.json").read_text())["storage"]
+    assert storage["dtypes"]["city"] == "category"
+    assert storage["memory_after"] < storage["memory_before"]
+    assert storage["column_memory"]["amount"]["after"] == 4 * len(df)
+
+
+def test_process_csv_rejects_empty_file(tmp_path):
+    service = _make_service(tmp_path)
+    result = asyncio.run(service.process_csv("s1", "empty.csv", io.BytesIO(b"")))
+    assert not result["success"]
+
+
+def test_get_file_data_is_served_from_cache(tmp_path):
+    from app.utils.dataframe_cache import dataframe_cache
+
+    service = _make_service(tmp_path)
+    result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(b"a,b\n1,x\n2,y\n")))
+    file_id = result["file_id"]
+
+    first = asyncio.run(service.get_file_data("s1", file_id))
+    second = asyncio.run(service.get_file_data("s1", file_id))
+    assert first is second
+
+    dataframe_cache.invalidate("s1")
+    assert asyncio.run(service.get_file_data("s1", file_id)) is not first
+
+
+def test_hot_format_loads_same_data_through_memory_map(tmp_path, monkeypatch):
+    from app.utils.dataframe_cache import dataframe_cache
+
+    monkeypatch.setattr(settings, "CSV_CHUNK_ROWS", 2)
+    monkeypatch.setattr(settings, "HOT_FORMAT_ENABLED", True)
+    csv = "id,city,day,price\n1,北京,2023-01-01,1.5\n2,上海,2023-01-02,\n3,北京,2023-01-03,2.5\n"
+    service = _make_service(tmp_path)
+    result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(csv.encode())))
+    file_dir = tmp_path / "s1" / result["file_id"]
+    assert (file_dir / "data.arrow").is_symlink()
+
+    def fail(*args):
+        raise AssertionError("有 Arrow IPC 文件时不应解码parquet")
+
+    monkeypatch.setattr(pd, "read_parquet", fail)
+    dataframe_cache.clear()
+    df = asyncio.run(service.get_file_data("s1", result["file_id"]))
+    monkeypatch.undo()
+    pd.testing.assert_frame_equal(df, pd.read_parquet(file_dir / "data.parquet"))
+    # 缓存只计入转换时复制的列（有空值的 price），引用映射页面的列不计入
+    copied = df.index.memory_usage() + df["price"].memory_usage(deep=True, index=False)
+    assert dataframe_cache.stats()["current_bytes"] == copied < df.memory_usage(deep=True).sum()
+
+    # 没有 Arrow IPC 文件时仍读取parquet
+    (file_dir / "data.arrow").unlink()
+    dataframe_cache.invalidate("s1")
+    pd.testing.assert_frame_equal(asyncio.run(service.get_file_data("s1", result["file_id"])), df)
+
+
+def test_cleanup_removes_only_expired_sessions_from_manifest(tmp_path):
+    from app.db.database import SessionLocal
+    from app.models.upload_manifest import UploadManifest
+
+    service = _make_service(tmp_path)
+    for session_id in ("old", "new"):
+        asyncio.run(service.process_csv(session_id, "data.csv", io.BytesIO(b"a,b\n1,x\n")))
+    # 未经过 FileService 写入的目录会在清理时补录进清单
+    (tmp_path / "unknown").mkdir()
+
+    with SessionLocal() as db:
+        db.get(UploadManifest, "old").last_modified = 0
+        db.commit()
+
+    result = asyncio.run(service.cleanup_old_sessions())
+
+    assert result["sessions_removed"] == 1
+    assert result["reclaimed_bytes"] > 0
+    assert not (tmp_path / "old").exists()
+    assert (tmp_path / "new").exists()
+    with SessionLocal() as db:
+        assert sorted(e.session_id for e in db.query(UploadManifest)) == ["new", "unknown"]
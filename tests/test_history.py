@@ -0,0 +1,124 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from app.api.v1.chat import analyze_data
+from app.core import history as history_module
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.core.history import build_history_messages, digest_response, normalize_turns
+from app.core.llm import LLMManager
+from app.core.llm_cache import llm_cache
+from app.schemas.chat import ChatRequest
+from app.services.chat_service import ChatService
+from app.services.context_service import ContextService
+from app.services.file_service import FileService
+from app.utils.tokens import estimate_tokens
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+
+def _turn(i, rows=200):
+    return {
+        "turn_id": f"t{i}",
+        "query": f"第{i}个问题：各城市的销售额是多少",
+        "response": {
+            "answer": f"第{i}个回答。北京最高，上海其次。",
+            "data_results": {
+                "processed_data": [{"city": f"c{r}", "sales": r * 1.5} for r in range(rows)],
+                "data_type": "table",
+            },
+            "code_snippet": "df.groupby('city')['sales'].sum()",
+        },
+    }
+
+
+def test_window_fits_budget_and_strips_result_tables():
+    turns = normalize_turns([_turn(i) for i in range(30)])
+    messages, state = build_history_messages(turns, token_budget=800, verbatim_turns=3, summary_budget=200)
+
+    assert sum(estimate_tokens(m["content"]) + 4 for m in messages) <= 800
+    assert messages[0]["role"] == "system" and "之前的对话摘要" in messages[0]["content"]
+    # 最近 3 轮原样保留，结果表只保留行数和列名
+    assert [m["content"] for m in messages if m["role"] == "user"] == [f"第{i}个问题：各城市的销售额是多少" for i in (27, 28, 29)]
+    assert messages[-1]["content"] == digest_response(turns[-1]["response"])
+    assert "结果: 200 行（city, sales）" in messages[-1]["content"]
+    assert "c199" not in json.dumps(messages, ensure_ascii=False)
+    assert state["last_key"] == "t26"
+    assert state["omitted"] > 0
+
+
+def test_rolling_summary_only_folds_new_turns(monkeypatch):
+    _, state = build_history_messages(normalize_turns([_turn(i) for i in range(10)]), verbatim_turns=2)
+    assert state["last_key"] == "t7"
+
+    folded = []
+    original = history_module._summary_line
+    monkeypatch.setattr(history_module, "_summary_line", lambda turn: folded.append(turn["key"]) or original(turn))
+    messages, state = build_history_messages(normalize_turns([_turn(i) for i in range(11)]), state, verbatim_turns=2)
+
+    assert folded == ["t8"]
+    assert state["last_key"] == "t8"
+    assert len(state["lines"]) == 9
+    # 摘要状态与当前历史不匹配时重新生成
+    _, rebuilt = build_history_messages(normalize_turns([_turn(i) for i in range(20, 24)]), state, verbatim_turns=2)
+    assert rebuilt["last_key"] == "t21" and len(rebuilt["lines"]) == 2
+
+
+def test_request_history_messages_are_normalized():
+    history = [
+        {"role": "user", "content": "只看华东"},
+        {"role": "assistant", "content": json.dumps(_turn(0)["response"], ensure_ascii=False)},
+        {"role": "user", "content": "按月份汇总"},
+    ]
+    messages = LLMManager(client=object())._build_messages(
+        "再按城市拆分", {}, build_history_messages(normalize_turns(history))[0]
+    )
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user", "user"]
+    assert "结果: 200 行" in messages[2]["content"]
+    assert messages[-1]["content"] == "再按城市拆分"
+
+
+class RecordingClient:
+    """记录每次请求的消息列表的假 LLM"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, model, messages, temperature, max_tokens):
+        self.calls.append(messages)
+        return {"content": json.dumps({"answer": f"第{len(self.calls)}次回答", "suggestions": []}), "total_tokens": 50}
+
+
+def test_analyze_sends_stored_history_before_query(tmp_path, monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+    monkeypatch.setattr(settings, "HISTORY_VERBATIM_TURNS", 1)
+    llm_cache.clear()
+    client = RecordingClient()
+
+    async def scenario():
+        context_service = ContextService()
+        file_service = FileService()
+        chat_service = ChatService()
+        chat_service.llm_manager = LLMManager(client=client)
+        await context_service.create_session("s1")
+        upload = await file_service.process_csv("s1", "sales.csv", io.BytesIO(b"city,sales\nA,1\nB,2\n"))
+        await context_service.add_file_to_session("s1", upload)
+        for query in ("总销售额", "平均销售额", "最大销售额"):
+            await analyze_data(ChatRequest(session_id="s1", query=query), chat_service, context_service, file_service)
+        return await context_service.get_context("s1")
+
+    context = asyncio.run(scenario())
+    last = client.calls[-1]
+    assert [m["content"] for m in last[1:]] == [
+        "之前的对话摘要:\n- 问: 总销售额 → 答: 第1次回答",
+        "平均销售额",
+        "第2次回答",
+        "最大销售额",
+    ]
+    assert [turn["query"] for turn in context["conversation_history"]] == ["总销售额", "平均销售额", "最大销售额"]
+    assert context["history_summary"]["lines"] == ["- 问: 总销售额 → 答: 第1次回答"]
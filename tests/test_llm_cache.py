@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+from redis.asyncio import BlockingConnectionPool
+
+from app.core import redis as redis_module
+from app.core.llm import LLMManager
+from app.core.llm_cache import llm_cache, normalize_query, query_similarity
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class FakeChatClient:
+    """离线的假 LLM 客户端，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def complete(self, model, messages, temperature, max_tokens):
+        self.calls += 1
+        return {
+            "content": json.dumps({"answer": f"第{self.calls}次回答", "suggestions": []}),
+            "total_tokens": 120,
+        }
+
+
+CONTEXT = {"data_info": {"columns": ["region", "sales"], "dtypes": {"region": "str", "sales": "float64"}, "shape": [10, 2]}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    llm_cache.clear()
+    yield
+    llm_cache.clear()
+
+
+def _ask(manager, *queries, context=CONTEXT, data_context=None):
+    async def scenario():
+        return [await manager.analyze(q, context, data_context) for q in queries]
+    return asyncio.run(scenario())
+
+
+def test_repeated_query_is_served_from_cache():
+    client = FakeChatClient()
+    manager = LLMManager(client=client)
+    first, second, third = _ask(manager, "各地区的销售额是多少？", "各地区的销售额是多少", "  各地区的 销售额是多少?")
+
+    assert client.calls == 1
+    assert first == second == third
+    stats = llm_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["saved_tokens"] == 240
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_near_duplicate_matching_is_opt_in():
+    client = FakeChatClient()
+    manager = LLMManager(client=client)
+    _ask(manager, "show me the average sales for each region", "please show me the average sales for each region")
+    assert client.calls == 2
+
+
+@pytest.mark.parametrize("a, b", [
+    ("total sales in the north region", "total sales in the south region"),
+    ("sort by sales ascending", "sort by sales descending"),
+    ("rows where region is not null", "rows where region is null"),
+    ("北部地区的销售额", "南部地区的销售额"),
+])
+def test_queries_with_different_meaning_are_not_similar(a, b):
+    assert query_similarity(normalize_query(a), normalize_query(b)) == 0.0
+
+
+def test_near_duplicate_matching_respects_numbers(monkeypatch):
+    monkeypatch.setattr(llm_cache, "similarity_threshold", 0.85)
+    client = FakeChatClient()
+    manager = LLMManager(client=client)
+    _ask(
+        manager,
+        "show me the average sales for each region",
+        "please show me the average sales for each region",
+        "show me the top 5 regions by average sales",
+        "show me the top 10 regions by average sales",
+    )
+    assert client.calls == 3
+    assert llm_cache.stats()["near_duplicate_hits"] == 1
+    assert query_similarity(normalize_query("Top 5 regions"), normalize_query("top 5 regions!")) == 1.0
+
+
+def test_cache_is_scoped_by_schema_and_history():
+    client = FakeChatClient()
+    manager = LLMManager(client=client)
+    other_schema = {"data_info": {**CONTEXT["data_info"], "columns": ["city", "sales"]}}
+    _ask(manager, "销售额总和")
+    _ask(manager, "销售额总和", context=other_schema)
+    _ask(manager, "销售额总和", data_context={"history": [{"role": "user", "content": "只看华东"}]})
+    assert client.calls == 3
+
+
+def test_falls_back_to_memory_when_redis_is_unavailable(monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", BlockingConnectionPool.from_url("redis://127.0.0.1:1", timeout=1))
+    client = FakeChatClient()
+    manager = LLMManager(client=client)
+    first, second = _ask(manager, "各地区的销售额", "各地区的销售额")
+
+    assert client.calls == 1
+    assert first == second
+    assert llm_cache.stats()["backend_errors"] > 0
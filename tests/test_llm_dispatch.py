@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.core.llm_dispatch import LLMDispatcher, LLMTimeoutError, TokenBucket
+
+MESSAGES = [{"role": "user", "content": "各城市的平均销售额"}]
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeLLM:
+    """按脚本注入错误和延迟的假 LLM，记录调用次数和最大并发数"""
+
+    def __init__(self, delay=0.01, failures=(), total_tokens=10):
+        self.delay = delay
+        self.failures = list(failures)
+        self.total_tokens = total_tokens
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def _call(self):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                raise self.failures.pop(0)
+        finally:
+            self.active -= 1
+
+    async def complete(self, model, messages, temperature, max_tokens):
+        await self._call()
+        return {"content": messages[-1]["content"], "total_tokens": self.total_tokens}
+
+    async def stream(self, model, messages, temperature, max_tokens):
+        await self._call()
+        for part in ("你好", "，世界"):
+            yield {"content": part}
+        yield {"total_tokens": self.total_tokens}
+
+
+def _dispatcher(**kwargs):
+    options = dict(
+        max_concurrency=4, requests_per_minute=0, tokens_per_minute=0,
+        timeout=1, max_retries=3, backoff_base=0.001, backoff_max=0.01
+    )
+    options.update(kwargs)
+    return LLMDispatcher(**options)
+
+
+def _complete(dispatcher, client, content="问题"):
+    return dispatcher.complete(client, "gpt", [{"role": "user", "content": content}], 0.2, 100)
+
+
+def test_identical_requests_are_coalesced():
+    dispatcher, client = _dispatcher(), FakeLLM(delay=0.05)
+
+    async def scenario():
+        return await asyncio.gather(*[_complete(dispatcher, client) for _ in range(5)], _complete(dispatcher, client, "另一个问题"))
+
+    results = asyncio.run(scenario())
+    assert client.calls == 2
+    assert [r["content"] for r in results] == ["问题"] * 5 + ["另一个问题"]
+    assert dispatcher.stats()["coalesced"] == 4
+
+    # 完成后的相同请求重新调用
+    asyncio.run(_complete(dispatcher, client))
+    assert client.calls == 3
+
+
+def test_concurrency_is_bounded():
+    dispatcher, client = _dispatcher(max_concurrency=3), FakeLLM(delay=0.02)
+
+    async def scenario():
+        await asyncio.gather(*[_complete(dispatcher, client, str(i)) for i in range(12)])
+
+    asyncio.run(scenario())
+    stats = dispatcher.stats()
+    assert client.max_active == 3
+    assert stats["completed"] == 12 and stats["in_flight"] == 0 and stats["queued"] == 0
+    assert stats["queue_wait_seconds_max"] > 0 and stats["latency_seconds_p95"] >= 0.02
+
+
+def test_retries_rate_limits_and_server_errors():
+    response = httpx.Response(429, request=httpx.Request("POST", "http://llm"), headers={"retry-after": "0.05"})
+    rate_limited = openai.RateLimitError("rate limited", response=response, body=None)
+    dispatcher, client = _dispatcher(), FakeLLM(failures=[rate_limited, StatusError(503)])
+
+    start = time.perf_counter()
+    result = asyncio.run(_complete(dispatcher, client))
+    assert result["content"] == "问题" and client.calls == 3
+    # 服务端要求的 Retry-After 优先于更短的退避时间
+    assert time.perf_counter() - start >= 0.05
+    stats = dispatcher.stats()
+    assert (stats["retries"], stats["rate_limited"], stats["server_errors"]) == (2, 1, 1)
+
+    # 4xx 不重试
+    client = FakeLLM(failures=[StatusError(400)])
+    with pytest.raises(StatusError):
+        asyncio.run(_complete(dispatcher, client))
+    assert client.calls == 1
+
+    # 用完重试次数后抛出最后的错误
+    client = FakeLLM(failures=[StatusError(500)] * 5)
+    with pytest.raises(StatusError):
+        asyncio.run(_complete(_dispatcher(max_retries=2), client))
+    assert client.calls == 3
+
+
+def test_timeouts():
+    dispatcher, client = _dispatcher(timeout=0.02, max_retries=1), FakeLLM(delay=0.2)
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(_complete(dispatcher, client))
+    assert client.calls == 2
+    assert dispatcher.stats()["timeouts"] == 2
+
+
+def test_stream_retries_before_first_chunk():
+    dispatcher, client = _dispatcher(), FakeLLM(failures=[StatusError(502)])
+
+    async def scenario():
+        return [chunk async for chunk in dispatcher.stream(client, "gpt", MESSAGES, 0.2, 100)]
+
+    chunks = asyncio.run(scenario())
+    assert chunks == [{"content": "你好"}, {"content": "，世界"}, {"total_tokens": 10}]
+    assert client.calls == 2 and dispatcher.stats()["in_flight"] == 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(6000)  # 每秒 100 个
+    assert bucket.delay(6000) == 0
+    bucket.take(6000)
+    assert 0.45 < bucket.delay(50) <= 0.5
+    # 按实际用量归还预估多扣的令牌
+    bucket.give(50)
+    assert bucket.delay(50) == 0
+    assert TokenBucket(0).delay(10**9) == 0
+
+
+def test_token_limit_uses_actual_usage():
+    # 每次调用预估约 110 个 token，实际只用 10 个；不按实际用量校正时第 3 个请求需要等待约 1 分钟
+    dispatcher, client = _dispatcher(tokens_per_minute=240, max_concurrency=1), FakeLLM(delay=0)
+
+    async def scenario():
+        for i in range(5):
+            await _complete(dispatcher, client, str(i))
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.metrics import get_metrics
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry, span
+from app.core.middleware import MetricsMiddleware
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "耗时", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, stage='a"b')
+    registry.counter("demo_total", "次数").inc(2)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("demo_seconds")] == [
+        'demo_seconds_bucket{stage="a\\"b",le="0.1"} 2',
+        'demo_seconds_bucket{stage="a\\"b",le="1"} 3',
+        'demo_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+        'demo_seconds_sum{stage="a\\"b"} 3.65',
+        'demo_seconds_count{stage="a\\"b"} 4',
+    ]
+    assert "demo_total 2" in lines
+    with pytest.raises(ValueError):
+        latency.observe(1)
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        redis = redis_module.get_redis()
+        with span("lookup"):
+            await redis.set(f"item:{item_id}", "x" * 100)
+            async with redis.pipeline() as pipe:
+                await pipe.get(f"item:{item_id}").get("missing").execute()
+        time.sleep(0.03)
+        return {"item_id": item_id}
+
+    return app
+
+
+def _sample(text, prefix):
+    return next(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_middleware_records_routes_spans_and_redis_round_trips(monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    before = asyncio.run(get_metrics()).body.decode()
+    round_trips = 'http_request_redis_round_trips_sum{route="/items/{item_id}"}'
+    previous = _sample(before, round_trips) if round_trips in before else 0
+
+    response = TestClient(_app()).get("/items/42")
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("lookup;dur=")
+    assert "total;dur=" in response.headers["server-timing"]
+
+    text = asyncio.run(get_metrics()).body.decode()
+    # 按路由模板统计，实际路径中的ID不作为标签；SET 和一次流水线，共两次往返
+    assert _sample(text, round_trips) == previous + 2
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"}' in text
+    assert 'redis_command_duration_seconds_count{command="PIPELINE"}' in text
+    assert _sample(text, 'redis_payload_bytes_sum{command="PIPELINE",direction="received"}') >= 100
+    assert 'stage_duration_seconds_count{stage="lookup"}' in text
+    # 组件的累计值以 counter 输出，其余以 gauge 输出
+    assert "# TYPE dataframe_cache_hits_total counter" in text and "dataframe_cache_hits_total " in text
+    assert "# TYPE dataframe_cache_hit_rate gauge" in text
+    assert "# TYPE dataframe_executor_queue_wait_seconds_total counter" in text
+    assert "# TYPE blob_store_blobs gauge" in text
+
+
+def test_profile_header_saves_folded_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    monkeypatch.setattr(settings, "PROFILING_DIRECTORY", tmp_path)
+    client = TestClient(_app())
+
+    # 未开启时忽略请求头
+    assert "x-profile-id" not in client.get("/items/1", headers={"X-Profile": "1"}).headers
+
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    response = client.get("/items/1", headers={"X-Profile": "1"})
+    profile = (tmp_path / response.headers["x-profile-id"]).read_text()
+    assert "read_item (test_metrics.py:" in profile
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in profile.splitlines())
@@ -0,0 +1,108 @@
+import asyncio
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app.services.file_service import FileService
+from app.utils.profiler import describe_from_profile, hll_distinct_count, profile_parquet
+
+
+def _write(tmp_path, df):
+    path = tmp_path / "data.parquet"
+    df.to_parquet(path, index=False)
+    return path
+
+
+def test_exact_profile_matches_pandas(tmp_path):
+    df = pd.DataFrame({
+        "id": [1, 2, 3, 4, 5],
+        "price": [10.0, 20.0, None, 20.0, 12.5],
+        "city": ["北京", "上海", "北京", None, "北京"],
+        "flag": [True, False, True, False, True],
+    })
+    profile = profile_parquet(_write(tmp_path, df), top_k=2, approx_min_rows=1000, sample_rows=100)
+    columns = {c["name"]: c for c in profile["columns"]}
+
+    for name in df.columns:
+        assert columns[name]["null_count"] == df[name].isnull().sum()
+        assert columns[name]["unique_count"] == df[name].nunique()
+        assert not columns[name]["approximate"]
+    assert columns["city"]["top_values"] == [{"value": "北京", "count": 3}, {"value": "上海", "count": 1}]
+    # 所有值都只出现一次时不记录高频值
+    assert columns["id"]["top_values"] == []
+    assert columns["flag"]["top_values"][0] == {"value": True, "count": 3}
+    assert "mean" not in columns["flag"]
+
+    expected = df.describe().to_dict()
+    actual = describe_from_profile(profile)
+    assert set(actual) == set(expected)
+    for name, stats in expected.items():
+        for key, value in stats.items():
+            assert actual[name][key] == pytest.approx(value)
+    assert len(profile["sample"]) == 3
+
+
+def test_hll_distinct_count_is_close():
+    values = pa.chunked_array([np.arange(200_000) % 50_000])
+    assert hll_distinct_count(values) == pytest.approx(50_000, rel=0.03)
+    strings = pa.chunked_array([[f"user-{i}" for i in range(30_000)] + [None]])
+    assert hll_distinct_count(strings) == pytest.approx(30_000, rel=0.03)
+
+
+def test_approximate_profile_above_row_threshold(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "category": rng.choice(["A", "B"], 20_000, p=[0.9, 0.1]),
+        "user": [f"user-{i % 15_000}" for i in range(20_000)],
+        "value": rng.random(20_000),
+    })
+    profile = profile_parquet(_write(tmp_path, df), top_k=2, approx_min_rows=10_000, sample_rows=1_000)
+    category, user, value = profile["columns"]
+
+    # 低基数列在抽样后仍精确计算
+    assert not category["approximate"]
+    assert category["top_values"] == [{"value": "A", "count": int((df["category"] == "A").sum())}, {
+        "value": "B", "count": int((df["category"] == "B").sum())}]
+    # 高基数字符串列使用 HyperLogLog
+    assert user["approximate"]
+    assert user["unique_count"] == pytest.approx(15_000, rel=0.03)
+    # 数值列始终精确
+    assert not value["approximate"]
+    assert value["unique_count"] == df["value"].nunique()
+    assert value["quantiles"]["50%"] == pytest.approx(df["value"].median())
+
+
+def test_profile_is_persisted_and_used_for_data_info(tmp_path):
+    service = FileService()
+    service.base_dir = tmp_path
+    result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(b"a,b\n1,x\n2,y\n2,y\n")))
+    file_id = result["file_id"]
+
+    assert (tmp_path / "s1" / file_id / "profile.json").exists()
+    info = asyncio.run(service.get_data_info("s1", file_id))
+    assert info["shape"] == [3, 2]
+    assert info["column_stats"]["b"] == {"null_count": 0, "unique_count": 2, "min": "x", "max": "y", "top_values": ["y", "x"]}
+    assert info["column_stats"]["a"]["mean"] == pytest.approx(5 / 3)
+
+
+def test_narrow_int_columns_do_not_overflow(tmp_path):
+    # 上传时整数列按取值范围缩小为 int8/int16，分位数插值不能在原类型上相减
+    values = [-100, 100] * 50
+    service = FileService()
+    service.base_dir = tmp_path
+    csv = "small,medium\n" + "".join(f"{v},{v * 300}\n" for v in values)
+    result = asyncio.run(service.process_csv("s1", "data.csv", io.BytesIO(csv.encode())))
+    df = pd.read_parquet(tmp_path / "s1" / result["file_id"] / "data.parquet")
+    assert (df["small"].dtype, df["medium"].dtype) == ("int8", "int16")
+
+    profile = asyncio.run(service.get_file_profile("s1", result["file_id"]))
+    columns = {c["name"]: c for c in profile["columns"]}
+    for name in ("small", "medium"):
+        expected = df[name].astype("float64").quantile([0.25, 0.5, 0.75]).tolist()
+        assert list(columns[name]["quantiles"].values()) == pytest.approx(expected)
+        assert columns[name]["std"] == pytest.approx(df[name].std())
+    assert columns["small"]["quantiles"]["50%"] == 0
+    assert result["summary"]["basic_stats"]["small"]["50%"] == 0
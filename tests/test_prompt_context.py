@@ -0,0 +1,90 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from app.api.v1.chat import _referenced_columns
+from app.core.config import settings
+from app.core.llm import LLMManager
+from app.services.file_service import FileService
+from app.utils.prompt_context import build_prompt_context
+from app.utils.tokens import estimate_tokens
+
+
+def _profile(column_count):
+    columns = [
+        {
+            "name": f"metric_{i}", "type": "double", "null_count": 0, "approximate": False,
+            "unique_count": 100, "top_values": [{"value": 1.5, "count": 3}],
+            "min": 0.0, "max": 99.0, "mean": 49.5,
+        }
+        for i in range(column_count)
+    ]
+    sample = [{c["name"]: float(row) for c in columns} for row in range(5)]
+    return {"row_count": 100, "column_count": column_count, "columns": columns, "sample": sample}
+
+
+def test_small_table_is_described_in_full():
+    profile = _profile(3)
+    result = build_prompt_context(profile, token_budget=1500, priority_columns=["metric_2"])
+
+    assert not result["truncated"]
+    assert result["tokens"] == estimate_tokens(result["text"])
+    # 未截断时输出与引用列无关
+    assert result == build_prompt_context(profile, token_budget=1500)
+    assert result["text"].count(", 均值") == 3
+    assert "样本数据:" in result["text"]
+
+
+def test_wide_table_respects_budget_and_priorities():
+    profile = _profile(300)
+    result = build_prompt_context(profile, token_budget=600, priority_columns=["metric_250", "missing"])
+
+    assert result["truncated"]
+    assert result["tokens"] <= 600
+    lines = {line.split(" (")[0]: line for line in result["text"].splitlines() if line.startswith("- ")}
+    # 引用过的列保留详细统计
+    assert "均值" in lines['- "metric_250"']
+    assert "列未列出" in result["text"]
+
+
+def test_prompt_context_is_precomputed_on_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+    monkeypatch.setattr(settings, "PROMPT_CONTEXT_TOKEN_BUDGET", 200)
+    header = ",".join(f"col_{i}" for i in range(40))
+    rows = "\n".join(",".join(str(r * i) for i in range(40)) for r in range(20))
+
+    async def scenario():
+        service = FileService()
+        upload = await service.process_csv("s1", "wide.csv", io.BytesIO(f"{header}\n{rows}\n".encode()))
+        default = await service.get_prompt_context("s1", upload["file_id"])
+        focused = await service.get_prompt_context("s1", upload["file_id"], ["col_39"])
+        return upload, default, focused
+
+    upload, default, focused = asyncio.run(scenario())
+    metadata = json.loads((tmp_path / "s1" / upload["file_id"] / "metadata.json").read_text())
+    assert default["truncated"]
+    assert default["tokens"] <= 200
+    assert '- "col_39" (int16), 空值' not in default["text"]
+    assert '- "col_39" (int16), 空值' in focused["text"]
+    assert metadata["prompt_context"] == default
+
+
+def test_system_prompt_prefix_is_stable():
+    manager = LLMManager(client=object())
+    first = manager._generate_system_prompt({"prompt_context": build_prompt_context(_profile(3), 1500)})
+    second = manager._generate_system_prompt({"prompt_context": build_prompt_context(_profile(30), 1500)})
+    data_start = first.index("数据信息:")
+
+    assert first[:data_start] == second[:data_start]
+    assert first == manager._generate_system_prompt({"prompt_context": build_prompt_context(_profile(3), 1500)})
+
+
+def test_referenced_columns_match_whole_names():
+    columns = ["id", "a", "age", "average_price", "销售额", "city"]
+    # id、a、age 只是 valid、average 等单词的一部分，不算提到
+    assert _referenced_columns("What is the average_price of valid orders by city?", columns, []) == [
+        "average_price", "city"
+    ]
+    assert _referenced_columns("按城市统计销售额和 age", columns, ["city"]) == ["age", "销售额", "city"]
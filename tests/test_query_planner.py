@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from app.utils.data_processor import process_dataframe
+from app.utils.query_planner import execute_operation, plan_operation, translate_query
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    df = pd.DataFrame({
+        "city": ["北京", "上海", None, "北京", "广州"],
+        "price": [10.0, np.nan, 30.0, 40.0, 50.0],
+        "quantity": [1, 2, 3, 4, 5],
+        "unused": ["a", "b", "c", "d", "e"],
+    })
+    path = tmp_path / "data.parquet"
+    df.to_parquet(path)
+    return path
+
+
+@pytest.mark.parametrize("query", [
+    "price > 20",
+    "price != 40",
+    "not (price > 20)",
+    "city == '北京' and quantity >= 2",
+    "city in ['北京', '广州'] or price < 15",
+    "city not in ['北京']",
+    "10 < price <= 40",
+    "~(city == '上海') & (quantity < 5)",
+])
+def test_pushed_down_filter_matches_pandas_query(parquet_path, query):
+    df = pd.read_parquet(parquet_path)
+    assert translate_query(query, list(df.columns)) is not None
+
+    result = execute_operation(parquet_path, {"type": "filter", "query": query})
+
+    expected = df.query(query).reset_index(drop=True)
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected)
+
+
+def test_untranslatable_filter_falls_back_to_pandas(parquet_path):
+    query = "price > quantity * 10"
+    assert translate_query(query, ["price", "quantity"]) is None
+
+    result = execute_operation(parquet_path, {"type": "filter", "query": query})
+
+    expected = pd.read_parquet(parquet_path).query(query)
+    assert result["quantity"].tolist() == expected["quantity"].tolist()
+
+
+def test_aggregation_projects_only_needed_columns(parquet_path):
+    operation = {
+        "type": "aggregation",
+        "method": "groupby",
+        "columns": ["city"],
+        "agg_func": "sum",
+        "target_columns": ["quantity"],
+    }
+    plan = plan_operation(operation, ["city", "price", "quantity", "unused"])
+    assert plan["columns"] == ["city", "quantity"]
+
+    result = execute_operation(parquet_path, operation)
+
+    expected = process_dataframe(pd.read_parquet(parquet_path), operation)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_unknown_columns_are_not_projected():
+    plan = plan_operation({"type": "statistical", "method": "describe", "columns": ["missing"]}, ["a"])
+    assert plan["columns"] is None
+
+
+def test_filter_projection_and_limit_are_pushed_down(parquet_path):
+    operation = {"type": "filter", "query": "price.notna() and quantity > 1", "columns": ["city"], "limit": 2}
+    plan = plan_operation(operation, ["city", "price", "quantity", "unused"])
+    assert plan["filter"] is not None and plan["residual"] is None
+    assert plan["columns"] == ["city"] and plan["limit"] == 2
+
+    result = execute_operation(parquet_path, operation)
+
+    expected = process_dataframe(pd.read_parquet(parquet_path), operation)
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_date_strings_are_pushed_down_against_timestamp_columns(tmp_path):
+    df = pd.DataFrame({
+        "day": pd.date_range("2023-01-01", periods=60, freq="D").astype("datetime64[us]"),
+        "city": pd.Categorical(["北京", "上海", "广州"] * 20),
+    })
+    path = tmp_path / "data.parquet"
+    df.to_parquet(path)
+    query = "day >= '2023-02-01' and city == '北京'"
+    types = {"day": pa.timestamp("us"), "city": pa.dictionary(pa.int8(), pa.string())}
+    assert translate_query(query, list(df.columns), types) is not None
+
+    result = execute_operation(path, {"type": "filter", "query": query})
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), df.query(query).reset_index(drop=True))
@@ -0,0 +1,92 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.chat import get_result_page
+from app.core.config import settings
+from app.services.chat_service import ChatService
+from app.services.file_service import FileService
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+    monkeypatch.setattr(settings, "RESULT_PAGE_SIZE", 100)
+    monkeypatch.setattr(settings, "RESULT_BATCH_ROWS", 1000)
+
+
+def _large_result(rows=5000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "city": rng.choice(["北京", "上海", None], rows),
+        "sales": rng.random(rows),
+    })
+
+
+def _payload(df):
+    async def scenario():
+        service = ChatService()
+        service.file_service = FileService()
+        context = {"data_source": {"session_id": "s1", "file_id": "f1"}}
+        return await service._result_payload(context, df)
+    return asyncio.run(scenario())
+
+
+def test_small_results_are_returned_inline():
+    df = _large_result(rows=50)
+    assert _payload(df) == {"processed_data": df.to_dict(orient="records")}
+
+
+def test_large_result_returns_first_page_and_handle():
+    df = _large_result()
+    payload = _payload(df)
+
+    assert payload["total_rows"] == 5000
+    assert payload["file_id"] == "f1"
+    assert payload["processed_data"] == df.head(100).to_dict(orient="records")
+
+    async def read_page(**params):
+        response = await get_result_page("s1", "f1", payload["result_id"], file_service=FileService(), **params)
+        return json.loads(response.body)
+
+    page = asyncio.run(read_page(offset=4950, limit=100, format="json"))
+    assert page["columns"] == ["id", "city", "sales"]
+    assert page["data"]["id"] == list(range(4950, 5000))
+    # 缺失值返回 null
+    assert page["data"]["city"] == [None if pd.isna(v) else v for v in df["city"].iloc[4950:]]
+    assert page["next_offset"] is None
+    first = asyncio.run(read_page(offset=0, limit=None, format="json"))
+    assert first["next_offset"] == 100 and len(first["data"]["sales"]) == 100
+
+
+def test_arrow_stream_returns_all_rows_in_batches():
+    df = _large_result()
+    payload = _payload(df)
+
+    async def read_stream():
+        response = await get_result_page(
+            "s1", "f1", payload["result_id"], offset=10, limit=None, format="arrow", file_service=FileService()
+        )
+        chunks = [chunk async for chunk in response.body_iterator]
+        return response, chunks
+
+    response, chunks = asyncio.run(read_stream())
+    assert response.headers["X-Total-Rows"] == "5000"
+    # 每个记录批次单独输出
+    assert len(chunks) > 5
+    table = pa.ipc.open_stream(io.BytesIO(b"".join(chunks))).read_all()
+    pd.testing.assert_frame_equal(table.to_pandas(), df.iloc[10:].reset_index(drop=True))
+
+
+def test_unknown_or_invalid_result_id_is_not_found():
+    for result_id in ("0" * 32, "../../data"):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(get_result_page("s1", "f1", result_id, offset=0, limit=None, format="json", file_service=FileService()))
+        assert exc.value.status_code == 404
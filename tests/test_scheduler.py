@@ -0,0 +1,42 @@
+import asyncio
+import pytest
+from app.core import redis as redis_module
+from app.core.scheduler import CleanupScheduler
+from app.services.context_service import ContextService
+from app.services.file_service import FileService
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    fake = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_module, "_pool", fake.connection_pool)
+
+
+def test_run_once_records_metrics_and_holds_lock(monkeypatch):
+    async def file_cleanup(self):
+        return {"sessions_removed": 2, "blobs_removed": 1, "reclaimed_bytes": 1024}
+
+    async def session_cleanup(self):
+        return 3
+
+    monkeypatch.setattr(FileService, "cleanup_old_sessions", file_cleanup)
+    monkeypatch.setattr(ContextService, "cleanup_inactive_sessions", session_cleanup)
+    scheduler = CleanupScheduler(interval=60)
+
+    async def scenario():
+        first = await scheduler.run_once()
+        # 锁未过期前，其他进程（或下一次调用）跳过本周期
+        second = await scheduler.run_once()
+        return first, second
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert scheduler.metrics["runs"] == 1
+    assert scheduler.metrics["skipped"] == 1
+    assert scheduler.metrics["last_file_sessions_removed"] == 2
+    assert scheduler.metrics["last_redis_sessions_removed"] == 3
+    assert scheduler.metrics["last_blobs_removed"] == 1
+    assert scheduler.metrics["total_reclaimed_bytes"] == 1024
+    assert scheduler.metrics["last_duration_seconds"] is not None
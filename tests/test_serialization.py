@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.core.serialization import FastJSONResponse, decode_blob, dumps, encode_blob
+from app.services.context_service import ContextService
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+
+def test_numpy_and_pandas_values_are_encoded():
+    df = pd.DataFrame({"a": [1, 2, None], "d": pd.to_datetime(["2023-01-01", None, "2023-01-03"])})
+    payload = {
+        "memory_usage": df.memory_usage(deep=True).sum(),
+        "describe": df[["a"]].describe().to_dict(),
+        "records": df.to_dict(orient="records"),
+        "by_date": df.set_index("d")["a"].to_dict(),
+        "array": np.arange(3),
+        "flag": np.bool_(True),
+    }
+    decoded = json.loads(dumps(payload))
+
+    assert decoded["memory_usage"] == int(payload["memory_usage"])
+    assert decoded["describe"]["a"]["count"] == 2.0
+    # NaN 和 NaT 编码为 null
+    assert decoded["records"][2] == {"a": None, "d": "2023-01-03T00:00:00"}
+    assert decoded["records"][1]["d"] is None
+    assert decoded["by_date"]["2023-01-01T00:00:00"] == 1.0
+    assert decoded["array"] == [0, 1, 2] and decoded["flag"] is True
+    assert json.loads(FastJSONResponse(payload).body) == decoded
+
+
+def test_large_blobs_are_compressed(monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_COMPRESS_MIN_BYTES", 1024)
+    small = {"answer": "北京"}
+    large = {"rows": [{"city": "北京", "sales": i} for i in range(500)]}
+
+    assert encode_blob(small) == '{"answer":"北京"}'
+    encoded = encode_blob(large)
+    assert encoded.startswith("z:") and len(encoded) < len(dumps(large)) / 5
+    assert decode_blob(encoded) == large
+    # 兼容用标准库写入的旧数据
+    assert decode_blob(json.dumps(small)) == small
+
+
+def test_session_round_trip_with_compressed_responses(monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    monkeypatch.setattr(settings, "MAX_CONVERSATION_HISTORY", 2)
+    response = {"answer": "结果", "data_results": {"processed_data": [{"v": np.int64(i)} for i in range(2000)]}}
+
+    async def scenario():
+        service = ContextService()
+        await service.create_session("s1")
+        await service.update_context("s1", {"last_response": response})
+        for i in range(3):
+            await service.add_conversation("s1", f"q{i}", response, file_id="f1")
+        stored = await service.redis.hgetall("context:s1:responses")
+        return stored, await service.get_context("s1")
+
+    stored, context = asyncio.run(scenario())
+    expected = json.loads(dumps(response))
+    # 超出记录上限的对话连同单独存储的回复一起删除
+    assert len(stored) == 2
+    assert all(value.startswith("z:") for value in stored.values())
+    assert context["last_response"] == expected
+    assert [turn["query"] for turn in context["conversation_history"]] == ["q1", "q2"]
+    assert all(turn["response"] == expected for turn in context["conversation_history"])
@@ -0,0 +1,200 @@
+import asyncio
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.core.llm import LLMManager
+from app.utils import session_query
+from app.utils.csv_ingest import infer_csv_dtypes, write_csv_to_parquet
+from app.utils.prompt_context import build_tables_context
+from app.utils.session_query import execute_session_operation, session_table_names
+
+
+@pytest.fixture
+def tables(tmp_path):
+    rng = np.random.default_rng(0)
+    orders = pd.DataFrame({
+        "order_id": np.arange(1000),
+        "customer_id": rng.integers(0, 50, 1000),
+        "amount": rng.random(1000) * 100,
+        "note": ["x" * 20] * 1000,
+    })
+    customers = pd.DataFrame({
+        "customer_id": np.arange(50),
+        "region": rng.choice(["north", "south"], 50),
+        "note": ["y"] * 50,
+    })
+    paths = {"orders": tmp_path / "orders.parquet", "customers": tmp_path / "customers.parquet"}
+    orders.to_parquet(paths["orders"])
+    customers.to_parquet(paths["customers"])
+    return paths, orders, customers
+
+
+def test_table_names_come_from_filenames():
+    files = [
+        {"file_id": "a", "filename": "2023 sales.csv"},
+        {"file_id": "b", "filename": "客户-列表.csv"},
+        {"file_id": "c", "filename": "2023 sales.csv"},
+    ]
+    assert session_table_names(files) == {"t_2023_sales": "a", "客户_列表": "b", "t_2023_sales_2": "c"}
+
+
+def test_join_then_aggregation_matches_pandas(tables, monkeypatch):
+    paths, orders, customers = tables
+    read_columns = []
+    original_read = session_query._read
+    monkeypatch.setattr(
+        session_query, "_read",
+        lambda dataset, columns, filter=None: read_columns.append(columns) or original_read(dataset, columns, filter)
+    )
+
+    result = execute_session_operation(paths, {
+        "type": "join", "left": "orders", "right": "customers", "on": "customer_id",
+        "then": {"type": "aggregation", "columns": ["region"], "target_columns": ["amount"], "agg_func": "sum"},
+    })
+
+    expected = orders.merge(customers, on="customer_id").groupby("region")["amount"].sum()
+    assert result.set_index("region")["amount"].to_dict() == pytest.approx(expected.to_dict())
+    # 只读取连接键和聚合引用的列
+    assert read_columns == [["customer_id", "amount"], ["customer_id", "region"]]
+
+
+def test_join_suffixes_duplicate_columns(tables):
+    paths, _, _ = tables
+    result = execute_session_operation(paths, {
+        "type": "join", "left": "orders", "right": "customers", "on": ["customer_id"], "how": "left",
+    })
+    assert {"note", "note_customers", "region"} <= set(result.columns)
+    assert len(result) == 1000
+
+
+def test_then_can_use_suffixed_columns(tables, monkeypatch):
+    paths, orders, customers = tables
+    read_columns = []
+    original_read = session_query._read
+    monkeypatch.setattr(
+        session_query, "_read",
+        lambda dataset, columns, filter=None: read_columns.append(columns) or original_read(dataset, columns, filter)
+    )
+
+    result = execute_session_operation(paths, {
+        "type": "join", "left": "orders", "right": "customers", "on": "customer_id",
+        "then": {"type": "aggregation", "columns": ["note_customers"], "target_columns": ["amount"], "agg_func": "count"},
+    })
+    assert result.set_index("note_customers")["amount"].to_dict() == {"y": len(orders)}
+    # 带后缀的列映射回右表的原列名
+    assert read_columns == [["customer_id", "amount"], ["customer_id", "note"]]
+
+
+def test_join_pushes_filter_to_one_side(tables, monkeypatch):
+    paths, orders, customers = tables
+    filters = []
+    original_read = session_query._read
+    monkeypatch.setattr(
+        session_query, "_read",
+        lambda dataset, columns, filter=None: filters.append(filter) or original_read(dataset, columns, filter)
+    )
+
+    result = execute_session_operation(paths, {
+        "type": "join", "left": "orders", "right": "customers", "on": "customer_id",
+        "then": {"type": "filter", "query": "region == 'north' and note_customers == 'y'"},
+    })
+    assert filters[0] is None and filters[1] is None
+    filters.clear()
+
+    result = execute_session_operation(paths, {
+        "type": "join", "left": "orders", "right": "customers", "on": "customer_id",
+        "then": {"type": "filter", "query": "region == 'north'"},
+    })
+    expected = orders.merge(customers, on="customer_id").query("region == 'north'")
+    assert filters[0] is None and filters[1] is not None
+    assert sorted(result["order_id"]) == sorted(expected["order_id"])
+
+    # left join 不下推右表的条件
+    filters.clear()
+    execute_session_operation(paths, {
+        "type": "join", "left": "orders", "right": "customers", "on": "customer_id", "how": "left",
+        "then": {"type": "filter", "query": "region == 'north'"},
+    })
+    assert filters == [None, None]
+
+
+def test_join_keys_with_different_types(tmp_path):
+    paths = {"a": tmp_path / "a.parquet", "b": tmp_path / "b.parquet"}
+    pd.DataFrame({"k": np.array([1, 2, 3], dtype="int8"), "x": ["p", "q", "r"]}).to_parquet(paths["a"])
+    pd.DataFrame({"k": [2, 3, 4], "y": pd.Categorical(["u", "v", "w"])}).to_parquet(paths["b"])
+    result = execute_session_operation(paths, {"type": "join", "left": "a", "right": "b", "on": "k"})
+    assert sorted(zip(result["k"], result["y"].astype(str))) == [(2, "u"), (3, "v")]
+
+    pd.DataFrame({"k": ["2"], "z": [1]}).to_parquet(paths["b"])
+    with pytest.raises(ValueError, match="类型不兼容"):
+        execute_session_operation(paths, {"type": "join", "left": "a", "right": "b", "on": "k"})
+
+
+def test_union_with_source_column(tables):
+    paths, orders, customers = tables
+    result = execute_session_operation(paths, {
+        "type": "union", "tables": ["orders", "customers"], "source_column": "source",
+        "then": {"type": "aggregation", "columns": ["source"], "target_columns": ["customer_id"], "agg_func": "count"},
+    })
+    counts = result.set_index("source")["customer_id"].to_dict()
+    assert counts == {"orders": len(orders), "customers": len(customers)}
+
+
+def test_union_categorical_and_string_columns(tmp_path):
+    # 导入时 a 的 city 为分类类型，b 的 city 取值都不重复，保持为字符串
+    contents = {
+        "a": "city,sales\n" + "bj,1\nsh,2\n" * 100,
+        "b": "city,sales\ngz,3\nsz,4\ncd,5\n",
+    }
+    paths = {}
+    for name, content in contents.items():
+        dtypes = infer_csv_dtypes(io.BytesIO(content.encode()), 1000, max_categories=100)
+        paths[name] = tmp_path / f"{name}.parquet"
+        write_csv_to_parquet(io.BytesIO(content.encode()), paths[name], dtypes, 1000)
+    assert pa.types.is_dictionary(pq.read_schema(paths["a"]).field("city").type)
+    assert not pa.types.is_dictionary(pq.read_schema(paths["b"]).field("city").type)
+
+    result = execute_session_operation(paths, {
+        "type": "union", "tables": ["a", "b"],
+        "then": {"type": "aggregation", "columns": ["city"], "target_columns": ["sales"], "agg_func": "sum"},
+    })
+    assert result.set_index("city")["sales"].to_dict() == {"bj": 100, "sh": 200, "gz": 3, "sz": 4, "cd": 5}
+
+
+def test_single_table_operation_on_named_table(tables):
+    paths, _, customers = tables
+    result = execute_session_operation(paths, {
+        "type": "filter", "table": "customers", "query": "region == 'north'"
+    })
+    assert len(result) == (customers["region"] == "north").sum()
+
+
+def test_unknown_table_is_rejected(tables):
+    paths, _, _ = tables
+    with pytest.raises(ValueError, match="未知的数据表"):
+        execute_session_operation(paths, {"type": "join", "left": "orders", "right": "missing", "on": "id"})
+
+
+def test_prompt_lists_session_tables():
+    session_tables = [
+        {"name": "orders", "file_id": "f1", "rows": 1000, "columns": {"order_id": "int64", "amount": "double"}},
+        {"name": "customers", "file_id": "f2", "rows": 50, "columns": {"customer_id": "int64"}},
+    ]
+    text = build_tables_context(session_tables, "f1")
+    assert '- orders（当前表，1000 行）: "order_id" (int64), "amount" (double)' in text
+    assert '- customers（50 行）: "customer_id" (int64)' in text
+
+    context = {
+        "prompt_context": {"text": "数据描述"},
+        "data_source": {"session_id": "s1", "file_id": "f1"},
+        "session_tables": session_tables,
+    }
+    single = LLMManager.__new__(LLMManager)._generate_system_prompt({"prompt_context": {"text": "数据描述"}})
+    prompt = LLMManager.__new__(LLMManager)._generate_system_prompt(context)
+    # 表列表追加在数据描述之后，不改变前缀
+    assert prompt.startswith(single) and text in prompt
@@ -0,0 +1,156 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api.v1.upload import get_upload_job, get_upload_job_result, submit_upload_job
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.core.jobs import upload_jobs
+from app.services.context_service import ContextService
+from app.services.upload_job_service import JOB_STAGES, UploadJobService
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+CSV = "city,sales\n北京,10\n上海,4\n北京,20\n".encode()
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(redis_module, "_pool", fakeredis.aioredis.FakeRedis(decode_responses=True).connection_pool)
+    monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", tmp_path)
+
+
+def _submit(session_id, content=CSV):
+    return submit_upload_job(session_id, UploadFile(io.BytesIO(content), filename="sales.csv"), UploadJobService())
+
+
+def test_upload_job_runs_stages_in_background(tmp_path, monkeypatch):
+    stages = []
+    save = UploadJobService._save
+
+    async def record(self, job):
+        stages.append((job["status"], job["stage"], job["progress"]))
+        await save(self, job)
+
+    monkeypatch.setattr(UploadJobService, "_save", record)
+
+    async def scenario():
+        await ContextService().create_session("s1")
+        job = await _submit("s1")
+        # 立即返回，任务尚未开始处理
+        assert job["status"] == "queued" and job["file_id"] is None
+        with pytest.raises(HTTPException) as pending:
+            await get_upload_job_result(job["job_id"], UploadJobService())
+        assert pending.value.status_code == 409
+
+        await upload_jobs.wait()
+        status = await get_upload_job(job["job_id"], UploadJobService())
+        result = await get_upload_job_result(job["job_id"], UploadJobService())
+        context = await ContextService().get_context("s1")
+        return job, status, result, context
+
+    job, status, result, context = asyncio.run(scenario())
+    assert [(status, stage) for status, stage, _ in stages] == [
+        ("queued", "queued"), *(("running", stage) for stage in JOB_STAGES[1:]), ("done", "register")
+    ]
+    assert [p for _, _, p in stages] == sorted(p for _, _, p in stages)
+    assert status["status"] == "done" and status["progress"] == 1.0
+    assert result["success"] and result["file_id"] == status["file_id"]
+    assert result["summary"]["row_count"] == 3
+    assert [f["file_id"] for f in context["files"]] == [result["file_id"]]
+    # 落盘的上传内容已删除
+    assert not list(tmp_path.glob("*.csv"))
+
+
+def test_duplicate_uploads_reuse_job(tmp_path):
+    async def scenario():
+        await ContextService().create_session("s1")
+        await ContextService().create_session("s2")
+        first = await _submit("s1")
+        # 处理中的相同内容复用同一个任务
+        second = await _submit("s1")
+        await upload_jobs.wait()
+        third = await _submit("s1")
+        other_session = await _submit("s2")
+        other_content = await _submit("s1", CSV + "广州,7\n".encode())
+        await upload_jobs.wait()
+        context = await ContextService().get_context("s1")
+        return first, second, third, other_session, other_content, context
+
+    first, second, third, other_session, other_content, context = asyncio.run(scenario())
+    assert second["duplicate"] and third["duplicate"]
+    assert first["job_id"] == second["job_id"] == third["job_id"]
+    assert third["status"] == "done"
+    assert not other_session["duplicate"] and not other_content["duplicate"]
+    assert len(context["files"]) == 2
+    assert len([p for p in (tmp_path / "s1").iterdir()]) == 2
+    assert not list(tmp_path.glob("*.csv"))
+
+
+def test_failed_job_is_retried_on_resubmit(tmp_path):
+    async def scenario():
+        # 会话不存在，注册阶段失败
+        failed = await _submit("missing")
+        await upload_jobs.wait()
+        failed = await get_upload_job(failed["job_id"], UploadJobService())
+        with pytest.raises(HTTPException) as error:
+            await get_upload_job_result(failed["job_id"], UploadJobService())
+
+        await ContextService().create_session("missing")
+        retried = await _submit("missing")
+        await upload_jobs.wait()
+        return failed, error.value, retried, await get_upload_job(retried["job_id"], UploadJobService())
+
+    failed, error, retried, status = asyncio.run(scenario())
+    assert failed["status"] == "failed" and failed["stage"] == "register"
+    assert error.status_code == 500
+    assert not retried["duplicate"] and retried["job_id"] != failed["job_id"]
+    assert status["status"] == "done"
+    # 失败任务导入的文件已删除，只保留重试任务的文件
+    assert [p.name for p in (tmp_path / "missing").iterdir()] == [status["file_id"]]
+
+
+def test_stale_job_is_not_reused(tmp_path, monkeypatch):
+    async def scenario():
+        await ContextService().create_session("s1")
+        first = await _submit("s1")
+        await upload_jobs.wait()
+        # 模拟处理进程在导入过程中退出：任务停留在 running，且长时间没有更新
+        redis = redis_module.get_redis()
+        job = await UploadJobService().get_job(first["job_id"])
+        job.update(status="running", stage="profile", updated_at=job["updated_at"] - settings.UPLOAD_JOB_STALE_SECONDS - 1)
+        await redis.set(f"upload_job:{first['job_id']}", dumps(job))
+        stale = await get_upload_job(first["job_id"], UploadJobService())
+
+        retried = await _submit("s1")
+        await upload_jobs.wait()
+        return stale, retried, await get_upload_job(retried["job_id"], UploadJobService())
+
+    stale, retried, status = asyncio.run(scenario())
+    assert stale["status"] == "failed" and "中断" in stale["error"]
+    assert not retried["duplicate"] and retried["job_id"] != stale["job_id"]
+    assert status["status"] == "done"
+
+
+def test_heartbeat_keeps_queued_job_fresh(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_JOB_STALE_SECONDS", 0.2)
+
+    async def scenario():
+        await ContextService().create_session("s1")
+        # 占满任务池，新任务排队超过中断判定时间
+        async with upload_jobs.slot(), upload_jobs.slot():
+            first = await _submit("s1")
+            await asyncio.sleep(0.5)
+            queued = await get_upload_job(first["job_id"], UploadJobService())
+            second = await _submit("s1")
+        await upload_jobs.wait()
+        return queued, second
+
+    monkeypatch.setattr(upload_jobs, "concurrency", 2)
+    queued, second = asyncio.run(scenario())
+    assert queued["status"] == "queued"
+    assert second["duplicate"]